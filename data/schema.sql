@@ -6,6 +6,7 @@
 -- - memory_facts: Extracted facts for long-term memory
 -- - documents: RAG document index
 -- - document_chunks: RAG document chunks with embeddings
+-- - chunk_embeddings: embeddings shared by chunks with identical content
 -- - autogpt_runs: Autonomous task runs
 -- - autogpt_steps: Steps within autonomous runs
 -- - user_profile: User preferences and habits
@@ -58,7 +59,9 @@ CREATE TABLE IF NOT EXISTS documents (
     file_type TEXT,  -- 'pdf', 'docx', 'txt', 'md'
     file_size INTEGER,
     chunk_count INTEGER DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    content_hash TEXT,  -- SHA-256 of the file (content dedup)
+    collection TEXT DEFAULT 'default'  -- rag_collections.name
 );
 
 -- Document Chunks (for RAG)
@@ -68,11 +71,24 @@ CREATE TABLE IF NOT EXISTS document_chunks (
     content TEXT NOT NULL,
     embedding BLOB,
     chunk_index INTEGER,
-    tokens INTEGER DEFAULT 0
+    tokens INTEGER DEFAULT 0,
+    page INTEGER,              -- 1-based page (PDFs)
+    heading_path TEXT,         -- "Guide > Setup > Linux"
+    char_start INTEGER,        -- Offsets into the parsed document text
+    char_end INTEGER,
+    content_hash TEXT,         -- SHA-256 of content, key into chunk_embeddings
+    store_slot INTEGER         -- Slot in the collection's segment store (text/embedding live there)
 );
 
 CREATE INDEX IF NOT EXISTS idx_chunks_document ON document_chunks(document_id);
 
+-- Embeddings shared by identical chunks (across documents and versions)
+CREATE TABLE IF NOT EXISTS chunk_embeddings (
+    content_hash TEXT PRIMARY KEY,
+    embedding BLOB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Auto-GPT Task Runs
 CREATE TABLE IF NOT EXISTS autogpt_runs (
     id TEXT PRIMARY KEY,
@@ -177,6 +193,30 @@ CREATE TABLE IF NOT EXISTS interaction_outcomes (
 CREATE INDEX IF NOT EXISTS idx_outcomes_date ON interaction_outcomes(session_date);
 CREATE INDEX IF NOT EXISTS idx_outcomes_message ON interaction_outcomes(message_id);
 
+-- Per-day outcome rollup, updated with every interaction_outcomes insert
+CREATE TABLE IF NOT EXISTS metrics_rollup_daily (
+    day DATE PRIMARY KEY,
+    total INTEGER DEFAULT 0,
+    positive INTEGER DEFAULT 0,
+    negative INTEGER DEFAULT 0,
+    corrections INTEGER DEFAULT 0,
+    util_sum REAL DEFAULT 0,                -- Sum of facts_referenced / facts_in_context
+    util_count INTEGER DEFAULT 0            -- Interactions with facts_in_context > 0
+);
+
+-- Per-hour outcome rollup of raw rows past retention (see metrics_retention)
+CREATE TABLE IF NOT EXISTS metrics_rollup_hourly (
+    hour TEXT PRIMARY KEY,                  -- Local 'YYYY-MM-DD HH:00'
+    total INTEGER DEFAULT 0,
+    positive INTEGER DEFAULT 0,
+    negative INTEGER DEFAULT 0,
+    corrections INTEGER DEFAULT 0,
+    util_sum REAL DEFAULT 0,
+    util_count INTEGER DEFAULT 0,
+    response_ms_sum INTEGER DEFAULT 0,      -- Sum of response_time_ms where recorded
+    response_count INTEGER DEFAULT 0
+);
+
 -- Daily Metrics Aggregates (for trend analysis)
 CREATE TABLE IF NOT EXISTS daily_metrics (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -117,7 +117,9 @@ export default function App() {
   };
 
   // Thinking Mode State
-  const [thinkingMode, setThinkingMode] = useState<'fast' | 'standard' | 'deep'>('standard');
+  const [thinkingMode, setThinkingMode] = useState<'fast' | 'standard' | 'deep' | 'speculative'>('standard');
+  // Speculative mode: run id while the deep revision is pending (draft can be accepted)
+  const [pendingRevision, setPendingRevision] = useState<string | null>(null);
   // Future: Image upload will set hasImage for vision mode (feature in backlog)
 
   // Thinking Modes Configuration
@@ -125,6 +127,7 @@ export default function App() {
     { id: 'fast' as const, icon: '⚡', label: 'Быстро', color: 'text-yellow-400', bgActive: 'bg-yellow-500/20' },
     { id: 'standard' as const, icon: '🧠', label: 'Обычно', color: 'text-indigo-400', bgActive: 'bg-indigo-500/20' },
     { id: 'deep' as const, icon: '🤔', label: 'Глубоко', color: 'text-purple-400', bgActive: 'bg-purple-500/20' },
+    { id: 'speculative' as const, icon: '🔀', label: 'Черновик+', color: 'text-emerald-400', bgActive: 'bg-emerald-500/20' },
   ];
 
   const [feedbackSent, setFeedbackSent] = useState<Record<number, 'up' | 'down' | null>>({});
@@ -413,6 +416,7 @@ export default function App() {
             score: confidenceEvent.score,
             level: confidenceEvent.level
           });
+          if (confidenceEvent.provisional) return;  // Logged once, when final
           const emoji = confidenceEvent.level === 'high' ? '🟢' : confidenceEvent.level === 'medium' ? '🟡' : '🔴';
           addLog(`${emoji} Уверенность: ${Math.round(confidenceEvent.score * 100)}%`, 'growth');
         },
@@ -423,7 +427,23 @@ export default function App() {
             addLog(`🔄 Загрузка модели: ${loadingEvent.model}...`, 'info');
           }
         },
-        abortControllerRef.current.signal
+        abortControllerRef.current.signal,
+        // Speculative mode: fast draft first, deep revision replaces it
+        (specEvent) => {
+          if (specEvent.status === 'start') {
+            setPendingRevision(specEvent.run_id);
+          } else if (specEvent.status === 'revision') {
+            setPendingRevision(null);
+            if (specEvent.changed && specEvent.content) {
+              setMessages(prev => prev.map(msg =>
+                msg.id === assistantId ? { ...msg, content: specEvent.content! } : msg
+              ));
+            }
+            addLog(`🔀 Уточнённый ответ ${specEvent.changed ? 'получен' : 'совпал с черновиком'}`, 'growth');
+          } else if (specEvent.status === 'accepted' || specEvent.status === 'revision_failed') {
+            setPendingRevision(null);
+          }
+        }
       );
     } catch (error: any) {
       if (error.name === 'AbortError') {
@@ -446,10 +466,18 @@ export default function App() {
       setIsGenerating(false);
       setIsThinking(false);  // Ensure thinking is off
       setLoadingModel(null);  // Issue #6: Clear loading state
+      setPendingRevision(null);
       abortControllerRef.current = null;
     }
   }
 
+  async function handleAcceptDraft() {
+    if (pendingRevision && await api.acceptSpeculativeDraft(pendingRevision)) {
+      addLog('🔀 Черновик принят', 'info');
+    }
+    setPendingRevision(null);
+  }
+
   function handleStopGeneration() {
     if (abortControllerRef.current) {
       abortControllerRef.current.abort();
@@ -501,10 +529,18 @@ export default function App() {
 
     setIsUploading(true);
     try {
-      await api.uploadDocument(file);
-      addLog(`Файл "${file.name}" загружен`, 'growth');
-      const docs = await api.getDocuments();
-      setDocuments(docs);
+      // Indexing runs in the background; the document fills in as batches land
+      const { job } = await api.uploadDocument(file);
+      addLog(`Файл "${file.name}" загружен, индексация...`, 'info');
+      setDocuments(await api.getDocuments());
+      api.watchIngestionJob(job.id, async (update) => {
+        setDocuments(await api.getDocuments());
+        if (update.status === 'completed') {
+          addLog(`Файл "${file.name}" проиндексирован (${update.total_chunks} чанков)`, 'growth');
+        } else if (update.status === 'failed') {
+          addLog(`Ошибка индексации "${file.name}": ${update.error}`, 'error');
+        }
+      });
     } catch (error) {
       addLog('Ошибка загрузки файла', 'error');
     } finally {
@@ -1015,6 +1051,18 @@ export default function App() {
                   {loadingModel && (
                     <div className="pl-12 md:pl-14"><ModelLoadingIndicator /></div>
                   )}
+                  {/* Speculative mode: keep the draft without waiting for the deep revision */}
+                  {isGenerating && pendingRevision && (
+                    <div className="pl-12 md:pl-14">
+                      <button
+                        onClick={handleAcceptDraft}
+                        className="flex items-center gap-2 px-3 py-1.5 rounded-full text-sm text-emerald-400 bg-emerald-500/10 hover:bg-emerald-500/20 transition-colors"
+                      >
+                        <span>🔀</span>
+                        <span>Уточняю ответ... Принять черновик</span>
+                      </button>
+                    </div>
+                  )}
                   {/* Show simple generating indicator when generating but not thinking */}
                   {isGenerating && !isThinking && messages[messages.length - 1]?.role === 'assistant' && !messages[messages.length - 1]?.content && (
                     <div className="pl-12 md:pl-14">
@@ -4,6 +4,16 @@
 
 const API_BASE = 'http://127.0.0.1:8000/api';
 
+// Per-tab session: the backend keeps conversation and agent state per X-Session-ID
+const SESSION_ID = (() => {
+    const existing = sessionStorage.getItem('max-session-id');
+    if (existing) return existing;
+    const id = crypto.randomUUID();
+    sessionStorage.setItem('max-session-id', id);
+    return id;
+})();
+const SESSION_HEADERS = { 'X-Session-ID': SESSION_ID };
+
 // ============= Types =============
 
 export interface Conversation {
@@ -27,7 +37,31 @@ export interface Document {
     size: string;
     type: string;
     chunks: number;
+    collection: string;
+    status: 'indexed' | 'processing';
+}
+
+export interface IngestionJob {
+    id: string;
+    filename: string;
+    status: 'queued' | 'parsing' | 'embedding' | 'completed' | 'failed' | 'cancelled';
+    document_id: string | null;
+    total_chunks: number;
+    done_chunks: number;
+    reused_chunks: number;  // Embeddings reused from identical content
+    computed_chunks: number;  // Embedded by this job
+    reindex: boolean;  // Updating an existing document
+    collection: string | null;  // Target collection of a new document (null: default)
+    progress: number;  // 0..1
+    eta_seconds: number | null;
+    error: string | null;
+}
+
+export interface UploadResult {
+    id: string | null;  // Document id (null until the job has parsed the file)
+    name: string;
     status: 'indexed' | 'processing';
+    job: IngestionJob;
 }
 
 export interface Template {
@@ -89,11 +123,22 @@ export interface ThinkingEvent {
     think_content?: string;  // For Collapsible Think
 }
 
-// Confidence Event (scored after response)
+// Confidence Event (scored while the response streams; final one when it ends)
 export interface ConfidenceEvent {
     score: number;        // 0.0 - 1.0
     level: 'low' | 'medium' | 'high';
     factors: string[];
+    provisional?: boolean;  // Score of the text so far
+}
+
+// Speculative mode events (fast draft, deep revision)
+export interface SpeculativeEvent {
+    status: 'start' | 'draft_done' | 'revision' | 'accepted' | 'revision_failed';
+    run_id: string;
+    content?: string;     // Revised answer (status === 'revision')
+    changed?: boolean;
+    draft_first_token_ms?: number | null;
+    deep_first_token_ms?: number | null;
 }
 
 // Chat
@@ -103,7 +148,7 @@ export async function streamChat(
     model: string = 'auto',
     temperature: number = 0.7,
     useRag: boolean = true,
-    thinkingMode: string = 'standard',  // NEW: fast/standard/deep
+    thinkingMode: string = 'standard',  // NEW: fast/standard/deep/speculative
     hasImage: boolean = false,          // NEW: auto-activates vision
     onToken: (token: string) => void = () => { },
     onComplete: (data: any) => void = () => { },
@@ -111,11 +156,12 @@ export async function streamChat(
     onThinking?: (event: ThinkingEvent) => void,   // Thinking callback
     onConfidence?: (event: ConfidenceEvent) => void,  // Confidence callback
     onLoading?: (event: { model: string }) => void,   // Issue #6: Loading state callback
-    abortSignal?: AbortSignal
+    abortSignal?: AbortSignal,
+    onSpeculative?: (event: SpeculativeEvent) => void  // Speculative draft/revision callback
 ): Promise<void> {
     const response = await fetch(`${API_BASE}/chat`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...SESSION_HEADERS },
         body: JSON.stringify({
             message,
             conversation_id: conversationId,
@@ -170,8 +216,13 @@ export async function streamChat(
                     onConfidence({
                         score: data.score,
                         level: data.level,
-                        factors: data.factors
+                        factors: data.factors,
+                        provisional: data.provisional
                     });
+                } else if (data.revision && onSpeculative) {
+                    onSpeculative({ ...data, status: 'revision' });
+                } else if (data.speculative && onSpeculative) {
+                    onSpeculative({ ...data, status: data.speculative });
                 } else if (data.status === 'loading' && onLoading) {
                     // Issue #6 fix: Handle model loading event
                     onLoading({ model: data.model || '' });
@@ -191,6 +242,11 @@ export async function streamChat(
     }
 }
 
+export async function acceptSpeculativeDraft(runId: string): Promise<boolean> {
+    const res = await fetch(`${API_BASE}/chat/speculative/${runId}/accept`, { method: 'POST' });
+    return res.ok;
+}
+
 // Conversations
 export async function getConversations(limit: number = 50): Promise<Conversation[]> {
     const res = await fetch(`${API_BASE}/conversations?limit=${limit}`);
@@ -217,17 +273,51 @@ export async function getDocuments(): Promise<Document[]> {
     return res.json();
 }
 
-export async function uploadDocument(file: File): Promise<Document> {
+export async function uploadDocument(file: File, collection?: string): Promise<UploadResult> {
     const formData = new FormData();
     formData.append('file', file);
+    const query = collection ? `?collection=${encodeURIComponent(collection)}` : '';
 
-    const res = await fetch(`${API_BASE}/documents/upload`, {
+    const res = await fetch(`${API_BASE}/documents/upload${query}`, {
         method: 'POST',
         body: formData,
     });
     return res.json();
 }
 
+/** Re-index a document from its file, or from a new version of it. */
+export async function reindexDocument(docId: string, file?: File): Promise<UploadResult> {
+    const formData = new FormData();
+    if (file) formData.append('file', file);
+
+    const res = await fetch(`${API_BASE}/documents/${docId}/reindex`, {
+        method: 'POST',
+        body: formData,
+    });
+    return res.json();
+}
+
+export async function getIngestionJob(jobId: string): Promise<IngestionJob> {
+    const res = await fetch(`${API_BASE}/documents/jobs/${jobId}`);
+    return res.json();
+}
+
+export async function cancelIngestionJob(jobId: string): Promise<void> {
+    await fetch(`${API_BASE}/documents/jobs/${jobId}/cancel`, { method: 'POST' });
+}
+
+/** Follow an ingestion job over SSE until it finishes. Returns an unsubscribe function. */
+export function watchIngestionJob(jobId: string, onUpdate: (job: IngestionJob) => void): () => void {
+    const source = new EventSource(`${API_BASE}/documents/jobs/${jobId}/events`);
+    source.onmessage = (event) => {
+        const job: IngestionJob = JSON.parse(event.data);
+        onUpdate(job);
+        if (!['queued', 'parsing', 'embedding'].includes(job.status)) source.close();
+    };
+    source.onerror = () => source.close();
+    return () => source.close();
+}
+
 export async function deleteDocument(docId: string): Promise<void> {
     await fetch(`${API_BASE}/documents/${docId}`, { method: 'DELETE' });
 }
@@ -251,19 +341,19 @@ export async function createTemplate(name: string, prompt: string, category: str
 export async function startAgent(goal: string, maxSteps: number = 20): Promise<{ run_id: string }> {
     const res = await fetch(`${API_BASE}/agent/start`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...SESSION_HEADERS },
         body: JSON.stringify({ goal, max_steps: maxSteps }),
     });
     return res.json();
 }
 
 export async function getAgentStatus(): Promise<AgentStatus> {
-    const res = await fetch(`${API_BASE}/agent/status`);
+    const res = await fetch(`${API_BASE}/agent/status`, { headers: SESSION_HEADERS });
     return res.json();
 }
 
 export async function stopAgent(): Promise<void> {
-    await fetch(`${API_BASE}/agent/stop`, { method: 'POST' });
+    await fetch(`${API_BASE}/agent/stop`, { method: 'POST', headers: SESSION_HEADERS });
 }
 
 // Metrics
@@ -0,0 +1,110 @@
+"""
+Chunking benchmark.
+
+Generates markdown-like text (headings, paragraphs, sentences) and
+chunks it with:
+
+- words:  the previous chunker, `chunk_size` whitespace words per chunk
+- whole:  Chunker.chunk_text() on the full text
+- stream: ChunkStream fed in 64KB units, as ingestion feeds parser pages
+
+Reports wall time, chunk count, the largest chunk in tokens and whether
+every chunk's char offsets reproduce its content. The tokenizer is
+tiktoken cl100k_base, or the regex approximation when it can't be loaded.
+
+Usage:
+    python scripts/bench_chunking.py [--mb 10] [--chunk-size 500] [--overlap 50] [--output chunking.json]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.chunker import Chunker
+
+WORDS = (
+    "индексация документов должна оставаться отзывчивой "
+    "the quick brown fox jumps over the lazy dog"
+).split()
+UNIT_CHARS = 64 * 1024
+
+
+def make_text(size_chars: int, seed: int = 1) -> str:
+    rng = random.Random(seed)
+    parts, size, i = [], 0, 0
+    while size < size_chars:
+        part = f"\n## Section {i}\n\n" if i % 40 == 0 else ""
+        part += " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 25))) + ". "
+        if i % 5 == 4:
+            part += "\n\n"
+        parts.append(part)
+        size += len(part)
+        i += 1
+    return "".join(parts)
+
+
+def word_chunks(text: str, chunk_size: int, overlap: int) -> list[str]:
+    """The previous word-count chunker."""
+    words = text.split()
+    step = max(1, chunk_size - overlap)
+    return [" ".join(words[i:i + chunk_size]) for i in range(0, len(words), step)]
+
+
+def run_mode(name: str, text: str, chunker: Chunker, chunk_size: int, overlap: int) -> dict:
+    start = time.perf_counter()
+    if name == "words":
+        chunks = word_chunks(text, chunk_size, overlap)
+    elif name == "whole":
+        chunks = chunker.chunk_text(text)
+    else:
+        stream = chunker.stream()
+        chunks = []
+        for unit in range(0, len(text), UNIT_CHARS):
+            chunks.extend(stream.feed(text[unit:unit + UNIT_CHARS]))
+        chunks.extend(stream.flush())
+    wall = time.perf_counter() - start
+
+    result = {"wall_s": round(wall, 3), "chunks": len(chunks)}
+    if name != "words":
+        result["max_tokens"] = max(c.tokens for c in chunks)
+        result["offsets_ok"] = all(text[c.char_start:c.char_end] == c.content for c in chunks)
+    print(f"{name:<8} wall {result['wall_s']:7.3f}s  chunks {len(chunks):6}  "
+          f"max tokens {result.get('max_tokens', '-')}  offsets ok {result.get('offsets_ok', '-')}")
+    return result
+
+
+def main(args) -> dict:
+    text = make_text(int(args.mb * 1_000_000))
+    chunker = Chunker(args.chunk_size, args.overlap)
+    tokenizer = chunker.tokenizer.name
+    print(f"{len(text) / 1e6:.1f}M chars, tokenizer {tokenizer}, "
+          f"chunk {args.chunk_size} tokens / overlap {args.overlap}")
+
+    start = time.perf_counter()
+    text.split()
+    print(f"(text.split() alone: {time.perf_counter() - start:.3f}s)")
+
+    results = {
+        name: run_mode(name, text, chunker, args.chunk_size, args.overlap)
+        for name in ("words", "whole", "stream")
+    }
+    return {"chars": len(text), "tokenizer": tokenizer, "modes": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, default=10)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    report = main(args)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
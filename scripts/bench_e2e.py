@@ -0,0 +1,462 @@
+"""
+End-to-end latency benchmark.
+
+Runs the FastAPI app in-process against a fake LM Studio server
+(tests/fake_lm_server.py: chat with configurable tokens/s and think
+blocks, deterministic embeddings, /v1/models) and drives /api/chat,
+/api/documents/upload, /api/agent/start and the memory/RAG hot paths at
+a configurable concurrency. No LM Studio needed; the database lives in a
+temporary directory.
+
+Per scenario it reports p50/p95/p99 latency, time-to-first-token and
+tokens/s (chat), DB time and embedding calls per request, and writes
+everything to a JSON artifact. `--compare` prints deltas against an
+earlier artifact and `--fail-over` turns p95 regressions into a non-zero
+exit code.
+
+Usage:
+    python scripts/bench_e2e.py [--requests 40] [--concurrency 4] [--tokens-per-s 200]
+        [--think-tokens 0] [--output bench_e2e.json] [--compare baseline.json] [--fail-over 20]
+"""
+import argparse
+import asyncio
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import redirect_stderr
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tests.fake_lm_server import FakeLMServer
+
+
+# ==================== Per-request instrumentation ====================
+
+@dataclass
+class RequestStats:
+    """DB and embedding work attributed to one benchmark request."""
+    db_ms: float = 0.0
+    db_ops: int = 0
+    embedding_calls: int = 0
+
+
+# Inherited by tasks the request spawns (background work done before the response ends counts too)
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("bench_stats", default=None)
+
+
+def instrument(db, lm_client):
+    """Time every aiosqlite operation and count embedding calls."""
+    execute = db._execute  # Every Connection/Cursor call goes through here
+
+    async def timed_execute(fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await execute(fn, *args, **kwargs)
+        finally:
+            stats = _current_stats.get()
+            if stats is not None:
+                stats.db_ms += (time.perf_counter() - start) * 1000
+                stats.db_ops += 1
+
+    get_embedding = lm_client.get_embedding
+
+    async def counted_embedding(text):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.embedding_calls += 1
+        return await get_embedding(text)
+
+    db._execute = timed_execute
+    lm_client.get_embedding = counted_embedding
+
+
+# ==================== In-process ASGI client ====================
+
+async def asgi_request(
+    app,
+    method: str,
+    path: str,
+    body: bytes = b"",
+    content_type: str = "application/json",
+    on_chunk: Optional[Callable[[bytes], None]] = None
+) -> tuple[int, bytes]:
+    """Call the ASGI app directly; `on_chunk` sees each body chunk as it is sent."""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [
+            (b"host", b"bench"),
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    sent = False
+    finished = asyncio.Event()
+    status = 0
+    chunks = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            chunks.append(message["body"])
+            if on_chunk:
+                on_chunk(message["body"])
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status, b"".join(chunks)
+
+
+def multipart(filename: str, content: bytes) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: text/plain\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+# ==================== Stats ====================
+
+def percentiles(values: list[float]) -> dict:
+    """Nearest-rank p50/p95/p99 plus mean and max."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, max(0, int(len(ordered) * p + 0.5) - 1))], 2)
+
+    return {
+        "p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99),
+        "mean": round(sum(ordered) / len(ordered), 2), "max": round(ordered[-1], 2),
+    }
+
+
+def summarize(samples: list[dict], wall_s: float) -> dict:
+    ok = [s for s in samples if not s.get("error")]
+    result = {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "throughput_rps": round(len(ok) / wall_s, 2) if wall_s else 0.0,
+    }
+    errors = sorted({s["error"] for s in samples if s.get("error")})
+    if errors:
+        result["error_samples"] = errors[:3]
+    metrics = sorted({k for s in ok for k, v in s.items() if isinstance(v, (int, float)) and k != "error"})
+    for metric in metrics:
+        result[metric] = percentiles([s[metric] for s in ok if s.get(metric) is not None])
+    return result
+
+
+async def run_concurrent(n: int, concurrency: int, fn) -> tuple[list[dict], float]:
+    """Run fn(i) for i in range(n) with at most `concurrency` in flight."""
+    queue = iter(range(n))
+    samples = []
+
+    async def worker(worker_id: int):
+        for i in queue:
+            stats = RequestStats()
+            reset = _current_stats.set(stats)
+            try:
+                sample = await fn(i, worker_id)
+            except Exception as e:
+                sample = {"error": f"{type(e).__name__}: {e}"}
+            finally:
+                _current_stats.reset(reset)
+            sample.update(db_ms=stats.db_ms, db_ops=stats.db_ops, embedding_calls=stats.embedding_calls)
+            samples.append(sample)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+# ==================== Scenarios ====================
+
+def document_text(index: int, kb: int) -> bytes:
+    paragraph = (
+        f"Документ {index}. Раздел о производительности локального ассистента: "
+        "кэширование, батчинг эмбеддингов, индексы SQLite и потоковая передача токенов. "
+    )
+    data = (paragraph * (kb * 1024 // len(paragraph.encode()) + 1)).encode()[: kb * 1024]
+    return data.decode(errors="ignore").encode()  # Don't cut a multi-byte char
+
+
+async def bench_upload(app, args) -> dict:
+    async def upload(i, _):
+        body, content_type = multipart(f"bench-{uuid.uuid4().hex[:8]}.txt", document_text(i, args.doc_kb))
+        start = time.perf_counter()
+        status, data = await asgi_request(app, "POST", "/api/documents/upload", body, content_type)
+        if status != 200:
+            return {"error": f"HTTP {status}: {data[:200]!r}"}
+        accepted_ms = (time.perf_counter() - start) * 1000
+
+        # Indexing runs as a background job: latency is until it is fully indexed
+        job = json.loads(data)["job"]
+        while job["status"] in ("queued", "parsing", "embedding"):
+            await asyncio.sleep(0.02)
+            _, data = await asgi_request(app, "GET", f"/api/documents/jobs/{job['id']}")
+            job = json.loads(data)
+        if job["status"] != "completed":
+            return {"error": f"job {job['status']}: {job.get('error')}"}
+        return {"latency_ms": (time.perf_counter() - start) * 1000, "accepted_ms": accepted_ms}
+
+    samples, wall = await run_concurrent(args.documents, args.concurrency, upload)
+    return summarize(samples, wall)
+
+
+async def bench_chat(app, args, token_len: int) -> dict:
+    conversations = []
+    for _ in range(args.concurrency):
+        _, data = await asgi_request(app, "POST", "/api/conversations", json.dumps({"title": "bench"}).encode())
+        conversations.append(json.loads(data)["id"])
+
+    async def chat(i, worker_id):
+        body = json.dumps({
+            "message": f"Вопрос {i}: как ускорить индексацию документов?",
+            "conversation_id": conversations[worker_id],
+            "use_rag": True,
+            "thinking_mode": args.thinking_mode,
+        }).encode()
+        start = time.perf_counter()
+        first_token = None
+        chars = 0
+        pending = b""
+
+        def on_chunk(data: bytes):
+            nonlocal first_token, chars, pending
+            pending += data
+            *frames, pending = pending.split(b"\n\n")
+            for frame in frames:
+                if not frame.startswith(b"data: "):
+                    continue
+                event = json.loads(frame[6:])
+                if "token" in event:
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    chars += len(event["token"])
+
+        status, _ = await asgi_request(app, "POST", "/api/chat", body, on_chunk=on_chunk)
+        end = time.perf_counter()
+        if status != 200 or first_token is None:
+            return {"error": f"HTTP {status}, no tokens"}
+        gen_s = end - first_token
+        return {
+            "ttft_ms": (first_token - start) * 1000,
+            "latency_ms": (end - start) * 1000,
+            "tokens_per_s": (chars / token_len) / gen_s if gen_s > 0 else None,
+        }
+
+    samples, wall = await run_concurrent(args.requests, args.concurrency, chat)
+    return summarize(samples, wall)
+
+
+async def bench_agent(app, args) -> dict:
+    async def agent_run(i, _):
+        body = json.dumps({"goal": f"Собери сводку по документам #{i}", "max_steps": 3}).encode()
+        start = time.perf_counter()
+        status, data = await asgi_request(app, "POST", "/api/agent/start", body)
+        if status != 200:
+            return {"error": f"HTTP {status}: {data[:200]!r}"}
+        started = time.perf_counter()
+        while True:
+            _, data = await asgi_request(app, "GET", "/api/agent/status")
+            if not json.loads(data).get("running"):
+                break
+            await asyncio.sleep(0.01)
+        return {
+            "start_ms": (started - start) * 1000,
+            "run_ms": (time.perf_counter() - start) * 1000,
+        }
+
+    # The agent is a singleton: runs are sequential
+    samples, wall = await run_concurrent(args.agent_runs, 1, agent_run)
+    return summarize(samples, wall)
+
+
+async def bench_hot_paths(args) -> dict:
+    from src.core.memory import memory
+    from src.core.rag import rag
+
+    conversations = await memory.list_conversations(limit=args.concurrency)
+    conv_ids = [c.id for c in conversations] or [(await memory.create_conversation("bench")).id]
+
+    async def context(i, _):
+        start = time.perf_counter()
+        await memory.get_context_segments(conv_ids[i % len(conv_ids)])
+        return {"latency_ms": (time.perf_counter() - start) * 1000}
+
+    async def retrieval(i, _):
+        start = time.perf_counter()
+        await rag.get_context_for_query(f"индексы SQLite {i}", max_tokens=1000)
+        return {"latency_ms": (time.perf_counter() - start) * 1000}
+
+    results = {}
+    for name, fn in (("memory_context", context), ("rag_context", retrieval)):
+        samples, wall = await run_concurrent(args.requests, args.concurrency, fn)
+        results[name] = summarize(samples, wall)
+    return results
+
+
+def agent_responder(payload: dict) -> Optional[str]:
+    """Scripted answers so agent runs plan, act once and finish."""
+    prompt = payload["messages"][-1].get("content") or ""
+    if '"tasks"' in prompt:
+        return json.dumps({"tasks": [{"description": "Собрать сводку", "tool": "list_directory"}]})
+    if '"is_final"' in prompt:
+        return json.dumps({"thought": "готово", "action": "finish", "result": "Сводка готова", "is_final": True})
+    return None
+
+
+# ==================== Report ====================
+
+def compare(current: dict, baseline: dict, fail_over: Optional[float]) -> bool:
+    """Print p50/p95 deltas; True if a p95 time metric regressed more than fail_over %."""
+    regressed = False
+    print(f"\n--- COMPARISON vs {baseline['meta']['timestamp']} ---")
+    for scenario, metrics in current["scenarios"].items():
+        base_metrics = baseline["scenarios"].get(scenario, {})
+        for metric, values in metrics.items():
+            base = base_metrics.get(metric)
+            if not isinstance(values, dict) or not isinstance(base, dict) or not base.get("p95"):
+                continue
+            deltas = {
+                p: (values[p] - base[p]) / base[p] * 100
+                for p in ("p50", "p95") if base.get(p)
+            }
+            print(f"{scenario + '.' + metric:<36} " +
+                  "  ".join(f"{p} {values[p]:10.1f} ({d:+6.1f}%)" for p, d in deltas.items()))
+            # Higher is worse for times, better for throughput
+            if fail_over is not None and metric.endswith("_ms") and deltas.get("p95", 0) > fail_over:
+                regressed = True
+    return regressed
+
+
+async def main(args) -> int:
+    from openai import AsyncOpenAI
+    from src.core.logger import configure_logging
+
+    configure_logging(enabled=args.verbose, debug=False)
+    token = "tok "
+    server = FakeLMServer(
+        token_interval=1 / args.tokens_per_s,
+        max_tokens=args.max_tokens,
+        token=token,
+        first_token_delay=args.prefill_ms / 1000,
+        think_tokens=args.think_tokens,
+        responder=agent_responder,
+    )
+    await server.start()
+
+    with tempfile.TemporaryDirectory(prefix="max-bench-") as tmp:
+        from src.core.lm_client import lm_client
+        from src.core.memory import memory
+        import src.api.api as api
+
+        lm_client.client = AsyncOpenAI(base_url=server.base_url, api_key="bench", max_retries=0)
+        memory.db_path = Path(tmp) / "bench.db"
+
+        start = time.perf_counter()
+        stderr = io.StringIO()
+        with redirect_stderr(stderr if not args.verbose else sys.stderr):
+            await api.startup()
+            startup_ms = (time.perf_counter() - start) * 1000
+            instrument(memory._db, lm_client)
+
+            scenarios = {}
+            print(f"--- E2E BENCHMARK (concurrency={args.concurrency}, {args.tokens_per_s} tok/s) ---",
+                  file=sys.stdout)
+            for name, coro in (
+                ("upload", bench_upload(api.app, args)),
+                ("chat", bench_chat(api.app, args, len(token))),
+                ("agent", bench_agent(api.app, args)),
+            ):
+                scenarios[name] = await coro
+                print(f"{name:<16} done ({scenarios[name]['requests']} requests, "
+                      f"{scenarios[name]['errors']} errors)", file=sys.stdout)
+            scenarios.update(await bench_hot_paths(args))
+
+            # Let background work (fact extraction, agent runs) settle before closing the DB
+            pending = {t for t in asyncio.all_tasks() if t is not asyncio.current_task()}
+            if pending:
+                await asyncio.wait(pending, timeout=5.0)
+            await memory.close()
+    await server.stop()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "startup_ms": round(startup_ms, 1),
+            "fake_server": {
+                "chat_requests": len(server.generations),
+                "embedding_requests": server.embedding_requests,
+            },
+            "args": vars(args),
+        },
+        "scenarios": scenarios,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    for name, result in scenarios.items():
+        line = "  ".join(
+            f"{metric} p50={values['p50']:.1f} p95={values['p95']:.1f} p99={values['p99']:.1f}"
+            for metric, values in result.items()
+            if isinstance(values, dict) and values and metric in ("ttft_ms", "latency_ms", "run_ms", "tokens_per_s")
+        )
+        print(f"{name:<16} {line}")
+    print(f"Report written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(report, baseline, args.fail_over):
+            print(f"p95 regression above {args.fail_over}%")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40, help="Chat / hot-path requests")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--documents", type=int, default=8, help="Documents uploaded")
+    parser.add_argument("--doc-kb", type=int, default=32, help="Size of each uploaded document")
+    parser.add_argument("--agent-runs", type=int, default=3)
+    parser.add_argument("--tokens-per-s", type=float, default=200.0, help="Fake server generation speed")
+    parser.add_argument("--max-tokens", type=int, default=100, help="Tokens per fake answer")
+    parser.add_argument("--prefill-ms", type=float, default=50.0, help="Fake prompt processing delay")
+    parser.add_argument("--think-tokens", type=int, default=0, help="Tokens in a <think> block per answer")
+    parser.add_argument("--thinking-mode", default="standard")
+    parser.add_argument("--output", default="bench_e2e.json")
+    parser.add_argument("--compare", help="Earlier JSON artifact to compare against")
+    parser.add_argument("--fail-over", type=float, help="Exit 1 if a p95 *_ms metric regresses by more than this %%")
+    parser.add_argument("--verbose", action="store_true", help="Show application logs")
+    sys.exit(asyncio.run(main(parser.parse_args())))
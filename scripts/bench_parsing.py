@@ -0,0 +1,156 @@
+"""
+Document parsing benchmark.
+
+Generates a large PDF and parses it the way ingestion consumes it
+(page stream -> chunk stream), comparing:
+
+- inline:    the previous path, all pages parsed on the event loop
+             into one string, then chunked
+- thread:    DocumentParser(processes=0), page ranges in a thread
+- processes: DocumentParser(processes=N), page ranges in parallel
+
+For each mode it reports wall time, time to the first chunk, the worst
+event-loop stall seen by a 10ms ticker (what other requests would feel)
+and the peak Python memory of the parent process. Needs PyMuPDF.
+
+Usage:
+    python scripts/bench_parsing.py [--pages 1000] [--processes 4] [--output parsing.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.doc_parsing import DocumentParser, parse_pdf_pages, pdf_page_count
+from src.core.chunker import Chunker
+
+LOREM = (
+    "Индексация документов должна оставаться отзывчивой: каждый абзац этой "
+    "страницы содержит достаточно текста, чтобы парсинг PDF был заметной "
+    "нагрузкой на процессор. The quick brown fox jumps over the lazy dog. "
+)
+
+
+def make_pdf(path: Path, pages: int, lines_per_page: int = 60):
+    import fitz  # PyMuPDF
+
+    words = LOREM.split()
+    doc = fitz.open()
+    for i in range(pages):
+        lines = (
+            f"{i}.{n} " + " ".join(words[(i + n + k) % len(words)] for k in range(12))
+            for n in range(lines_per_page)
+        )
+        doc.new_page().insert_text((36, 48), "\n".join(lines), fontsize=8, lineheight=1.4)
+    doc.save(str(path))
+    doc.close()
+
+
+async def loop_lag_monitor(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Worst delay of a `interval` sleep while the benchmark runs (seconds)."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run_mode(name: str, path: Path, processes: int, chunk_size: int, overlap: int) -> dict:
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(loop_lag_monitor(stop))
+    await asyncio.sleep(0.02)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_chunk = None
+    chunks = 0
+    stream = Chunker(chunk_size, overlap).stream()
+
+    if name == "inline":
+        # Previous behaviour: blocking parse of the whole file, then chunk it all
+        pages = parse_pdf_pages(str(path), 0, pdf_page_count(str(path)))
+        produced = []
+        for number, text in enumerate(pages, start=1):
+            produced.extend(stream.feed(text if text.endswith("\n") else text + "\n", number))
+        produced.extend(stream.flush())
+        first_chunk = time.perf_counter() - start
+        chunks = len(produced)
+        del pages, produced
+        parser = None
+    else:
+        parser = DocumentParser(processes=processes)
+        if processes:
+            await parser._run(pdf_page_count, str(path))  # Pool start-up isn't per document
+            start = time.perf_counter()
+            tracemalloc.reset_peak()
+        async for text, page in parser.iter_pages(path):
+            produced = stream.feed(text, page)
+            if produced and first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            chunks += len(produced)  # Consumed (embedded) and dropped
+        chunks += len(stream.flush())
+
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stop.set()
+    worst_lag = await monitor
+    if parser:
+        parser.shutdown()
+
+    result = {
+        "wall_s": round(wall, 3),
+        "first_chunk_s": round(first_chunk or wall, 3),
+        "max_loop_stall_ms": round(worst_lag * 1000, 1),
+        "peak_python_mb": round(peak / 1e6, 1),
+        "chunks": chunks,
+    }
+    print(f"{name:<14} wall {result['wall_s']:7.2f}s  first chunk {result['first_chunk_s']:6.2f}s  "
+          f"loop stall {result['max_loop_stall_ms']:8.1f}ms  peak {result['peak_python_mb']:6.1f}MB  "
+          f"chunks {chunks}")
+    return result
+
+
+async def main(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "large.pdf"
+        start = time.perf_counter()
+        make_pdf(path, args.pages)
+        print(f"Generated {args.pages}-page PDF ({path.stat().st_size / 1e6:.1f}MB) "
+              f"in {time.perf_counter() - start:.1f}s; {os.cpu_count()} CPUs")
+
+        results = {
+            "inline": await run_mode("inline", path, 0, args.chunk_size, args.overlap),
+            "thread": await run_mode("thread", path, 0, args.chunk_size, args.overlap),
+        }
+        for n in sorted({1, args.processes}):
+            results[f"processes={n}"] = await run_mode(f"processes={n}", path, n, args.chunk_size, args.overlap)
+
+    chunk_counts = {r["chunks"] for r in results.values()}
+    if len(chunk_counts) != 1:
+        print(f"WARNING: modes produced different chunk counts: {chunk_counts}")
+    return {"pages": args.pages, "cpus": os.cpu_count(), "modes": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
@@ -0,0 +1,168 @@
+"""
+Signal matching benchmark.
+
+Generates long pasted messages (logs, code, mixed Russian/English prose)
+and runs the text-signal analyzers over them:
+
+- feedback:   ImplicitFeedbackAnalyzer.analyze()
+- correction: CorrectionDetector.detect()
+- confidence: ConfidenceScorer.score_response()
+
+each against the previous implementation (one substring check or
+re.search per pattern), reporting wall time per message and whether both
+give the same result. The confidence score is also computed from the
+message streamed in --chunk-chars pieces (ConfidenceStream): total feed
+time, and the finish() time left once the stream ends.
+
+Usage:
+    python scripts/bench_signals.py [--kb 100] [--messages 20] [--chunk-chars 16] [--output signals.json]
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.adaptation import CorrectionDetector
+from src.core.confidence import (
+    ConfidenceScorer, CONFIDENCE_SIGNALS, ERROR_PATTERNS, HEDGING_PATTERNS_EN, HEDGING_PATTERNS_RU
+)
+from src.core.metrics import ImplicitFeedbackAnalyzer
+
+LINES = [
+    "Traceback (most recent call last):",
+    '  File "main.py", line 42, in <module>',
+    "ValueError: invalid literal for int() with base 10: 'abc'",
+    "def handler(event, context):",
+    "    return {\"status\": 200, \"body\": json.dumps(result)}",
+    "Посмотри пожалуйста, почему этот код не работает после обновления",
+    "возможно дело в версии библиотеки, но я не уверен",
+    "- step one: install dependencies",
+    "1. Run the migration before starting the server",
+    "The quick brown fox jumps over the lazy dog because it can.",
+    "нет, я имел в виду другое — не то, что ты предложил",
+    "ВАЖНО: не трогай production базу",
+]
+
+
+def make_message(size_chars: int, seed: int) -> str:
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < size_chars:
+        line = rng.choice(LINES)
+        parts.append(line)
+        size += len(line) + 1
+    return "\n".join(parts)
+
+
+def previous_feedback(text: str) -> tuple[bool, bool, bool]:
+    """The previous analyze(): one substring check per signal."""
+    a = ImplicitFeedbackAnalyzer
+    lower = text.lower()
+    positive = any(sig in lower for sig in a.POSITIVE_SIGNALS)
+    negative = any(sig in lower for sig in a.NEGATIVE_SIGNALS)
+    correction = any(sig in lower for sig in a.CORRECTION_SIGNALS)
+    return positive, negative or correction, correction
+
+
+def previous_correction(text: str):
+    lower = text.lower()
+    for pattern, category in CorrectionDetector.CORRECTION_PATTERNS:
+        if re.search(pattern, lower):
+            return True, category
+    return False, None
+
+
+def previous_confidence_counts(text: str) -> tuple[int, int, bool]:
+    flags = re.IGNORECASE | re.MULTILINE
+    hedging = sum(1 for p in HEDGING_PATTERNS_RU + HEDGING_PATTERNS_EN if re.search(p, text, flags))
+    structure = sum(1 for p in CONFIDENCE_SIGNALS if re.search(p, text, flags))
+    error = any(re.search(p, text, re.IGNORECASE) for p in ERROR_PATTERNS)
+    return hedging, structure, error
+
+
+def timed(fn, messages: list[str]) -> tuple[float, list]:
+    start = time.perf_counter()
+    results = [fn(m) for m in messages]
+    return (time.perf_counter() - start) / len(messages) * 1000, results
+
+
+def main(args) -> dict:
+    messages = [make_message(int(args.kb * 1000), seed) for seed in range(args.messages)]
+    print(f"{len(messages)} messages of {args.kb:.0f}K chars")
+
+    analyzer = ImplicitFeedbackAnalyzer()
+    detector = CorrectionDetector()
+    scorer = ConfidenceScorer()
+
+    def confidence_counts(text: str) -> tuple[int, int, bool]:
+        found = [m.label for m in scorer._matcher.matched(text.lower()).values()]
+        return found.count("hedging"), found.count("structure"), "error" in found
+
+    def feedback(text: str) -> tuple[bool, bool, bool]:
+        # Feedback signals only (CAPS analysis is not part of the comparison)
+        signals = analyzer._matcher.labels(text.lower(), analyzer.FEEDBACK_LABELS)
+        correction = "correction" in signals
+        return "positive" in signals, "negative" in signals or correction, correction
+
+    cases = {
+        "feedback": (previous_feedback, feedback),
+        "correction": (previous_correction, detector.detect),
+        "confidence": (previous_confidence_counts, confidence_counts),
+    }
+    report = {}
+    for name, (previous, current) in cases.items():
+        before_ms, expected = timed(previous, messages)
+        after_ms, actual = timed(current, messages)
+        report[name] = {
+            "previous_ms": round(before_ms, 2),
+            "matcher_ms": round(after_ms, 2),
+            "same_results": expected == actual,
+        }
+        print(f"{name:<11} previous {before_ms:8.2f}ms  matcher {after_ms:8.2f}ms  "
+              f"same results {expected == actual}")
+
+    _, full = timed(analyzer.analyze, messages)
+    report["analyze_ms"] = round(_, 2)
+    print(f"analyze() with CAPS analysis: {_:.2f}ms per message")
+
+    feed_s = finish_s = 0.0
+    same = True
+    for message in messages:
+        stream = scorer.stream()
+        start = time.perf_counter()
+        for i in range(0, len(message), args.chunk_chars):
+            stream.feed(message[i:i + args.chunk_chars])
+        middle = time.perf_counter()
+        result = stream.finish()
+        finish_s += time.perf_counter() - middle
+        feed_s += middle - start
+        same = same and result == scorer.score_response(message)
+    report["stream"] = {
+        "chunk_chars": args.chunk_chars,
+        "feed_ms": round(feed_s / len(messages) * 1000, 2),
+        "finish_ms": round(finish_s / len(messages) * 1000, 3),
+        "same_results": same,
+    }
+    print(f"stream      feed {report['stream']['feed_ms']:8.2f}ms  finish {report['stream']['finish_ms']:.3f}ms  "
+          f"same results {same}")
+    return {"chars": int(args.kb * 1000), "messages": len(messages), "cases": report}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--kb", type=float, default=100)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--chunk-chars", type=int, default=16, help="Streamed chunk size")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    report = main(args)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
@@ -0,0 +1,175 @@
+"""
+Streaming pipeline benchmark.
+
+Measures tokens/s of the think-tag filter + SSE framing path
+(LMStudioClient._stream_response -> SSE frames) against raw passthrough
+of the same fake upstream stream. No LM Studio needed.
+
+Also times ThinkTagParser on one long reasoning trace against a
+simplified version of the previous scan (buffer.lower().find + unbounded
+string concatenation).
+
+Usage:
+    python scripts/bench_stream.py [--tokens 20000] [--think-chars 50000] [--debug]
+"""
+import argparse
+import asyncio
+import io
+import json
+import sys
+import time
+from contextlib import redirect_stderr
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def make_chunks(n_tokens: int, think_every: int = 200) -> list[SimpleNamespace]:
+    """Build OpenAI-style stream chunks with periodic think blocks."""
+    chunks = []
+    for i in range(n_tokens):
+        if i % think_every == 0:
+            text = "<think>"
+        elif i % think_every == think_every // 4:
+            text = "</think>"
+        else:
+            text = f" tok{i % 97}"
+        delta = SimpleNamespace(content=text)
+        chunks.append(SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)]))
+    return chunks
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def create(self, **params):
+        async def gen():
+            for chunk in self._chunks:
+                yield chunk
+        return gen()
+
+
+async def run_raw(client, chunks) -> int:
+    """Raw passthrough: upstream delta -> SSE frame, no filtering or logging."""
+    count = 0
+    async for chunk in await FakeCompletions(chunks).create():
+        content = chunk.choices[0].delta.content
+        if content:
+            frame = f"data: {json.dumps({'token': content})}\n\n"
+            count += 1
+    return count
+
+
+async def run_pipeline(client, chunks, coalesce_ms: int = 0) -> int:
+    """Full path: _stream_response filter + (optionally coalesced) SSE framing."""
+    from src.api.streaming import StreamWriter, coalesce_tokens
+
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(chunks)))
+    writer = StreamWriter()
+
+    frames = 0
+    upstream = client._stream_response({"model": "bench"})
+    async for chunk in coalesce_tokens(upstream, flush_interval=coalesce_ms / 1000):
+        if isinstance(chunk, dict):
+            frame = writer.event({'thinking': chunk['_meta']})
+        else:
+            frame = writer.token(chunk)
+        frames += 1
+    return frames
+
+
+async def run_pipeline_coalesced(client, chunks) -> int:
+    return await run_pipeline(client, chunks, coalesce_ms=20)
+
+
+def legacy_filter(pieces: list[str]) -> int:
+    """Simplified previous algorithm: lower() + find() over the pending buffer, uncapped concat."""
+    in_think = False
+    pending = ""
+    think_content = ""
+    visible = 0
+    for piece in pieces:
+        pending += piece
+        if not in_think:
+            pos = pending.lower().find("<think>")
+            if pos == -1:
+                visible += len(pending)
+                pending = ""
+                continue
+            visible += pos
+            pending = pending[pos + len("<think>"):]
+            in_think = True
+        close_pos = pending.lower().find("</think>")
+        if close_pos == -1:
+            think_content += pending
+            pending = ""
+            continue
+        think_content += pending[:close_pos]
+        pending = pending[close_pos + len("</think>"):]
+        in_think = False
+    return visible
+
+
+def bench_long_trace(think_chars: int, chunk_chars: int = 4):
+    """Parse one long <think> block streamed in small chunks."""
+    from src.core.think_parser import ThinkTagParser
+
+    text = "<think>" + ("if a<b: step " * (think_chars // 13)) + "</think>Answer."
+    pieces = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+
+    start = time.perf_counter()
+    parser = ThinkTagParser()
+    for piece in pieces:
+        parser.feed(piece)
+    parser.flush()
+    parser_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    legacy_filter(pieces)
+    legacy_ms = (time.perf_counter() - start) * 1000
+
+    print(f"--- LONG TRACE ({think_chars} think chars, {len(pieces)} chunks) ---")
+    print(f"{'ThinkTagParser':<28} {parser_ms:9.1f} ms   "
+          f"({len(text) / parser_ms * 1000:,.0f} chars/s, kept {parser.max_think_chars} of {think_chars} think chars)")
+    print(f"{'legacy scan (simplified)':<28} {legacy_ms:9.1f} ms")
+
+
+async def measure(name: str, coro_fn, client, chunks, n_tokens: int) -> float:
+    start = time.perf_counter()
+    with redirect_stderr(io.StringIO()):
+        frames = await coro_fn(client, chunks)
+    elapsed = time.perf_counter() - start
+    rate = n_tokens / elapsed
+    print(f"{name:<28} {elapsed * 1000:9.1f} ms   {rate:12,.0f} tokens/s   {frames:7d} frames")
+    return rate
+
+
+async def main(n_tokens: int, think_chars: int, debug: bool):
+    from src.core.lm_client import LMStudioClient
+    from src.core.logger import configure_logging
+
+    configure_logging(debug=debug)
+    client = LMStudioClient()  # Construct outside the timed region
+    chunks = make_chunks(n_tokens)
+
+    print(f"--- STREAM BENCHMARK ({n_tokens} tokens, debug={debug}) ---")
+    raw = await measure("raw passthrough (json.dumps)", run_raw, client, chunks, n_tokens)
+    pipeline = await measure("filter + SSE", run_pipeline, client, chunks, n_tokens)
+    print(f"Overhead vs raw: {(raw / pipeline - 1) * 100:.1f}%")
+    await measure("filter + coalesced SSE", run_pipeline_coalesced, client, chunks, n_tokens)
+
+    bench_long_trace(think_chars)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--think-chars", type=int, default=50000)
+    parser.add_argument("--debug", action="store_true", help="Enable per-chunk tracing")
+    args = parser.parse_args()
+    asyncio.run(main(args.tokens, args.think_chars, args.debug))
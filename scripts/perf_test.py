@@ -1,6 +1,8 @@
 
 import time
 import asyncio
+import json
+import subprocess
 import sys
 import os
 from pathlib import Path
@@ -8,6 +10,11 @@ from pathlib import Path
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+ROOT = Path(__file__).parent.parent
+
+# Imported on first use only; none of these should load with the API module
+HEAVY_LIBS = ["tiktoken", "fitz", "docx", "PIL", "duckduckgo_search", "ddgs", "bs4", "gradio"]
+
 
 def measure_import_lib(lib_name):
     start = time.time()
@@ -27,34 +34,89 @@ def measure_import(module_name):
     except Exception as e:
         print(f"Import {module_name} FAILED: {e}")
 
+def measure_cold_import(module_name) -> float:
+    """Import time of `module_name` in a fresh interpreter (nothing cached in sys.modules)."""
+    code = (
+        "import sys, time; sys.path.insert(0, '.'); t = time.perf_counter(); "
+        f"import {module_name}; print(time.perf_counter() - t)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Cold import {module_name} FAILED: {result.stderr.strip().splitlines()[-1:]}")
+        return -1.0
+    seconds = float(result.stdout.strip().splitlines()[-1])
+    print(f"Cold import {module_name}: {seconds:.4f}s")
+    return seconds
+
+def check_heavy_libs():
+    """Heavy optional libraries pulled in by importing the API module."""
+    code = (
+        "import sys, json; sys.path.insert(0, '.'); import src.api.api; "
+        f"print(json.dumps([m for m in {HEAVY_LIBS!r} if m in sys.modules]))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    loaded = json.loads(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else None
+    print(f"Heavy libs loaded by src.api.api: {loaded if loaded is not None else 'check FAILED'}")
+    return loaded
+
 async def measure_startup():
     start = time.time()
     try:
         from src.api.api import startup
+        from src.core.services import services
+        from src.core.semantic_router import semantic_router
         await startup()
         end = time.time()
         print(f"Startup execution: {end - start:.4f}s")
+
+        # Per-subsystem cold start (own init time; ready_at includes waiting for deps)
+        stats = services.get_stats()
+        for name, s in sorted(stats["services"].items(), key=lambda kv: -(kv[1]["init_ms"] or 0)):
+            status = "ok" if s["ready"] else f"FAILED ({s['error']})"
+            print(f"  {name:<16} init {s['init_ms'] or 0:8.1f}ms  ready at {s['ready_at_ms'] or 0:8.1f}ms  {status}")
+
+        # Intent probes embed in the background after startup returns
+        router_start = time.time()
+        ready = await semantic_router.wait_ready(timeout=60)
+        print(f"Semantic router background warm-up: {time.time() - router_start:.4f}s "
+              f"({'semantic' if ready else 'keyword fallback'})")
+        return stats
     except Exception as e:
         print(f"Startup FAILED: {e}")
+        return None
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Import and cold-start timings")
+    parser.add_argument("--output", help="Write timings as JSON to this file")
+    args = parser.parse_args()
+
     print("--- BASELINE MEASUREMENTS ---")
-    
+
     # Measure Libs
     measure_import_lib("tiktoken")
     measure_import_lib("aiosqlite")
     measure_import("src.core.config")
 
-    # Measure Imports
-    measure_import("src.core.memory")
-    measure_import("src.core.rag")
-    measure_import("src.core.lm_client")
-    measure_import("src.api.api")
-    
+    # Cold imports: each module in its own interpreter
+    cold = {m: measure_cold_import(m) for m in (
+        "src.core.memory", "src.core.rag", "src.core.lm_client", "src.core.tools", "src.api.api"
+    )}
+    heavy = check_heavy_libs()
+
     # Measure Startup (simulated)
     # We invoke the startup function directly if possible
     # checks if event loop exists
+    startup_stats = None
     try:
-        asyncio.run(measure_startup())
+        startup_stats = asyncio.run(measure_startup())
     except Exception as e:
         print(f"Startup Test Error: {e}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "cold_import_s": cold,
+            "heavy_libs_loaded": heavy,
+            "startup": startup_stats,
+        }, indent=2))
+        print(f"Timings written to {args.output}")
@@ -11,11 +11,11 @@ Provides endpoints for React frontend:
 import asyncio
 import json
 from typing import Optional, AsyncGenerator
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Query
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
 # Import MAX core modules
@@ -26,11 +26,15 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from src.core.memory import memory
 from src.core.lm_client import lm_client
 from src.core.rag import rag
+from src.core.ingestion import ingestion, JobStatus
+from src.core.folder_sync import folder_sync
+from src.core.doc_parsing import document_parser
 from src.core.templates import templates
 from src.core.autogpt import RunStatus  # Keep enum, use ReflectiveAgent
 from src.core.agent_v2 import ReflectiveAgent
 from src.core.user_profile import user_profile
 from src.core.metrics import metrics_engine
+from src.core.metrics_retention import metrics_retention
 from src.core.adaptation import initialize_adaptation, prompt_builder
 from src.core.backup import backup_manager
 # AI Next Gen modules
@@ -40,6 +44,18 @@ from src.core.context_primer import context_primer
 from src.core.self_reflection import self_reflection, initialize_self_reflection
 from src.core.confidence import confidence_scorer
 from src.core.error_memory import error_memory  # P1: Integrate orphan module
+from src.core.config import config
+from src.core.prompt_layout import prompt_layout
+from src.core.response_cache import response_cache
+from src.core.speculative import speculative_engine, run_owner
+from src.core.cancellation import CancelToken, cancel_scope
+from src.core.sessions import Session, session_manager
+from src.core.services import services
+from src.core.worker_bus import (
+    worker_bus, agent_registry,
+    TOPIC_METRICS, TOPIC_PROFILE, TOPIC_AGENT_STOP, TOPIC_SPECULATIVE_ACCEPT
+)
+from src.api.streaming import StreamFormat, StreamWriter, coalesce_tokens
 
 # ============= FastAPI App =============
 
@@ -58,11 +74,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global state
+# Global state (per-client chat/agent state lives in session_manager)
 _initialized = False
-_current_conversation_id: Optional[str] = None
-_autogpt_agent: Optional[ReflectiveAgent] = None  # P1: Use ReflectiveAgent with verification
-_agent_lock = asyncio.Lock()  # P1 fix: Lock for singleton race condition
+SESSION_HEADER = "X-Session-ID"
 
 
 def _log_task_exception(task: asyncio.Task):
@@ -76,6 +90,18 @@ def _log_task_exception(task: asyncio.Task):
         pass
 
 
+def _get_session(http_request: Request, fallback_id: Optional[str] = None) -> Session:
+    """Session of the calling client: X-Session-ID header, else `fallback_id` (e.g. conversation)."""
+    return session_manager.get(http_request.headers.get(SESSION_HEADER) or fallback_id)
+
+
+async def _create_agent() -> ReflectiveAgent:
+    """Per-session agent (P1: ReflectiveAgent adds verification to AutoGPT)."""
+    agent = ReflectiveAgent(memory._db)
+    await agent.initialize(memory._db)
+    return agent
+
+
 # ============= Pydantic Models =============
 
 class ChatRequest(BaseModel):
@@ -84,8 +110,9 @@ class ChatRequest(BaseModel):
     model: str = "auto"
     temperature: float = 0.7
     use_rag: bool = True
-    thinking_mode: str = "standard"  # fast/standard/deep
+    thinking_mode: str = "standard"  # fast/standard/deep/speculative
     has_image: bool = False  # Auto-activates vision mode
+    stream_format: str = "sse"  # sse / ndjson
 
 
 class ConversationCreate(BaseModel):
@@ -105,6 +132,16 @@ class AgentStartRequest(BaseModel):
     use_files: bool = False
 
 
+class SyncFolderRequest(BaseModel):
+    path: str
+    recursive: bool = True
+
+
+class CollectionRequest(BaseModel):
+    name: str
+    storage: str = "sqlite"  # sqlite | segments
+
+
 class FeedbackRequest(BaseModel):
     message_id: int
     rating: int  # 1 = positive, -1 = negative
@@ -112,37 +149,80 @@ class FeedbackRequest(BaseModel):
 
 # ============= Startup =============
 
+def _register_services():
+    """Subsystems and their dependencies (independent ones initialize concurrently)."""
+    services.register("memory", memory.initialize)
+    for name, init in (
+        ("user_profile", user_profile.initialize),
+        ("rag", rag.initialize),
+        ("templates", templates.initialize),
+        ("metrics", metrics_engine.initialize),
+        ("adaptation", initialize_adaptation),
+        ("self_reflection", initialize_self_reflection),
+        ("agent_registry", agent_registry.initialize),
+    ):
+        services.register(name, lambda init=init: init(memory._db), depends=("memory",))
+    
+    # AI Next Gen: semantic routing and context priming
+    services.register("embeddings", lambda: embedding_service.initialize(lm_client))
+    # Intent probes are embedded in the background; keyword routing until ready
+    services.register(
+        "semantic_router",
+        lambda: semantic_router.initialize(lm_client, embedding_service, background=True),
+        depends=("embeddings",)
+    )
+    for name, component in (
+        ("context_primer", context_primer),
+        ("error_memory", error_memory),  # P1: learning from mistakes
+        ("response_cache", response_cache),
+    ):
+        services.register(
+            name, lambda c=component: c.initialize(memory._db, embedding_service),
+            depends=("memory", "embeddings")
+        )
+    
+    services.register("worker_bus", _start_worker_bus, depends=("metrics", "user_profile"))
+    # Resumes interrupted jobs; needs worker heartbeats to tell which are orphaned
+    services.register(
+        "ingestion", lambda: ingestion.initialize(memory._db),
+        depends=("rag", "agent_registry", "worker_bus")
+    )
+    services.register("folder_sync", lambda: folder_sync.initialize(memory._db), depends=("ingestion",))
+    services.register("metrics_retention", lambda: metrics_retention.initialize(memory._db), depends=("metrics",))
+
+
+async def _start_worker_bus():
+    """
+    Multi-worker mode: workers share only the database; per-worker caches
+    are invalidated and agent/speculative requests forwarded over the bus.
+    """
+    if config.workers.api_workers <= 1:
+        return
+    worker_bus.subscribe(TOPIC_METRICS, lambda _: metrics_engine.invalidate_cache())
+    worker_bus.subscribe(TOPIC_PROFILE, lambda _: user_profile.reload())
+    worker_bus.subscribe(TOPIC_AGENT_STOP, _stop_local_agent)
+    worker_bus.subscribe(TOPIC_SPECULATIVE_ACCEPT, lambda p: speculative_engine.accept(p["run_id"]))
+    await worker_bus.start(memory._db)
+
+
 @app.on_event("startup")
 async def startup():
     """Initialize all subsystems."""
-    global _initialized, _autogpt_agent
+    global _initialized
     
     if _initialized:
         return
     
-    await memory.initialize()
-    await user_profile.initialize(memory._db)
-    await rag.initialize(memory._db)
-    await templates.initialize(memory._db)
-    await metrics_engine.initialize(memory._db)
-    await initialize_adaptation(memory._db)
+    _register_services()
+    await services.start()
     
-    # AI Next Gen: Initialize semantic routing and context priming
-    await embedding_service.initialize(lm_client)
-    await semantic_router.initialize(lm_client, embedding_service)
-    await context_primer.initialize(memory._db, embedding_service)
-    await initialize_self_reflection(memory._db)
-    
-    # P1: Initialize error_memory for learning from mistakes
-    await error_memory.initialize(memory._db, embedding_service)
-    
-    # P1: Use ReflectiveAgent (adds verification step to AutoGPT)
-    _autogpt_agent = ReflectiveAgent(memory._db)
-    await _autogpt_agent.initialize(memory._db)
+    # Agents are created per session on first use
+    session_manager.initialize(agent_factory=_create_agent)
     
     _initialized = True
     from src.core.logger import log
-    log.api("✅ AI Next Gen modules initialized (SemanticRouter, ContextPrimer, SelfReflection, ErrorMemory, ReflectiveAgent)")
+    log.api("✅ AI Next Gen modules initialized (SemanticRouter, ContextPrimer, SelfReflection, ErrorMemory, ReflectiveAgent)",
+            startup_ms=round(services.total_ms))
 
 
 @app.on_event("shutdown")
@@ -151,6 +231,11 @@ async def shutdown():
     from src.core.logger import log
     log.api("📦 Spawning backup worker before shutdown...")
     backup_manager.spawn_backup_worker()
+    await folder_sync.stop()
+    await metrics_retention.stop()
+    await ingestion.stop()  # Unfinished jobs resume on next start
+    document_parser.shutdown()
+    await worker_bus.stop()
     await memory.close()
 
 
@@ -177,18 +262,35 @@ async def trigger_backup():
 
 # ============= Chat Endpoints =============
 
+async def _watch_disconnect(http_request: Request, token: CancelToken, interval: float = 0.25):
+    """Cancel `token` if the client goes away before streaming starts."""
+    while not token.cancelled:
+        if await http_request.is_disconnected():
+            token.cancel("client disconnected")
+            return
+        await asyncio.sleep(interval)
+
+
 @app.post("/api/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """Chat with streaming response (SSE)."""
     # DIRECT PRINT - guaranteed visibility
     # Replaced with log.api/log.request_start but keeping the cleaner log for now
     from src.core.logger import log
     
-    global _current_conversation_id
-    
     # Start request tracing
     log.request_start(request.message, request.model, request.thinking_mode)
     
+    try:
+        writer = StreamWriter(StreamFormat(request.stream_format))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown stream_format: {request.stream_format}")
+    
+    # Request-scoped cancellation: a disconnect closes the upstream stream and
+    # cancels context assembly / fact extraction started for this request
+    cancel_token = CancelToken("chat")
+    watcher = asyncio.create_task(_watch_disconnect(http_request, cancel_token))
+    
     # Get or create conversation
     conv_id = request.conversation_id
     is_new_conv = False
@@ -199,10 +301,14 @@ async def chat(request: ChatRequest):
         is_new_conv = True
         log.api(f"Created conversation: {conv_id}")
         log.api("Created new conversation", id=conv_id)
-    _current_conversation_id = conv_id
     
-    # Add user message
-    await memory.add_message(conv_id, "user", request.message)
+    # Per-client state: two tabs never share a current conversation
+    session = _get_session(http_request, fallback_id=conv_id)
+    session.conversation_id = conv_id
+    
+    # Add user message (fact extraction task is tied to cancel_token)
+    with cancel_scope(cancel_token):
+        await memory.add_message(conv_id, "user", request.message)
     log.api("User message saved")
     log.api("User message saved to memory")
     
@@ -231,34 +337,68 @@ async def chat(request: ChatRequest):
     if is_new_conv:
         asyncio.create_task(_update_title())
     
-    # Get context
-    context = await memory.get_smart_context(conv_id)
-    log.api("Context retrieved", messages=len(context))
-    
     # RAG augmentation
-    if request.use_rag:
+    async def _rag_block() -> str:
+        if not request.use_rag:
+            return ""
         rag_context = await rag.get_context_for_query(request.message, max_tokens=1000)
-        if rag_context:
-            context.insert(0, {
-                "role": "system",
-                "content": f"Релевантные документы:\n{rag_context}"
-            })
-            log.api("RAG context added", chars=len(rag_context))
-    
-    # Build adaptive prompt
-    style_prompt = await prompt_builder.build_adaptive_prompt(request.message)
-    if style_prompt:
-        context.insert(0, {"role": "system", "content": style_prompt})
-        log.api("Adaptive prompt injected")
+        if not rag_context:
+            return ""
+        log.api("RAG context added", chars=len(rag_context))
+        return f"Релевантные документы:\n{rag_context}"
+    
+    # Context assembly runs concurrently, as tasks cancelled with the request:
+    # memory segments (laid out below from most to least stable for KV-cache
+    # reuse), RAG and the adaptive style prompt (the query changes every turn)
+    context_tasks = [
+        cancel_token.add_task(asyncio.create_task(coro)) for coro in (
+            memory.get_context_segments(conv_id),
+            _rag_block(),
+            prompt_builder.build_adaptive_prompt(base_style_prompt=user_profile.get_style_prompt()),
+        )
+    ]
+    try:
+        segments, rag_block, style_prompt = await asyncio.gather(*context_tasks)
+    except asyncio.CancelledError:
+        if not cancel_token.cancelled:
+            raise
+        log.warn("Client disconnected during context assembly")
+        return Response(status_code=499)
+    log.api("Context retrieved", messages=len(segments.history), facts=len(segments.facts))
     
     async def generate() -> AsyncGenerator[str, None]:
-        """Stream tokens as SSE."""
+        """Stream tokens as SSE (or NDJSON), coalesced into frames."""
+        response_parts: list[str] = []  # Joined once at the end
         full_response = ""
+        model_used = None  # Set when it differs from lm_client.current_model
         error_occurred = False
+        disconnected = False
         sse_count = 0
+        trace = log.trace_chunks()  # Per-token SSE logging only in debug mode
+        confidence_stream = confidence_scorer.stream()  # Scored while tokens arrive
+        confidence_interval = config.streaming.confidence_interval_chars
+        confidence_sent = None  # Last (score, level) sent
+        confidence_done = False
+        
+        def confidence_event(result, provisional: bool = False) -> str:
+            nonlocal confidence_sent
+            confidence_sent = (result.score, result.level)
+            data = {
+                'confidence': True,
+                'score': result.score,
+                'level': result.level.value,
+                'factors': result.factors
+            }
+            if provisional:
+                data['provisional'] = True
+            return writer.event(data)
         
         log.api("Starting SSE generator")
+        watcher.cancel()  # The streaming response watches for disconnects from here on
+        if cancel_token.cancelled:
+            return
         
+        session.begin_request()  # Not evicted while streaming
         try:
             # Convert string to ThinkingMode enum
             from src.core.lm_client import ThinkingMode
@@ -268,48 +408,81 @@ async def chat(request: ChatRequest):
                 thinking_mode = ThinkingMode.STANDARD
                 log.warn(f"Invalid thinking_mode '{request.thinking_mode}', using STANDARD")
             
-            log.api("Calling lm_client.chat()", mode=thinking_mode.value)
-            
-            # P2 Fix: Resolve model and handle loading state
-            target_model = request.model
+            # Stable prompt layout: mode suffix goes into the static head
+            effective_mode = ThinkingMode.VISION if request.has_image else thinking_mode
+            messages = prompt_layout.build(
+                query=request.message,
+                system=lm_client.get_mode_config(effective_mode).system_prompt_suffix,
+                profile=style_prompt,
+                memory=segments.memory_text,
+                history=segments.history,
+                retrieval=rag_block
+            )
+            prefix = prompt_layout.tracker.observe(conv_id, messages)
+            log.api("Prompt layout", messages=len(messages),
+                    prefix_reuse=f"{prefix.ratio:.0%}", head_stable=prefix.head_stable)
             
-            # Smart model resolution for "auto":
-            # 1. Check if any model is already loaded in LM Studio
-            # 2. If yes - use it (no hot-swap needed!)
-            # 3. If no - use config default for the thinking mode
-            if target_model == "auto" or not target_model:
-                # First check if LM Studio has a model loaded
-                loaded_model = await lm_client.get_loaded_model()
-                if loaded_model:
-                    target_model = loaded_model
-                    log.api(f"Auto-selected already loaded model: {target_model}")
-                else:
-                    # No model loaded, use config default
-                    mode_config = lm_client.get_mode_config(thinking_mode)
-                    target_model = mode_config.model
-                    log.api(f"Auto-selected config model: {target_model}")
+            log.api("Calling lm_client.chat()", mode=thinking_mode.value)
             
-            # Check if we need to load (Hot-swap)
-            # We use local check first to avoid IPC if possible, but ensure_model_loaded is safe
-            if lm_client.current_model != target_model:
-                log.api(f"Model switch needed: {lm_client.current_model} -> {target_model}")
-                sse_loading = json.dumps({'status': 'loading', 'model': target_model})
-                yield f"data: {sse_loading}\n\n"
+            if effective_mode == ThinkingMode.SPECULATIVE:
+                # Draft and deep models run side by side: no hot-swap to a single model
+                run = speculative_engine.start(
+                    messages, temperature=request.temperature, cancel_token=cancel_token
+                )
+                model_used = run.draft_model
+                yield writer.event({
+                    'speculative': 'start', 'run_id': run.id,
+                    'draft_model': run.draft_model, 'deep_model': run.deep_model
+                })
+                upstream = speculative_engine.stream(run)
+            else:
+                # P2 Fix: Resolve model and handle loading state
+                target_model = request.model
+                
+                # Smart model resolution for "auto":
+                # 1. Check if any model is already loaded in LM Studio
+                # 2. If yes - use it (no hot-swap needed!)
+                # 3. If no - use config default for the thinking mode
+                if target_model == "auto" or not target_model:
+                    # First check if LM Studio has a model loaded
+                    loaded_model = await lm_client.get_loaded_model()
+                    if loaded_model:
+                        target_model = loaded_model
+                        log.api(f"Auto-selected already loaded model: {target_model}")
+                    else:
+                        # No model loaded, use config default
+                        mode_config = lm_client.get_mode_config(thinking_mode)
+                        target_model = mode_config.model
+                        log.api(f"Auto-selected config model: {target_model}")
                 
-                success = await lm_client.ensure_model_loaded(target_model)
-                if not success:
-                    error_msg = f"Failed to load model: {target_model}"
-                    log.error(error_msg)
-                    yield f"data: {json.dumps({'error': error_msg})}\n\n"
-                    return
-
-            async for chunk in await lm_client.chat(
-                messages=context + [{"role": "user", "content": request.message}],
-                temperature=request.temperature,
-                model=target_model,  # Explicitly pass resolved model
-                thinking_mode=thinking_mode,
-                has_image=request.has_image,
-                stream=True
+                # Check if we need to load (Hot-swap)
+                # We use local check first to avoid IPC if possible, but ensure_model_loaded is safe
+                if lm_client.current_model != target_model:
+                    log.api(f"Model switch needed: {lm_client.current_model} -> {target_model}")
+                    yield writer.event({'status': 'loading', 'model': target_model})
+                    
+                    success = await lm_client.ensure_model_loaded(target_model)
+                    if not success:
+                        error_msg = f"Failed to load model: {target_model}"
+                        log.error(error_msg)
+                        yield writer.event({'error': error_msg})
+                        return
+
+                upstream = await lm_client.chat(
+                    messages=messages,
+                    temperature=request.temperature,
+                    model=target_model,  # Explicitly pass resolved model
+                    thinking_mode=thinking_mode,
+                    has_image=request.has_image,
+                    stream=True,
+                    cancel_token=cancel_token
+                )
+            async for chunk in coalesce_tokens(
+                upstream,
+                flush_interval=config.streaming.coalesce_ms / 1000,
+                max_chars=config.streaming.max_frame_chars,
+                # Error chunks must stay separate to be detected below
+                is_control=lambda c: not isinstance(c, str) or c.startswith("\n[Error:")
             ):
                 sse_count += 1
                 
@@ -318,33 +491,61 @@ async def chat(request: ChatRequest):
                     meta_type = chunk["_meta"]
                     if meta_type == "thinking_start":
                         log.api("🧠 Thinking started")
-                        yield f"data: {json.dumps({'thinking': 'start'})}\n\n"
+                        yield writer.event({'thinking': 'start'})
                     elif meta_type == "thinking_end":
                         duration = chunk.get("duration_ms", 0)
                         chars = chunk.get("chars_filtered", 0)
                         think_content = chunk.get("think_content", "")
                         log.api(f"🧠 Thinking ended", duration_ms=duration, chars_filtered=chars)
-                        yield f"data: {json.dumps({'thinking': 'end', 'duration_ms': duration, 'chars_filtered': chars, 'think_content': think_content})}\n\n"
+                        yield writer.event({'thinking': 'end', 'duration_ms': duration, 'chars_filtered': chars, 'think_content': think_content})
+                    elif meta_type == "revision":
+                        # Deep answer replaces the draft (in the UI and in memory)
+                        response_parts = [chunk["content"]]
+                        confidence_stream = confidence_scorer.stream()
+                        confidence_stream.feed(chunk["content"])
+                        model_used = chunk["model"]
+                        log.api("🔀 Revision delivered", changed=chunk["changed"],
+                                deep_first_token_ms=chunk["deep_first_token_ms"])
+                        yield writer.event({**{k: v for k, v in chunk.items() if k != "_meta"}, 'revision': True})
+                    elif meta_type in ("draft_done", "accepted", "revision_failed"):
+                        yield writer.event({**{k: v for k, v in chunk.items() if k != "_meta"}, 'speculative': meta_type})
                     continue
                 
                 # Check for error in chunk
                 if chunk.startswith("\n[Error:"):
                     error_occurred = True
-                    full_response += chunk
+                    response_parts.append(chunk)
                     log.error(f"Error chunk received: {chunk}")
-                    yield f"data: {json.dumps({'error': chunk.strip()})}\n\n"
+                    yield writer.event({'error': chunk.strip()})
                     break
                 
-                full_response += chunk
+                response_parts.append(chunk)
+                
+                if trace:
+                    log.sse_yield("token", len(chunk))
+                yield writer.token(chunk)
                 
-                # SSE format
-                sse_data = json.dumps({'token': chunk})
-                log.sse_yield("token", len(chunk))
-                yield f"data: {sse_data}\n\n"
+                # Provisional confidence each time another interval of text has streamed
+                before = confidence_stream.length
+                confidence_stream.feed(chunk)
+                if confidence_interval and (
+                    confidence_stream.length // confidence_interval > before // confidence_interval
+                ):
+                    provisional = confidence_stream.score()
+                    if (provisional.score, provisional.level) != confidence_sent:
+                        yield confidence_event(provisional, provisional=True)
+            
+            # Final confidence right as generation ends (before the save)
+            if not error_occurred and confidence_stream.length:
+                confidence_done = True
+                yield confidence_event(confidence_stream.finish())
                 
-        except asyncio.CancelledError:
+        except (asyncio.CancelledError, GeneratorExit):
             log.warn("Client disconnected (Stop Generation)")
-            full_response += " [Interrupted]"
+            # Stop upstream generation now, not when the generator is collected
+            cancel_token.cancel("client disconnected")
+            disconnected = True
+            response_parts.append(" [Interrupted]")
             # Don't yield here, channel is closed
             
         except Exception as e:
@@ -352,16 +553,18 @@ async def chat(request: ChatRequest):
             import traceback
             log.error(f"Traceback:\n{traceback.format_exc()}")
             error_msg = f"\n[System Error: {str(e)}]"
-            full_response += error_msg
-            yield f"data: {json.dumps({'error': error_msg})}\n\n"
+            response_parts.append(error_msg)
+            yield writer.event({'error': error_msg})
         
         finally:
+            session.end_request()
+            full_response = "".join(response_parts)
             # P0 CRITICAL FIX: Guaranteed save even on disconnect
             if full_response:
                 try:
                     saved_msg = await memory.add_message(
                         conv_id, "assistant", full_response,
-                        model_used=lm_client.current_model or "unknown"
+                        model_used=model_used or lm_client.current_model or "unknown"
                     )
                     log.api("Response saved to memory (guaranteed)", msg_id=saved_msg.id, chars=len(full_response))
                     
@@ -369,27 +572,21 @@ async def chat(request: ChatRequest):
                     await metrics_engine.record_interaction_outcome(
                         message_id=saved_msg.id,
                         user_message=request.message,
-                        facts_in_context=len(context),
+                        facts_in_context=len(segments.facts),
                         style_prompt_length=len(style_prompt) if style_prompt else 0
                     )
                     
                     # Send done signal if we can
-                    if not error_occurred:
+                    if not error_occurred and not disconnected:
                         done_data = {'done': True, 'message_id': saved_msg.id, 'conversation_id': conv_id}
-                        yield f"data: {json.dumps(done_data)}\n\n"
+                        yield writer.event(done_data)
                         
-                        # Score confidence
-                        try:
-                            confidence_result = confidence_scorer.score_response(full_response)
-                            confidence_data = {
-                                'confidence': True,
-                                'score': confidence_result.score,
-                                'level': confidence_result.level.value,
-                                'factors': confidence_result.factors
-                            }
-                            yield f"data: {json.dumps(confidence_data)}\n\n"
-                        except Exception:
-                            pass
+                        # Generation failed before the final score was sent
+                        if not confidence_done:
+                            try:
+                                yield confidence_event(confidence_scorer.score_response(full_response))
+                            except Exception:
+                                pass
                             
                 except Exception as save_err:
                      log.error(f"FATAL: Failed to save response to DB: {save_err}")
@@ -398,11 +595,26 @@ async def chat(request: ChatRequest):
     
     return StreamingResponse(
         generate(),
-        media_type="text/event-stream",
+        media_type=writer.media_type,
         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
+@app.post("/api/chat/speculative/{run_id}/accept")
+async def accept_speculative_draft(run_id: str):
+    """Keep the draft of a speculative run and cancel its deep refinement."""
+    if speculative_engine.accept(run_id):
+        return {"success": True, "run_id": run_id}
+    
+    # Forward only to a live worker that started the run; it may still refuse it
+    owner = run_owner(run_id)
+    if (not worker_bus.running or not owner or owner == worker_bus.worker_id
+            or not await worker_bus.is_alive(owner)):
+        raise HTTPException(404, "Speculative run not found or already finished")
+    await worker_bus.publish(TOPIC_SPECULATIVE_ACCEPT, {"run_id": run_id})
+    return {"success": True, "run_id": run_id, "forwarded": True, "accepted": "unknown"}
+
+
 @app.get("/api/conversations")
 async def list_conversations(limit: int = 50):
     """List recent conversations with message counts."""
@@ -444,85 +656,247 @@ async def get_messages(conv_id: str, limit: int = 100):
 
 @app.get("/api/documents")
 async def list_documents():
-    """List all indexed documents."""
+    """List all indexed documents (still-ingesting ones are partially queryable)."""
     docs = await rag.list_documents()
+    ingesting = await ingestion.active_document_ids()
     return [{
         "id": str(d.id),
         "name": d.filename,
         "size": f"{d.chunk_count * 500} chars",  # Approximate
         "type": d.filename.split(".")[-1] if "." in d.filename else "txt",
         "chunks": d.chunk_count,
-        "status": "indexed"
+        "collection": d.collection,
+        "status": "processing" if d.id in ingesting else "indexed"
     } for d in docs]
 
 
+@app.get("/api/documents/collections")
+async def list_collections():
+    """Document collections with their storage, counts and segment store stats."""
+    return await rag.list_collections()
+
+
+@app.post("/api/documents/collections")
+async def create_collection(request: CollectionRequest):
+    """Create a collection; storage "segments" keeps its chunks out of max.db."""
+    try:
+        return await rag.create_collection(request.name, request.storage)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.post("/api/documents/collections/{name}/compact")
+async def compact_collection(name: str):
+    """Reclaim the space of deleted chunks in a segment collection."""
+    try:
+        return await rag.compact_collection(name)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
 @app.post("/api/documents/upload")
-async def upload_document(file: UploadFile = File(...)):
-    """Upload and index a document."""
-    import tempfile
-    import os
-    
-    # Save to temp file (Streamed)
-    temp_path = os.path.join(tempfile.gettempdir(), file.filename)
+async def upload_document(file: UploadFile = File(...), collection: Optional[str] = None):
+    """Upload a document and queue it for indexing (returns the ingestion job)."""
+    if collection and not await rag.get_collection(collection):
+        raise HTTPException(404, "Collection not found")
+    upload_path = ingestion.new_upload_path(file.filename)
     # Optimization: Read in chunks to avoid memory spike
-    with open(temp_path, 'wb') as f:
+    with open(upload_path, 'wb') as f:
         while chunk := await file.read(1024 * 1024):  # 1MB chunks
             f.write(chunk)
     
-    try:
-        # Index document
-        doc = await rag.add_document(temp_path)
-        return {"id": str(doc.id), "name": doc.filename, "status": "indexed"}
-    finally:
-        # P1 fix: Cleanup temp file to prevent disk leak
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+    job = await ingestion.submit(upload_path, file.filename, collection=collection)
+    return {
+        "id": job.document_id,
+        "name": job.filename,
+        "status": "indexed" if job.status == JobStatus.COMPLETED else "processing",
+        "job": job.to_dict()
+    }
+
+
+@app.get("/api/documents/jobs")
+async def list_ingestion_jobs(limit: int = Query(50, ge=1, le=500), active: bool = False):
+    """Recent ingestion jobs."""
+    return await ingestion.list_jobs(limit=limit, active_only=active)
+
+
+@app.get("/api/documents/jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    """Ingestion job progress (for polling)."""
+    job = await ingestion.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job
+
+
+@app.get("/api/documents/jobs/{job_id}/events")
+async def stream_ingestion_job(job_id: str, http_request: Request):
+    """Ingestion job progress as SSE until the job finishes."""
+    if not await ingestion.get(job_id):
+        raise HTTPException(404, "Job not found")
+    writer = StreamWriter(StreamFormat.SSE)
+
+    async def generate():
+        async for state in ingestion.events(job_id):
+            if await http_request.is_disconnected():
+                break
+            yield writer.event(state)
+
+    return StreamingResponse(
+        generate(),
+        media_type=writer.media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/documents/jobs/{job_id}/cancel")
+async def cancel_ingestion_job(job_id: str):
+    """Cancel a queued or running ingestion job; its partial document is removed."""
+    if not await ingestion.cancel(job_id):
+        raise HTTPException(404, "Job not found or already finished")
+    return {"success": True, "job_id": job_id}
+
+
+@app.post("/api/documents/{doc_id}/reindex")
+async def reindex_document(doc_id: str, file: Optional[UploadFile] = File(None)):
+    """
+    Re-index a document from its file, or from an uploaded new version.
+    Only chunks whose content changed are embedded again; the job reports
+    reused_chunks vs computed_chunks.
+    """
+    doc = await rag.get_document(doc_id)
+    if not doc:
+        raise HTTPException(404, "Document not found")
+    if file is not None:
+        path = ingestion.new_upload_path(file.filename)
+        with open(path, 'wb') as f:
+            while chunk := await file.read(1024 * 1024):
+                f.write(chunk)
+    else:
+        path = Path(doc.file_path)
+        if not path.exists():
+            raise HTTPException(409, "Document file no longer exists; upload the new version")
+
+    job = await ingestion.submit(path, doc.filename, document_id=doc_id)
+    return {
+        "id": doc_id,
+        "name": doc.filename,
+        "status": "indexed" if job.status == JobStatus.COMPLETED else "processing",
+        "job": job.to_dict()
+    }
 
 
 @app.delete("/api/documents/{doc_id}")
 async def delete_document(doc_id: str):
-    """Delete a document."""
+    """Delete a document (stopping its ingestion if still running)."""
+    await ingestion.cancel_document(doc_id)
     await rag.remove_document(doc_id)
     return {"success": True}
 
 
+# ============= Folder Sync Endpoints =============
+
+@app.get("/api/sync/folders")
+async def list_sync_folders():
+    """Watched folders with the result of their last scan."""
+    return [folder.to_dict() for folder in await folder_sync.list_folders()]
+
+
+@app.post("/api/sync/folders")
+async def add_sync_folder(request: SyncFolderRequest):
+    """Watch a folder: its supported files are indexed and kept in sync."""
+    try:
+        folder = await folder_sync.add_folder(request.path, recursive=request.recursive)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    folder_sync.trigger_scan(folder.id)
+    return folder.to_dict()
+
+
+@app.post("/api/sync/folders/{folder_id}/scan")
+async def scan_sync_folder(folder_id: str):
+    """Rescan a folder now (in the background; see last_scan for the result)."""
+    if not await folder_sync.get_folder(folder_id):
+        raise HTTPException(404, "Folder not found")
+    return {"folder_id": folder_id, "started": folder_sync.trigger_scan(folder_id)}
+
+
+@app.delete("/api/sync/folders/{folder_id}")
+async def remove_sync_folder(folder_id: str, remove_documents: bool = True):
+    """Stop watching a folder (by default its documents are removed too)."""
+    if not await folder_sync.remove_folder(folder_id, remove_documents=remove_documents):
+        raise HTTPException(404, "Folder not found")
+    return {"success": True}
+
+
 # ============= Auto-GPT Endpoints =============
 
 @app.post("/api/agent/start")
-async def start_agent(request: AgentStartRequest):
-    """Start autonomous agent."""
-    global _autogpt_agent
-    
-    if _autogpt_agent.is_running():
-        raise HTTPException(400, "Agent already running")
+async def start_agent(request: AgentStartRequest, http_request: Request):
+    """Start autonomous agent (one agent per session)."""
+    session = _get_session(http_request)
+    agent = await session_manager.get_agent(session)
     
-    run = await _autogpt_agent.set_goal(request.goal, request.max_steps)
+    async with session.lock:  # Two start clicks from one tab don't race
+        if agent.is_running or await _remote_run(session, running_only=True):
+            raise HTTPException(400, "Agent already running")
+        run = await agent.set_goal(request.goal, request.max_steps)
+        await agent_registry.register(session.id, run.id)
     
     # Start in background
-    asyncio.create_task(_run_agent())
+    task = asyncio.create_task(_run_agent(agent))
+    task.add_done_callback(_log_task_exception)
     
-    return {"run_id": run.id, "status": "running"}
+    return {"run_id": run.id, "status": "running", "session_id": session.id}
 
 
-async def _run_agent():
+async def _run_agent(agent: ReflectiveAgent):
     """Background agent execution."""
-    global _autogpt_agent
-    async for step in _autogpt_agent.run_generator():
+    async for step in agent.run_generator():
         pass  # Steps are stored in DB
 
 
+async def _remote_run(session: Session, running_only: bool = False):
+    """
+    The session's latest run if another worker owns it (loaded from the DB).
+    With running_only, only a run that is still running on a live worker.
+    """
+    entry = await agent_registry.lookup(session.id)
+    if not entry or entry["local"]:
+        return None
+    if running_only and not entry["alive"]:
+        return None  # Owner died: its run can't be running any more
+    # Only DB reads: don't build (and keep) a full agent just to look at the run
+    reader = session.agent or ReflectiveAgent(memory._db)
+    run = await reader.get_run(entry["run_id"])
+    if run and not entry["alive"] and run.status == RunStatus.RUNNING:
+        run.status = RunStatus.FAILED
+    if running_only and (not run or run.status != RunStatus.RUNNING):
+        return None
+    return run
+
+
+async def _stop_local_agent(payload: dict):
+    """Bus handler: stop a run owned by this worker."""
+    agent = session_manager.find_agent_run(payload.get("run_id", ""))
+    if agent:
+        await agent.cancel()
+
+
 @app.get("/api/agent/status")
-async def agent_status():
-    """Get agent status and steps."""
-    global _autogpt_agent
+async def agent_status(http_request: Request):
+    """Get agent status and steps (from the DB if another worker runs the agent)."""
+    session = _get_session(http_request)
+    agent = session.agent  # None until this worker starts an agent for the session
     
-    if not _autogpt_agent or not _autogpt_agent._current_run:
+    run = await _remote_run(session) or (agent._current_run if agent else None)
+    if not run:
         return {"running": False, "steps": []}
     
-    run = _autogpt_agent._current_run
+    local = agent is not None and run is agent._current_run
     return {
-        "running": _autogpt_agent.is_running(),
-        "paused": _autogpt_agent.is_paused(),
+        "running": bool(agent.is_running) if local else run.status == RunStatus.RUNNING,
+        "paused": agent.is_paused if local else run.status == RunStatus.PAUSED,
         "goal": run.goal,
         "steps": [{
             "id": s.id,
@@ -535,13 +909,24 @@ async def agent_status():
 
 
 @app.post("/api/agent/stop")
-async def stop_agent():
-    """Stop agent execution."""
-    global _autogpt_agent
-    await _autogpt_agent.cancel()
+async def stop_agent(http_request: Request):
+    """Stop agent execution (forwarded to the owning worker if it isn't this one)."""
+    session = _get_session(http_request)
+    
+    remote = await _remote_run(session, running_only=True)
+    if remote:
+        await worker_bus.publish(TOPIC_AGENT_STOP, {"run_id": remote.id})
+    elif session.agent:
+        await session.agent.cancel()
     return {"success": True}
 
 
+@app.get("/api/session")
+async def get_session(http_request: Request):
+    """State of the calling client's session."""
+    return _get_session(http_request).to_dict()
+
+
 # ============= Templates Endpoints =============
 
 @app.get("/api/templates")
@@ -584,6 +969,23 @@ async def get_adaptation_proof():
     return proof
 
 
+@app.get("/api/metrics/hourly")
+async def get_hourly_metrics(since: Optional[str] = None, until: Optional[str] = None):
+    """Hourly outcome totals (local hours, default: the last 7 days)."""
+    since = since or (date.today() - timedelta(days=7)).isoformat()
+    return await metrics_retention.hourly(since, until)
+
+
+@app.post("/api/metrics/retention")
+async def run_metrics_retention():
+    """Expire raw outcomes past retention now (export, hourly rollup, delete)."""
+    try:
+        report = await metrics_retention.run()
+    except (ImportError, ValueError) as e:  # Export format not available / unknown
+        raise HTTPException(400, str(e))
+    return report.to_dict()
+
+
 @app.get("/api/achievements")
 async def get_achievements():
     """Get all achievements."""
@@ -639,6 +1041,19 @@ async def cognitive_health():
             "iq_today": iq.score,
             "context_cache": cache_stats,
             "embedding_cache": embedding_stats,
+            "llm_scheduler": lm_client.scheduler.get_stats(),
+            "prompt_prefix": prompt_layout.get_stats(),
+            "response_cache": response_cache.get_stats(),
+            "speculative": speculative_engine.get_stats(),
+            "sessions": session_manager.get_stats(),
+            "worker_bus": worker_bus.get_stats(),
+            "ingestion": ingestion.get_stats(),
+            "folder_sync": folder_sync.get_stats(),
+            "retrieval": rag.retrieval.get_stats(),
+            "metrics": metrics_engine.get_stats(),
+            "metrics_retention": metrics_retention.get_stats(),
+            "startup": services.get_stats(),
+            "semantic_router_ready": semantic_router.ready,
             "semantic_routing": True,
             "context_priming": True
         }
@@ -658,6 +1073,30 @@ async def health():
 
 # ============= Run Server =============
 
-if __name__ == "__main__":
+def run_api(host: str = "0.0.0.0", port: int = 8000, workers: Optional[int] = None):
+    """
+    Run the API server. With workers > 1 uvicorn starts that many processes;
+    they coordinate through the database (src/core/worker_bus.py).
+    """
+    import os
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    
+    workers = workers or config.workers.api_workers
+    if workers <= 1:
+        uvicorn.run(app, host=host, port=port)
+        return
+    os.environ["MAX_API_WORKERS"] = str(workers)  # Read by config in each worker
+    uvicorn.run("src.api.api:app", host=host, port=port, workers=workers,
+                app_dir=str(Path(__file__).parent.parent.parent))
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="MAX AI API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: MAX_API_WORKERS or 1)")
+    args = parser.parse_args()
+    run_api(args.host, args.port, args.workers)
@@ -0,0 +1,160 @@
+"""
+Streaming helpers for /api/chat.
+
+- StreamWriter: frames events as SSE ("data: {...}\\n\\n") or NDJSON
+  ("{...}\\n") with pre-serialized token frame templates
+- coalesce_tokens: merges upstream tokens into larger frames by time
+  window or size, so a fast model doesn't cost one write per token
+
+Usage:
+    writer = StreamWriter(StreamFormat.SSE)
+    async for item in coalesce_tokens(upstream, flush_interval=0.02):
+        yield writer.token(item) if isinstance(item, str) else writer.event(item)
+"""
+import asyncio
+import json
+from collections import deque
+from enum import Enum
+from json.encoder import encode_basestring_ascii  # Same output as json.dumps(str)
+from typing import Any, AsyncIterator, Callable, Optional
+
+
+class StreamFormat(Enum):
+    """Wire format of the chat stream."""
+    SSE = "sse"        # text/event-stream (browser EventSource / fetch reader)
+    NDJSON = "ndjson"  # One JSON object per line
+
+
+class StreamWriter:
+    """Serializes stream events for the selected wire format."""
+
+    MEDIA_TYPES = {
+        StreamFormat.SSE: "text/event-stream",
+        StreamFormat.NDJSON: "application/x-ndjson",
+    }
+
+    def __init__(self, fmt: StreamFormat = StreamFormat.SSE):
+        self.format = fmt
+        if fmt == StreamFormat.SSE:
+            self._prefix, self._suffix = "data: ", "\n\n"
+        else:
+            self._prefix, self._suffix = "", "\n"
+        # Token frames are the hot path: only the token string is encoded per frame
+        self._token_open = self._prefix + '{"token": '
+        self._token_close = "}" + self._suffix
+
+    @property
+    def media_type(self) -> str:
+        return self.MEDIA_TYPES[self.format]
+
+    def token(self, text: str) -> str:
+        """Frame a text token (equivalent to event({'token': text}))."""
+        return self._token_open + encode_basestring_ascii(text) + self._token_close
+
+    def event(self, payload: dict) -> str:
+        """Frame a control event (thinking, done, error, ...)."""
+        return self._prefix + json.dumps(payload) + self._suffix
+
+
+def _is_control(item: Any) -> bool:
+    return not isinstance(item, str)
+
+
+async def coalesce_tokens(
+    source: AsyncIterator[Any],
+    flush_interval: float = 0.02,
+    max_chars: int = 512,
+    is_control: Optional[Callable[[Any], bool]] = None
+) -> AsyncIterator[Any]:
+    """
+    Merge consecutive text tokens from `source`.
+
+    Buffered text is flushed when `flush_interval` seconds have passed
+    since its first token, when it reaches `max_chars`, before any
+    control item (passed through unchanged, order preserved) and at the
+    end of the stream. A stalled upstream never holds text longer than
+    the window.
+
+    Args:
+        source: Async iterator of text tokens and control items
+        flush_interval: Coalescing window in seconds (<= 0 disables coalescing)
+        max_chars: Flush early once this many chars are buffered
+        is_control: Predicate for items that must not be merged
+            (default: anything that is not a str)
+    """
+    is_control = is_control or _is_control
+
+    if flush_interval <= 0:
+        async for item in source:
+            yield item
+        return
+
+    loop = asyncio.get_running_loop()
+    items: deque = deque()
+    ready = asyncio.Event()
+    finished = False
+    error: Optional[BaseException] = None
+
+    async def pump():
+        # Single reader task: upstream items land in `items` without per-item tasks
+        nonlocal finished, error
+        try:
+            async for item in source:
+                items.append(item)
+                ready.set()
+        except Exception as e:
+            error = e
+        finally:
+            finished = True
+            ready.set()
+
+    reader = asyncio.ensure_future(pump())
+    buffer: list[str] = []
+    buffered = 0
+    deadline = 0.0
+
+    try:
+        while True:
+            if not items:
+                if finished:
+                    break
+                if buffer:
+                    # Wake up at the window deadline even if upstream is quiet
+                    timer = loop.call_at(deadline, ready.set)
+                    await ready.wait()
+                    timer.cancel()
+                else:
+                    await ready.wait()
+                ready.clear()
+
+            while items:
+                item = items.popleft()
+                if is_control(item):
+                    if buffer:
+                        yield "".join(buffer)
+                        buffer.clear()
+                        buffered = 0
+                    yield item
+                    continue
+
+                if not buffer:
+                    deadline = loop.time() + flush_interval
+                buffer.append(item)
+                buffered += len(item)
+                if buffered >= max_chars:
+                    yield "".join(buffer)
+                    buffer.clear()
+                    buffered = 0
+
+            if buffer and (finished or loop.time() >= deadline):
+                yield "".join(buffer)
+                buffer.clear()
+                buffered = 0
+
+        if buffer:
+            yield "".join(buffer)
+        if error is not None:
+            raise error
+    finally:
+        if not reader.done():
+            reader.cancel()
@@ -10,7 +10,6 @@ Implements:
 These techniques make the model genuinely adapt to user preferences.
 """
 import json
-import re
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional, Any
@@ -18,6 +17,7 @@ from typing import Optional, Any
 import aiosqlite
 
 from .config import config
+from .pattern_matcher import PatternMatcher
 
 
 @dataclass
@@ -118,6 +118,11 @@ class CorrectionDetector:
     
     def __init__(self, db: Optional[aiosqlite.Connection] = None):
         self._db = db
+        # All patterns in one compiled scan (label = category)
+        self._matcher = PatternMatcher(
+            [(category, pattern) for pattern, category in self.CORRECTION_PATTERNS],
+            regex=True
+        )
     
     async def initialize(self, db: aiosqlite.Connection):
         """Initialize with database connection."""
@@ -128,15 +133,13 @@ class CorrectionDetector:
         Detect if text contains a correction.
         
         Returns:
-            tuple: (is_correction, category)
+            tuple: (is_correction, category) — the category of the first
+            pattern in CORRECTION_PATTERNS that matches
         """
-        text_lower = text.lower()
-        
-        for pattern, category in self.CORRECTION_PATTERNS:
-            if re.search(pattern, text_lower):
-                return True, category
-        
-        return False, None
+        match = self._matcher.first(text.lower())
+        if match is None:
+            return False, None
+        return True, match.label
     
     async def record_correction(
         self,
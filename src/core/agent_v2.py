@@ -26,6 +26,7 @@ from typing import Optional
 
 from .autogpt import AutoGPTAgent, Step, StepStatus, AutoGPTRun
 from .lm_client import lm_client, TaskType
+from .llm_scheduler import RequestPriority
 from .logger import log
 
 
@@ -189,7 +190,9 @@ class ReflectiveAgent(AutoGPTAgent):
                 messages=[{"role": "user", "content": prompt}],
                 task_type=TaskType.REASONING,
                 stream=False,
-                max_tokens=200
+                max_tokens=200,
+                priority=RequestPriority.AGENT,
+                cache_site="agent_verify"
             )
             
             return self._parse_verification_response(response)
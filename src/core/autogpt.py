@@ -20,6 +20,7 @@ import aiosqlite
 
 from .config import config
 from .lm_client import lm_client, TaskType
+from .llm_scheduler import RequestPriority
 from .tools import tools, TOOLS, DANGEROUS_TOOLS
 
 
@@ -273,7 +274,9 @@ class AutoGPTAgent:
                 messages=[{"role": "user", "content": plan_prompt}],
                 stream=False,
                 task_type=TaskType.REASONING,
-                max_tokens=1000
+                max_tokens=1000,
+                priority=RequestPriority.AGENT,
+                cache_site="agent_plan"
             )
             
             # Parse JSON from response
@@ -338,7 +341,8 @@ class AutoGPTAgent:
             messages=[{"role": "user", "content": next_action_prompt}],
             stream=False,
             task_type=TaskType.REASONING,
-            max_tokens=500
+            max_tokens=500,
+            priority=RequestPriority.AGENT
         )
         
         # Parse action (P1 fix: specific exception + validation)
@@ -0,0 +1,128 @@
+"""
+Request-scoped cancellation for MAX AI Assistant.
+
+A CancelToken ties together everything started for one chat request:
+the upstream LLM stream (closed immediately so the server stops
+generating), background tasks (fact extraction, context assembly) and
+arbitrary cleanup callbacks.
+
+Usage:
+    token = CancelToken("chat:<conv_id>")
+    with cancel_scope(token):
+        track_task(asyncio.create_task(work()))   # Registered with token
+    ...
+    token.cancel("client disconnected")           # Cancels + closes all
+"""
+import asyncio
+import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from .logger import log
+
+
+class CancelToken:
+    """Cancellation handle shared by everything one request started."""
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.reason: Optional[str] = None
+        self._cancelled = False
+        self._tasks: set[asyncio.Task] = set()
+        self._callbacks: list[Callable[[], Any]] = []
+        self._pending: set[asyncio.Future] = set()  # Async callbacks still running
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def add_task(self, task: asyncio.Task) -> asyncio.Task:
+        """Cancel `task` together with the token (immediately if already cancelled)."""
+        if self._cancelled:
+            task.cancel()
+            return task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def on_cancel(self, callback: Callable[[], Any]) -> Callable[[], None]:
+        """
+        Run `callback` on cancel (sync, or returning an awaitable such as
+        `stream.close`). Returns a function that unregisters it.
+        """
+        if self._cancelled:
+            self._invoke(callback)
+            return lambda: None
+        self._callbacks.append(callback)
+
+        def unregister():
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+        return unregister
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Cancel registered tasks and run callbacks. False if already cancelled."""
+        if self._cancelled:
+            return False
+        self._cancelled = True
+        self.reason = reason
+
+        tasks, self._tasks = self._tasks, set()
+        callbacks, self._callbacks = self._callbacks, []
+        for task in tasks:
+            task.cancel()
+        for callback in callbacks:
+            self._invoke(callback)
+
+        if tasks or callbacks:
+            log.debug(f"Cancelled {self.name or 'request'}: {reason}",
+                      tasks=len(tasks), callbacks=len(callbacks))
+        return True
+
+    async def wait_closed(self, timeout: float = 1.0):
+        """Wait for async cancel callbacks (e.g. stream closes) to finish."""
+        if self._pending:
+            await asyncio.wait(set(self._pending), timeout=timeout)
+
+    def _invoke(self, callback: Callable[[], Any]):
+        try:
+            result = callback()
+        except Exception as e:
+            log.warn(f"Cancel callback failed: {e}")
+            return
+        if inspect.isawaitable(result):
+            future = asyncio.ensure_future(result)
+            self._pending.add(future)
+            future.add_done_callback(self._callback_done)
+
+    def _callback_done(self, future: asyncio.Future):
+        self._pending.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            log.warn(f"Cancel callback failed: {future.exception()}")
+
+
+_current_token: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    """Token of the request being handled (None outside a cancel scope)."""
+    return _current_token.get()
+
+
+@contextmanager
+def cancel_scope(token: CancelToken):
+    """Make `token` the current token (inherited by tasks created inside)."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def track_task(task: asyncio.Task) -> asyncio.Task:
+    """Register a background task with the current request's token, if any."""
+    token = _current_token.get()
+    if token is not None:
+        token.add_task(task)
+    return task
@@ -0,0 +1,340 @@
+"""
+Memory-mapped segment store for large RAG collections.
+
+A collection created with storage "segments" keeps chunk text and
+embeddings out of SQLite: its document_chunks rows hold only metadata and
+`store_slot`, the chunk's position in the collection's store. Files under
+data_dir/segments/<collection>/, suffixed with the store generation:
+
+- vectors.<gen>.f32  float32 rows of a fixed stride (L2-normalized), append-only
+- text.<gen>.heap    UTF-8 chunk text, append-only
+- slots.<gen>.idx    per slot: heap offset, byte length, deleted flag
+
+Search is one matrix product over a zero-copy np.memmap view of the
+vectors. delete() only flags slots; compact() copies the live slots into
+the next generation's files and returns its number. The caller records
+the new generation and slot numbers in SQLite in one transaction, then
+calls activate(), which removes the older generations' files, so a crash
+at any point leaves the generation SQLite points at.
+
+Several processes (API workers) can open the same store. Writers hold
+`store.lock`, an exclusive file lock, and every write first re-reads the
+slot count from disk; readers call refresh() to see slots appended
+elsewhere. Files of a newer generation (a compaction that never
+committed) are only removed by discard_newer() under the lock, since
+another process may be writing them.
+
+Usage:
+    store = SegmentStore(config.data_dir / "segments" / "wiki", generation=0)
+    slots = store.append(["text a", "text b"], [[0.1, 0.2], [0.3, 0.4]])
+    for slot, score in store.search([0.1, 0.2], k=5):
+        print(store.texts([slot])[0], score)
+"""
+import json
+import mmap
+import re
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:  # Windows
+    import msvcrt
+    HAS_FCNTL = False
+
+
+SLOT_DTYPE = np.dtype([("offset", "<i8"), ("length", "<u4"), ("deleted", "<u4")])
+COPY_ROWS = 65536  # Rows copied per step during compaction
+
+_GENERATION_FILE = re.compile(r"^(vectors|text|slots)\.(\d+)\.(f32|heap|idx)$")
+
+
+class FileLock:
+    """Exclusive advisory lock on a file, held across processes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock; without `blocking` return False if another process holds it."""
+        f = open(self.path, "a+b")
+        try:
+            if HAS_FCNTL:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+                        time.sleep(0.05)
+        except OSError:
+            f.close()
+            if blocking:
+                raise
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        if not HAS_FCNTL:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()  # Also releases a flock
+        self._file = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SegmentStore:
+    """Append-only mmap'd vectors + text heap + slot index for one collection."""
+
+    def __init__(self, root: Path, generation: int = 0):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.generation = generation
+        self.lock = FileLock(self.root / "lock")
+        self.dim: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self._slots: Optional[np.memmap] = None
+        self._heap: Optional[mmap.mmap] = None
+        self._heap_file = None
+        self._load()
+
+    def _path(self, kind: str, generation: Optional[int] = None) -> Path:
+        suffix = {"vectors": "f32", "text": "heap", "slots": "idx"}[kind]
+        return self.root / f"{kind}.{self.generation if generation is None else generation}.{suffix}"
+
+    def _load(self):
+        """Drop older generations' files and read the live one's slot count."""
+        self._remove_generations(lambda generation: generation < self.generation)
+        self.count = -1
+        self.refresh()
+
+    def _remove_generations(self, which):
+        for path in self.root.iterdir():
+            match = _GENERATION_FILE.match(path.name)
+            if match and which(int(match.group(2))):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass  # Still mapped by a reader (Windows): removed on a later open
+
+    def refresh(self):
+        """Pick up slots appended by other processes (the slot index decides how many exist)."""
+        slots = self._path("slots")
+        count = slots.stat().st_size // SLOT_DTYPE.itemsize if slots.exists() else 0
+        if count == self.count:
+            return
+        self.close()
+        if self.dim is None:
+            meta_path = self.root / "meta.json"
+            if meta_path.exists():
+                self.dim = json.loads(meta_path.read_text(encoding="utf-8")).get("dim")
+        self.count = count
+        self._heap_end = 0
+        if self.count:
+            with open(slots, "rb") as f:
+                f.seek((self.count - 1) * SLOT_DTYPE.itemsize)
+                last = np.frombuffer(f.read(SLOT_DTYPE.itemsize), dtype=SLOT_DTYPE)[0]
+            self._heap_end = int(last["offset"]) + int(last["length"])
+
+    def discard_newer(self):
+        """Remove files of generations newer than the live one (hold the lock)."""
+        self._remove_generations(lambda generation: generation > self.generation)
+
+    @property
+    def stride(self) -> int:
+        return (self.dim or 0) * 4
+
+    # ==================== Writes ====================
+
+    def append(self, texts: list[str], vectors: list[list[float]]) -> list[int]:
+        """
+        Store chunks and return their slots (hold the lock). A missing
+        (empty) vector is stored as zeros, which never matches a search.
+        """
+        self.refresh()
+        if self.dim is None:
+            self.dim = next((len(v) for v in vectors if v), None)
+            if self.dim is None:
+                raise ValueError("A segment store needs embeddings (none to fix its dimension)")
+            (self.root / "meta.json").write_text(json.dumps({"dim": self.dim}), encoding="utf-8")
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, vector in enumerate(vectors):
+            if len(vector) == self.dim:
+                matrix[i] = vector
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        matrix /= norms[:, None]
+
+        encoded = [text.encode("utf-8") for text in texts]
+        records = np.zeros(len(texts), dtype=SLOT_DTYPE)
+        records["length"] = [len(b) for b in encoded]
+        records["offset"] = self._heap_end + np.concatenate(([0], np.cumsum(records["length"])[:-1]))
+
+        # Slot records last: a slot exists once its index record is written
+        self.close()
+        with open(self._path("text"), "ab") as f:
+            f.seek(self._heap_end)
+            f.truncate()  # Bytes of an interrupted append
+            f.write(b"".join(encoded))
+        self._write_at(self._path("vectors"), self.count * self.stride, matrix.tobytes())
+        self._write_at(self._path("slots"), self.count * SLOT_DTYPE.itemsize, records.tobytes())
+
+        first = self.count
+        self.count += len(texts)
+        self._heap_end += int(records["length"].sum())
+        return list(range(first, self.count))
+
+    @staticmethod
+    def _write_at(path: Path, offset: int, data: bytes):
+        with open(path, "r+b" if path.exists() else "w+b") as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+
+    def delete(self, slots: list[int]):
+        """Flag slots as deleted (hold the lock; space is reclaimed by compact())."""
+        if not slots:
+            return
+        self.refresh()
+        self.close()
+        index = np.memmap(self._path("slots"), dtype=SLOT_DTYPE, mode="r+", shape=(self.count,))
+        index["deleted"][np.asarray(slots, dtype=np.int64)] = 1
+        index.flush()
+        del index
+
+    def compact(self, keep: list[int]) -> int:
+        """
+        Copy `keep` (live slots, in their new order) into the next
+        generation's files (hold the lock); returns the generation to
+        activate() once SQLite maps old slot keep[i] to new slot i.
+        """
+        self.refresh()
+        generation = self.generation + 1
+        order = np.asarray(keep, dtype=np.int64)
+        vectors, index, heap = self._views()
+        with open(self._path("vectors", generation), "wb") as vf, \
+                open(self._path("text", generation), "wb") as tf:
+            records = np.zeros(len(order), dtype=SLOT_DTYPE)
+            offset = 0
+            for start in range(0, len(order), COPY_ROWS):
+                part = order[start:start + COPY_ROWS]
+                vf.write(np.ascontiguousarray(vectors[part]).tobytes())
+                for i, slot in enumerate(part, start=start):
+                    begin, length = int(index["offset"][slot]), int(index["length"][slot])
+                    tf.write(heap[begin:begin + length])
+                    records[i] = (offset, length, 0)
+                    offset += length
+        self._path("slots", generation).write_bytes(records.tobytes())
+        return generation
+
+    def activate(self, generation: int):
+        """Switch to a generation written by compact() and drop the older files."""
+        self.close()
+        self.generation = generation
+        self._load()
+
+    # ==================== Reads ====================
+
+    def _views(self) -> tuple[np.ndarray, np.ndarray, bytes]:
+        """(vectors, slot records, text heap) of the live files, mapped on first use."""
+        if self._vectors is None:
+            if not self.count:
+                return np.zeros((0, self.dim or 0), dtype=np.float32), np.zeros(0, dtype=SLOT_DTYPE), b""
+            self._vectors = np.memmap(self._path("vectors"), dtype=np.float32, mode="r",
+                                      shape=(self.count, self.dim))
+            self._slots = np.memmap(self._path("slots"), dtype=SLOT_DTYPE, mode="r", shape=(self.count,))
+            if self._heap_end:
+                self._heap_file = open(self._path("text"), "rb")
+                self._heap = mmap.mmap(self._heap_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._vectors, self._slots, self._heap if self._heap is not None else b""
+
+    def texts(self, slots: list[int]) -> list[str]:
+        _, index, heap = self._views()
+        result = []
+        for slot in slots:
+            begin, length = int(index["offset"][slot]), int(index["length"][slot])
+            result.append(bytes(heap[begin:begin + length]).decode("utf-8"))
+        return result
+
+    def vectors(self, slots: Optional[list[int]] = None) -> np.ndarray:
+        """All vectors (a zero-copy view) or a copy of the given slots' rows."""
+        vectors, _, _ = self._views()
+        return vectors if slots is None else vectors[np.asarray(slots, dtype=np.int64)]
+
+    def search(
+        self,
+        query: list[float],
+        k: int,
+        slots: Optional[list[int]] = None
+    ) -> list[tuple[int, float]]:
+        """
+        (slot, cosine similarity) of the k best live slots, best first;
+        `slots` restricts the search to those slots.
+        """
+        vectors, index, _ = self._views()
+        if not len(vectors) or len(query) != self.dim or k <= 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if not norm:
+            return []
+        q /= norm
+
+        if slots is None:
+            candidates = None
+            scores = vectors @ q
+            scores[index["deleted"] != 0] = -np.inf
+        else:
+            candidates = np.asarray(slots, dtype=np.int64)
+            scores = vectors[candidates] @ q
+            scores[index["deleted"][candidates] != 0] = -np.inf
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+        else:
+            top = np.argsort(-scores, kind="stable")
+        return [
+            (int(i if candidates is None else candidates[i]), float(scores[i]))
+            for i in top if scores[i] != -np.inf
+        ]
+
+    def get_stats(self) -> dict:
+        _, index, _ = self._views()
+        deleted = int(np.count_nonzero(index["deleted"])) if len(index) else 0
+        return {
+            "generation": self.generation,
+            "dim": self.dim,
+            "slots": self.count,
+            "deleted": deleted,
+            "vector_bytes": self.count * self.stride,
+            "text_bytes": self._heap_end,
+        }
+
+    def close(self):
+        """Unmap the files (required before they are rewritten or removed on Windows)."""
+        self._vectors = self._slots = None
+        if self._heap is not None:
+            self._heap.close()
+            self._heap = None
+        if self._heap_file is not None:
+            self._heap_file.close()
+            self._heap_file = None
@@ -0,0 +1,434 @@
+"""
+Token-accurate, structure-aware chunking for RAG.
+
+Chunks are cut on tokenizer offsets, so `config.rag.chunk_size` and
+`chunk_overlap` are real token counts (the same tokenizer counts tokens
+for the context budget). Within the token limit a chunk ends at the
+strongest structural boundary available:
+
+- markdown headings (also DOCX heading styles) always start a new chunk
+- page / paragraph breaks, then line breaks, then sentence ends
+- never inside a fenced code block unless the block alone exceeds the limit
+
+Each chunk carries its page, heading path and character offsets into
+the document text. Boundary detection and token offsets are computed
+with numpy over the whole buffer; the only Python loop is one step per
+emitted chunk.
+
+`ChunkStream` accepts text unit by unit (PDF pages from the parser
+stream) and returns chunks as soon as they are final, keeping at most
+one chunk of pending text.
+
+Usage:
+    chunks = chunker.chunk_text(markdown)
+    stream = chunker.stream()
+    for page_no, text in pages:
+        ready = stream.feed(text, page=page_no)
+    ready = stream.flush()
+"""
+import bisect
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from .config import config
+from .logger import log
+
+
+MIN_FILL = 0.5  # Soft boundaries are only used past this fraction of the token limit
+HEADING_SEPARATOR = " > "
+BLANK_LINE_MAX_CHARS = 16  # Longer whitespace-only lines don't count as paragraph breaks
+
+_HEADING_RE = re.compile(r"(#{1,6})[ \t]+(.+?)[ \t#]*$", re.M)  # Matched at line starts
+_FENCES = ("```", "~~~")
+
+_SENTENCE_END = np.array([ord(c) for c in ".!?…;"], dtype=np.uint32)
+
+
+@dataclass
+class TextChunk:
+    """A chunk of document text with its position and structure."""
+    content: str
+    tokens: int
+    char_start: int  # Offsets into the full document text
+    char_end: int
+    page: Optional[int] = None  # 1-based, PDFs only
+    heading_path: str = ""  # "Guide > Setup > Linux"
+
+
+def _code_points(text: str) -> np.ndarray:
+    """Text as an array of code points (index i == text[i])."""
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+def _is_space(cp: np.ndarray) -> np.ndarray:
+    """Whitespace mask (space and control characters, NBSP, ideographic space)."""
+    return (cp <= 32) | (cp == 0xA0) | (cp == 0x3000)
+
+
+_ASCII_PUNCT = np.zeros(129, dtype=bool)  # Index 128: any non-ASCII character
+for _c in "!\"#$%&'()*+,-./:;<=>?@[\\]^`{|}~":
+    _ASCII_PUNCT[ord(_c)] = True
+
+
+def _is_ascii_punct(cp: np.ndarray) -> np.ndarray:
+    return _ASCII_PUNCT[np.minimum(cp, 128)]
+
+
+# ============= Tokenizers =============
+
+class TiktokenTokenizer:
+    """cl100k_base offsets: token byte lengths via a vocabulary lookup table."""
+
+    PIECE_CHARS = 256 * 1024  # Encoded in parallel (tiktoken releases the GIL)
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        import tiktoken
+        self.name = f"tiktoken:{encoding_name}"
+        self._enc = tiktoken.get_encoding(encoding_name)
+        lengths = np.zeros(self._enc.n_vocab, dtype=np.int64)
+        for token in range(self._enc.n_vocab):
+            try:
+                lengths[token] = len(self._enc.decode_single_token_bytes(token))
+            except KeyError:
+                pass  # Unused ids between the regular and special tokens
+        self._byte_len = lengths
+
+    def count(self, text: str) -> int:
+        return len(self._enc.encode_ordinary(text))
+
+    def offsets(self, text: str) -> np.ndarray:
+        """Char offset of each token's first character."""
+        pieces, bases = self._split(text)
+        encoded = self._enc.encode_ordinary_batch(pieces, num_threads=os.cpu_count() or 1)
+        result = []
+        for piece, base, tokens in zip(pieces, bases, encoded):
+            if not tokens:
+                continue
+            byte_len = self._byte_len[np.asarray(tokens, dtype=np.int64)]
+            byte_start = np.concatenate(([0], np.cumsum(byte_len)[:-1]))
+            raw = np.frombuffer(piece.encode("utf-8"), dtype=np.uint8)
+            char_of_byte = np.cumsum((raw & 0xC0) != 0x80) - 1
+            result.append(char_of_byte[byte_start] + base)
+        return np.concatenate(result) if result else np.zeros(0, dtype=np.int64)
+
+    def _split(self, text: str) -> tuple[list[str], list[int]]:
+        """Pieces of about PIECE_CHARS, cut after a newline (tokens never span one)."""
+        pieces, bases, start = [], [], 0
+        while start < len(text):
+            end = text.find("\n", start + self.PIECE_CHARS)
+            end = len(text) if end == -1 else end + 1
+            pieces.append(text[start:end])
+            bases.append(start)
+            start = end
+        return pieces, bases
+
+
+class RegexTokenizer:
+    """
+    Approximate tokenizer used when tiktoken's encoding can't be loaded
+    (offline): one token per punctuation mark and per 4 word characters.
+    """
+
+    name = "regex"
+    CHARS_PER_TOKEN = 4
+
+    def count(self, text: str) -> int:
+        return len(self.offsets(text))
+
+    def offsets(self, text: str) -> np.ndarray:
+        cp = _code_points(text)
+        if not len(cp):
+            return np.zeros(0, dtype=np.int64)
+        space = _is_space(cp)
+        punct = _is_ascii_punct(cp)
+        word = ~space & ~punct
+        # A token at every word start, then every CHARS_PER_TOKEN characters
+        # (by absolute position: same count on average, no per-run bookkeeping)
+        starts = word.copy()
+        starts[1:] &= ~word[:-1]
+        stride = np.zeros(len(cp), dtype=bool)
+        stride[::self.CHARS_PER_TOKEN] = True
+        starts |= (word & stride) | punct
+        return np.flatnonzero(starts)
+
+
+_tokenizer = None
+
+
+def get_tokenizer():
+    """Shared tokenizer: tiktoken cl100k_base, or the regex approximation offline."""
+    global _tokenizer
+    if _tokenizer is None:
+        try:
+            _tokenizer = TiktokenTokenizer()
+        except Exception as e:
+            log.warn(f"tiktoken unavailable ({type(e).__name__}); token counts are approximate")
+            _tokenizer = RegexTokenizer()
+    return _tokenizer
+
+
+# ============= Chunking =============
+
+class ChunkStream:
+    """Incremental chunker: feed text units, get the chunks that are final."""
+
+    def __init__(self, chunk_tokens: int, overlap_tokens: int, tokenizer):
+        self.size = max(1, chunk_tokens)
+        self.overlap = min(max(0, overlap_tokens), self.size - 1)
+        self.tokenizer = tokenizer
+        self._buf = ""
+        self._base = 0  # Document offset of _buf[0]
+        self._units: list[tuple[int, Optional[int]]] = []  # (buffer offset, page) per unit
+        self._headings: list[str] = []  # Heading path at _buf[0] ("" for skipped levels)
+        self._in_fence = False  # _buf[0] is inside a fenced code block
+        self._line_start = True  # _buf[0] starts a line
+
+    def feed(self, text: str, page: Optional[int] = None) -> list[TextChunk]:
+        """
+        Add the next unit of the document (page, paragraph group, block);
+        units are concatenated as-is. Returns the chunks completed so far.
+        """
+        self._add(text, page)
+        return self._chunk(final=False)
+
+    def flush(self) -> list[TextChunk]:
+        """Chunks for the remaining text (end of document)."""
+        return self._chunk(final=True)
+
+    def feed_final(self, text: str, page: Optional[int] = None) -> list[TextChunk]:
+        """feed() + flush() in one pass (whole documents)."""
+        self._add(text, page)
+        return self._chunk(final=True)
+
+    def _add(self, text: str, page: Optional[int]):
+        self._units.append((len(self._buf), page))
+        self._buf += text
+
+    def _chunk(self, final: bool) -> list[TextChunk]:
+        text = self._buf
+        offsets = self.tokenizer.offsets(text)
+        n_tokens = len(offsets)
+        token_char = np.append(offsets, len(text))
+
+        cp = _code_points(text)
+        line_starts = np.flatnonzero(cp[:-1] == 10) + 1
+        if self._line_start:
+            line_starts = np.concatenate(([0], line_starts))
+        fences = self._fences(text, line_starts)
+        headings = self._headings_in(text, cp, line_starts, fences)
+        heading_pos = [pos for pos, _ in headings]
+        heading_paths = [path for _, path in headings]
+
+        # For every token index: the next section start after it, and the
+        # last boundary of each strength at or before it (O(1) per chunk)
+        next_hard = np.full(n_tokens + 2, n_tokens + self.size + 1, dtype=np.int64)
+        hard = self._to_tokens(offsets, heading_pos)
+        next_hard[hard] = hard
+        next_hard = np.minimum.accumulate(next_hard[::-1])[::-1]
+        soft = []
+        for positions in self._soft_boundaries(cp, line_starts):
+            prev = np.full(n_tokens + 1, -1, dtype=np.int32)
+            level = self._to_tokens(offsets, self._outside(positions, fences))
+            prev[level] = level
+            soft.append(np.maximum.accumulate(prev))
+
+        chunks = []
+        start = 0
+        min_end = int(self.size * MIN_FILL)
+        while start < n_tokens:
+            limit = start + self.size
+            h = int(next_hard[start + 1])
+            if h <= limit:
+                end = next_start = h  # Section ends; no overlap into the next one
+            elif limit >= n_tokens:
+                if not final:
+                    break  # Needs more text to decide
+                end = next_start = n_tokens
+            else:
+                end = limit
+                for prev in soft:
+                    boundary = int(prev[limit])
+                    if boundary > start + min_end:
+                        end = boundary
+                        break
+                next_start = max(end - self.overlap, start + 1)
+
+            chunk = self._make_chunk(
+                text, int(token_char[start]), int(token_char[end]), end - start,
+                heading_pos, heading_paths
+            )
+            if chunk:
+                chunks.append(chunk)
+            start = next_start
+
+        if final:
+            self._reset()
+        else:
+            self._consume(int(token_char[start]) if start < n_tokens else len(text), heading_pos, heading_paths, fences)
+        return chunks
+
+    def _make_chunk(self, text, char_start, char_end, tokens, heading_pos, heading_paths) -> Optional[TextChunk]:
+        raw = text[char_start:char_end]
+        left = raw.lstrip()
+        if not left:
+            return None
+        content = left.rstrip()
+        char_start += len(raw) - len(left)
+        i = bisect.bisect_right(heading_pos, char_start) - 1
+        path = heading_paths[i] if i >= 0 else self._headings
+        u = bisect.bisect_right([pos for pos, _ in self._units], char_start) - 1
+        return TextChunk(
+            content=content,
+            tokens=tokens,
+            char_start=self._base + char_start,
+            char_end=self._base + char_start + len(content),
+            page=self._units[u][1] if u >= 0 else None,
+            heading_path=HEADING_SEPARATOR.join(p for p in path if p),
+        )
+
+    def _fences(self, text: str, line_starts: np.ndarray) -> list[tuple[int, int]]:
+        """Fenced code block ranges (opening line start, closing line end)."""
+        lines = set()
+        for marker in _FENCES:
+            pos = text.find(marker)
+            while pos != -1:
+                line = text.rfind("\n", 0, pos) + 1
+                if (line > 0 or self._line_start) and not text[line:pos].strip(" \t"):
+                    lines.add(line)
+                next_line = text.find("\n", pos)
+                pos = text.find(marker, next_line + 1) if next_line != -1 else -1
+
+        fences = []
+        open_at = 0 if self._in_fence else None
+        for line in sorted(lines):
+            if open_at is None:
+                open_at = line
+            else:
+                line_end = text.find("\n", line)
+                fences.append((open_at, len(text) if line_end == -1 else line_end))
+                open_at = None
+        if open_at is not None:
+            fences.append((open_at, len(text)))
+        return fences
+
+    def _headings_in(self, text, cp, line_starts, fences) -> list[tuple[int, list[str]]]:
+        """Markdown headings outside code fences: (position, heading path from there on)."""
+        candidates = line_starts[cp[line_starts] == ord("#")] if len(cp) else line_starts
+        headings = []
+        path = list(self._headings)
+        for pos in self._outside(candidates, fences, inclusive=True).tolist():
+            m = _HEADING_RE.match(text, pos)
+            if not m:
+                continue
+            level = len(m.group(1))
+            path = path[:level - 1] + [""] * max(0, level - 1 - len(path)) + [m.group(2).strip()]
+            headings.append((pos, path))
+        return headings
+
+    def _soft_boundaries(self, cp: np.ndarray, line_starts: np.ndarray) -> list[np.ndarray]:
+        """Char positions where a chunk may end, strongest first."""
+        if not len(cp):
+            return []
+        newline = line_starts[line_starts > 0] - 1
+
+        # Paragraph break: two newlines with only whitespace between them
+        # (blank lines are short, so only short gaps are checked in Python)
+        gaps = np.flatnonzero(np.diff(newline) <= BLANK_LINE_MAX_CHARS)
+        text = self._buf
+        paragraphs = np.array([
+            newline[i + 1] + 1 for i in gaps.tolist()
+            if not text[newline[i] + 1:newline[i + 1]].strip()
+        ], dtype=np.int64)
+        pages = np.array([pos for pos, page in self._units if pos > 0 and page is not None], dtype=np.int64)
+
+        after_space = np.flatnonzero(_is_space(cp[1:])) + 1
+        sentences = after_space[np.isin(cp[after_space - 1], _SENTENCE_END)]
+        return [
+            np.union1d(paragraphs, pages),
+            newline + 1,
+            sentences,
+        ]
+
+    @staticmethod
+    def _outside(positions: np.ndarray, fences: list[tuple[int, int]], inclusive: bool = False) -> np.ndarray:
+        """Positions not inside a fence (inclusive: not on its opening line either)."""
+        if not fences or not len(positions):
+            return positions
+        keep = np.ones(len(positions), dtype=bool)
+        for start, end in fences:
+            lo, hi = np.searchsorted(positions, [start if inclusive else start + 1, end])
+            keep[lo:hi] = False
+        return positions[keep]
+
+    @staticmethod
+    def _to_tokens(offsets: np.ndarray, positions) -> np.ndarray:
+        """Token boundary before the token containing each char position (sorted, unique, > 0)."""
+        if not len(positions) or not len(offsets):
+            return np.zeros(0, dtype=np.int64)
+        tokens = np.searchsorted(offsets, np.asarray(positions), side="right") - 1
+        # Positions are sorted, so tokens are too: drop repeats without sorting
+        tokens = tokens[np.concatenate(([True], tokens[1:] != tokens[:-1]))]
+        return tokens[tokens > 0]
+
+    def _consume(self, cut: int, heading_pos, heading_paths, fences):
+        """Drop emitted text before `cut`, carrying structure state over."""
+        if cut <= 0:
+            return
+        i = bisect.bisect_left(heading_pos, cut) - 1
+        if i >= 0:
+            self._headings = heading_paths[i]
+        self._in_fence = any(start < cut < end for start, end in fences)
+        self._line_start = self._buf[cut - 1] == "\n"
+
+        page = None
+        for pos, unit_page in self._units:
+            if pos <= cut:
+                page = unit_page
+        self._units = [(0, page)] + [(pos - cut, p) for pos, p in self._units if pos > cut]
+        self._buf = self._buf[cut:]
+        self._base += cut
+
+    def _reset(self):
+        self._base += len(self._buf)
+        self._buf = ""
+        self._units = []
+        self._headings = []
+        self._in_fence = False
+        self._line_start = True
+
+
+class Chunker:
+    """Creates chunk streams with the configured token size and overlap."""
+
+    def __init__(
+        self,
+        chunk_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None,
+        tokenizer=None
+    ):
+        self._chunk_tokens = chunk_tokens
+        self._overlap_tokens = overlap_tokens
+        self._tokenizer = tokenizer
+
+    @property
+    def tokenizer(self):
+        return self._tokenizer or get_tokenizer()
+
+    def stream(self) -> ChunkStream:
+        return ChunkStream(
+            self._chunk_tokens or config.rag.chunk_size,
+            self._overlap_tokens if self._overlap_tokens is not None else config.rag.chunk_overlap,
+            self.tokenizer,
+        )
+
+    def chunk_text(self, text: str, page: Optional[int] = None) -> list[TextChunk]:
+        """Chunk a whole text at once."""
+        return self.stream().feed_final(text, page)
+
+
+# Global instance
+chunker = Chunker()
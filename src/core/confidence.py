@@ -6,17 +6,30 @@ Scores the confidence of generated responses based on:
 - Response structure (code blocks, lists, etc.)
 - Task category match
 
+Scoring can also run while the response streams: ConfidenceStream keeps
+the patterns found so far and only scans each new chunk plus a short tail
+of the previous text (STREAM_LOOKBACK chars, for patterns split across
+chunks), so the final score is ready as soon as generation ends.
+
 Usage:
     from .confidence import confidence_scorer
     
     result = confidence_scorer.score_response(response, category="code")
     # ConfidenceResult(score=0.85, level="high", factors=["code_present", "structured"])
+    
+    stream = confidence_scorer.stream()
+    for chunk in chunks:
+        stream.feed(chunk)
+        provisional = stream.score()
+    result = stream.finish()
 """
 import re
 from dataclasses import dataclass, field
 from typing import List, Optional
 from enum import Enum
 
+from .pattern_matcher import PatternMatcher
+
 
 class ConfidenceLevel(Enum):
     """Confidence level categories."""
@@ -71,6 +84,13 @@ CONFIDENCE_SIGNALS = [
     r"\bbecause\b",     # Explanations (EN)
 ]
 
+# Error mentions reduce confidence
+ERROR_PATTERNS = [r"ошибк[аи]", r"error", r"exception", r"fail"]
+
+# Streamed text kept for matching patterns split across chunks
+# (longer than any pattern above short of runs of whitespace)
+STREAM_LOOKBACK = 64
+
 
 class ConfidenceScorer:
     """
@@ -84,14 +104,17 @@ class ConfidenceScorer:
     """
     
     def __init__(self):
-        self._hedging_patterns = [
-            re.compile(p, re.IGNORECASE | re.MULTILINE) 
-            for p in HEDGING_PATTERNS_RU + HEDGING_PATTERNS_EN
-        ]
-        self._confidence_patterns = [
-            re.compile(p, re.IGNORECASE | re.MULTILINE)
-            for p in CONFIDENCE_SIGNALS
-        ]
+        # Hedging, structure and error patterns in one compiled scan
+        # (patterns are lowercase and run on lowercased text: faster than IGNORECASE)
+        self._matcher = PatternMatcher(
+            [("hedging", p) for p in HEDGING_PATTERNS_RU + HEDGING_PATTERNS_EN] +
+            [("structure", p) for p in CONFIDENCE_SIGNALS] +
+            [("error", p) for p in ERROR_PATTERNS],
+            regex=True,
+            flags=re.MULTILINE
+        )
+    
+        self._code_block = next(i for i, (_, p) in enumerate(self._matcher.patterns) if p == "```")
     
     def score_response(
         self,
@@ -108,7 +131,23 @@ class ConfidenceScorer:
         Returns:
             ConfidenceResult with score, level, and contributing factors
         """
-        if not response or not response.strip():
+        response = response or ""
+        found = self._matcher.matched(response.lower())
+        return self._result(found, len(response), bool(response.strip()), category)
+    
+    def stream(self, category: Optional[str] = None) -> "ConfidenceStream":
+        """Incremental scorer for a response that is still being generated."""
+        return ConfidenceStream(self, category)
+    
+    def _result(
+        self,
+        found: dict,
+        length: int,
+        has_text: bool,
+        category: Optional[str] = None
+    ) -> ConfidenceResult:
+        """Score from the distinct patterns found (by index) and the response length."""
+        if not has_text:
             return ConfidenceResult(
                 score=0.0,
                 level=ConfidenceLevel.LOW,
@@ -118,11 +157,11 @@ class ConfidenceScorer:
         factors = []
         score = 0.5  # Start neutral
         
+        # Distinct patterns found, by label
+        labels = [m.label for m in found.values()]
+        
         # 1. Check for hedging patterns (-0.1 each, max -0.3)
-        hedging_count = 0
-        for pattern in self._hedging_patterns:
-            if pattern.search(response):
-                hedging_count += 1
+        hedging_count = labels.count("hedging")
         
         hedging_penalty = min(hedging_count * 0.1, 0.3)
         if hedging_count > 0:
@@ -130,10 +169,7 @@ class ConfidenceScorer:
             score -= hedging_penalty
         
         # 2. Check for confidence signals (+0.1 each, max +0.3)
-        confidence_count = 0
-        for pattern in self._confidence_patterns:
-            if pattern.search(response):
-                confidence_count += 1
+        confidence_count = labels.count("structure")
         
         confidence_bonus = min(confidence_count * 0.1, 0.3)
         if confidence_count > 0:
@@ -141,12 +177,11 @@ class ConfidenceScorer:
             score += confidence_bonus
         
         # 3. Code present in code category = high confidence
-        if category == "code" and "```" in response:
+        if category == "code" and self._code_block in found:
             factors.append("code_present")
             score += 0.2
         
         # 4. Length factor (very short = lower, structured long = higher)
-        length = len(response)
         if length < 50:
             factors.append("very_short")
             score -= 0.1
@@ -155,12 +190,9 @@ class ConfidenceScorer:
             score += 0.1
         
         # 5. Error mentions reduce confidence
-        error_patterns = [r"ошибк[аи]", r"error", r"exception", r"fail"]
-        for ep in error_patterns:
-            if re.search(ep, response, re.IGNORECASE):
-                factors.append("mentions_error")
-                score -= 0.1
-                break
+        if "error" in labels:
+            factors.append("mentions_error")
+            score -= 0.1
         
         # Clamp score
         score = max(0.0, min(1.0, score))
@@ -180,5 +212,52 @@ class ConfidenceScorer:
         )
 
 
+class ConfidenceStream:
+    """
+    Running confidence of a streamed response.
+    
+    Each feed() scans the new chunk plus the lookback tail for patterns not
+    found yet. Matches touching the end of the text so far are left for the
+    next chunk (a trailing \\b may not hold once more text arrives), and
+    finish() settles them.
+    """
+    
+    def __init__(self, scorer: ConfidenceScorer, category: Optional[str] = None):
+        self._scorer = scorer
+        self.category = category
+        self.found: dict = {}  # Pattern index -> first SignalMatch (positions in the window)
+        self.length = 0
+        self._has_text = False
+        self._seen = 0  # Lowercased chars before the tail
+        self._tail = ""
+    
+    def feed(self, chunk: str):
+        if not chunk:
+            return
+        self.length += len(chunk)
+        self._has_text = self._has_text or not chunk.isspace()
+        window = self._tail + chunk.lower()
+        self._scan(window, partial=True)
+        # One char more than the lookback: context for \b and ^ at the first kept position
+        keep = window[-(STREAM_LOOKBACK + 1):]
+        self._seen += len(window) - len(keep)
+        self._tail = keep
+    
+    def _scan(self, window: str, partial: bool):
+        pos = 1 if self._seen else 0  # The first char is context once text was dropped
+        self.found.update(self._scorer._matcher.matched(
+            window, pos, exclude=self.found, partial=partial
+        ))
+    
+    def score(self) -> ConfidenceResult:
+        """Provisional result for the text so far."""
+        return self._scorer._result(self.found, self.length, self._has_text, self.category)
+    
+    def finish(self) -> ConfidenceResult:
+        """Final result once the response is complete."""
+        self._scan(self._tail, partial=False)
+        return self.score()
+
+
 # Global instance
 confidence_scorer = ConfidenceScorer()
@@ -72,6 +72,83 @@ class LMStudioConfig:
     })
 
 
+@dataclass
+class LLMSchedulerConfig:
+    """Priority scheduler for LLM calls (interactive > agent > background)."""
+    # Per-class concurrency caps (global cap = lm_studio.max_concurrent_requests)
+    interactive_max_concurrent: int = 3
+    agent_max_concurrent: int = 2
+    background_max_concurrent: int = 1
+
+    # Queued lower-class requests older than this jump the queue (anti-starvation)
+    aging_seconds: float = 10.0
+
+    # Drop queued background jobs when this many interactive requests wait (0 = never)
+    shed_background_threshold: int = 2
+
+
+@dataclass
+class StreamingConfig:
+    """Chat stream framing (/api/chat)."""
+    # Merge tokens into one frame per window (0 = one frame per upstream chunk)
+    coalesce_ms: int = 20
+    # Flush a frame early once this many chars are buffered
+    max_frame_chars: int = 512
+    # Provisional confidence event at most once per this many streamed chars (0 = final only)
+    confidence_interval_chars: int = 400
+
+
+@dataclass
+class SpeculativeConfig:
+    """Speculative mode: quick-model draft streamed while the reasoning model refines."""
+    draft_mode: str = "fast"   # thinking_modes entry used for the draft
+    refine_mode: str = "deep"  # thinking_modes entry used for the revision
+    # Keep finished runs' registry entries bounded (accept requests for stale runs are ignored)
+    max_active_runs: int = 16
+
+
+@dataclass
+class SessionConfig:
+    """Per-client chat/agent state (src/core/sessions.py)."""
+    max_sessions: int = 64            # Least recently used idle sessions are evicted beyond this
+    idle_ttl_seconds: int = 3600      # Sessions idle longer than this are dropped
+    sweep_interval_seconds: int = 60  # How often lookups check for idle sessions
+
+
+@dataclass
+class WorkersConfig:
+    """Multi-worker API deployment (src/api/api.py run_api, src/core/worker_bus.py)."""
+    # Worker processes started by run_api (MAX_API_WORKERS is set for the children)
+    api_workers: int = field(default_factory=lambda: int(os.environ.get("MAX_API_WORKERS", "1")))
+    bus_poll_interval: float = 0.5     # Seconds between change-table polls
+    heartbeat_interval: float = 5.0    # Seconds between worker heartbeats
+    worker_timeout: float = 30.0       # Worker without heartbeat for this long is dead
+    event_retention_seconds: int = 600
+    sqlite_busy_timeout_ms: int = 5000  # Wait for other workers' write locks
+
+
+@dataclass
+class ResponseCacheConfig:
+    """Cache of non-streaming LLM responses (lm_client.chat(cache_site=...))."""
+    enabled: bool = True
+    ttl_seconds: int = 7 * 24 * 3600
+    max_entries: int = 2000
+
+    # Per-call-site switches; unknown sites are never cached
+    sites: dict = field(default_factory=lambda: {
+        "extract_facts": True,
+        "compress_history": True,
+        "agent_plan": True,
+        "agent_verify": True,
+    })
+
+    # Semantic (embedding) matching: opt-in per site, low-temperature calls only
+    semantic_sites: list = field(default_factory=list)
+    semantic_max_temperature: float = 0.3
+    semantic_threshold: float = 0.97
+    semantic_candidates: int = 200  # Most recent entries compared per lookup
+
+
 @dataclass
 class MemoryConfig:
     """Memory system configuration."""
@@ -97,6 +174,61 @@ class RAGConfig:
     chunk_size: int = 500  # tokens per chunk
     chunk_overlap: int = 50  # overlap between chunks
     default_top_k: int = 5  # default number of results
+    # Prompt-context retrieval (src/core/retrieval.py)
+    candidate_k: int = 30          # Vector (cosine) candidates
+    keyword_k: int = 20            # Keyword (FTS5 bm25) candidates
+    mmr_k: int = 10                # Chunks kept by MMR
+    mmr_lambda: float = 0.7        # 1.0 = relevance only, 0.0 = diversity only
+    merge_neighbours: bool = True  # Merge overlapping / adjacent chunks before packing
+    rerank_enabled: bool = False   # Score the MMR output with a local model (adds latency)
+    rerank_model: str = ""         # "" = lm_client's default model
+    rerank_top_n: int = 10         # Chunks sent to the reranker
+    rerank_passage_chars: int = 1000  # Passage truncation in the rerank prompt
+    rerank_cache_ttl_seconds: int = 7 * 24 * 3600
+    # Packed results per query embedding, dropped whenever the index changes
+    retrieval_cache_enabled: bool = True
+    retrieval_cache_mb: float = 16.0
+    retrieval_cache_threshold: float = 0.98  # Cosine for a near-duplicate query hit
+    # Segment collections (src/core/chunk_store.py)
+    segment_dir_name: str = "segments"  # Under data_dir, one directory per collection
+    segment_compact_ratio: float = 0.3  # Compact once this share of slots is deleted
+
+
+@dataclass
+class IngestionConfig:
+    """Background document ingestion (src/core/ingestion.py)."""
+    workers: int = 2               # Documents ingested concurrently
+    embed_batch_size: int = 32     # Chunks per embedding request (and per commit)
+    # Parser process pool (src/core/doc_parsing.py); 0 parses in a thread
+    parse_processes: int = field(default_factory=lambda: min(4, os.cpu_count() or 1))
+    pdf_pages_per_task: int = 16   # PDF pages per parse task (ranges run in parallel)
+    upload_dir_name: str = "uploads"  # Under data_dir; kept until the job finishes
+    job_retention_days: int = 7    # Finished jobs older than this are pruned
+
+
+@dataclass
+class FolderSyncConfig:
+    """Watched-folder sync into the RAG index (src/core/folder_sync.py)."""
+    enabled: bool = True
+    scan_interval_seconds: int = 300  # Periodic rescan of every registered folder
+    # Work budget: the scanner sleeps so that it uses at most this share of one
+    # core, and reads files for hashing at most this fast
+    cpu_budget: float = 0.25
+    io_budget_mb_per_s: float = 32.0
+    max_queued_jobs: int = 4       # Ingestion jobs from sync waiting at once
+    scan_lease_seconds: int = 900  # A scan claimed by a dead worker is retaken after this
+
+
+@dataclass
+class MetricsRetentionConfig:
+    """Raw interaction_outcomes retention (src/core/metrics_retention.py)."""
+    enabled: bool = True
+    raw_days: int = 30                 # Raw outcome rows kept this long (at least 7), then rolled up hourly
+    interval_seconds: int = 3600       # How often expired days are processed
+    batch_rows: int = 2000             # Rows rolled up and deleted per transaction
+    export: bool = True                # Write each expired day to a file before deleting its rows
+    export_format: str = "auto"        # auto (parquet if pyarrow is installed, else csv) | parquet | csv
+    export_dir_name: str = "metrics_export"  # Under data_dir
 
 
 @dataclass
@@ -136,9 +268,18 @@ class AppConfig:
     
     # Sub-configs
     lm_studio: LMStudioConfig = field(default_factory=LMStudioConfig)
+    llm_scheduler: LLMSchedulerConfig = field(default_factory=LLMSchedulerConfig)
+    streaming: StreamingConfig = field(default_factory=StreamingConfig)
+    response_cache: ResponseCacheConfig = field(default_factory=ResponseCacheConfig)
+    speculative: SpeculativeConfig = field(default_factory=SpeculativeConfig)
+    sessions: SessionConfig = field(default_factory=SessionConfig)
+    workers: WorkersConfig = field(default_factory=WorkersConfig)
     memory: MemoryConfig = field(default_factory=MemoryConfig)
     user_profile: UserProfileConfig = field(default_factory=UserProfileConfig)
     rag: RAGConfig = field(default_factory=RAGConfig)
+    ingestion: IngestionConfig = field(default_factory=IngestionConfig)
+    folder_sync: FolderSyncConfig = field(default_factory=FolderSyncConfig)
+    metrics_retention: MetricsRetentionConfig = field(default_factory=MetricsRetentionConfig)
     
     def __post_init__(self):
         # Ensure directories exist
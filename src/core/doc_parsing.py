@@ -0,0 +1,228 @@
+"""
+Document parsing off the event loop.
+
+PDF and DOCX parsing is CPU-bound and holds the GIL, so it runs in a
+process pool rather than on the event loop (or a thread). PDFs are split
+into page ranges parsed in parallel across cores; `iter_pages()` yields
+(text, page) units in order with only a few ranges in flight, so memory
+stays bounded however large the document is and chunking/embedding can
+start on the first pages while later ones are still being parsed.
+
+Units yielded per format:
+- PDF: one text per page, numbered from 1
+- DOCX: groups of paragraphs separated by blank lines, heading styles
+  as markdown headings (a DOCX is one zip/XML, parsed in one task)
+- TXT/MD: blocks of whole lines, read in a thread
+Units concatenate to the document text (character offsets of chunks
+refer to it); only PDF units carry a page number, the others None.
+
+Usage:
+    async for text, page in document_parser.iter_pages(path):
+        chunks.extend(stream.feed(text, page))
+    text = await document_parser.parse(path)  # Whole document, for small files
+"""
+import asyncio
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from .config import config
+from .logger import log
+
+
+PDF_SUFFIXES = (".pdf",)
+DOCX_SUFFIXES = (".docx",)
+TEXT_SUFFIXES = (".txt", ".md", ".markdown")
+
+DOCX_PARAGRAPHS_PER_UNIT = 50
+TEXT_BLOCK_CHARS = 64 * 1024
+
+
+# Worker functions: module-level so the process pool can pickle them
+
+def pdf_page_count(path: str) -> int:
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise ImportError("PyMuPDF not installed. Run: pip install pymupdf")
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def parse_pdf_pages(path: str, start: int, end: int) -> list[str]:
+    """Text of pages start..end-1."""
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise ImportError("PyMuPDF not installed. Run: pip install pymupdf")
+    with fitz.open(path) as doc:
+        return [doc[i].get_text() for i in range(start, min(end, doc.page_count))]
+
+
+def _docx_heading_level(style_name: str) -> int:
+    """Markdown level for "Title" / "Heading N" paragraph styles (0: body text)."""
+    if style_name == "Title":
+        return 1
+    if style_name.startswith("Heading "):
+        level = style_name[len("Heading "):]
+        if level.isdigit():
+            return min(6, max(1, int(level)))
+    return 0
+
+
+def parse_docx_paragraphs(path: str) -> list[str]:
+    """Non-empty paragraphs, headings prefixed with '#' per level."""
+    try:
+        from docx import Document as DocxDocument
+    except ImportError:
+        raise ImportError("python-docx not installed. Run: pip install python-docx")
+    paragraphs = []
+    for p in DocxDocument(path).paragraphs:
+        text = p.text.strip()
+        if not text:
+            continue
+        level = _docx_heading_level(p.style.name if p.style is not None else "")
+        paragraphs.append(f"{'#' * level} {text}" if level else text)
+    return paragraphs
+
+
+def read_text_blocks(path: str, block_chars: int = TEXT_BLOCK_CHARS) -> Iterator[str]:
+    """Text file in blocks of whole lines (about `block_chars` each)."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        block: list[str] = []
+        size = 0
+        for line in f:
+            block.append(line)
+            size += len(line)
+            if size >= block_chars:
+                yield "".join(block)
+                block, size = [], 0
+        if block:
+            yield "".join(block)
+
+
+class DocumentParser:
+    """Parses documents in a process pool, streaming pages in order."""
+
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        pages_per_task: Optional[int] = None,
+        tasks_in_flight: Optional[int] = None
+    ):
+        self._processes = processes
+        self._pages_per_task = pages_per_task
+        self._tasks_in_flight = tasks_in_flight
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def processes(self) -> int:
+        """Pool size; 0 parses in a thread instead."""
+        return self._processes if self._processes is not None else config.ingestion.parse_processes
+
+    @property
+    def pages_per_task(self) -> int:
+        return self._pages_per_task or config.ingestion.pdf_pages_per_task
+
+    @property
+    def tasks_in_flight(self) -> int:
+        return self._tasks_in_flight or max(2, self.processes * 2)
+
+    def _get_pool(self) -> Optional[Executor]:
+        if self.processes <= 0:
+            return None  # Default thread pool
+        if self._pool is None:
+            # spawn: forking a process that runs aiosqlite/event-loop threads is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    async def _run(self, fn: Callable, *args):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_pool(), fn, *args)
+        except BrokenProcessPool:
+            # A worker died (OOM, killed): drop the pool and parse this part in a thread
+            log.warn(f"Parser process pool broken; parsing {fn.__name__} in a thread")
+            self._pool = None
+            return await loop.run_in_executor(None, fn, *args)
+
+    @staticmethod
+    def _check_supported(path: Path) -> str:
+        suffix = path.suffix.lower()
+        if suffix not in PDF_SUFFIXES + DOCX_SUFFIXES + TEXT_SUFFIXES:
+            raise ValueError(f"Unsupported file type: {suffix}")
+        return suffix
+
+    async def count_pages(self, path: Path) -> Optional[int]:
+        """Page count for PDFs (None for formats without pages)."""
+        if self._check_supported(path) in PDF_SUFFIXES:
+            return await self._run(pdf_page_count, str(path))
+        return None
+
+    async def iter_pages(self, path: Path) -> AsyncIterator[tuple[str, Optional[int]]]:
+        """Yield the document's text unit by unit, in order, as (text, page)."""
+        suffix = self._check_supported(path)
+        if suffix in PDF_SUFFIXES:
+            async for unit in self._iter_pdf(path):
+                yield unit
+        elif suffix in DOCX_SUFFIXES:
+            paragraphs = await self._run(parse_docx_paragraphs, str(path))
+            for i in range(0, len(paragraphs), DOCX_PARAGRAPHS_PER_UNIT):
+                yield "".join(f"{p}\n\n" for p in paragraphs[i:i + DOCX_PARAGRAPHS_PER_UNIT]), None
+        else:
+            blocks = read_text_blocks(str(path))
+            while True:
+                block = await asyncio.to_thread(next, blocks, None)
+                if block is None:
+                    break
+                yield block, None
+
+    async def _iter_pdf(self, path: Path) -> AsyncIterator[tuple[str, int]]:
+        page_count = await self._run(pdf_page_count, str(path))
+        ranges = iter(range(0, page_count, self.pages_per_task))
+        in_flight: deque[asyncio.Future] = deque()
+
+        def submit_next() -> bool:
+            start = next(ranges, None)
+            if start is None:
+                return False
+            in_flight.append(asyncio.ensure_future(
+                self._run(parse_pdf_pages, str(path), start, start + self.pages_per_task)
+            ))
+            return True
+
+        page = 0
+        try:
+            while len(in_flight) < self.tasks_in_flight and submit_next():
+                pass
+            while in_flight:
+                pages = await in_flight.popleft()
+                submit_next()  # Keep the window full while the consumer works
+                for text in pages:
+                    page += 1
+                    yield (text if text.endswith("\n") else text + "\n"), page
+        finally:
+            # Consumer stopped early (cancelled job, error): drop queued ranges
+            for future in in_flight:
+                future.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def parse(self, path: Path) -> str:
+        """Whole document text."""
+        return "".join([text async for text, _ in self.iter_pages(path)])
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global instance
+document_parser = DocumentParser()
@@ -0,0 +1,566 @@
+"""
+Watched-folder sync for the RAG knowledge base.
+
+Registered folders are rescanned periodically (and on demand). A scan
+walks the tree with os.scandir and compares each file's size and mtime
+with the folder's manifest (`sync_manifest`):
+
+- same size and mtime: skipped without opening the file
+- changed stat: the file is hashed; if the content hash changed it is
+  queued for ingestion (new document, or a re-index job that only
+  embeds the chunks that changed, see ingestion)
+- gone: its document is removed
+
+so rescanning an unchanged tree costs one stat per file and one manifest
+read. Work is throttled by `config.folder_sync`: the scanner sleeps in
+proportion to the time it worked (CPU share), hashes files at a bounded
+read rate and keeps only a few of its ingestion jobs queued at once.
+With several API workers a scan is claimed in the database, so each
+folder is scanned by one worker at a time.
+
+Documents are named by the file's full path, so files with the same
+relative path in folders with the same name stay separate documents. The
+manifest records each file's document id, and a deleted file only
+removes the document this folder's manifest recorded for it.
+
+Usage:
+    await folder_sync.initialize(memory._db)
+    folder = await folder_sync.add_folder("~/Documents/notes")
+    stats = await folder_sync.scan(folder.id)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import aiosqlite
+
+from .config import config
+from .doc_parsing import DOCX_SUFFIXES, PDF_SUFFIXES, TEXT_SUFFIXES
+from .ingestion import ACTIVE_STATUSES, JobStatus, IngestionManager, ingestion
+from .logger import log
+from .rag import RAGEngine, rag
+from .worker_bus import worker_bus
+
+
+SUPPORTED_SUFFIXES = PDF_SUFFIXES + DOCX_SUFFIXES + TEXT_SUFFIXES
+HASH_BLOCK = 1024 * 1024
+MANIFEST_COMMIT_EVERY = 200  # Manifest rows written per commit
+
+
+@dataclass
+class SyncFolder:
+    """A registered folder."""
+    id: str
+    path: str
+    recursive: bool = True
+    created_at: float = field(default_factory=time.time)
+    last_scan_at: Optional[float] = None
+    last_scan: Optional[dict] = None  # ScanStats of the last finished scan
+
+    @property
+    def name(self) -> str:
+        return Path(self.path).name or self.path
+
+    def document_name(self, rel_path: str) -> str:
+        return str(Path(self.path) / rel_path)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "path": self.path,
+            "recursive": self.recursive,
+            "created_at": self.created_at,
+            "last_scan_at": self.last_scan_at,
+            "last_scan": self.last_scan,
+        }
+
+    @classmethod
+    def from_row(cls, row) -> "SyncFolder":
+        return cls(
+            id=row["id"],
+            path=row["path"],
+            recursive=bool(row["recursive"]),
+            created_at=row["created_at"],
+            last_scan_at=row["last_scan_at"],
+            last_scan=json.loads(row["last_scan"]) if row["last_scan"] else None,
+        )
+
+
+@dataclass
+class ScanStats:
+    """What a scan found and did."""
+    files: int = 0
+    unchanged: int = 0  # Same size and mtime: not read
+    hashed: int = 0
+    touched: int = 0  # Stat changed, content didn't
+    new: int = 0  # Queued as new documents
+    changed: int = 0  # Queued for re-indexing
+    retried: int = 0  # Previous ingestion failed, queued again
+    deleted: int = 0
+    skipped: int = 0  # Unsupported file types
+    errors: int = 0
+    bytes_hashed: int = 0
+    duration_s: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class WorkBudget:
+    """
+    Keeps background work within a CPU share and an I/O rate by sleeping:
+    after `work` seconds of work at share f it sleeps work * (1 - f) / f.
+    """
+
+    def __init__(self, cpu_share: float, io_bytes_per_s: float):
+        self.cpu_share = min(1.0, max(0.01, cpu_share))
+        self.io_bytes_per_s = max(1.0, io_bytes_per_s)
+        self._work_start = time.perf_counter()
+        self._io_start = time.perf_counter()
+        self._io_bytes = 0
+        self.slept = 0.0
+
+    async def pace(self, min_work: float = 0.05):
+        """Call between units of work; sleeps once `min_work` seconds have accumulated."""
+        work = time.perf_counter() - self._work_start
+        if work < min_work:
+            return
+        if self.cpu_share < 1.0:
+            await self._sleep(work * (1 - self.cpu_share) / self.cpu_share)
+        self._work_start = time.perf_counter()
+
+    async def read(self, nbytes: int):
+        """Account for `nbytes` read; sleeps when ahead of the I/O rate."""
+        self._io_bytes += nbytes
+        ahead = self._io_bytes / self.io_bytes_per_s - (time.perf_counter() - self._io_start)
+        if ahead > 0:
+            await self._sleep(ahead)
+        elif ahead < -1.0:
+            # Idle for a while: don't let unused budget accumulate into a burst
+            self._io_start, self._io_bytes = time.perf_counter(), 0
+
+    async def _sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+        self.slept += seconds
+        self._work_start = time.perf_counter()
+
+
+def walk_folder(root: str, recursive: bool) -> tuple[dict[str, tuple[int, int]], int]:
+    """
+    Supported files under `root` as {relative posix path: (size, mtime_ns)},
+    plus the number of unsupported files. Hidden entries are skipped and
+    symlinked directories are not followed.
+    """
+    files: dict[str, tuple[int, int]] = {}
+    skipped = 0
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            entries = os.scandir(os.path.join(root, rel_dir))
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(rel)
+                    elif entry.is_file():
+                        if os.path.splitext(entry.name)[1].lower() not in SUPPORTED_SUFFIXES:
+                            skipped += 1
+                            continue
+                        st = entry.stat()
+                        files[rel] = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    continue  # Vanished or unreadable meanwhile
+    return files, skipped
+
+
+class FolderSync:
+    """Registers folders and keeps the RAG index in sync with them."""
+
+    def __init__(
+        self,
+        rag_engine: Optional[RAGEngine] = None,
+        ingestion_manager: Optional[IngestionManager] = None
+    ):
+        self._db: Optional[aiosqlite.Connection] = None
+        self._rag = rag_engine or rag
+        self._ingestion = ingestion_manager or ingestion
+        self._loop_task: Optional[asyncio.Task] = None
+        self._scans: dict[str, asyncio.Task] = {}  # Background scans by folder id
+        self._scans_done = 0
+
+    async def initialize(self, db: aiosqlite.Connection, start: Optional[bool] = None):
+        """Create the tables and start periodic scanning."""
+        self._db = db
+        await self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS sync_folders (
+                id TEXT PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                recursive INTEGER DEFAULT 1,
+                created_at REAL NOT NULL,
+                last_scan_at REAL,
+                last_scan TEXT,
+                scanning_by TEXT,
+                scan_claimed_at REAL
+            );
+
+            CREATE TABLE IF NOT EXISTS sync_manifest (
+                folder_id TEXT NOT NULL REFERENCES sync_folders(id) ON DELETE CASCADE,
+                rel_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT,
+                job_id TEXT,
+                document_id TEXT,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (folder_id, rel_path)
+            );
+        """)
+        # Column added after the table was first shipped
+        async with self._db.execute("PRAGMA table_info(sync_manifest)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        if "document_id" not in columns:
+            await self._db.execute("ALTER TABLE sync_manifest ADD COLUMN document_id TEXT")
+            await self._adopt_documents()
+        await self._db.commit()
+        if start if start is not None else config.folder_sync.enabled:
+            self._loop_task = asyncio.create_task(self._scan_loop())
+
+    async def _adopt_documents(self):
+        """
+        One-off migration: record the documents synced before the manifest
+        kept document ids, renaming them from "<folder name>/<relative
+        path>" to their full path (no commit).
+        """
+        async with self._db.execute(
+            """SELECT m.folder_id, m.rel_path, f.path, j.document_id FROM sync_manifest m
+               JOIN sync_folders f ON f.id = m.folder_id
+               JOIN ingestion_jobs j ON j.id = m.job_id
+               WHERE j.document_id IS NOT NULL"""
+        ) as cursor:
+            rows = await cursor.fetchall()
+        for folder_id, rel_path, path, doc_id in rows:
+            folder = SyncFolder(id=folder_id, path=path)
+            cursor = await self._db.execute(
+                "UPDATE documents SET filename = ? WHERE id = ? AND filename = ?",
+                (folder.document_name(rel_path), doc_id, f"{folder.name}/{rel_path}")
+            )
+            if cursor.rowcount:
+                await self._db.execute(
+                    "UPDATE sync_manifest SET document_id = ? WHERE folder_id = ? AND rel_path = ?",
+                    (doc_id, folder_id, rel_path)
+                )
+
+    # ============= Folders =============
+
+    async def add_folder(self, path: str, recursive: bool = True) -> SyncFolder:
+        """Register a folder (the registered one if it already is); scanned on the next cycle."""
+        resolved = Path(path).expanduser().resolve()
+        if not resolved.is_dir():
+            raise ValueError(f"Not a directory: {path}")
+        existing = await self._find_folder(str(resolved))
+        if existing:
+            return existing
+        folder = SyncFolder(id=str(uuid.uuid4()), path=str(resolved), recursive=recursive)
+        await self._db.execute(
+            "INSERT INTO sync_folders (id, path, recursive, created_at) VALUES (?, ?, ?, ?)",
+            (folder.id, folder.path, int(folder.recursive), folder.created_at)
+        )
+        await self._db.commit()
+        return folder
+
+    async def remove_folder(self, folder_id: str, remove_documents: bool = True) -> bool:
+        """Unregister a folder, by default removing the documents synced from it."""
+        folder = await self.get_folder(folder_id)
+        if not folder:
+            return False
+        task = self._scans.pop(folder_id, None)
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if remove_documents:
+            for rel_path, (*_, job_id, doc_id) in (await self._load_manifest(folder_id)).items():
+                await self._remove_document(folder, rel_path, job_id, doc_id)
+        await self._db.execute("DELETE FROM sync_manifest WHERE folder_id = ?", (folder_id,))
+        await self._db.execute("DELETE FROM sync_folders WHERE id = ?", (folder_id,))
+        await self._db.commit()
+        return True
+
+    async def get_folder(self, folder_id: str) -> Optional[SyncFolder]:
+        async with self._db.execute("SELECT * FROM sync_folders WHERE id = ?", (folder_id,)) as cursor:
+            row = await cursor.fetchone()
+        return SyncFolder.from_row(row) if row else None
+
+    async def _find_folder(self, path: str) -> Optional[SyncFolder]:
+        async with self._db.execute("SELECT * FROM sync_folders WHERE path = ?", (path,)) as cursor:
+            row = await cursor.fetchone()
+        return SyncFolder.from_row(row) if row else None
+
+    async def list_folders(self) -> list[SyncFolder]:
+        async with self._db.execute("SELECT * FROM sync_folders ORDER BY created_at") as cursor:
+            rows = await cursor.fetchall()
+        return [SyncFolder.from_row(row) for row in rows]
+
+    # ============= Scanning =============
+
+    def trigger_scan(self, folder_id: str) -> bool:
+        """Start a background scan unless one is already running here."""
+        task = self._scans.get(folder_id)
+        if task and not task.done():
+            return False
+        self._scans[folder_id] = asyncio.create_task(self.scan(folder_id))
+        return True
+
+    async def scan_all(self) -> dict[str, Optional[ScanStats]]:
+        return {folder.id: await self.scan(folder.id) for folder in await self.list_folders()}
+
+    async def scan(self, folder_id: str) -> Optional[ScanStats]:
+        """
+        Sync one folder. Returns None if the folder is unknown or being
+        scanned by another worker.
+        """
+        folder = await self.get_folder(folder_id)
+        if not folder or not await self._claim(folder_id):
+            return None
+        try:
+            stats = await self._scan(folder)
+            folder.last_scan_at, folder.last_scan = time.time(), stats.to_dict()
+            await self._db.execute(
+                "UPDATE sync_folders SET last_scan_at = ?, last_scan = ? WHERE id = ?",
+                (folder.last_scan_at, json.dumps(folder.last_scan), folder_id)
+            )
+            self._scans_done += 1
+            log.debug(f"Folder sync {folder.path}: {stats.to_dict()}")
+            return stats
+        finally:
+            await self._release(folder_id)
+
+    async def _scan(self, folder: SyncFolder) -> ScanStats:
+        cfg = config.folder_sync
+        budget = WorkBudget(cfg.cpu_budget, cfg.io_budget_mb_per_s * 1024 * 1024)
+        stats = ScanStats()
+        start = time.perf_counter()
+
+        if not Path(folder.path).is_dir():
+            # Unmounted or moved: don't treat every file as deleted
+            log.warn(f"Folder sync: {folder.path} is not available, skipping")
+            stats.errors = 1
+            return stats
+
+        files, stats.skipped = await asyncio.to_thread(walk_folder, folder.path, folder.recursive)
+        stats.files = len(files)
+        manifest = await self._load_manifest(folder.id)
+        retry = await self._failed_entries(folder.id)
+        await budget.pace()
+
+        pending_jobs: list[str] = []
+        writes = 0
+        for rel_path, (size, mtime_ns) in files.items():
+            entry = manifest.get(rel_path)
+            if entry and entry[0] == size and entry[1] == mtime_ns and rel_path not in retry:
+                stats.unchanged += 1
+                continue
+            await budget.pace()
+            path = Path(folder.path) / rel_path
+            try:
+                digest = await self._hash(path, budget)
+            except OSError as e:
+                log.warn(f"Folder sync: cannot read {path}: {e}")
+                stats.errors += 1
+                continue
+            stats.hashed += 1
+            stats.bytes_hashed += size
+
+            job_id, doc_id = entry[3:] if entry else (None, None)
+            if entry and entry[2] == digest and rel_path not in retry:
+                stats.touched += 1
+            else:
+                await self._wait_for_queue(pending_jobs, folder.id)
+                try:
+                    job = await self._ingestion.submit(
+                        path, folder.document_name(rel_path), content_hash=digest
+                    )
+                except (OSError, ValueError) as e:
+                    log.warn(f"Folder sync: cannot queue {path}: {e}")
+                    stats.errors += 1
+                    continue
+                job_id = job.id
+                if job.reindex or job.active:
+                    doc_id = job.document_id  # A new document's id is recorded once its job creates it
+                if job.content_hash != digest:
+                    # A job for the previous version is still running: look again next scan
+                    size = -1
+                if job.active:
+                    pending_jobs.append(job.id)
+                if rel_path in retry:
+                    stats.retried += 1
+                elif entry:
+                    stats.changed += 1
+                else:
+                    stats.new += 1
+            await self._db.execute(
+                """INSERT OR REPLACE INTO sync_manifest
+                   (folder_id, rel_path, size, mtime_ns, content_hash, job_id, document_id, synced_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (folder.id, rel_path, size, mtime_ns, digest, job_id, doc_id, time.time())
+            )
+            writes += 1
+            if writes % MANIFEST_COMMIT_EVERY == 0:
+                await self._db.commit()
+
+        for rel_path in manifest.keys() - files.keys():
+            await budget.pace()
+            await self._remove_document(folder, rel_path, *manifest[rel_path][3:])
+            await self._db.execute(
+                "DELETE FROM sync_manifest WHERE folder_id = ? AND rel_path = ?",
+                (folder.id, rel_path)
+            )
+            stats.deleted += 1
+        await self._db.commit()
+
+        stats.duration_s = round(time.perf_counter() - start, 3)
+        return stats
+
+    async def _load_manifest(self, folder_id: str) -> dict[str, tuple]:
+        """
+        {rel_path: (size, mtime_ns, content_hash, job_id, document_id)}.
+        Documents created by a job since the last scan are recorded first.
+        """
+        await self._db.execute(
+            """UPDATE sync_manifest SET document_id = (
+                   SELECT j.document_id FROM ingestion_jobs j
+                   WHERE j.id = sync_manifest.job_id AND j.reindex = 0 AND j.started_at IS NOT NULL)
+               WHERE folder_id = ? AND document_id IS NULL AND job_id IS NOT NULL""",
+            (folder_id,)
+        )
+        await self._db.commit()
+        async with self._db.execute(
+            """SELECT rel_path, size, mtime_ns, content_hash, job_id, document_id
+               FROM sync_manifest WHERE folder_id = ?""",
+            (folder_id,)
+        ) as cursor:
+            return {row[0]: tuple(row[1:]) for row in await cursor.fetchall()}
+
+    async def _failed_entries(self, folder_id: str) -> set[str]:
+        """Files whose last ingestion failed (retried even if unchanged)."""
+        async with self._db.execute(
+            """SELECT m.rel_path FROM sync_manifest m
+               JOIN ingestion_jobs j ON j.id = m.job_id
+               WHERE m.folder_id = ? AND j.status = ?""",
+            (folder_id, JobStatus.FAILED.value)
+        ) as cursor:
+            return {row[0] for row in await cursor.fetchall()}
+
+    async def _hash(self, path: Path, budget: WorkBudget) -> str:
+        """Content hash, read in blocks within the I/O budget."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while True:
+                block = await asyncio.to_thread(f.read, HASH_BLOCK)
+                if not block:
+                    break
+                digest.update(block)
+                await budget.read(len(block))
+        return digest.hexdigest()
+
+    async def _wait_for_queue(self, pending_jobs: list[str], folder_id: str):
+        """Block while this scan has `max_queued_jobs` ingestion jobs still active."""
+        while True:
+            for job_id in list(pending_jobs):
+                job = await self._ingestion.get(job_id)
+                if not job or JobStatus(job["status"]) not in ACTIVE_STATUSES:
+                    pending_jobs.remove(job_id)
+            if len(pending_jobs) < config.folder_sync.max_queued_jobs:
+                return
+            await self._renew(folder_id)
+            await asyncio.sleep(self._ingestion.POLL_INTERVAL)
+
+    async def _remove_document(
+        self,
+        folder: SyncFolder,
+        rel_path: str,
+        job_id: Optional[str],
+        doc_id: Optional[str]
+    ):
+        """Remove the document the manifest recorded for a file (only one this sync created)."""
+        if job_id:
+            await self._ingestion.cancel(job_id)
+        doc = await self._rag.get_document(doc_id) if doc_id else None
+        if doc and doc.filename == folder.document_name(rel_path):
+            await self._ingestion.cancel_document(doc.id)
+            await self._rag.remove_document(doc.id)
+
+    # ============= Coordination =============
+
+    async def _claim(self, folder_id: str) -> bool:
+        """Compare-and-set: one worker scans a folder at a time (stale claims expire)."""
+        now = time.time()
+        cursor = await self._db.execute(
+            """UPDATE sync_folders SET scanning_by = ?, scan_claimed_at = ?
+               WHERE id = ? AND (scanning_by IS NULL OR scan_claimed_at < ?)""",
+            (worker_bus.worker_id, now, folder_id, now - config.folder_sync.scan_lease_seconds)
+        )
+        await self._db.commit()
+        return bool(cursor.rowcount)
+
+    async def _renew(self, folder_id: str):
+        await self._db.execute(
+            "UPDATE sync_folders SET scan_claimed_at = ? WHERE id = ? AND scanning_by = ?",
+            (time.time(), folder_id, worker_bus.worker_id)
+        )
+        await self._db.commit()
+
+    async def _release(self, folder_id: str):
+        await self._db.execute(
+            "UPDATE sync_folders SET scanning_by = NULL, scan_claimed_at = NULL WHERE id = ? AND scanning_by = ?",
+            (folder_id, worker_bus.worker_id)
+        )
+        await self._db.commit()
+
+    async def _scan_loop(self):
+        while True:
+            try:
+                await self.scan_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"Folder sync failed: {e}")
+            await asyncio.sleep(config.folder_sync.scan_interval_seconds)
+
+    async def stop(self):
+        tasks = [t for t in [self._loop_task, *self._scans.values()] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+        self._scans.clear()
+        if self._db is not None:
+            # Scans interrupted here can be retaken right away (by any worker)
+            await self._db.execute(
+                "UPDATE sync_folders SET scanning_by = NULL, scan_claimed_at = NULL WHERE scanning_by = ?",
+                (worker_bus.worker_id,)
+            )
+            await self._db.commit()
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self._loop_task is not None and not self._loop_task.done(),
+            "scans_in_progress": sum(1 for t in self._scans.values() if not t.done()),
+            "scans_done": self._scans_done,
+        }
+
+
+# Global instance
+folder_sync = FolderSync()
@@ -0,0 +1,726 @@
+"""
+Background document ingestion for MAX AI Assistant.
+
+Uploads are saved under `data_dir/uploads` and queued as jobs; the HTTP
+request returns the job id right away. A small pool of worker tasks
+streams each file page by page from the parser process pool (see
+doc_parsing), chunks it incrementally and embeds full batches while
+later pages are still being parsed (one embedding request per batch).
+Every batch is committed together with the job's progress, so:
+
+- the document is queryable as soon as its first batch lands,
+- a crashed process resumes from the last committed batch on restart,
+  deleting rows past the recorded progress (the database connection is
+  shared, so another caller's commit can land between a batch's rows
+  and its progress, which is written last),
+- cancellation takes effect between batches and removes the partial document.
+
+Uploads are hashed first: content that is already indexed completes
+immediately, and a changed file uploaded under an indexed name becomes a
+re-index job that only embeds the chunks whose content changed. The new
+version is staged beside the old one and swapped in once complete, so a
+cancelled or interrupted re-index leaves the previous version in place.
+
+Job state lives in `ingestion_jobs`, so progress can be polled from any
+API worker; the worker running a job also pushes updates to in-process
+subscribers (SSE).
+
+Usage:
+    await ingestion.initialize(memory._db)
+    job = await ingestion.submit(upload_path, "report.pdf")
+    async for update in ingestion.events(job.id):
+        print(update["status"], update["progress"], update["eta_seconds"])
+"""
+import asyncio
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import aiosqlite
+
+from .config import config
+from .logger import log
+from .lm_client import lm_client
+from .doc_parsing import DocumentParser, document_parser
+from .chunker import TextChunk, chunker
+from .rag import RAGEngine, file_hash, rag
+from .worker_bus import worker_bus
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    PARSING = "parsing"
+    EMBEDDING = "embedding"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+ACTIVE_STATUSES = (JobStatus.QUEUED, JobStatus.PARSING, JobStatus.EMBEDDING)
+
+# SQL filter for active jobs
+_ACTIVE_SQL = f"status IN ({','.join('?' * len(ACTIVE_STATUSES))})"
+_ACTIVE_PARAMS = tuple(s.value for s in ACTIVE_STATUSES)
+
+
+@dataclass
+class IngestionJob:
+    """One document being ingested."""
+    id: str
+    filename: str
+    file_path: str
+    status: JobStatus = JobStatus.QUEUED
+    document_id: Optional[str] = None
+    total_chunks: int = 0
+    done_chunks: int = 0  # Committed (queryable) chunks
+    total_pages: Optional[int] = None  # PDFs only
+    done_pages: int = 0  # Parsed pages
+    reused_chunks: int = 0  # Chunks whose embedding already existed (not recomputed)
+    content_hash: Optional[str] = None  # SHA-256 of the upload
+    reindex: bool = False  # Replaces the chunks of an existing document_id
+    collection: Optional[str] = None  # RAG collection of a new document (None: default)
+    error: Optional[str] = None
+    worker_id: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # Embedding rate of the current run (chunks/s); not persisted
+    rate: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def progress(self) -> float:
+        if self.status == JobStatus.COMPLETED:
+            return 1.0
+        return self.done_chunks / self.total_chunks if self.total_chunks else 0.0
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        if not self.active or not self.rate or not self.total_chunks:
+            return None
+        return round((self.total_chunks - self.done_chunks) / self.rate, 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status.value,
+            "document_id": self.document_id,
+            "total_chunks": self.total_chunks,
+            "done_chunks": self.done_chunks,
+            "total_pages": self.total_pages,
+            "done_pages": self.done_pages,
+            "reused_chunks": self.reused_chunks,
+            "computed_chunks": max(0, self.done_chunks - self.reused_chunks),
+            "reindex": self.reindex,
+            "collection": self.collection,
+            "progress": round(self.progress, 3),
+            "eta_seconds": self.eta_seconds,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    @classmethod
+    def from_row(cls, row) -> "IngestionJob":
+        return cls(
+            id=row["id"],
+            filename=row["filename"],
+            file_path=row["file_path"],
+            status=JobStatus(row["status"]),
+            document_id=row["document_id"],
+            total_chunks=row["total_chunks"],
+            done_chunks=row["done_chunks"],
+            total_pages=row["total_pages"],
+            done_pages=row["done_pages"],
+            reused_chunks=row["reused_chunks"] or 0,
+            content_hash=row["content_hash"],
+            reindex=bool(row["reindex"]),
+            collection=row["collection"],
+            error=row["error"],
+            worker_id=row["worker_id"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+            started_at=row["started_at"],
+            finished_at=row["finished_at"],
+        )
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when its job was cancelled."""
+
+
+class BatchLost(Exception):
+    """Raised when a batch's rows were rolled back by another caller before its commit."""
+
+    def __init__(self, job_id: str, chunks: int):
+        super().__init__(job_id)
+        self.chunks = chunks  # Rows the document kept
+
+
+class IngestionManager:
+    """Job queue and worker pool for document ingestion."""
+
+    POLL_INTERVAL = 1.0  # Seconds between DB reads for jobs running on other workers
+    MAX_RESTARTS = 3  # Times a job restarts from its last recorded batch after one was lost
+
+    def __init__(
+        self,
+        rag_engine: Optional[RAGEngine] = None,
+        embed: Optional[Callable[[list[str]], Awaitable[list[list[float]]]]] = None,
+        parser: Optional[DocumentParser] = None
+    ):
+        self._rag = rag_engine or rag
+        self._embed = embed or lm_client.get_embeddings
+        self._parser = parser or document_parser
+        self._db: Optional[aiosqlite.Connection] = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+        self._jobs: dict[str, IngestionJob] = {}  # Jobs claimed by this worker
+        self._subscribers: dict[str, list[asyncio.Queue]] = {}
+        self._completed = 0
+        self._failed = 0
+
+    @property
+    def upload_dir(self) -> Path:
+        return config.data_dir / config.ingestion.upload_dir_name
+
+    async def initialize(self, db: aiosqlite.Connection, workers: Optional[int] = None):
+        """Create the table, resume interrupted jobs and start the worker pool."""
+        self._db = db
+        if self._db.row_factory is None:
+            self._db.row_factory = aiosqlite.Row
+        await self._ensure_tables()
+        await self._prune()
+        resumed = await self._resume()
+
+        for _ in range(workers or config.ingestion.workers):
+            self._workers.append(asyncio.create_task(self._worker()))
+        if resumed:
+            log.debug(f"Ingestion: resumed {resumed} interrupted job(s)")
+
+    async def _ensure_tables(self):
+        await self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                document_id TEXT,
+                total_chunks INTEGER DEFAULT 0,
+                done_chunks INTEGER DEFAULT 0,
+                total_pages INTEGER,
+                done_pages INTEGER DEFAULT 0,
+                error TEXT,
+                worker_id TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status ON ingestion_jobs(status);
+        """)
+        # Columns added after the table was first shipped
+        async with self._db.execute("PRAGMA table_info(ingestion_jobs)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        for column, ddl in (("total_pages", "INTEGER"), ("done_pages", "INTEGER DEFAULT 0"),
+                            ("reused_chunks", "INTEGER DEFAULT 0"), ("content_hash", "TEXT"),
+                            ("reindex", "INTEGER DEFAULT 0"), ("collection", "TEXT")):
+            if column not in columns:
+                await self._db.execute(f"ALTER TABLE ingestion_jobs ADD COLUMN {column} {ddl}")
+        await self._db.commit()
+
+    async def _prune(self):
+        cutoff = time.time() - config.ingestion.job_retention_days * 86400
+        await self._db.execute(
+            "DELETE FROM ingestion_jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (cutoff,)
+        )
+        await self._db.commit()
+
+    async def _resume(self) -> int:
+        """Claim active jobs whose worker is gone (crash/restart) and queue them again."""
+        async with self._db.execute(
+            f"SELECT * FROM ingestion_jobs WHERE {_ACTIVE_SQL} ORDER BY created_at",
+            _ACTIVE_PARAMS
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+        resumed = 0
+        for row in rows:
+            job = IngestionJob.from_row(row)
+            if job.worker_id and worker_bus._db is not None and await worker_bus.is_alive(job.worker_id):
+                continue  # Still running on another worker
+            # Compare-and-set so only one restarting worker takes the job
+            cursor = await self._db.execute(
+                """UPDATE ingestion_jobs SET worker_id = ?, status = ?, updated_at = ?
+                   WHERE id = ? AND worker_id IS ?""",
+                (worker_bus.worker_id, JobStatus.QUEUED.value, time.time(), job.id, job.worker_id)
+            )
+            await self._db.commit()
+            if cursor.rowcount:
+                job.worker_id = worker_bus.worker_id
+                job.status = JobStatus.QUEUED
+                self._enqueue(job)
+                resumed += 1
+        return resumed
+
+    def new_upload_path(self, filename: str) -> Path:
+        """Where to store an upload until its job finishes."""
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        safe_name = re.sub(r"[^\w.\-]", "_", Path(filename).name) or "upload"
+        return self.upload_dir / f"{uuid.uuid4().hex[:12]}_{safe_name}"
+
+    async def submit(
+        self,
+        file_path: Path,
+        filename: str,
+        document_id: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        collection: Optional[str] = None
+    ) -> IngestionJob:
+        """
+        Queue a saved upload for ingestion.
+
+        - a name that is being ingested: the returned job is that job
+        - content already indexed (under any name): a completed job
+          pointing at the existing document
+        - a changed file under an indexed name: a re-index job for that
+          document (unchanged chunks keep their embeddings)
+
+        With `document_id` the file is a new version of that document
+        (re-indexed unless its content is unchanged). `content_hash` skips
+        hashing a file the caller has already hashed. A new document goes
+        to `collection` (default: "default").
+        """
+        if collection and not await self._rag.get_collection(collection):
+            self._discard_upload(str(file_path))
+            raise ValueError(f"Collection not found: {collection}")
+        previous = None
+        if document_id:
+            previous = await self._rag.get_document(document_id)
+            if not previous:
+                raise ValueError(f"Document not found: {document_id}")
+            filename = previous.filename
+        existing_job = await self._find_active_job(filename)
+        if existing_job:
+            self._discard_upload(str(file_path))
+            return existing_job
+
+        job = IngestionJob(
+            id=str(uuid.uuid4()),
+            filename=filename,
+            file_path=str(file_path),
+            worker_id=worker_bus.worker_id,
+            content_hash=content_hash or await asyncio.to_thread(file_hash, Path(file_path)),
+            collection=collection,
+        )
+        if previous:
+            unchanged = previous if previous.content_hash == job.content_hash else None
+        else:
+            unchanged = await self._rag.find_by_hash(job.content_hash)
+            previous = None if unchanged else await self._rag.find_document(filename)
+        if unchanged:
+            job.status = JobStatus.COMPLETED
+            job.document_id = unchanged.id
+            job.total_chunks = job.done_chunks = job.reused_chunks = unchanged.chunk_count
+            job.finished_at = time.time()
+            self._discard_upload(job.file_path)
+        elif previous:
+            job.reindex = True
+            job.document_id = previous.id
+            job.total_chunks = previous.chunk_count  # Estimate until re-chunked
+
+        await self._db.execute(
+            """INSERT INTO ingestion_jobs
+               (id, filename, file_path, status, document_id, total_chunks, done_chunks,
+                reused_chunks, content_hash, reindex, collection, worker_id,
+                created_at, updated_at, finished_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (job.id, job.filename, job.file_path, job.status.value, job.document_id,
+             job.total_chunks, job.done_chunks, job.reused_chunks, job.content_hash,
+             int(job.reindex), job.collection, job.worker_id,
+             job.created_at, job.updated_at, job.finished_at)
+        )
+        await self._db.commit()
+
+        if job.active:
+            self._enqueue(job)
+        return job
+
+    async def _find_active_job(self, filename: str) -> Optional[IngestionJob]:
+        async with self._db.execute(
+            f"SELECT * FROM ingestion_jobs WHERE filename = ? AND {_ACTIVE_SQL} LIMIT 1",
+            (filename, *_ACTIVE_PARAMS)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if not row:
+            return None
+        return self._jobs.get(row["id"]) or IngestionJob.from_row(row)
+
+    def _enqueue(self, job: IngestionJob):
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job.id)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Job state (local jobs include the live ETA)."""
+        job = self._jobs.get(job_id)
+        if job:
+            return job.to_dict()
+        async with self._db.execute(
+            "SELECT * FROM ingestion_jobs WHERE id = ?", (job_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return IngestionJob.from_row(row).to_dict() if row else None
+
+    async def list_jobs(self, limit: int = 50, active_only: bool = False) -> list[dict]:
+        """Most recent jobs first."""
+        query = "SELECT * FROM ingestion_jobs"
+        params: list = []
+        if active_only:
+            query += f" WHERE {_ACTIVE_SQL}"
+            params.extend(_ACTIVE_PARAMS)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        async with self._db.execute(query, params) as cursor:
+            rows = await cursor.fetchall()
+        return [
+            self._jobs[row["id"]].to_dict() if row["id"] in self._jobs
+            else IngestionJob.from_row(row).to_dict()
+            for row in rows
+        ]
+
+    async def active_document_ids(self) -> set[str]:
+        """Documents that are still being ingested (partially queryable)."""
+        return {
+            job["document_id"] for job in await self.list_jobs(limit=1000, active_only=True)
+            if job["document_id"]
+        }
+
+    async def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job (on any worker). The running worker
+        notices before its next batch and removes the partial document.
+        """
+        now = time.time()
+        cursor = await self._db.execute(
+            f"""UPDATE ingestion_jobs SET status = ?, updated_at = ?, finished_at = ?
+                WHERE id = ? AND {_ACTIVE_SQL}""",
+            (JobStatus.CANCELLED.value, now, now, job_id, *_ACTIVE_PARAMS)
+        )
+        await self._db.commit()
+        # A job running here stays visible as running until its worker has
+        # removed the partial document (checked before each batch)
+        return bool(cursor.rowcount)
+
+    async def cancel_document(self, document_id: str) -> int:
+        """Cancel active jobs ingesting `document_id` (before the document is deleted)."""
+        cancelled = 0
+        for job in await self.list_jobs(limit=1000, active_only=True):
+            if job["document_id"] == document_id and await self.cancel(job["id"]):
+                cancelled += 1
+        return cancelled
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(job_id, [])
+        if queue in queues:
+            queues.remove(queue)
+        if not queues:
+            self._subscribers.pop(job_id, None)
+
+    async def events(self, job_id: str) -> AsyncIterator[dict]:
+        """
+        Job snapshots until it finishes: pushed by the local worker, or
+        polled from the database when another worker runs the job.
+        """
+        queue = self.subscribe(job_id)
+        try:
+            state = await self.get(job_id)
+            if state is None:
+                return
+            yield state
+            while state["status"] in _ACTIVE_PARAMS:
+                try:
+                    state = await asyncio.wait_for(queue.get(), timeout=self.POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    latest = await self.get(job_id)
+                    if latest is None or latest["updated_at"] == state["updated_at"]:
+                        continue
+                    state = latest
+                yield state
+        finally:
+            self.unsubscribe(job_id, queue)
+
+    def _publish(self, job: IngestionJob):
+        job.updated_at = time.time()
+        snapshot = job.to_dict()
+        for queue in self._subscribers.get(job.id, []):
+            queue.put_nowait(snapshot)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            try:
+                if job and job.active:
+                    await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"Ingestion worker error for {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+                if job and not job.active:
+                    self._jobs.pop(job_id, None)
+
+    async def _process(self, job: IngestionJob):
+        try:
+            await self._set_status(job, JobStatus.PARSING, started_at=time.time())
+            path = Path(job.file_path)
+            if not path.exists():
+                raise FileNotFoundError(f"Upload not found: {job.file_path}")
+
+            if job.reindex:
+                await self._reindex(job, path)
+            else:
+                await self._prepare_document(job, path)
+                for restart in range(self.MAX_RESTARTS + 1):
+                    try:
+                        await self._stream_chunks(job, path)
+                        break
+                    except BatchLost as lost:
+                        if restart == self.MAX_RESTARTS:
+                            raise
+                        log.warn(f"Ingestion of {job.filename}: batch lost, resuming at chunk {lost.chunks}")
+                        job.done_chunks = lost.chunks
+                        await self._rag.truncate_document(job.document_id, job.done_chunks)
+                        await self._checkpoint(job)
+                if not job.total_chunks:
+                    raise ValueError("Document is empty or couldn't be parsed")
+
+            self._completed += 1
+            await self._finish(job, JobStatus.COMPLETED)
+            log.debug(f"Ingested {job.filename}: {job.total_chunks} chunks")
+
+        except JobCancelled:
+            await self._discard_document(job)
+            await self._finish(job, JobStatus.CANCELLED)
+        except asyncio.CancelledError:
+            raise  # Shutdown: the job stays active and resumes on restart
+        except Exception as e:
+            self._failed += 1
+            log.error(f"Ingestion of {job.filename} failed: {e}")
+            await self._discard_document(job)
+            await self._finish(job, JobStatus.FAILED, error=f"{type(e).__name__}: {e}")
+
+    async def _prepare_document(self, job: IngestionJob, path: Path):
+        """Create the document record, or pick up where an interrupted run stopped."""
+        if job.document_id and await self._rag.get_document(job.document_id):
+            async with self._db.execute(
+                "SELECT done_chunks, reused_chunks FROM ingestion_jobs WHERE id = ?", (job.id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            job.done_chunks, job.reused_chunks = row[0] or 0, row[1] or 0
+            # Rows past the recorded progress were written but never checkpointed
+            await self._rag.truncate_document(job.document_id, job.done_chunks)
+            return
+
+        doc = await self._rag.create_document(path, job.filename, job.content_hash, job.collection)
+        job.document_id = doc.id
+        job.done_chunks = job.reused_chunks = 0
+        await self._checkpoint(job)  # Commits the document with the job's reference to it
+
+    async def _reindex(self, job: IngestionJob, path: Path):
+        """Replace an existing document's chunks with the uploaded version."""
+        await self._set_status(job, JobStatus.EMBEDDING)
+        rate_start = time.perf_counter()
+
+        async def on_batch(report):
+            job.done_chunks = report.chunks
+            job.reused_chunks = report.reused
+            job.total_chunks = max(job.total_chunks, report.chunks)
+            elapsed = time.perf_counter() - rate_start
+            if elapsed > 0:
+                job.rate = report.chunks / elapsed
+            # A cancelled job stops here; the staged version is discarded
+            await self._checkpoint(job)
+            self._publish(job)
+
+        report = await self._rag.reindex_document(
+            job.document_id, path, embed=self._embed, digest=job.content_hash, on_batch=on_batch
+        )
+        job.total_chunks = job.done_chunks = report.chunks
+        job.reused_chunks = report.reused
+
+    async def _stream_chunks(self, job: IngestionJob, path: Path):
+        """
+        Parse page by page (process pool), chunk incrementally and embed each
+        full batch as soon as it is available. On resume the chunks committed
+        by the interrupted run are re-parsed but not embedded again.
+        """
+        batch_size = config.ingestion.embed_batch_size
+        stream = chunker.stream()
+        skip = job.done_chunks
+        produced = 0
+        pending: list[TextChunk] = []
+        job.total_pages = await self._parser.count_pages(path)
+        job.done_pages = 0
+        rate_start, rate_first = time.perf_counter(), job.done_chunks
+
+        async def embed_pending(final: bool = False):
+            nonlocal pending
+            while len(pending) >= batch_size or (final and pending):
+                batch, pending = pending[:batch_size], pending[batch_size:]
+                if job.status != JobStatus.EMBEDDING:
+                    await self._set_status(job, JobStatus.EMBEDDING)
+                await self._embed_batch(job, batch)
+                elapsed = time.perf_counter() - rate_start
+                if elapsed > 0:
+                    job.rate = (job.done_chunks - rate_first) / elapsed
+                self._publish(job)
+
+        async for text, page in self._parser.iter_pages(path):
+            chunks = stream.feed(text, page)
+            if job.total_pages:
+                job.done_pages += 1
+            pending.extend(chunks[max(0, skip - produced):])
+            produced += len(chunks)
+            if job.total_pages and job.done_pages < job.total_pages:
+                # Estimate from pages parsed so far until the real count is known
+                estimate = -(-produced * job.total_pages // job.done_pages)
+                job.total_chunks = max(estimate, job.done_chunks + len(pending))
+            await embed_pending()
+
+        tail = stream.flush()
+        pending.extend(tail[max(0, skip - produced):])
+        produced += len(tail)
+        job.total_chunks = produced
+        await embed_pending(final=True)
+
+    async def _embed_batch(self, job: IngestionJob, batch: list[TextChunk]):
+        embeddings, reused = await self._rag.embed_chunks(batch, self._embed)
+        # Segment collections: no compaction between the slots' append and commit
+        async with self._rag.store_writer(job.collection):
+            await self._ensure_active(job)  # Nothing is written for a cancelled job
+            start = job.done_chunks
+            await self._rag.add_chunks(job.document_id, start, batch, embeddings)
+            job.done_chunks = start + len(batch)
+            job.reused_chunks += reused
+            # Progress last: another caller's commit landing in between
+            # persists rows past the recorded progress, which resume deletes
+            await self._checkpoint(job, commit=False)
+            await self._db.commit()
+            # Another caller's rollback on the shared connection may have undone the batch
+            async with self._db.execute(
+                "SELECT COUNT(*) FROM document_chunks WHERE document_id = ?", (job.document_id,)
+            ) as cursor:
+                chunks = (await cursor.fetchone())[0]
+            if chunks != job.done_chunks:
+                raise BatchLost(job.id, chunks)
+
+    async def _ensure_active(self, job: IngestionJob):
+        """Raise JobCancelled if the job is no longer active (read only)."""
+        async with self._db.execute(
+            f"SELECT 1 FROM ingestion_jobs WHERE id = ? AND {_ACTIVE_SQL}", (job.id, *_ACTIVE_PARAMS)
+        ) as cursor:
+            if await cursor.fetchone() is None:
+                raise JobCancelled(job.id)
+
+    async def _checkpoint(self, job: IngestionJob, commit: bool = True):
+        """Persist progress; raises JobCancelled if the job is no longer active."""
+        cursor = await self._db.execute(
+            f"""UPDATE ingestion_jobs
+                SET document_id = ?, total_chunks = ?, done_chunks = ?, reused_chunks = ?,
+                    total_pages = ?, done_pages = ?, updated_at = ?
+                WHERE id = ? AND {_ACTIVE_SQL}""",
+            (job.document_id, job.total_chunks, job.done_chunks, job.reused_chunks,
+             job.total_pages, job.done_pages, time.time(), job.id, *_ACTIVE_PARAMS)
+        )
+        if not cursor.rowcount:
+            raise JobCancelled(job.id)
+        if commit:
+            await self._db.commit()
+
+    async def _set_status(self, job: IngestionJob, status: JobStatus, started_at: Optional[float] = None):
+        job.status = status
+        job.started_at = started_at or job.started_at
+        cursor = await self._db.execute(
+            f"""UPDATE ingestion_jobs SET status = ?, started_at = ?, updated_at = ?
+                WHERE id = ? AND {_ACTIVE_SQL}""",
+            (status.value, job.started_at, time.time(), job.id, *_ACTIVE_PARAMS)
+        )
+        await self._db.commit()
+        if not cursor.rowcount:
+            raise JobCancelled(job.id)
+        self._publish(job)
+
+    async def _finish(self, job: IngestionJob, status: JobStatus, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.rate = None
+        await self._db.execute(
+            """UPDATE ingestion_jobs SET status = ?, error = ?, document_id = ?,
+                   total_chunks = ?, done_chunks = ?, reused_chunks = ?, updated_at = ?, finished_at = ?
+               WHERE id = ?""",
+            (status.value, error, job.document_id, job.total_chunks, job.done_chunks,
+             job.reused_chunks, time.time(), job.finished_at, job.id)
+        )
+        await self._db.commit()
+        self._discard_upload(job.file_path)
+        self._publish(job)
+
+    async def _discard_document(self, job: IngestionJob):
+        """Remove a partially ingested document (a re-index discards its staged chunks itself)."""
+        if job.reindex:
+            return
+        if job.document_id:
+            await self._rag.remove_document(job.document_id)
+            job.document_id = None
+        job.done_chunks = 0
+
+    def _discard_upload(self, file_path: str):
+        """Delete a saved upload (files outside the upload dir are left alone)."""
+        path = Path(file_path).resolve()
+        if not path.is_relative_to(self.upload_dir.resolve()):
+            return
+        try:
+            path.unlink(missing_ok=True)
+        except OSError as e:
+            log.warn(f"Could not remove upload {file_path}: {e}")
+
+    async def stop(self):
+        """Stop the workers; unfinished jobs resume on the next start."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize(),
+            "running": sum(1 for j in self._jobs.values() if j.status in (JobStatus.PARSING, JobStatus.EMBEDDING)),
+            "completed": self._completed,
+            "failed": self._failed,
+        }
+
+
+# Global instance
+ingestion = IngestionManager()
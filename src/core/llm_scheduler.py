@@ -0,0 +1,293 @@
+"""
+Priority-aware LLM Request Scheduler for MAX AI Assistant.
+
+Replaces the single shared semaphore in front of LMStudioClient with
+per-class admission control, so background work (fact extraction,
+summarization) never delays interactive tokens.
+
+Features:
+- Priority classes: interactive > agent > background
+- Per-class concurrency caps under a global cap
+- Preemption-free fair queuing (FIFO per class + aging against starvation)
+- Shedding of queued background jobs when interactive load spikes
+- Queue depth / wait time metrics
+
+Usage:
+    from .llm_scheduler import RequestPriority
+
+    async with lm_client.scheduler.slot(RequestPriority.BACKGROUND):
+        response = await client.chat.completions.create(**params)
+"""
+import asyncio
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import AsyncIterator, Optional
+
+
+class RequestPriority(Enum):
+    """Priority class of an LLM request."""
+    INTERACTIVE = "interactive"  # User is waiting for tokens (/api/chat)
+    AGENT = "agent"              # Agent planning / verification
+    BACKGROUND = "background"    # Fact extraction, summarization
+
+
+# Dispatch order (highest priority first)
+PRIORITY_ORDER = [
+    RequestPriority.INTERACTIVE,
+    RequestPriority.AGENT,
+    RequestPriority.BACKGROUND,
+]
+
+
+class RequestShedError(RuntimeError):
+    """Raised for a queued request dropped to make room for interactive load."""
+
+
+@dataclass
+class _Ticket:
+    """A queued request waiting for a slot."""
+    priority: RequestPriority
+    seq: int
+    enqueued_at: float
+    future: asyncio.Future
+
+
+@dataclass
+class _ClassStats:
+    """Per-class counters."""
+    active: int = 0
+    completed: int = 0
+    shed: int = 0
+    cancelled: int = 0
+    wait_total_ms: float = 0.0
+    wait_max_ms: float = 0.0
+    recent_waits_ms: deque = field(default_factory=lambda: deque(maxlen=256))
+
+
+class LLMScheduler:
+    """
+    Admission controller for LLM calls.
+
+    A request is granted a slot when the global cap and its class cap
+    both have room. Waiting requests are served strictly by priority,
+    FIFO within a class; a lower-class request that waited longer than
+    `aging_seconds` is promoted ahead of higher classes so it cannot
+    starve. Running requests are never preempted.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 5,
+        class_limits: Optional[dict[RequestPriority, int]] = None,
+        aging_seconds: float = 10.0,
+        shed_threshold: int = 2
+    ):
+        self._max_concurrent = max(1, max_concurrent)
+        self._class_limits = {
+            RequestPriority.INTERACTIVE: self._max_concurrent,
+            RequestPriority.AGENT: self._max_concurrent,
+            RequestPriority.BACKGROUND: self._max_concurrent,
+        }
+        if class_limits:
+            self._class_limits.update(class_limits)
+        self._aging_seconds = aging_seconds
+        self._shed_threshold = shed_threshold
+
+        self._queues: dict[RequestPriority, deque[_Ticket]] = {
+            p: deque() for p in PRIORITY_ORDER
+        }
+        self._stats: dict[RequestPriority, _ClassStats] = {
+            p: _ClassStats() for p in PRIORITY_ORDER
+        }
+        self._active_total = 0
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_config(cls, lm_config, scheduler_config) -> "LLMScheduler":
+        """Build scheduler from LMStudioConfig + LLMSchedulerConfig."""
+        return cls(
+            max_concurrent=lm_config.max_concurrent_requests,
+            class_limits={
+                RequestPriority.INTERACTIVE: scheduler_config.interactive_max_concurrent,
+                RequestPriority.AGENT: scheduler_config.agent_max_concurrent,
+                RequestPriority.BACKGROUND: scheduler_config.background_max_concurrent,
+            },
+            aging_seconds=scheduler_config.aging_seconds,
+            shed_threshold=scheduler_config.shed_background_threshold
+        )
+
+    # ==================== Public API ====================
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        priority: RequestPriority = RequestPriority.INTERACTIVE
+    ) -> AsyncIterator[None]:
+        """Hold a scheduler slot for the duration of the block."""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    async def acquire(self, priority: RequestPriority = RequestPriority.INTERACTIVE):
+        """
+        Wait for a slot.
+
+        Raises:
+            RequestShedError: if a queued background request was dropped
+        """
+        stats = self._stats[priority]
+
+        # Fast path: nothing queued ahead of us and capacity available
+        if self._can_run(priority) and not self._has_waiters_at_or_above(priority):
+            self._grant(priority, waited_ms=0.0)
+            return
+
+        loop = asyncio.get_running_loop()
+        ticket = _Ticket(
+            priority=priority,
+            seq=next(self._seq),
+            enqueued_at=time.monotonic(),
+            future=loop.create_future()
+        )
+        self._queues[priority].append(ticket)
+
+        if priority == RequestPriority.INTERACTIVE:
+            self._maybe_shed_background()
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled() \
+                    and ticket.future.exception() is None:
+                # Slot was granted right as we were cancelled - give it back
+                self.release(priority)
+            else:
+                self._remove_ticket(ticket)
+                stats.cancelled += 1
+            raise
+
+    def release(self, priority: RequestPriority):
+        """Return a slot and wake the next eligible waiter."""
+        stats = self._stats[priority]
+        stats.active = max(0, stats.active - 1)
+        stats.completed += 1
+        self._active_total = max(0, self._active_total - 1)
+        self._dispatch()
+
+    def queue_depth(self, priority: Optional[RequestPriority] = None) -> int:
+        """Number of waiting requests (for one class or in total)."""
+        if priority:
+            return len(self._queues[priority])
+        return sum(len(q) for q in self._queues.values())
+
+    def get_stats(self) -> dict:
+        """Get queue depth and wait-time metrics per class."""
+        classes = {}
+        for priority in PRIORITY_ORDER:
+            stats = self._stats[priority]
+            waits = sorted(stats.recent_waits_ms)
+            granted = stats.completed + stats.active
+            classes[priority.value] = {
+                "queued": len(self._queues[priority]),
+                "active": stats.active,
+                "limit": self._class_limits[priority],
+                "completed": stats.completed,
+                "shed": stats.shed,
+                "cancelled": stats.cancelled,
+                "avg_wait_ms": round(stats.wait_total_ms / granted, 1) if granted else 0.0,
+                "p95_wait_ms": round(waits[int(len(waits) * 0.95) - 1], 1) if waits else 0.0,
+                "max_wait_ms": round(stats.wait_max_ms, 1),
+            }
+        return {
+            "max_concurrent": self._max_concurrent,
+            "active": self._active_total,
+            "queued": self.queue_depth(),
+            "classes": classes,
+        }
+
+    # ==================== Internals ====================
+
+    def _can_run(self, priority: RequestPriority) -> bool:
+        return (
+            self._active_total < self._max_concurrent and
+            self._stats[priority].active < self._class_limits[priority]
+        )
+
+    def _has_waiters_at_or_above(self, priority: RequestPriority) -> bool:
+        for p in PRIORITY_ORDER:
+            if self._queues[p]:
+                return True
+            if p == priority:
+                break
+        # Aged lower-class waiters also take precedence
+        return any(
+            self._queues[p] and self._is_aged(self._queues[p][0], time.monotonic())
+            for p in PRIORITY_ORDER
+        )
+
+    def _is_aged(self, ticket: _Ticket, now: float) -> bool:
+        return now - ticket.enqueued_at >= self._aging_seconds
+
+    def _grant(self, priority: RequestPriority, waited_ms: float):
+        stats = self._stats[priority]
+        stats.active += 1
+        self._active_total += 1
+        stats.wait_total_ms += waited_ms
+        stats.wait_max_ms = max(stats.wait_max_ms, waited_ms)
+        stats.recent_waits_ms.append(waited_ms)
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        """Pick the next ticket to run (aged first, then by priority)."""
+        now = time.monotonic()
+        eligible = [
+            self._queues[p][0] for p in PRIORITY_ORDER
+            if self._queues[p] and self._stats[p].active < self._class_limits[p]
+        ]
+        if not eligible:
+            return None
+
+        aged = [t for t in eligible if self._is_aged(t, now)]
+        if aged:
+            return min(aged, key=lambda t: t.seq)
+        return eligible[0]
+
+    def _dispatch(self):
+        """Grant slots to waiters while capacity allows."""
+        while self._active_total < self._max_concurrent:
+            ticket = self._next_ticket()
+            if not ticket:
+                return
+            self._queues[ticket.priority].popleft()
+            if ticket.future.done():
+                continue  # Cancelled while queued
+            waited_ms = (time.monotonic() - ticket.enqueued_at) * 1000
+            self._grant(ticket.priority, waited_ms)
+            ticket.future.set_result(None)
+
+    def _remove_ticket(self, ticket: _Ticket):
+        try:
+            self._queues[ticket.priority].remove(ticket)
+        except ValueError:
+            pass
+
+    def _maybe_shed_background(self):
+        """Drop queued background jobs when interactive requests pile up."""
+        if self._shed_threshold <= 0:
+            return
+        if len(self._queues[RequestPriority.INTERACTIVE]) < self._shed_threshold:
+            return
+
+        background = self._queues[RequestPriority.BACKGROUND]
+        while background:
+            ticket = background.popleft()
+            if not ticket.future.done():
+                ticket.future.set_exception(
+                    RequestShedError("Background LLM request shed due to interactive load")
+                )
+                self._stats[RequestPriority.BACKGROUND].shed += 1
@@ -11,6 +11,8 @@ Features:
 """
 import asyncio
 import json
+import time
+import traceback
 from typing import AsyncIterator, Optional, Any
 from dataclasses import dataclass
 from enum import Enum
@@ -19,6 +21,11 @@ from openai import AsyncOpenAI
 
 from .config import config
 from .safe_shell import safe_shell
+from .llm_scheduler import LLMScheduler, RequestPriority
+from .logger import log
+from .cancellation import CancelToken, current_cancel_token
+from .response_cache import response_cache
+from .think_parser import ThinkTagParser, ThinkEvent
 
 
 class TaskType(Enum):
@@ -34,6 +41,7 @@ class ThinkingMode(Enum):
     FAST = "fast"           # Quick responses, minimal reasoning
     STANDARD = "standard"   # Balanced quality/speed
     DEEP = "deep"           # Chain-of-thought, detailed analysis
+    SPECULATIVE = "speculative"  # Fast draft now, deep revision later
     VISION = "vision"       # Auto-activated for images
 
 
@@ -69,8 +77,8 @@ class LMStudioClient:
         self._current_model: Optional[str] = None
         self._last_used: float = 0
         self._unload_task: Optional[asyncio.Task] = None
-        # P2 fix: Rate limiting via semaphore
-        self._request_semaphore = asyncio.Semaphore(config.lm_studio.max_concurrent_requests)
+        # Priority scheduler replaces the single shared semaphore
+        self._scheduler = LLMScheduler.from_config(config.lm_studio, config.llm_scheduler)
         self._last_request_time: float = 0
         
         # P0 Fix: Race Condition Lock
@@ -81,6 +89,11 @@ class LMStudioClient:
         self._last_scan_time: float = 0
         self._scan_ttl: int = 60  # Cache model list for 60s
     
+    @property
+    def scheduler(self) -> LLMScheduler:
+        """Get the LLM request scheduler."""
+        return self._scheduler
+
     @property
     def current_model(self) -> Optional[str]:
         """Get currently set model name."""
@@ -88,7 +101,6 @@ class LMStudioClient:
     
     async def get_available_models(self, force_refresh: bool = False) -> list[str]:
         """Get list of available model keys (smart scan)."""
-        import time
         now = time.monotonic()
         
         # Use cache if fresh
@@ -384,6 +396,9 @@ class LMStudioClient:
         thinking_mode: ThinkingMode = ThinkingMode.STANDARD,  # NEW
         has_image: bool = False,  # NEW: Auto-detect vision
         tools: Optional[list[dict]] = None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        cache_site: Optional[str] = None,
+        cancel_token: Optional[CancelToken] = None,
         **kwargs
     ) -> AsyncIterator[str] | str:
         """
@@ -399,6 +414,11 @@ class LMStudioClient:
             thinking_mode: User-selected thinking depth
             has_image: If True, auto-switch to VISION mode
             tools: Function tools for tool calling
+            priority: Scheduler class (interactive / agent / background)
+            cache_site: Response cache call site (non-streaming only,
+                see config.response_cache.sites)
+            cancel_token: Closes the upstream stream when cancelled
+                (default: the current request's token)
             
         Returns:
             Async iterator of chunks if streaming, else complete response
@@ -445,26 +465,48 @@ class LMStudioClient:
         self._current_model = model
 
         if stream:
-            return self._stream_response(params)
-        else:
-            # P2 fix: Apply rate limiting
-            async with self._request_semaphore:
+            return self._stream_response(params, priority, cancel_token or current_cancel_token())
+
+        cache_key = None
+        cached = None
+        if not kwargs and response_cache.is_enabled(cache_site):
+            cache_key = response_cache.make_key(model, messages, temperature, max_tokens, tools)
+            cached = await response_cache.lookup(cache_site, cache_key, model, messages, temperature)
+            if cached.response is not None:
+                log.lm(f"💾 Response cache hit ({cache_site}{', semantic' if cached.semantic else ''})")
+                return cached.response
+
+        async with self._scheduler.slot(priority):
+            # P2 fix: Rate limiting (interactive requests are never delayed)
+            if priority != RequestPriority.INTERACTIVE:
                 await self._enforce_rate_limit()
-                response = await self.client.chat.completions.create(**params)
-                return response.choices[0].message.content or ""
+            started = time.perf_counter()
+            response = await self.client.chat.completions.create(**params)
+            content = response.choices[0].message.content or ""
+
+        if cache_key:
+            await response_cache.store(
+                cache_site, cache_key, model, temperature, content,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                embedding=cached.embedding
+            )
+        return content
 
     def _inject_thinking_prompt(self, messages: list[dict], suffix: str) -> list[dict]:
         """
         Inject thinking mode system prompt suffix.
         
         Appends the mode-specific instructions to the system message
-        for Chain-of-Thought reasoning.
+        for Chain-of-Thought reasoning. No-op if the system message already
+        carries the suffix (placed by prompt_layout at a stable position).
         """
         messages = messages.copy()  # Don't mutate original
         
         # Find existing system message
         for i, msg in enumerate(messages):
             if msg.get("role") == "system":
+                if suffix in (msg.get("content") or ""):
+                    return messages
                 messages[i] = {
                     **msg,
                     "content": f"{msg.get('content', '')}\n\n{suffix}"
@@ -477,7 +519,6 @@ class LMStudioClient:
 
     async def _enforce_rate_limit(self):
         """Enforce minimum interval between requests (P2 fix)."""
-        import time
         now = time.monotonic()
         elapsed = now - self._last_request_time
         if elapsed < self.MIN_REQUEST_INTERVAL:
@@ -493,7 +534,12 @@ class LMStudioClient:
         ("<reflection>", "</reflection>"), # Reflection models
     ]
     
-    async def _stream_response(self, params: dict) -> AsyncIterator[str]:
+    async def _stream_response(
+        self,
+        params: dict,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        cancel_token: Optional[CancelToken] = None
+    ) -> AsyncIterator[str]:
         """
         Stream response chunks with multi-pattern think tag filtering.
         
@@ -502,189 +548,121 @@ class LMStudioClient:
         - Claude-style: <thinking>...</thinking>
         - Generic: <reasoning>...</reasoning>
         
-        Uses buffering to handle tags split across chunk boundaries.
-        """
-        import re
-        from .logger import log
+        Tags split across chunk boundaries are handled by ThinkTagParser,
+        which only scans newly received text.
+        Per-chunk tracing only runs when debug logging is on; otherwise
+        counters are aggregated and logged once at stream end.
         
-        # State machine
-        in_think_block = False
-        current_close_tag = ""
-        pending_buffer = ""  # Buffer for potential partial tags
-        think_content = ""   # Accumulated thinking content
-        think_start_time = 0.0  # Timestamp when thinking started
+        The upstream HTTP stream is closed as soon as `cancel_token` is
+        cancelled (LM Studio stops generating when the connection drops)
+        and in any case when this generator exits.
+        """
+        # Evaluated once per stream: per-chunk log calls are skipped entirely when off
+        trace = log.trace_chunks()
+        parser = ThinkTagParser(self.THINK_TAG_PATTERNS, max_think_chars=2000)  # 2000 chars for UI
         
-        # Stats for logging
         chunk_count = 0
         total_chars_received = 0
-        total_chars_yielded = 0
-        total_chars_filtered = 0
-        
-        # Pre-compile patterns for efficiency
-        open_pattern = re.compile(r'<(think|thinking|reasoning|reflection)>', re.IGNORECASE)
         
         model = params.get("model", "unknown")
-        # log.lm_stream_start(model) is called by logger internally via events? 
-        # Actually log.lm_stream_start is a method of Logger. 
-        # The original code had print then log calls. We unify.
-        log.lm(f"Starting stream for model={model}")
         log.lm_stream_start(model)
         
+        slot_held = False
+        stream = None
+        unregister = None
         try:
-            log.lm("Creating chat completion...", model=model)
+            # Hold a scheduler slot for the whole generation
+            await self._scheduler.acquire(priority)
+            slot_held = True
+            if cancel_token and cancel_token.cancelled:
+                return
+
             stream = await self.client.chat.completions.create(**params)
-            log.lm("Stream connection established ✓")
+            if cancel_token:
+                unregister = cancel_token.on_cancel(stream.close)
+            if trace:
+                log.lm("Stream connection established ✓", model=model)
             
             async for chunk in stream:
                 chunk_count += 1
                 
                 # Check for empty chunk
                 if not chunk.choices:
-                    log.stream(f"[#{chunk_count:03d}] Empty chunk (no choices)", level="DEBUG")
+                    if trace:
+                        log.stream(f"[#{chunk_count:03d}] Empty chunk (no choices)", level="DEBUG")
                     continue
                 
                 delta = chunk.choices[0].delta
                 if not delta.content:
                     # Log finish reason if present
-                    finish_reason = chunk.choices[0].finish_reason
-                    if finish_reason:
-                        log.stream(f"[#{chunk_count:03d}] Finish signal", reason=finish_reason)
+                    if trace and chunk.choices[0].finish_reason:
+                        log.stream(f"[#{chunk_count:03d}] Finish signal",
+                                   reason=chunk.choices[0].finish_reason)
                     continue
                     
                 content = delta.content
                 total_chars_received += len(content)
                 
                 # Log raw chunk received
-                preview = content.replace("\n", "\\n")[:40]
-                log.stream(f"[#{chunk_count:03d}] RAW CHUNK", 
-                          chars=len(content), 
-                          preview=f'"{preview}"',
-                          state="THINK" if in_think_block else "NORMAL")
-                
-                pending_buffer += content
+                if trace:
+                    preview = content.replace("\n", "\\n")[:40]
+                    log.stream(f"[#{chunk_count:03d}] RAW CHUNK", 
+                              chars=len(content), 
+                              preview=f'"{preview}"',
+                              state="THINK" if parser.in_think_block else "NORMAL")
                 
-                while pending_buffer:
-                    if not in_think_block:
-                        # Look for opening tag
-                        match = open_pattern.search(pending_buffer)
-                        
-                        if match:
-                            # Found opening tag
-                            tag_name = match.group(1).lower()
-                            current_close_tag = f"</{tag_name}>"
-                            
-                            log.think_block_start(f"<{tag_name}>")
-                            
-                            # Yield content before the tag
-                            before_tag = pending_buffer[:match.start()]
-                            if before_tag:
-                                total_chars_yielded += len(before_tag)
-                                log.stream(f"  → YIELD (before tag)", chars=len(before_tag))
-                                yield before_tag
-                            
-                            # Enter think mode
-                            in_think_block = True
-                            think_content = ""
-                            pending_buffer = pending_buffer[match.end():]
-                            log.think(f"  State: NORMAL → THINK", buffer_remaining=len(pending_buffer))
-                            
-                            # Emit thinking_start event
-                            import time
-                            think_start_time = time.time()
-                            yield {"_meta": "thinking_start"}
-                        else:
-                            # Check for potential partial tag at end
-                            if pending_buffer.endswith('<'):
-                                # Keep '<' for next iteration
-                                to_yield = pending_buffer[:-1]
-                                if to_yield:
-                                    total_chars_yielded += len(to_yield)
-                                    log.stream(f"  → YIELD (partial '<' held)", chars=len(to_yield))
-                                    yield to_yield
-                                pending_buffer = '<'
-                                break
-                            elif '<' in pending_buffer[-15:]:
-                                # Potential partial tag, check if it could be start of known tag
-                                last_lt = pending_buffer.rfind('<')
-                                potential = pending_buffer[last_lt:]
-                                
-                                is_partial_think_tag = any(
-                                    tag[0].lower().startswith(potential.lower()) 
-                                    for tag in self.THINK_TAG_PATTERNS
-                                )
-                                
-                                if is_partial_think_tag:
-                                    # Keep partial for next chunk
-                                    to_yield = pending_buffer[:last_lt]
-                                    if to_yield:
-                                        total_chars_yielded += len(to_yield)
-                                        log.stream(f"  → YIELD (partial tag held)", 
-                                                  chars=len(to_yield),
-                                                  held=f'"{potential}"')
-                                        yield to_yield
-                                    pending_buffer = potential
-                                    break
-                                else:
-                                    # Not a think tag, yield all
-                                    total_chars_yielded += len(pending_buffer)
-                                    log.stream(f"  → YIELD (not a think tag)", chars=len(pending_buffer))
-                                    yield pending_buffer
-                                    pending_buffer = ""
-                            else:
-                                # No potential tags, yield all
-                                total_chars_yielded += len(pending_buffer)
-                                log.stream(f"  → YIELD (clean)", chars=len(pending_buffer))
-                                yield pending_buffer
-                                pending_buffer = ""
-                    else:
-                        # Inside think block, look for closing tag
-                        close_pos = pending_buffer.lower().find(current_close_tag.lower())
-                        
-                        if close_pos != -1:
-                            # Found closing tag
-                            think_content += pending_buffer[:close_pos]
-                            total_chars_filtered += len(think_content)
-                            
-                            log.think_block_end(len(think_content))
-                            log.think(f"  🧠 FILTERED CONTENT", chars=len(think_content))
-                            
-                            # Exit think mode
-                            in_think_block = False
-                            pending_buffer = pending_buffer[close_pos + len(current_close_tag):]
-                            log.think(f"  State: THINK → NORMAL", buffer_remaining=len(pending_buffer))
-                            
-                            # Emit thinking_end event with duration and content
-                            import time
-                            duration_ms = int((time.time() - think_start_time) * 1000)
-                            yield {
-                                "_meta": "thinking_end",
-                                "duration_ms": duration_ms,
-                                "chars_filtered": len(think_content),
-                                "think_content": think_content[:2000]  # Limit to 2000 chars for UI
-                            }
-                            
-                            think_content = ""
-                            current_close_tag = ""
-                        else:
-                            # Still in think block, accumulate
-                            think_content += pending_buffer
-                            log.think(f"  Accumulating think content", 
-                                     total_think_chars=len(think_content))
-                            pending_buffer = ""
-                            break
+                for event in parser.feed(content):
+                    yield self._think_event_output(event, trace)
+            
+            for event in parser.flush():
+                yield self._think_event_output(event, trace)
             
-            # Log final stats
+            # Aggregated stats, logged once per stream
             log.lm_stream_end(chunk_count)
             log.lm(f"📊 STREAM STATS", 
                    received=total_chars_received,
-                   yielded=total_chars_yielded,
-                   filtered=total_chars_filtered)
+                   yielded=parser.visible_chars,
+                   filtered=parser.filtered_chars,
+                   think_blocks=parser.blocks)
                         
         except Exception as e:
+            if cancel_token and cancel_token.cancelled:
+                # Upstream closed by the cancel token - not an error
+                log.lm("Stream cancelled", reason=cancel_token.reason, chunks=chunk_count)
+                return
             log.error(f"Stream exception: {type(e).__name__}: {e}")
-            import traceback
             log.error(f"Traceback:\n{traceback.format_exc()}")
             yield f"\n[Error: {str(e)}]"
+        finally:
+            if unregister:
+                unregister()
+            if stream is not None:
+                try:
+                    await stream.close()  # Drop the connection if not fully read
+                except Exception:
+                    pass
+            if slot_held:
+                self._scheduler.release(priority)
+    
+    @staticmethod
+    def _think_event_output(event: str | ThinkEvent, trace: bool) -> str | dict:
+        """Map parser output to a stream item (text or `_meta` event)."""
+        if isinstance(event, str):
+            return event
+        
+        if event.kind == "start":
+            if trace:
+                log.think_block_start(event.tag)
+            return {"_meta": "thinking_start"}
+        
+        if trace:
+            log.think_block_end(event.chars)
+        return {
+            "_meta": "thinking_end",
+            "duration_ms": event.duration_ms,
+            "chars_filtered": event.chars,
+            "think_content": event.content
+        }
     
     async def chat_with_tools(
         self,
@@ -769,6 +747,22 @@ class LMStudioClient:
             # Silent fail - embeddings are optional, system uses keyword fallback
             return []
 
+    async def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """Embedding vectors for several texts in one request ([] per text on failure)."""
+        if not texts:
+            return []
+        try:
+            response = await self.client.embeddings.create(
+                model="text-embedding-model",
+                input=texts
+            )
+            vectors = [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+            if len(vectors) == len(texts):
+                return vectors
+        except Exception:
+            pass
+        return [[] for _ in texts]
+
 
 # Global client instance
 lm_client = LMStudioClient()
@@ -12,6 +12,7 @@ Usage:
     log.api("Incoming chat request", message=msg[:50])
     log.lm("Chunk received", size=len(chunk), in_think=True)
 """
+import os
 import sys
 import time
 from datetime import datetime
@@ -55,7 +56,8 @@ class LogConfig:
     enabled: bool = True
     show_timestamps: bool = True
     show_request_id: bool = True
-    show_chunks: bool = True          # Show each streaming chunk
+    show_chunks: bool = True          # Show each streaming chunk (requires debug)
+    debug: bool = field(default_factory=lambda: os.getenv("MAX_LOG_DEBUG", "") == "1")
     show_think_content: bool = False  # Show actual thinking content (verbose)
     max_chunk_preview: int = 50       # Max chars to show per chunk
     component_filter: set = field(default_factory=set)  # Empty = show all
@@ -71,6 +73,19 @@ class Logger:
     def __init__(self):
         self._start_times: dict[str, float] = {}
     
+    def is_debug(self) -> bool:
+        """Check if debug-level logging is on."""
+        return config.enabled and config.debug
+
+    def trace_chunks(self) -> bool:
+        """
+        Check if per-chunk stream tracing is on.
+
+        Hot paths evaluate this once per stream and skip per-chunk
+        log calls entirely (no formatting, no stderr flush) when False.
+        """
+        return config.enabled and config.debug and config.show_chunks
+
     def set_request_id(self, req_id: str):
         """Set correlation ID for current request."""
         _request_id.set(req_id[:4])
@@ -174,13 +189,15 @@ class Logger:
     
     def debug(self, message: str, **kwargs):
         """Log debug info (only when verbose)."""
+        if not self.is_debug():
+            return
         self._print(Component.API, message, level="DEBUG", **kwargs)
     
     # === Chunk logging ===
     
     def chunk(self, content: str, filtered: bool = False, chunk_num: int = 0):
         """Log a streaming chunk."""
-        if not config.show_chunks:
+        if not self.trace_chunks():
             return
         
         preview = content[:config.max_chunk_preview]
@@ -261,7 +278,9 @@ class Logger:
                    filtered=f"{chars_filtered} chars")
     
     def sse_yield(self, data_type: str, size: int):
-        """Log SSE yield event."""
+        """Log SSE yield event (per-token, debug only)."""
+        if not self.trace_chunks():
+            return
         self.sse(f"→ SSE", type=data_type, size=size)
 
 
@@ -274,11 +293,14 @@ def configure_logging(
     enabled: bool = True,
     show_chunks: bool = True,
     show_think_content: bool = False,
-    components: Optional[set[str]] = None
+    components: Optional[set[str]] = None,
+    debug: Optional[bool] = None
 ):
     """Configure logging options at runtime."""
     config.enabled = enabled
     config.show_chunks = show_chunks
     config.show_think_content = show_think_content
+    if debug is not None:
+        config.debug = debug
     if components:
         config.component_filter = components
@@ -16,10 +16,11 @@ from dataclasses import dataclass, field
 from pathlib import Path
 
 import aiosqlite
-import tiktoken
 
 from .config import config
 from .lm_client import lm_client
+from .llm_scheduler import RequestPriority
+from .cancellation import track_task
 
 
 # P3 fix: Constants for context allocation (magic numbers extracted)
@@ -73,6 +74,20 @@ class Fact:
     created_at: Optional[datetime] = None
 
 
+@dataclass
+class ContextSegments:
+    """Context pieces for one turn (see MemoryManager.get_context_segments)."""
+    summary: str = ""
+    facts: list[Fact] = field(default_factory=list)
+    facts_text: str = ""
+    history: list[dict] = field(default_factory=list)
+
+    @property
+    def memory_text(self) -> str:
+        """Summary + facts as one block (slowly changing part of the prompt)."""
+        return "\n\n".join(part for part in (self.summary, self.facts_text) if part)
+
+
 @dataclass
 class Conversation:
     """Represents a conversation session."""
@@ -103,6 +118,10 @@ class MemoryManager:
         """Initialize database connection and create tables."""
         self._db = await aiosqlite.connect(str(self.db_path))
         self._db.row_factory = aiosqlite.Row
+        # WAL + busy timeout: API workers share this file (readers don't block the writer)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute(f"PRAGMA busy_timeout={config.workers.sqlite_busy_timeout_ms}")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
         
         # Load and execute schema
         schema_path = Path(__file__).parent.parent.parent / "data" / "schema.sql"
@@ -129,6 +148,7 @@ class MemoryManager:
     def count_tokens(self, text: str) -> int:
         """Count tokens in text using tiktoken."""
         if self._encoder is None:
+            import tiktoken  # Heavy import, deferred to first use
             self._encoder = tiktoken.get_encoding("cl100k_base")
         return len(self._encoder.encode(text))
     
@@ -231,9 +251,10 @@ class MemoryManager:
         # Check if we need to trigger summarization
         await self._maybe_summarize(conversation_id)
         
-        # Extract facts from user messages (with error logging)
+        # Extract facts from user messages (with error logging).
+        # Tied to the current request: cancelled if its client disconnects.
         if role == "user" and config.memory.extract_facts:
-            task = asyncio.create_task(self._extract_facts(cursor.lastrowid, content))
+            task = track_task(asyncio.create_task(self._extract_facts(cursor.lastrowid, content)))
             task.add_done_callback(_log_task_exception)
         
         return Message(
@@ -282,24 +303,23 @@ class MemoryManager:
     
     # ==================== Smart Context ====================
     
-    async def get_smart_context(
+    async def get_context_segments(
         self,
         conversation_id: str,
         max_tokens: Optional[int] = None,
-        include_facts: bool = True,
-        include_cross_session: bool = True
-    ) -> list[dict]:
+        include_facts: bool = True
+    ) -> "ContextSegments":
         """
-        Get optimized context for LLM within token budget.
+        Get context pieces within token budget, kept separate so callers
+        can lay them out (see prompt_layout).
         
         Strategy:
-        1. Include conversation summary if exists
-        2. Include recent messages (up to limit)
-        3. Include relevant facts
-        4. Include cross-session relevant context
+        1. Conversation summary if exists
+        2. Recent messages (up to limit)
+        3. Relevant facts
         """
         max_tokens = max_tokens or config.memory.max_context_tokens
-        context = []
+        segments = ContextSegments()
         tokens_used = 0
         
         # 1. Get conversation summary
@@ -313,7 +333,7 @@ class MemoryManager:
                 summary_msg = f"[Краткое содержание предыдущего разговора: {row['summary']}]"
                 tokens = self.count_tokens(summary_msg)
                 if tokens_used + tokens < max_tokens * config.memory.summary_token_ratio:
-                    context.append({"role": "system", "content": summary_msg})
+                    segments.summary = summary_msg
                     tokens_used += tokens
         
         # 2. Get recent messages
@@ -328,10 +348,10 @@ class MemoryManager:
             msg_tokens = msg.tokens_used or self.count_tokens(msg.content)
             if tokens_used + msg_tokens > max_tokens * MESSAGES_TOKEN_RATIO:
                 break
-            messages_to_add.insert(0, {"role": msg.role, "content": msg.content})
+            messages_to_add.append({"role": msg.role, "content": msg.content})
             tokens_used += msg_tokens
-        
-        context.extend(messages_to_add)
+        messages_to_add.reverse()
+        segments.history = messages_to_add
         
         # 3. Include relevant facts
         if include_facts:
@@ -344,8 +364,31 @@ class MemoryManager:
                 facts_text = "\n".join([f"• {f.content}" for f in facts])
                 facts_msg = f"[Известные факты о пользователе:\n{facts_text}]"
                 if tokens_used + self.count_tokens(facts_msg) < max_tokens:
-                    context.insert(0, {"role": "system", "content": facts_msg})
+                    segments.facts = facts
+                    segments.facts_text = facts_msg
         
+        return segments
+    
+    async def get_smart_context(
+        self,
+        conversation_id: str,
+        max_tokens: Optional[int] = None,
+        include_facts: bool = True,
+        include_cross_session: bool = True
+    ) -> list[dict]:
+        """
+        Get optimized context for LLM within token budget.
+        
+        Returns [facts?, summary?, *recent messages] as chat messages.
+        """
+        segments = await self.get_context_segments(conversation_id, max_tokens, include_facts)
+        
+        context = []
+        if segments.facts_text:
+            context.append({"role": "system", "content": segments.facts_text})
+        if segments.summary:
+            context.append({"role": "system", "content": segments.summary})
+        context.extend(segments.history)
         return context
     
     # ==================== Summarization ====================
@@ -436,7 +479,9 @@ class MemoryManager:
             summary = await lm_client.chat(
                 messages=[{"role": "user", "content": summarize_prompt}],
                 stream=False,
-                max_tokens=200
+                max_tokens=200,
+                priority=RequestPriority.BACKGROUND,
+                cache_site="compress_history"
             )
             
             # Save summary
@@ -485,7 +530,9 @@ class MemoryManager:
             response = await lm_client.chat(
                 messages=[{"role": "user", "content": extract_prompt}],
                 stream=False,
-                max_tokens=200
+                max_tokens=200,
+                priority=RequestPriority.BACKGROUND,
+                cache_site="extract_facts"
             )
             
             if "НЕТ" in response.upper():
@@ -8,6 +8,17 @@ Outcome-based metrics system that tracks real adaptation quality:
 - Implicit Feedback: detecting "спасибо" vs "нет, не то"
 
 Provides API for React UI to display metrics and achievements.
+
+Scores are computed from `metrics_rollup_daily` (one row per day, updated
+in the same transaction as each outcome insert), so a recalculation costs
+O(days) rather than a scan of every interaction. Computed results are
+cached per generation: invalidate_cache() bumps the generation instead of
+clearing, and a result computed while the generation moved is never served.
+
+Achievement inputs live in `metrics_counters`, kept current by triggers on
+messages, memory_facts and the rollup. Recording an interaction reads those
+few counter rows and writes achievements only when a counter reaches the
+threshold of a still-locked achievement, in a single UPDATE.
 """
 import json
 from dataclasses import dataclass, field, asdict
@@ -17,6 +28,9 @@ from enum import Enum
 
 import aiosqlite
 
+from .pattern_matcher import PatternMatcher
+from .worker_bus import worker_bus, TOPIC_METRICS
+
 
 class MetricCategory(Enum):
     """Categories for metrics and achievements."""
@@ -266,10 +280,30 @@ class ImplicitFeedbackAnalyzer:
         "note", "remember", "key", "main", "only"
     ]
     
+    # Signals that CAPS text is frustration rather than emphasis
+    FRUSTRATION_SIGNALS = [
+        "!!!", "?!",  # Multiple punctuation
+        "блин", "черт", "damn", "hell",  # Mild swearing
+        "сколько раз", "я же", "опять",  # Repetition frustration
+        "почему ты не", "зачем ты",  # Questioning actions
+    ]
+    
+    FEEDBACK_LABELS = ("positive", "negative", "correction")
+    
     # Minimum caps ratio to consider it significant (avoid short words)
     MIN_CAPS_RATIO = 0.5
     MIN_CAPS_LENGTH = 3  # Minimum word length to analyze for caps
     
+    def __init__(self):
+        # All signal lists in one matcher: a single pass finds every class
+        self._matcher = PatternMatcher(
+            [("positive", sig) for sig in self.POSITIVE_SIGNALS] +
+            [("negative", sig) for sig in self.NEGATIVE_SIGNALS] +
+            [("correction", sig) for sig in self.CORRECTION_SIGNALS] +
+            [("emphasis", sig) for sig in self.EMPHASIS_CONTEXT] +
+            [("frustration", sig) for sig in self.FRUSTRATION_SIGNALS]
+        )
+    
     def analyze(self, text: str) -> tuple[bool, bool, bool]:
         """
         Analyze text for implicit feedback signals.
@@ -278,17 +312,20 @@ class ImplicitFeedbackAnalyzer:
             tuple: (is_positive, is_negative, is_correction)
         """
         text_lower = text.lower()
+        has_caps = text_lower != text
         
-        is_positive = any(sig in text_lower for sig in self.POSITIVE_SIGNALS)
-        is_negative = any(sig in text_lower for sig in self.NEGATIVE_SIGNALS)
-        is_correction = any(sig in text_lower for sig in self.CORRECTION_SIGNALS)
+        # Emphasis/frustration context only matters for CAPS text
+        signals = self._matcher.labels(text_lower, None if has_caps else self.FEEDBACK_LABELS)
+        is_positive = "positive" in signals
+        is_negative = "negative" in signals
+        is_correction = "correction" in signals
         
         # Correction overrides simple negative
         if is_correction:
             is_negative = True
         
         # CAPS detection with context
-        caps_analysis = self._analyze_caps(text, is_negative)
+        caps_analysis = self._analyze_caps(text, is_negative, signals) if has_caps else "none"
         if caps_analysis == "frustration":
             is_negative = True
         elif caps_analysis == "emphasis" and not is_negative:
@@ -297,34 +334,36 @@ class ImplicitFeedbackAnalyzer:
         
         return is_positive, is_negative, is_correction
     
-    def _analyze_caps(self, text: str, already_negative: bool) -> str:
+    def explain(self, text: str) -> list[dict]:
+        """
+        Every signal found, with its position in the lowercased text
+        (for debugging/UI: why a message counted as positive or negative).
+        """
+        return [m.to_dict() for m in self._matcher.finditer(text.lower())]
+    
+    def _analyze_caps(
+        self,
+        text: str,
+        already_negative: bool,
+        signals: Optional[set[str]] = None
+    ) -> str:
         """
         Analyze CAPS usage in text to determine intent.
         
+        `signals` are the labels already found in the text (computed when omitted).
+        
         Returns:
             "frustration" - angry caps (negative signal)
             "emphasis" - important emphasis (neutral)
             "none" - no significant caps
         """
-        # Find all caps words (3+ chars)
-        words = text.split()
-        caps_words = []
-        
-        for word in words:
-            # Remove punctuation for analysis
-            clean = ''.join(c for c in word if c.isalpha())
-            if len(clean) >= self.MIN_CAPS_LENGTH:
-                upper_count = sum(1 for c in clean if c.isupper())
-                ratio = upper_count / len(clean)
-                if ratio >= self.MIN_CAPS_RATIO:
-                    caps_words.append(clean)
-        
-        if not caps_words:
+        # Is there any caps word (3+ chars)? All-lowercase words can't be one
+        if not any(self._is_caps_word(word) for word in text.split() if not word.islower()):
             return "none"
         
         # Calculate overall caps presence
-        total_alpha = sum(1 for c in text if c.isalpha())
-        total_upper = sum(1 for c in text if c.isupper())
+        total_alpha = sum(map(str.isalpha, text))
+        total_upper = sum(map(str.isupper, text))
         
         if total_alpha == 0:
             return "none"
@@ -336,19 +375,10 @@ class ImplicitFeedbackAnalyzer:
             return "none"
         
         # Check context: is it emphasis or frustration?
-        text_lower = text.lower()
-        
-        # Check for emphasis context
-        is_emphasis = any(ctx in text_lower for ctx in self.EMPHASIS_CONTEXT)
-        
-        # Check for frustration signals
-        frustration_signals = [
-            "!!!", "?!",  # Multiple punctuation
-            "блин", "черт", "damn", "hell",  # Mild swearing
-            "сколько раз", "я же", "опять",  # Repetition frustration
-            "почему ты не", "зачем ты",  # Questioning actions
-        ]
-        has_frustration = any(sig in text_lower for sig in frustration_signals)
+        if signals is None:
+            signals = self._matcher.labels(text.lower())
+        is_emphasis = "emphasis" in signals
+        has_frustration = "frustration" in signals
         
         # Decision logic
         if has_frustration or already_negative:
@@ -364,14 +394,22 @@ class ImplicitFeedbackAnalyzer:
             # Default to emphasis if unclear
             return "emphasis"
     
+    def _is_caps_word(self, word: str) -> bool:
+        # Remove punctuation for analysis
+        clean = ''.join(filter(str.isalpha, word))
+        if len(clean) < self.MIN_CAPS_LENGTH:
+            return False
+        upper_count = sum(map(str.isupper, clean))
+        return upper_count / len(clean) >= self.MIN_CAPS_RATIO
+    
     def get_caps_info(self, text: str) -> dict:
         """
         Get detailed caps analysis for debugging/UI.
         
         Returns dict with caps ratio, interpretation, etc.
         """
-        total_alpha = sum(1 for c in text if c.isalpha())
-        total_upper = sum(1 for c in text if c.isupper())
+        total_alpha = sum(map(str.isalpha, text))
+        total_upper = sum(map(str.isupper, text))
         
         caps_ratio = total_upper / total_alpha if total_alpha > 0 else 0
         interpretation = self._analyze_caps(text, False)
@@ -409,12 +447,26 @@ class MetricsEngine:
         "friction": 0.15
     }
     
+    # Counter-based achievements: achievement id -> metrics_counters name
+    ACHIEVEMENT_COUNTERS = {
+        "first_chat": "messages",
+        "first_thank": "positive_outcomes",
+        "memory_10": "memory_facts",
+        "memory_50": "memory_facts",
+        "week_together": "active_days",
+        "month_together": "active_days",
+        "habit_5": "active_days",
+    }
+    
     def __init__(self, db: Optional[aiosqlite.Connection] = None):
         self._db = db
         self._feedback_analyzer = ImplicitFeedbackAnalyzer()
-        self._cache: dict[str, Any] = {}
-        self._cache_ttl = 60  # seconds
-        self._last_cache_time: Optional[datetime] = None
+        self._cache: dict[str, tuple[int, datetime, Any]] = {}  # key -> (generation, time, value)
+        self._cache_ttl = 60  # seconds (profile changes are picked up by TTL)
+        self._generation = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._locked: dict[str, float] = {}  # Counter-based achievements not yet unlocked -> threshold
     
     async def initialize(self, db: aiosqlite.Connection):
         """Initialize with database connection."""
@@ -466,8 +518,119 @@ class MetricsEngine:
                 unlocked_at TIMESTAMP,
                 notified BOOLEAN DEFAULT FALSE
             );
+            
+            CREATE TABLE IF NOT EXISTS metrics_rollup_daily (
+                day DATE PRIMARY KEY,
+                total INTEGER DEFAULT 0,
+                positive INTEGER DEFAULT 0,
+                negative INTEGER DEFAULT 0,
+                corrections INTEGER DEFAULT 0,
+                util_sum REAL DEFAULT 0,
+                util_count INTEGER DEFAULT 0
+            );
         """)
+        await self._backfill_rollup()
         await self._db.commit()
+        await self._ensure_counters()
+        await self._load_locked_achievements()
+    
+    async def _backfill_rollup(self):
+        """
+        Build the daily rollup from existing outcomes (databases created
+        before the rollup existed). Every insert updates the rollup, so an
+        empty rollup next to recorded outcomes means it was never built.
+        """
+        async with self._db.execute("SELECT 1 FROM metrics_rollup_daily LIMIT 1") as cursor:
+            if await cursor.fetchone():
+                return
+        await self._db.execute("""
+            INSERT INTO metrics_rollup_daily
+            (day, total, positive, negative, corrections, util_sum, util_count)
+            SELECT 
+                session_date,
+                COUNT(*),
+                SUM(CASE WHEN implicit_positive THEN 1 ELSE 0 END),
+                SUM(CASE WHEN implicit_negative THEN 1 ELSE 0 END),
+                SUM(CASE WHEN was_correction THEN 1 ELSE 0 END),
+                SUM(CASE WHEN facts_in_context > 0 
+                    THEN CAST(facts_referenced AS REAL) / facts_in_context 
+                    ELSE 0 END),
+                SUM(CASE WHEN facts_in_context > 0 THEN 1 ELSE 0 END)
+            FROM interaction_outcomes
+            GROUP BY session_date
+        """)
+    
+    async def _ensure_counters(self):
+        """
+        Create achievement counters, seeded once from the current tables,
+        and the triggers that keep them current (one transaction, so no
+        insert lands between the seed and its trigger).
+        """
+        await self._db.executescript("""
+            BEGIN;
+            
+            CREATE TABLE IF NOT EXISTS metrics_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER DEFAULT 0
+            );
+            
+            INSERT INTO metrics_counters (name, value)
+            SELECT 'messages', (SELECT COUNT(*) FROM messages)
+            WHERE NOT EXISTS (SELECT 1 FROM metrics_counters WHERE name = 'messages');
+            INSERT INTO metrics_counters (name, value)
+            SELECT 'memory_facts', (SELECT COUNT(*) FROM memory_facts)
+            WHERE NOT EXISTS (SELECT 1 FROM metrics_counters WHERE name = 'memory_facts');
+            INSERT INTO metrics_counters (name, value)
+            SELECT 'active_days', (SELECT COUNT(*) FROM metrics_rollup_daily)
+            WHERE NOT EXISTS (SELECT 1 FROM metrics_counters WHERE name = 'active_days');
+            INSERT INTO metrics_counters (name, value)
+            SELECT 'positive_outcomes', (SELECT COALESCE(SUM(positive), 0) FROM metrics_rollup_daily)
+            WHERE NOT EXISTS (SELECT 1 FROM metrics_counters WHERE name = 'positive_outcomes');
+            
+            CREATE TRIGGER IF NOT EXISTS metrics_counters_msg_ai AFTER INSERT ON messages BEGIN
+                UPDATE metrics_counters SET value = value + 1 WHERE name = 'messages';
+            END;
+            CREATE TRIGGER IF NOT EXISTS metrics_counters_msg_ad AFTER DELETE ON messages BEGIN
+                UPDATE metrics_counters SET value = value - 1 WHERE name = 'messages';
+            END;
+            CREATE TRIGGER IF NOT EXISTS metrics_counters_fact_ai AFTER INSERT ON memory_facts BEGIN
+                UPDATE metrics_counters SET value = value + 1 WHERE name = 'memory_facts';
+            END;
+            CREATE TRIGGER IF NOT EXISTS metrics_counters_fact_ad AFTER DELETE ON memory_facts BEGIN
+                UPDATE metrics_counters SET value = value - 1 WHERE name = 'memory_facts';
+            END;
+            CREATE TRIGGER IF NOT EXISTS metrics_counters_day_ai AFTER INSERT ON metrics_rollup_daily BEGIN
+                UPDATE metrics_counters SET value = value + 1 WHERE name = 'active_days';
+                UPDATE metrics_counters SET value = value + NEW.positive WHERE name = 'positive_outcomes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS metrics_counters_day_au AFTER UPDATE OF positive ON metrics_rollup_daily BEGIN
+                UPDATE metrics_counters SET value = value + NEW.positive - OLD.positive
+                WHERE name = 'positive_outcomes';
+            END;
+            
+            COMMIT;
+        """)
+    
+    async def _load_locked_achievements(self):
+        """Remember thresholds of counter-based achievements still locked."""
+        ids = list(self.ACHIEVEMENT_COUNTERS)
+        async with self._db.execute(f"""
+            SELECT id, threshold_value FROM achievements
+            WHERE unlocked_at IS NULL AND id IN ({",".join("?" * len(ids))})
+        """, ids) as cursor:
+            self._locked = {row[0]: row[1] for row in await cursor.fetchall()}
+    
+    async def get_counters(self) -> dict[str, int]:
+        """Current achievement counters (a few primary-key rows)."""
+        async with self._db.execute("SELECT name, value FROM metrics_counters") as cursor:
+            return {row[0]: row[1] for row in await cursor.fetchall()}
+    
+    def _achievement_value(self, ach_id: str, counters: dict[str, int]) -> int:
+        """Progress value of a counter-based achievement."""
+        value = counters.get(self.ACHIEVEMENT_COUNTERS[ach_id], 0)
+        if ach_id == "habit_5":
+            return min(5, value // 3)  # Proxy for habits
+        return value
     
     def analyze_message(self, text: str) -> tuple[bool, bool, bool]:
         """
@@ -517,28 +680,75 @@ class MetricsEngine:
             message_id, today.isoformat(), was_correction, is_positive, is_negative,
             facts_in_context, facts_referenced, style_prompt_length, response_time_ms
         ))
+        
+        # Fold into today's rollup row in the same transaction
+        has_facts = facts_in_context > 0
+        await self._db.execute("""
+            INSERT INTO metrics_rollup_daily
+            (day, total, positive, negative, corrections, util_sum, util_count)
+            VALUES (?, 1, ?, ?, ?, ?, ?)
+            ON CONFLICT(day) DO UPDATE SET
+                total = total + 1,
+                positive = positive + excluded.positive,
+                negative = negative + excluded.negative,
+                corrections = corrections + excluded.corrections,
+                util_sum = util_sum + excluded.util_sum,
+                util_count = util_count + excluded.util_count
+        """, (
+            today.isoformat(), int(bool(is_positive)), int(bool(is_negative)), int(bool(was_correction)),
+            facts_referenced / facts_in_context if has_facts else 0.0, int(has_facts)
+        ))
         await self._db.commit()
         
-        # Invalidate cache (set time for TTL tracking)
-        self._cache.clear()
-        self._last_cache_time = None
+        # Invalidate cache here and in the other API workers
+        self.invalidate_cache()
+        await worker_bus.publish(TOPIC_METRICS)
         
         # Check for achievement updates
         await self._update_achievements()
     
+    def invalidate_cache(self):
+        """Mark cached scores stale by moving to a new generation (O(1))."""
+        self._generation += 1
+    
     def _is_cache_valid(self, key: str) -> bool:
-        """Check if cached value is still valid based on TTL."""
-        if key not in self._cache:
+        """Check if cached value belongs to the current generation and day, within TTL."""
+        entry = self._cache.get(key)
+        if entry is None:
             return False
-        if self._last_cache_time is None:
-            return False
-        elapsed = (datetime.now() - self._last_cache_time).total_seconds()
-        return elapsed < self._cache_ttl
+        generation, cached_at, _ = entry
+        now = datetime.now()
+        return (
+            generation == self._generation
+            and cached_at.date() == now.date()  # Day windows move at midnight
+            and (now - cached_at).total_seconds() < self._cache_ttl
+        )
     
-    def _set_cache(self, key: str, value: Any):
-        """Set cache value with timestamp."""
-        self._cache[key] = value
-        self._last_cache_time = datetime.now()
+    def _get_cache(self, key: str) -> Optional[Any]:
+        """Cached value if still valid, else None (counts hits/misses)."""
+        if self._is_cache_valid(key):
+            self._cache_hits += 1
+            return self._cache[key][2]
+        self._cache_misses += 1
+        return None
+    
+    def _set_cache(self, key: str, value: Any, generation: int):
+        """
+        Set cache value computed at `generation` (read before any await);
+        a value computed across an invalidation is dropped.
+        """
+        if generation == self._generation:
+            self._cache[key] = (generation, datetime.now(), value)
+    
+    def get_stats(self) -> dict:
+        """Score cache statistics."""
+        lookups = self._cache_hits + self._cache_misses
+        return {
+            "generation": self._generation,
+            "cache_hits": self._cache_hits,
+            "cache_misses": self._cache_misses,
+            "hit_rate": round(self._cache_hits / lookups, 2) if lookups else 0.0,
+        }
     
     async def calculate_iq(self) -> MetricResult:
         """
@@ -550,11 +760,18 @@ class MetricsEngine:
         - First-Try Rate (20%): single exchanges / total
         - Context Utilization (10%): facts_used / facts_available
         """
+        cached = self._get_cache("iq")
+        if cached is not None:
+            return cached
+        generation = self._generation
+        
         # Get recent data (last 30 days)
         data = await self._get_recent_outcomes(days=30)
         
         if not data["total"]:
-            return self._empty_result("iq")
+            result = self._empty_result("iq")
+            self._set_cache("iq", result, generation)
+            return result
         
         # Calculate components
         accuracy = data["positive"] / max(1, data["positive"] + data["negative"])
@@ -588,7 +805,7 @@ class MetricsEngine:
             context_utilization=context_util
         )
         
-        return MetricResult(
+        result = MetricResult(
             score=score,
             level=level,
             progress=progress,
@@ -596,6 +813,8 @@ class MetricsEngine:
             trend=trend,
             trend_value=trend_value
         )
+        self._set_cache("iq", result, generation)
+        return result
     
     async def calculate_empathy(self) -> MetricResult:
         """
@@ -607,6 +826,11 @@ class MetricsEngine:
         - Anticipation (20%): suggestions accepted rate
         - Friction Trend (15%): improvement in correction rate over time
         """
+        cached = self._get_cache("empathy")
+        if cached is not None:
+            return cached
+        generation = self._generation
+        
         # Get profile data
         profile_data = await self._get_profile_metrics()
         
@@ -639,7 +863,7 @@ class MetricsEngine:
             friction_trend=friction
         )
         
-        return MetricResult(
+        result = MetricResult(
             score=score,
             level=level,
             progress=progress,
@@ -647,6 +871,8 @@ class MetricsEngine:
             trend=trend,
             trend_value=trend_value
         )
+        self._set_cache("empathy", result, generation)
+        return result
     
     async def get_current_metrics(self) -> dict:
         """
@@ -676,7 +902,13 @@ class MetricsEngine:
         """) as cursor:
             rows = await cursor.fetchall()
         
+        # Stored values are written on unlock only; progress comes from the counters
+        counters = await self.get_counters()
+        
         for row in rows:
+            current = row[7] or 0
+            if row[0] in self.ACHIEVEMENT_COUNTERS:
+                current = max(current, self._achievement_value(row[0], counters))
             ach = Achievement(
                 id=row[0],
                 name=row[1],
@@ -685,7 +917,7 @@ class MetricsEngine:
                 icon=row[4],
                 threshold_type=row[5],
                 threshold_value=row[6],
-                current_value=row[7] or 0,
+                current_value=current,
                 unlocked=row[8] is not None,
                 unlocked_at=datetime.fromisoformat(row[8]) if row[8] else None,
                 notified=bool(row[9])
@@ -815,16 +1047,10 @@ class MetricsEngine:
         
         # Get today's outcomes
         async with self._db.execute("""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN implicit_positive THEN 1 ELSE 0 END) as positive,
-                SUM(CASE WHEN implicit_negative THEN 1 ELSE 0 END) as negative,
-                SUM(CASE WHEN was_correction THEN 1 ELSE 0 END) as corrections,
-                AVG(CASE WHEN facts_in_context > 0 
-                    THEN CAST(facts_referenced AS REAL) / facts_in_context 
-                    ELSE 0 END) as avg_util
-            FROM interaction_outcomes
-            WHERE session_date = ?
+            SELECT total, positive, negative, corrections,
+                   util_sum / MAX(total, 1) as avg_util
+            FROM metrics_rollup_daily
+            WHERE day = ?
         """, (today.isoformat(),)) as cursor:
             row = await cursor.fetchone()
         
@@ -850,33 +1076,33 @@ class MetricsEngine:
             row[3] or 0, row[4] or 0, iq.score, empathy.score, json.dumps(breakdown)
         ))
         await self._db.commit()
+        self.invalidate_cache()  # Trends read daily_metrics
     
     # ==================== Private Methods ====================
     
     async def _get_recent_outcomes(self, days: int = 30) -> dict:
-        """Get aggregated outcomes for recent days."""
+        """Get aggregated outcomes for recent days (from the daily rollup)."""
         since = (date.today() - timedelta(days=days)).isoformat()
         
         async with self._db.execute("""
             SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN implicit_positive THEN 1 ELSE 0 END) as positive,
-                SUM(CASE WHEN implicit_negative THEN 1 ELSE 0 END) as negative,
-                SUM(CASE WHEN was_correction THEN 1 ELSE 0 END) as corrections,
-                AVG(CASE WHEN facts_in_context > 0 
-                    THEN CAST(facts_referenced AS REAL) / facts_in_context 
-                    ELSE 0.5 END) as avg_util
-            FROM interaction_outcomes
-            WHERE session_date >= ?
+                SUM(total), SUM(positive), SUM(negative), SUM(corrections),
+                SUM(util_sum), SUM(util_count)
+            FROM metrics_rollup_daily
+            WHERE day >= ?
         """, (since,)) as cursor:
             row = await cursor.fetchone()
         
+        total = row[0] or 0
+        # Interactions without facts in context count as 0.5 utilization
+        avg_util = ((row[4] or 0) + 0.5 * (total - (row[5] or 0))) / total if total else 0.5
+        
         return {
-            "total": row[0] or 0,
+            "total": total,
             "positive": row[1] or 0,
             "negative": row[2] or 0,
             "corrections": row[3] or 0,
-            "avg_context_util": row[4] or 0.5
+            "avg_context_util": avg_util or 0.5
         }
     
     async def _get_profile_metrics(self) -> dict:
@@ -905,38 +1131,22 @@ class MetricsEngine:
         ]
         completeness = sum(completeness_factors) / len(completeness_factors)
         
+        week = await self._get_recent_outcomes(days=7)
+        
         # Mood success: Calculate from actual feedback data
         # Good mood detection = fewer negative signals after responses
-        async with self._db.execute("""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN implicit_negative THEN 1 ELSE 0 END) as negative
-            FROM interaction_outcomes
-            WHERE session_date >= date('now', '-7 days')
-        """) as cursor:
-            mood_row = await cursor.fetchone()
-        
-        if mood_row and mood_row[0] > 0:
+        if week["total"] > 0:
             # Invert negative rate: fewer negatives = better mood understanding
-            negative_rate = mood_row[1] / mood_row[0]
+            negative_rate = week["negative"] / week["total"]
             mood_success = max(0.3, min(1.0, 1 - negative_rate))
         else:
             # Cold start: default to neutral, boosted by profile completeness
             mood_success = 0.5 + completeness * 0.2
         
         # Anticipation: Based on positive feedback rate (proxy for successful predictions)
-        async with self._db.execute("""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN implicit_positive THEN 1 ELSE 0 END) as positive
-            FROM interaction_outcomes
-            WHERE session_date >= date('now', '-7 days')
-        """) as cursor:
-            ant_row = await cursor.fetchone()
-        
-        if ant_row and ant_row[0] >= 5:
+        if week["total"] >= 5:
             # Positive rate indicates we anticipated user needs correctly
-            anticipation = ant_row[1] / ant_row[0]
+            anticipation = week["positive"] / week["total"]
         else:
             # Cold start: base anticipation boosted by profile completeness
             anticipation = 0.2 + completeness * 0.3
@@ -958,13 +1168,9 @@ class MetricsEngine:
         prev_week_start = (today - timedelta(days=14)).isoformat()
         
         async with self._db.execute("""
-            SELECT 
-                session_date,
-                SUM(CASE WHEN was_correction THEN 1 ELSE 0 END) as corrections,
-                COUNT(*) as total
-            FROM interaction_outcomes
-            WHERE session_date >= ?
-            GROUP BY session_date
+            SELECT day, corrections, total
+            FROM metrics_rollup_daily
+            WHERE day >= ?
         """, (prev_week_start,)) as cursor:
             rows = await cursor.fetchall()
         
@@ -1052,50 +1258,35 @@ class MetricsEngine:
         return level, progress
     
     async def _update_achievements(self):
-        """Check and update achievement progress."""
-        # Get counts for achievements
-        async with self._db.execute("SELECT COUNT(*) FROM messages") as cursor:
-            msg_count = (await cursor.fetchone())[0]
-        
-        async with self._db.execute("SELECT COUNT(*) FROM memory_facts") as cursor:
-            fact_count = (await cursor.fetchone())[0]
-        
-        async with self._db.execute(
-            "SELECT COUNT(DISTINCT session_date) FROM interaction_outcomes"
-        ) as cursor:
-            active_days = (await cursor.fetchone())[0]
-        
-        async with self._db.execute("""
-            SELECT COUNT(*) FROM interaction_outcomes WHERE implicit_positive = TRUE
-        """) as cursor:
-            positive_count = (await cursor.fetchone())[0]
-        
-        # Update achievement values
-        updates = [
-            ("first_chat", msg_count),
-            ("first_thank", positive_count),
-            ("memory_10", fact_count),
-            ("memory_50", fact_count),
-            ("week_together", active_days),
-            ("month_together", active_days),
-            ("habit_5", min(5, active_days // 3)),  # Proxy for habits
-        ]
+        """
+        Unlock counter-based achievements whose counter reached the threshold.
         
-        for ach_id, value in updates:
-            await self._db.execute("""
-                UPDATE achievements 
-                SET current_value = ?
-                WHERE id = ? AND (unlocked_at IS NULL OR current_value < ?)
-            """, (value, ach_id, value))
-            
-            # Check if newly unlocked
-            await self._db.execute("""
-                UPDATE achievements
-                SET unlocked_at = CURRENT_TIMESTAMP
-                WHERE id = ? AND current_value >= threshold_value AND unlocked_at IS NULL
-            """, (ach_id,))
+        Reads the counter rows only; achievements are written (in one
+        statement) just when one of them crosses a threshold.
+        """
+        if not self._locked:
+            return
+        counters = await self.get_counters()
+        due = {}
+        for ach_id, threshold in self._locked.items():
+            value = self._achievement_value(ach_id, counters)
+            if value >= threshold:
+                due[ach_id] = value
+        if not due:
+            return
         
+        values = ", ".join("(?, ?)" for _ in due)
+        params = [item for pair in due.items() for item in pair]
+        await self._db.execute(f"""
+            WITH due(id, value) AS (VALUES {values})
+            UPDATE achievements
+            SET current_value = (SELECT value FROM due WHERE due.id = achievements.id),
+                unlocked_at = COALESCE(unlocked_at, CURRENT_TIMESTAMP)
+            WHERE id IN (SELECT id FROM due)
+        """, params)
         await self._db.commit()
+        for ach_id in due:
+            del self._locked[ach_id]
     
     def _empty_result(self, metric_type: str) -> MetricResult:
         """Return empty result for cold start."""
@@ -0,0 +1,296 @@
+"""
+Retention and downsampling for interaction_outcomes.
+
+interaction_outcomes gains one row per message. Scores are computed from
+`metrics_rollup_daily` (kept forever, see metrics), so raw rows are only
+needed for recent detail. Once a day is older than
+`config.metrics_retention.raw_days` its rows are:
+
+1. exported to data_dir/metrics_export/interaction_outcomes.<day>.parquet
+   (.csv when pyarrow is not installed) for offline analysis. The file is
+   written under a temporary name and linked into place only if no file
+   for the day exists yet, so an export file is always complete;
+2. folded into `metrics_rollup_hourly` and deleted, `batch_rows` rows per
+   transaction: a row's hourly counts and its deletion commit together.
+
+A pass interrupted while deleting finds the day's export file on the next
+run and continues with the deletes. hourly() serves one series across
+both: rolled-up hours and hours still in the raw table.
+
+Usage:
+    await metrics_retention.initialize(memory._db)
+    report = await metrics_retention.run()
+    series = await metrics_retention.hourly(since="2025-01-01")
+"""
+import asyncio
+import csv
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional
+
+import aiosqlite
+
+from .config import config
+from .logger import log
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+COLUMNS = (
+    "id", "message_id", "session_date", "was_correction", "implicit_positive", "implicit_negative",
+    "facts_in_context", "facts_referenced", "style_prompt_length", "response_time_ms", "recorded_at",
+)
+MIN_RAW_DAYS = 7  # The adaptive prompt reads the last week of raw outcomes
+
+# recorded_at is UTC (CURRENT_TIMESTAMP); hours are local like session_date
+_HOUR_SQL = "strftime('%Y-%m-%d %H:00', recorded_at, 'localtime')"
+_AGGREGATE_SQL = """
+    COUNT(*),
+    SUM(CASE WHEN implicit_positive THEN 1 ELSE 0 END),
+    SUM(CASE WHEN implicit_negative THEN 1 ELSE 0 END),
+    SUM(CASE WHEN was_correction THEN 1 ELSE 0 END),
+    SUM(CASE WHEN facts_in_context > 0
+        THEN CAST(facts_referenced AS REAL) / facts_in_context
+        ELSE 0 END),
+    SUM(CASE WHEN facts_in_context > 0 THEN 1 ELSE 0 END),
+    COALESCE(SUM(response_time_ms), 0),
+    COUNT(response_time_ms)
+"""
+_HOURLY_COLUMNS = (
+    "hour", "total", "positive", "negative", "corrections",
+    "util_sum", "util_count", "response_ms_sum", "response_count",
+)
+
+
+@dataclass
+class RetentionReport:
+    """What one retention pass did."""
+    days: list[str] = field(default_factory=list)   # Days whose raw rows were expired
+    rows_deleted: int = 0
+    files: list[str] = field(default_factory=list)  # Export files written
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def export_format() -> str:
+    """Configured export format, "auto" resolved by whether pyarrow is installed."""
+    fmt = config.metrics_retention.export_format
+    if fmt == "auto":
+        return "parquet" if HAS_PYARROW else "csv"
+    if fmt == "parquet" and not HAS_PYARROW:
+        raise ImportError("pyarrow not installed. Run: pip install pyarrow")
+    if fmt not in ("parquet", "csv"):
+        raise ValueError(f"Unknown metrics export format: {fmt}")
+    return fmt
+
+
+def write_export(path: Path, rows: list[tuple], fmt: str) -> bool:
+    """
+    Write rows (in COLUMNS order) to `path` unless it already exists;
+    returns False if it did (the first complete file wins).
+    """
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        if fmt == "parquet":
+            table = pyarrow.table({name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)})
+            pyarrow.parquet.write_table(table, str(tmp), compression="zstd")
+        else:
+            with open(tmp, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+                writer.writerows(rows)
+        try:
+            os.link(tmp, path)  # Fails if another worker published the day first
+        except FileExistsError:
+            return False
+        return True
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+class MetricsRetention:
+    """Expires old interaction_outcomes rows into hourly aggregates and export files."""
+
+    def __init__(self):
+        self._db: Optional[aiosqlite.Connection] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()  # One pass at a time in this worker
+        self._runs = 0
+        self._rows_deleted = 0
+        self._files_written = 0
+        self._last_run_at: Optional[float] = None
+
+    @property
+    def export_dir(self) -> Path:
+        return config.data_dir / config.metrics_retention.export_dir_name
+
+    async def initialize(self, db: aiosqlite.Connection, start: Optional[bool] = None):
+        """Create the hourly rollup and start periodic retention passes."""
+        self._db = db
+        await self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS metrics_rollup_hourly (
+                hour TEXT PRIMARY KEY,
+                total INTEGER DEFAULT 0,
+                positive INTEGER DEFAULT 0,
+                negative INTEGER DEFAULT 0,
+                corrections INTEGER DEFAULT 0,
+                util_sum REAL DEFAULT 0,
+                util_count INTEGER DEFAULT 0,
+                response_ms_sum INTEGER DEFAULT 0,
+                response_count INTEGER DEFAULT 0
+            );
+        """)
+        await self._db.commit()
+        if start if start is not None else config.metrics_retention.enabled:
+            self._loop_task = asyncio.create_task(self._retention_loop())
+
+    # ============= Retention =============
+
+    async def run(self, today: Optional[date] = None) -> RetentionReport:
+        """Export, roll up and delete the raw rows of every day past the retention window."""
+        settings = config.metrics_retention
+        keep_days = max(settings.raw_days, MIN_RAW_DAYS)
+        cutoff = ((today or date.today()) - timedelta(days=keep_days)).isoformat()
+        report = RetentionReport()
+        async with self._lock:
+            async with self._db.execute(
+                "SELECT DISTINCT session_date FROM interaction_outcomes WHERE session_date < ? ORDER BY session_date",
+                (cutoff,)
+            ) as cursor:
+                days = [row[0] for row in await cursor.fetchall()]
+
+            for day in days:
+                if settings.export:
+                    path = await self._export(day)
+                    if path is not None:
+                        report.files.append(str(path))
+                report.rows_deleted += await self._expire(day, settings.batch_rows)
+                report.days.append(day)
+
+        self._runs += 1
+        self._rows_deleted += report.rows_deleted
+        self._files_written += len(report.files)
+        self._last_run_at = time.time()
+        if report.days:
+            log.debug(f"Metrics retention: {report.to_dict()}")
+        return report
+
+    async def _export(self, day: str) -> Optional[Path]:
+        """Write the day's raw rows to a file; None if one exists already."""
+        if list(self.export_dir.glob(f"interaction_outcomes.{day}.*")):
+            return None  # Exported by a pass that was interrupted while deleting
+        fmt = export_format()
+        async with self._db.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM interaction_outcomes WHERE session_date = ? ORDER BY id",
+            (day,)
+        ) as cursor:
+            rows = [tuple(row) for row in await cursor.fetchall()]
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        path = self.export_dir / f"interaction_outcomes.{day}.{fmt}"
+        written = await asyncio.to_thread(write_export, path, rows, fmt)
+        return path if written else None
+
+    async def _expire(self, day: str, batch_rows: int) -> int:
+        """Fold the day's rows into the hourly rollup and delete them, one batch per transaction."""
+        deleted = 0
+        while True:
+            # Highest id of the next batch (ids in index order within the day)
+            async with self._db.execute(
+                "SELECT id FROM interaction_outcomes WHERE session_date = ? ORDER BY id LIMIT 1 OFFSET ?",
+                (day, max(1, batch_rows) - 1)
+            ) as cursor:
+                row = await cursor.fetchone()
+            last_id = row[0] if row else None
+            where = "session_date = ?" + (" AND id <= ?" if last_id is not None else "")
+            params = (day, last_id) if last_id is not None else (day,)
+
+            await self._db.execute(f"""
+                INSERT INTO metrics_rollup_hourly ({', '.join(_HOURLY_COLUMNS)})
+                SELECT {_HOUR_SQL}, {_AGGREGATE_SQL}
+                FROM interaction_outcomes
+                WHERE {where}
+                GROUP BY 1
+                ON CONFLICT(hour) DO UPDATE SET
+                    total = total + excluded.total,
+                    positive = positive + excluded.positive,
+                    negative = negative + excluded.negative,
+                    corrections = corrections + excluded.corrections,
+                    util_sum = util_sum + excluded.util_sum,
+                    util_count = util_count + excluded.util_count,
+                    response_ms_sum = response_ms_sum + excluded.response_ms_sum,
+                    response_count = response_count + excluded.response_count
+            """, params)
+            cursor = await self._db.execute(f"DELETE FROM interaction_outcomes WHERE {where}", params)
+            await self._db.commit()
+            deleted += cursor.rowcount
+            if last_id is None:
+                return deleted
+            await asyncio.sleep(0)  # Requests get the shared connection between batches
+
+    async def _retention_loop(self):
+        while True:
+            try:
+                await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"Metrics retention failed: {e}")
+            await asyncio.sleep(config.metrics_retention.interval_seconds)
+
+    async def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+
+    # ============= Reads =============
+
+    async def hourly(self, since: str, until: Optional[str] = None) -> list[dict]:
+        """
+        Hourly outcome totals for local hours in [since, until) ("YYYY-MM-DD"
+        or "YYYY-MM-DD HH:00"): rolled-up hours and hours still in the raw table.
+        """
+        until = until or "9999-12-31"  # A date: "9999" would compare as a number with session_date
+        sums = ", ".join(f"SUM({name}) AS {name}" for name in _HOURLY_COLUMNS[1:])
+        async with self._db.execute(f"""
+            SELECT hour, {sums} FROM (
+                SELECT {', '.join(_HOURLY_COLUMNS)} FROM metrics_rollup_hourly
+                WHERE hour >= ? AND hour < ?
+                UNION ALL
+                SELECT {_HOUR_SQL} AS hour, {_AGGREGATE_SQL}
+                FROM interaction_outcomes
+                WHERE session_date >= ? AND session_date <= ?
+                GROUP BY 1
+                HAVING hour >= ? AND hour < ?
+            )
+            GROUP BY hour
+            ORDER BY hour
+        """, (since, until, since[:10], until[:10], since, until)) as cursor:
+            rows = await cursor.fetchall()
+        return [dict(zip(_HOURLY_COLUMNS, row)) for row in rows]
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self._loop_task is not None and not self._loop_task.done(),
+            "raw_days": max(config.metrics_retention.raw_days, MIN_RAW_DAYS),
+            "runs": self._runs,
+            "rows_deleted": self._rows_deleted,
+            "files_written": self._files_written,
+            "last_run_at": self._last_run_at,
+            "export_format": config.metrics_retention.export_format if config.metrics_retention.export else None,
+            "pyarrow": HAS_PYARROW,
+        }
+
+
+# Global instance
+metrics_retention = MetricsRetention()
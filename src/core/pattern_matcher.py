@@ -0,0 +1,246 @@
+"""
+Multi-pattern matcher for text signals.
+
+Finds every occurrence of many labelled patterns in one pass over the text,
+with positions, so analyzers can both decide ("is there a correction?") and
+explain ("because of 'не то' at 12-17").
+
+- Literal patterns (substring semantics, like `sig in text`) are compiled
+  into one regex shaped like their trie: at each position at most one
+  branch is followed, so the scan costs about one C-level trie walk per
+  character. The longest literal found at a position is expanded to the
+  shorter literals that are its prefixes (e.g. "не то" inside
+  "не то что я просил"), so overlapping signals are all reported.
+- Regex patterns are joined into one alternation. At each position p it
+  matches, the patterns are tried at p on their own (to name them) and the
+  scan resumes at p + 1, so the set of reported (pattern, position) pairs
+  is the same as running each pattern on its own. matched() and first()
+  need one occurrence per pattern, so patterns are dropped once found (or
+  once they can no longer win). The alternation is recompiled without them
+  only after REBUILD_AFTER hits that found nothing new: a log repeating one
+  signal costs about as much as a text without it, and a text where every
+  signal occurs once compiles nothing.
+
+The regex engine skips ahead by first character only when every branch
+starts with a literal or class, so a leading \\b or ^ is moved after the
+pattern's first character in the alternation (`\\bmaybe` -> `m(?<!\\w[\\s\\S])aybe`).
+Capturing groups around the branches and IGNORECASE disable that skip as
+well (about 10x slower on long text): lowercase the text instead.
+
+Usage:
+    matcher = PatternMatcher([("positive", "спасибо"), ("negative", "не то")])
+    for m in matcher.finditer(text.lower()):
+        print(m.label, m.pattern, m.start, m.end)
+    if "negative" in matcher.labels(text.lower()):
+        ...
+"""
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+
+@dataclass(frozen=True)
+class SignalMatch:
+    """One occurrence of a pattern."""
+    label: str
+    pattern: str
+    start: int
+    end: int
+    index: int  # Position of the pattern in the list it was built from
+
+    def to_dict(self) -> dict:
+        return {"label": self.label, "pattern": self.pattern, "start": self.start, "end": self.end}
+
+
+REBUILD_AFTER = 8  # Wasted alternation hits before it is recompiled without found patterns
+
+# A leading \b or ^ followed by one atom (a character or \d-style escape), optionally "+"
+_LEADING_ANCHOR = re.compile(r"^(\\b|\^)(\\(?:[dswDSW]|\W)|[^\\\[\](){}.*+?^$|])(\+?)(?![*?{])")
+
+
+def _late_anchor(pattern: str, flags: int) -> str:
+    """
+    Same pattern with a leading \\b/^ checked after the first atom, so the
+    combined regex can skip positions by first character.
+    """
+    m = _LEADING_ANCHOR.match(pattern)
+    if m is None:
+        return pattern
+    anchor, atom, plus = m.groups()
+    if anchor == r"\b":
+        if not re.fullmatch(r"\w", atom):
+            return pattern
+        check = r"(?<!\w[\s\S])"  # Character before the atom is not a word character
+    elif flags & re.MULTILINE:
+        check = r"(?<![^\n][\s\S])"  # Atom at the start of a line
+    else:
+        return pattern
+    return atom + check + (atom + "*" if plus else "") + pattern[m.end():]
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Regex matching the longest of `words` at a position, shaped like their trie."""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # End of a word
+
+    def emit(node: dict) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A word ends here too: the longer continuation is optional (greedy)
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+
+class PatternMatcher:
+    """Compiled set of labelled patterns, matched in one pass."""
+
+    def __init__(
+        self,
+        patterns: Iterable[tuple[str, str]],
+        regex: bool = False,
+        flags: int = 0
+    ):
+        """
+        Args:
+            patterns: (label, pattern) pairs; order is kept in SignalMatch.index
+            regex: patterns are regular expressions (else literal substrings,
+                matched case-sensitively: lowercase the text first)
+            flags: re flags for regex patterns
+        """
+        self.patterns = [(label, pattern) for label, pattern in patterns if pattern]
+        self.regex = regex
+        self._all_labels = frozenset(label for label, _ in self.patterns)
+
+        if regex:
+            self._flags = flags
+            self._compiled = [re.compile(p, flags) for _, p in self.patterns]
+            self._scan = self._alternation(range(len(self.patterns)))
+        else:
+            self._literals: dict[str, list[tuple[int, str]]] = {}  # literal -> [(index, label)]
+            for i, (label, literal) in enumerate(self.patterns):
+                self._literals.setdefault(literal, []).append((i, label))
+            self._lengths = sorted({len(literal) for literal in self._literals})
+            self._scan = re.compile(_trie_regex(self._literals) or "(?!)")
+
+    def finditer(self, text: str, pos: int = 0) -> Iterator[SignalMatch]:
+        """Every occurrence of every pattern, ordered by start position."""
+        search = self._scan.search
+        while True:
+            m = search(text, pos)
+            if m is None:
+                return
+            start = m.start()
+            if self.regex:
+                yield from self._regex_matches(text, start, range(len(self.patterns)))
+            else:
+                found = m.group()
+                for length in self._lengths:
+                    if length > len(found):
+                        break
+                    for index, label in self._literals.get(found[:length], ()):
+                        yield SignalMatch(label, found[:length], start, start + length, index)
+            pos = start + 1
+
+    def _alternation(self, indices: Iterable[int]) -> re.Pattern:
+        """One regex for the given patterns (compiled regexes are cached by re)."""
+        source = "|".join(f"(?:{_late_anchor(self.patterns[i][1], self._flags)})" for i in indices)
+        return re.compile(source or "(?!)", self._flags)
+
+    def _regex_matches(self, text: str, start: int, candidates: Iterable[int]) -> Iterator[SignalMatch]:
+        """Candidate patterns matching at `start` (where the alternation matched)."""
+        for index in candidates:
+            m = self._compiled[index].match(text, start)
+            if m is not None:
+                label, pattern = self.patterns[index]
+                yield SignalMatch(label, pattern, start, m.end(), index)
+
+    def find_all(self, text: str) -> list[SignalMatch]:
+        return list(self.finditer(text))
+
+    def labels(self, text: str, wanted: Optional[Iterable[str]] = None) -> set[str]:
+        """Labels present in the text; stops early once all `wanted` labels are seen."""
+        wanted = self._all_labels if wanted is None else frozenset(wanted)
+        found: set[str] = set()
+        for m in self.finditer(text):
+            found.add(m.label)
+            if wanted <= found:
+                break
+        return found
+
+    def matched(
+        self,
+        text: str,
+        pos: int = 0,
+        exclude: Iterable[int] = (),
+        partial: bool = False
+    ) -> dict[int, SignalMatch]:
+        """
+        First occurrence of each pattern that occurs, by pattern index.
+        
+        Args:
+            pos: first start position (earlier text is context for \\b and ^)
+            exclude: pattern indices not to look for (already found)
+            partial: `text` is the tail of a growing stream; matches reaching
+                its end may still change (a trailing \\b) and are not reported
+        """
+        if self.regex:
+            return self._distinct(text, False, pos, exclude, partial)
+        skip = set(exclude)
+        first: dict[int, SignalMatch] = {}
+        for m in self.finditer(text, pos):
+            if m.index not in skip and not (partial and m.end == len(text)):
+                first.setdefault(m.index, m)
+        return first
+
+    def first(self, text: str) -> Optional[SignalMatch]:
+        """First occurrence of the lowest-index pattern that occurs anywhere."""
+        found = self._distinct(text, priority=True) if self.regex else self.matched(text)
+        return found[min(found)] if found else None
+
+    def _distinct(
+        self,
+        text: str,
+        priority: bool,
+        pos: int = 0,
+        exclude: Iterable[int] = (),
+        partial: bool = False
+    ) -> dict[int, SignalMatch]:
+        """
+        One forward scan keeping only patterns still worth finding: those not
+        found yet, or (priority) those ranked above the best found so far.
+        """
+        skip = set(exclude)
+        remaining = [i for i in range(len(self.patterns)) if i not in skip]
+        scan = self._scan
+        scanned = len(self.patterns)  # Patterns in `scan`
+        wasted = 0
+        found: dict[int, SignalMatch] = {}
+        while remaining:
+            m = scan.search(text, pos)
+            if m is None:
+                break
+            start = m.start()
+            new = False
+            for match in self._regex_matches(text, start, remaining):
+                if not (partial and match.end == len(text)) and match.index not in found:
+                    found[match.index] = match
+                    new = True
+            pos = start + 1
+            if new:
+                if priority:
+                    best = min(found)
+                    remaining = [i for i in remaining if i < best]
+                else:
+                    remaining = [i for i in remaining if i not in found]
+            elif scanned != len(remaining):
+                wasted += 1
+                if wasted >= REBUILD_AFTER:
+                    scan, scanned, wasted = self._alternation(remaining), len(remaining), 0
+        return found
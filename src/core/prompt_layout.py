@@ -0,0 +1,169 @@
+"""
+Prompt Layout Engine for MAX AI Assistant.
+
+Orders prompt segments from most to least stable so the local LLM server
+can reuse its KV cache for the shared prefix between turns:
+
+    1. Static system prompt (+ thinking mode instructions)
+    2. User profile / adaptive style      (changes rarely)
+    3. Memory: summary + known facts      (changes slowly)
+    4. Conversation history               (append-only)
+    5. Per-turn RAG context + the query   (changes every turn)
+
+Segments 1-3 are merged into one leading system message (some chat
+templates accept only one), RAG context travels with the final user
+message. PrefixTracker reports how much of each prompt is identical to
+the previous turn of the same conversation.
+"""
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+
+# Separator between messages when measuring prefix reuse
+_MESSAGE_SEP = "\x00"
+
+
+@dataclass
+class PrefixReport:
+    """Prefix reuse of one prompt against the previous turn."""
+    prompt_chars: int
+    reused_chars: int
+    head_stable: bool  # Leading system message unchanged
+
+    @property
+    def ratio(self) -> float:
+        return self.reused_chars / self.prompt_chars if self.prompt_chars else 0.0
+
+
+class PrefixTracker:
+    """
+    Tracks per-conversation prompt prefixes.
+
+    Keeps the previous prompt of up to `max_conversations` conversations
+    (LRU) and compares the next prompt against it.
+    """
+
+    def __init__(self, max_conversations: int = 64):
+        self._max_conversations = max_conversations
+        self._previous: OrderedDict[str, tuple[str, list[str]]] = OrderedDict()
+
+        # Aggregate stats
+        self._turns = 0
+        self._compared_turns = 0
+        self._ratio_sum = 0.0
+        self._head_changes = 0
+
+    def observe(self, conversation_id: str, messages: list[dict]) -> PrefixReport:
+        """Record a prompt and report its reuse of the previous turn's prompt."""
+        parts = [f"{m.get('role', '')}\n{m.get('content') or ''}{_MESSAGE_SEP}" for m in messages]
+        head_hash = hashlib.sha1(parts[0].encode()).hexdigest() if parts else ""
+        prompt_chars = sum(len(p) for p in parts)
+
+        previous = self._previous.pop(conversation_id, None)
+        self._previous[conversation_id] = (head_hash, parts)
+        while len(self._previous) > self._max_conversations:
+            self._previous.popitem(last=False)
+
+        self._turns += 1
+        if previous is None:
+            return PrefixReport(prompt_chars=prompt_chars, reused_chars=0, head_stable=False)
+
+        prev_hash, prev_parts = previous
+        reused = 0
+        for new, old in zip(parts, prev_parts):
+            if new == old:
+                reused += len(new)
+                continue
+            reused += _common_prefix_len(new, old)
+            break
+
+        report = PrefixReport(
+            prompt_chars=prompt_chars,
+            reused_chars=reused,
+            head_stable=(head_hash == prev_hash)
+        )
+        self._compared_turns += 1
+        self._ratio_sum += report.ratio
+        if not report.head_stable:
+            self._head_changes += 1
+        return report
+
+    def forget(self, conversation_id: str):
+        """Drop tracking state for a conversation."""
+        self._previous.pop(conversation_id, None)
+
+    def get_stats(self) -> dict:
+        """Get aggregate prefix reuse statistics."""
+        return {
+            "tracked_conversations": len(self._previous),
+            "turns": self._turns,
+            "avg_prefix_reuse": round(self._ratio_sum / self._compared_turns, 3) if self._compared_turns else 0.0,
+            "head_changes": self._head_changes,
+        }
+
+
+def _common_prefix_len(a: str, b: str) -> int:
+    """Length of the common prefix (binary search over C-level slice compares)."""
+    n = min(len(a), len(b))
+    if a[:n] == b[:n]:
+        return n
+    lo, hi = 0, n  # a[:lo] == b[:lo], a[:hi] != b[:hi]
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+class PromptLayout:
+    """Builds chat messages ordered from most to least stable segment."""
+
+    def __init__(self, tracker: Optional[PrefixTracker] = None):
+        self.tracker = tracker or PrefixTracker()
+
+    def build(
+        self,
+        query: str,
+        system: str = "",
+        profile: str = "",
+        memory: str = "",
+        history: Optional[list[dict]] = None,
+        retrieval: str = ""
+    ) -> list[dict]:
+        """
+        Assemble messages for one turn.
+
+        Args:
+            query: Current user message
+            system: Static system prompt (incl. thinking mode suffix)
+            profile: User profile / adaptive style prompt
+            memory: Conversation summary and known facts
+            history: Previous conversation messages (oldest first). A
+                trailing copy of `query` (already saved to memory) is dropped.
+            retrieval: Per-turn RAG context
+        """
+        messages = []
+
+        head = "\n\n".join(part for part in (system, profile, memory) if part)
+        if head:
+            messages.append({"role": "system", "content": head})
+
+        history = history or []
+        if history and history[-1].get("role") == "user" and history[-1].get("content") == query:
+            history = history[:-1]
+        messages.extend(history)
+
+        content = f"{retrieval}\n\n{query}" if retrieval else query
+        messages.append({"role": "user", "content": content})
+        return messages
+
+    def get_stats(self) -> dict:
+        return self.tracker.get_stats()
+
+
+# Global layout engine
+prompt_layout = PromptLayout()
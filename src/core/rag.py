@@ -3,34 +3,41 @@ RAG (Retrieval-Augmented Generation) Engine.
 
 Features:
 - Load documents: PDF, DOCX, TXT, MD
-- Chunk text with overlap
+- Token-accurate, structure-aware chunking with overlap (see chunker)
 - Vector index via embeddings
 - Semantic search across documents
+- Content hashing: identical files are not indexed twice, identical
+  chunks (across documents and versions) share one embedding row, and
+  re-indexing a changed file only embeds the chunks that changed
+- Hybrid retrieval for prompt context: vector + FTS5 keyword candidates,
+  MMR diversity, optional cached rerank, neighbour merge (see retrieval)
+- Collections: documents go to "default" (chunks in SQLite) or to a named
+  collection, which can keep chunk text and embeddings in a memory-mapped
+  segment store instead of max.db (see chunk_store)
 """
+import asyncio
+import hashlib
+import re
 import uuid
 import json
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
-from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from dataclasses import asdict, dataclass, field
 
 import aiosqlite
-import tiktoken
+import numpy as np
 
-# Document parsers
-try:
-    import fitz  # PyMuPDF
-    HAS_PYMUPDF = True
-except ImportError:
-    HAS_PYMUPDF = False
-
-try:
-    from docx import Document as DocxDocument
-    HAS_DOCX = True
-except ImportError:
-    HAS_DOCX = False
+# Document parsers (PyMuPDF, python-docx, see doc_parsing) and tiktoken are
+# imported on first use: they dominate import time and most requests never need them
 
+from .chunk_store import SegmentStore
+from .chunker import TextChunk, chunker, get_tokenizer
 from .config import config
+from .doc_parsing import document_parser
 from .lm_client import lm_client
+from .logger import log
+from .retrieval import RetrievalPipeline
 
 
 def _escape_like(query: str) -> str:
@@ -38,6 +45,75 @@ def _escape_like(query: str) -> str:
     return query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 
+def content_hash(text: str) -> str:
+    """Hash identifying a chunk's content (key of its shared embedding)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path: Path) -> str:
+    """SHA-256 of a file's bytes (read in blocks; run it in a thread)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_WORD = re.compile(r"\w+")
+_COLLECTION_NAME = re.compile(r"^[\w\-]{1,64}$")
+
+DEFAULT_COLLECTION = "default"
+STORAGES = ("sqlite", "segments")
+
+Embedder = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+# Chunk rows with their (shared or, for rows not yet migrated, inline) embedding
+_CHUNK_SELECT = """SELECT c.id, c.document_id, c.content, c.chunk_index, c.tokens,
+                          c.page, c.heading_path, c.char_start, c.char_end, c.content_hash,
+                          c.store_slot, COALESCE(e.embedding, c.embedding) AS embedding,
+                          d.filename AS source_filename, d.collection
+                   FROM document_chunks c
+                   JOIN documents d ON c.document_id = d.id
+                   LEFT JOIN chunk_embeddings e ON e.content_hash = c.content_hash"""
+
+SQL_BATCH = 500  # Host parameters per IN (...) list
+STORE_LOCK_POLL = 0.05  # Seconds between tries for a segment store held by another worker
+
+# Columns copied from document_chunks_staging when a re-index is swapped in
+_STAGED_COLUMNS = ("content, content_hash, chunk_index, tokens, page, heading_path, "
+                   "char_start, char_end, store_slot")
+
+
+def _chunk_from_row(row: aiosqlite.Row, score: float) -> "Chunk":
+    return Chunk(
+        id=row["id"],
+        document_id=row["document_id"],
+        content=row["content"],
+        chunk_index=row["chunk_index"],
+        tokens=row["tokens"],
+        score=score,
+        source_filename=row["source_filename"],
+        page=row["page"],
+        heading_path=row["heading_path"] or "",
+        char_start=row["char_start"],
+        char_end=row["char_end"],
+        content_hash=row["content_hash"],
+    )
+
+
+def _document_from_row(row: aiosqlite.Row) -> "Document":
+    return Document(
+        id=row["id"],
+        filename=row["filename"],
+        file_path=row["file_path"],
+        file_type=row["file_type"],
+        chunk_count=row["chunk_count"],
+        created_at=row["created_at"],
+        content_hash=row["content_hash"],
+        collection=row["collection"] or DEFAULT_COLLECTION,
+    )
+
+
 @dataclass
 class Document:
     """Represents an indexed document."""
@@ -47,6 +123,22 @@ class Document:
     file_type: str
     chunk_count: int
     created_at: Optional[str] = None
+    content_hash: Optional[str] = None  # SHA-256 of the indexed file
+    collection: str = DEFAULT_COLLECTION
+
+
+@dataclass
+class IndexReport:
+    """Outcome of indexing or re-indexing a document."""
+    document_id: str
+    status: str = "indexed"  # indexed | reindexed | unchanged
+    chunks: int = 0
+    reused: int = 0  # Chunks whose embedding already existed
+    computed: int = 0  # Chunks embedded now
+    removed: int = 0  # Chunks of the previous version no longer present
+
+    def to_dict(self) -> dict:
+        return asdict(self)
 
 
 @dataclass
@@ -59,6 +151,12 @@ class Chunk:
     tokens: int = 0
     score: float = 0.0  # Relevance score for search results
     source_filename: Optional[str] = None  # Source document filename for context
+    page: Optional[int] = None  # 1-based page (PDFs)
+    heading_path: str = ""  # Section the chunk belongs to, "Guide > Setup"
+    char_start: Optional[int] = None  # Offsets into the parsed document text
+    char_end: Optional[int] = None
+    content_hash: Optional[str] = None
+    embedding: Optional[list[float]] = field(default=None, repr=False)  # Set by get_chunks
 
 
 class RAGEngine:
@@ -70,26 +168,162 @@ class RAGEngine:
 
     def __init__(self, db: Optional[aiosqlite.Connection] = None):
         self._db = db
-        # P2 fix: Use config instead of hardcoded values
-        self._chunk_size = config.rag.chunk_size
-        self._chunk_overlap = config.rag.chunk_overlap
-        # Use tiktoken for accurate token counting
-        self._encoder = tiktoken.get_encoding("cl100k_base")
+        self._fts = False  # document_chunks_fts available
+        self.retrieval = RetrievalPipeline(self, db)
+        self._stores: dict[str, SegmentStore] = {}  # By collection, opened on use
+        self._store_locks: dict[str, asyncio.Lock] = {}
+        self._store_writers: dict[str, asyncio.Task] = {}  # Task holding store_writer()
 
     async def initialize(self, db: aiosqlite.Connection):
         """Initialize with database connection."""
         self._db = db
+        await self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS chunk_embeddings (
+                content_hash TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS rag_collections (
+                name TEXT PRIMARY KEY,
+                storage TEXT NOT NULL DEFAULT 'sqlite',  -- sqlite | segments
+                store_generation INTEGER NOT NULL DEFAULT 0,  -- Live SegmentStore files
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            -- Bumped in every transaction that changes the chunk index, so
+            -- all workers see the same generation (retrieval cache key)
+            CREATE TABLE IF NOT EXISTS rag_index_generation (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                generation INTEGER NOT NULL DEFAULT 0
+            );
+            INSERT OR IGNORE INTO rag_index_generation (id, generation) VALUES (1, 0);
+
+            -- New version of a document being re-indexed, swapped into
+            -- document_chunks once complete (not searchable until then)
+            CREATE TABLE IF NOT EXISTS document_chunks_staging (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id TEXT NOT NULL,
+                content TEXT NOT NULL,
+                content_hash TEXT,
+                chunk_index INTEGER,
+                tokens INTEGER DEFAULT 0,
+                page INTEGER,
+                heading_path TEXT,
+                char_start INTEGER,
+                char_end INTEGER,
+                store_slot INTEGER
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_chunks_staging_document ON document_chunks_staging(document_id);
+            CREATE INDEX IF NOT EXISTS idx_chunks_staging_hash ON document_chunks_staging(content_hash);
+        """)
+        # Columns added after the schema was first shipped (indexed here, not
+        # in schema.sql, which also runs against databases without them)
+        migrations = {
+            "documents": (("content_hash", "TEXT"), ("collection", "TEXT DEFAULT 'default'")),
+            "document_chunks": (("page", "INTEGER"), ("heading_path", "TEXT"),
+                                ("char_start", "INTEGER"), ("char_end", "INTEGER"),
+                                ("content_hash", "TEXT"), ("store_slot", "INTEGER")),
+        }
+        indexed = {"documents": "collection", "document_chunks": "store_slot"}
+        for table, added in migrations.items():
+            async with self._db.execute(f"PRAGMA table_info({table})") as cursor:
+                columns = {row[1] for row in await cursor.fetchall()}
+            if not columns:
+                continue  # Table not created (no schema applied)
+            for column, ddl in added:
+                if column not in columns:
+                    await self._db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+            await self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_hash ON {table}(content_hash)"
+            )
+            await self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_{indexed[table]} ON {table}({indexed[table]})"
+            )
+        await self._ensure_keyword_index()
+        await self._db.commit()
+        await self._share_inline_embeddings()
+        await self.retrieval.initialize(db)
+
+    async def _ensure_keyword_index(self):
+        """
+        FTS5 index over chunk content for keyword candidates, kept in sync
+        by triggers; built from existing rows when first created.
+        """
+        async with self._db.execute(
+            "SELECT name FROM sqlite_master WHERE name IN ('document_chunks', 'document_chunks_fts')"
+        ) as cursor:
+            existing = {row[0] for row in await cursor.fetchall()}
+        if "document_chunks" not in existing:
+            return
+        try:
+            await self._db.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS document_chunks_fts USING fts5(
+                    content, content='document_chunks', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+
+                CREATE TRIGGER IF NOT EXISTS document_chunks_fts_ai AFTER INSERT ON document_chunks BEGIN
+                    INSERT INTO document_chunks_fts (rowid, content) VALUES (new.id, new.content);
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS document_chunks_fts_ad AFTER DELETE ON document_chunks BEGIN
+                    INSERT INTO document_chunks_fts (document_chunks_fts, rowid, content)
+                    VALUES ('delete', old.id, old.content);
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS document_chunks_fts_au AFTER UPDATE OF content ON document_chunks BEGIN
+                    INSERT INTO document_chunks_fts (document_chunks_fts, rowid, content)
+                    VALUES ('delete', old.id, old.content);
+                    INSERT INTO document_chunks_fts (rowid, content) VALUES (new.id, new.content);
+                END;
+            """)
+        except aiosqlite.OperationalError as e:
+            log.warn(f"RAG: FTS5 unavailable, keyword search uses LIKE ({e})")
+            return
+        if "document_chunks_fts" not in existing:
+            await self._db.execute("INSERT INTO document_chunks_fts (document_chunks_fts) VALUES ('rebuild')")
+        self._fts = True
+
+    async def _share_inline_embeddings(self):
+        """
+        One-off migration: hash chunks indexed before content hashing and
+        move their embeddings into chunk_embeddings.
+        """
+        while True:
+            async with self._db.execute(
+                "SELECT id, content, embedding FROM document_chunks WHERE content_hash IS NULL LIMIT ?",
+                (SQL_BATCH,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            if not rows:
+                return
+            hashed = [(content_hash(row["content"]), row["id"], row["embedding"]) for row in rows]
+            await self._db.executemany(
+                "INSERT OR IGNORE INTO chunk_embeddings (content_hash, embedding) VALUES (?, ?)",
+                [(h, embedding) for h, _, embedding in hashed if embedding]
+            )
+            await self._db.executemany(
+                "UPDATE document_chunks SET content_hash = ?, embedding = NULL WHERE id = ?",
+                [(h, chunk_id) for h, chunk_id, _ in hashed]
+            )
+            await self._db.commit()
 
     def count_tokens(self, text: str) -> int:
-        """Count tokens using tiktoken for accuracy."""
-        return len(self._encoder.encode(text))
-        
-    async def add_document(self, file_path: str) -> Document:
+        """Count tokens with the chunker's tokenizer (tiktoken cl100k_base when available)."""
+        return get_tokenizer().count(text)
+
+    async def add_document(self, file_path: str, collection: Optional[str] = None) -> Document:
         """
         Add and index a document.
 
+        A file whose content is already indexed (under any name) returns
+        that document; a changed file at an indexed path is re-indexed.
+
         Args:
             file_path: Path to document (PDF, DOCX, TXT, MD)
+            collection: Collection to add it to (default: "default")
 
         Returns:
             Document metadata with chunk count
@@ -98,125 +332,426 @@ class RAGEngine:
 
         if not path.exists():
             raise FileNotFoundError(f"Document not found: {file_path}")
+        if collection and not await self.get_collection(collection):
+            raise ValueError(f"Collection not found: {collection}")
+
+        digest = await asyncio.to_thread(file_hash, path)
+        existing = await self.find_by_hash(digest)
+        if existing:
+            return existing
+        existing = await self.find_document(path.name)
+        if existing and existing.file_path == str(path):
+            await self.reindex_document(existing.id, path, digest=digest)
+            return await self.get_document(existing.id)
 
-        # Logic Fix: Deduplication
-        # Check if file with same name already exists
+        # One savepoint for atomicity - its statements are undone on any error
+        doc, slots = None, []
+        async with self.store_writer(collection):
+            try:
+                async with self._savepoint():
+                    doc = await self.create_document(path, path.name, digest, collection)
+                    try:
+                        report = await self.index_file(doc.id, path)
+                        if not report.chunks:
+                            raise ValueError("Document is empty or couldn't be parsed")
+                    except BaseException:
+                        # Slots already appended to a segment store are flagged deleted
+                        slots = await self._store_slots(doc.id)
+                        raise
+                await self._db.commit()
+
+                # Update chunk count
+                doc.chunk_count = report.chunks
+                return doc
+
+            except Exception as e:
+                if doc and await self.get_document(doc.id):
+                    await self.remove_document(doc.id)  # Committed by another caller meanwhile
+                elif doc:
+                    await self._release_slots(collection, slots)
+                raise RuntimeError(f"Failed to add document: {e}") from e
+
+    async def find_document(self, filename: str) -> Optional[Document]:
+        """Indexed document with this filename, if any."""
         async with self._db.execute(
-            "SELECT id FROM documents WHERE filename = ? LIMIT 1",
-            (path.name,)
+            "SELECT * FROM documents WHERE filename = ? LIMIT 1",
+            (filename,)
         ) as cursor:
-            existing = await cursor.fetchone()
-            if existing:
-                return await self.get_document(existing["id"])
-
-        # Parse document
-        content = await self._parse_document(path)
+            row = await cursor.fetchone()
+        return _document_from_row(row) if row else None
 
-        if not content.strip():
-            raise ValueError("Document is empty or couldn't be parsed")
+    async def find_by_hash(self, digest: str) -> Optional[Document]:
+        """Indexed document with this file content hash, if any."""
+        async with self._db.execute(
+            "SELECT * FROM documents WHERE content_hash = ? LIMIT 1",
+            (digest,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return _document_from_row(row) if row else None
 
-        # Create document record
-        doc_id = str(uuid.uuid4())
+    async def create_document(
+        self,
+        path: Path,
+        filename: str,
+        digest: Optional[str] = None,
+        collection: Optional[str] = None
+    ) -> Document:
+        """Insert an empty document record (no commit); chunks are added with add_chunks."""
         doc = Document(
-            id=doc_id,
-            filename=path.name,
+            id=str(uuid.uuid4()),
+            filename=filename,
             file_path=str(path),
-            file_type=path.suffix.lower()[1:],
-            chunk_count=0
+            file_type=Path(filename).suffix.lower()[1:],
+            chunk_count=0,
+            content_hash=digest,
+            collection=collection or DEFAULT_COLLECTION
+        )
+        await self._db.execute(
+            """INSERT INTO documents (id, filename, file_path, file_type, chunk_count, content_hash, collection)
+               VALUES (?, ?, ?, ?, 0, ?, ?)""",
+            (doc.id, doc.filename, doc.file_path, doc.file_type, doc.content_hash, doc.collection)
         )
+        return doc
 
-        # Use transaction for atomicity - rollback on any error
-        try:
-            await self._db.execute(
-                """INSERT INTO documents (id, filename, file_path, file_type, chunk_count)
-                   VALUES (?, ?, ?, ?, 0)""",
-                (doc.id, doc.filename, doc.file_path, doc.file_type)
+    async def embed_chunks(
+        self,
+        chunks: list[TextChunk],
+        embed: Optional[Embedder] = None,
+        reuse: Optional[dict[str, list[float]]] = None
+    ) -> tuple[dict[str, list[float]], int]:
+        """
+        Embed the chunks whose content has no shared embedding yet.
+
+        Returns (new embeddings by content hash, number of chunks reused).
+        Chunks whose embedding failed are missing from the dict. Vectors in
+        `reuse` (by content hash) count as known and are returned as well.
+        """
+        reuse = reuse or {}
+        hashes = [content_hash(chunk.content) for chunk in chunks]
+        known = await self._known_hashes(hashes) | reuse.keys()
+        todo: dict[str, str] = {}
+        for digest, chunk in zip(hashes, chunks):
+            if digest not in known:
+                todo.setdefault(digest, chunk.content)
+        computed: dict[str, list[float]] = {h: reuse[h] for h in hashes if h in reuse}
+        if todo:
+            vectors = await (embed or lm_client.get_embeddings)(list(todo.values()))
+            computed.update((digest, vector) for digest, vector in zip(todo, vectors) if vector)
+        return computed, sum(1 for digest in hashes if digest in known)
+
+    async def _known_hashes(self, hashes: list[str]) -> set[str]:
+        known: set[str] = set()
+        unique = list(dict.fromkeys(hashes))
+        for i in range(0, len(unique), SQL_BATCH):
+            batch = unique[i:i + SQL_BATCH]
+            async with self._db.execute(
+                f"SELECT content_hash FROM chunk_embeddings WHERE content_hash IN ({','.join('?' * len(batch))})",
+                batch
+            ) as cursor:
+                known.update(row[0] for row in await cursor.fetchall())
+        return known
+
+    async def add_chunks(
+        self,
+        doc_id: str,
+        start_index: int,
+        chunks: list[TextChunk],
+        embeddings: dict[str, list[float]],
+        staged: bool = False
+    ):
+        """
+        Insert chunks `start_index..` of a document, store the newly
+        computed shared embeddings (from embed_chunks) and bump the
+        document's chunk_count (no commit, so callers decide the
+        transaction boundary). `staged` chunks go to the re-index staging
+        table instead (see reindex_document).
+
+        In a segment collection the text and vectors are appended to its
+        SegmentStore and the row keeps only metadata and the slot; hold
+        store_writer() until the rows are committed.
+        """
+        hashes = [content_hash(chunk.content) for chunk in chunks]
+        collection = await self._document_collection(doc_id)
+        store = await self._store(collection)
+        if store:
+            vectors = await self._vectors_for(hashes, embeddings)
+            async with self.store_writer(collection) as store:
+                slots = store.append([chunk.content for chunk in chunks], vectors)
+            contents = [""] * len(chunks)
+        else:
+            await self._db.executemany(
+                "INSERT OR IGNORE INTO chunk_embeddings (content_hash, embedding) VALUES (?, ?)",
+                [(digest, json.dumps(vector).encode()) for digest, vector in embeddings.items()]
             )
+            slots = [None] * len(chunks)
+            contents = [chunk.content for chunk in chunks]
+        rows = []
+        for offset, chunk in enumerate(chunks):
+            rows.append((doc_id, contents[offset], hashes[offset], start_index + offset,
+                         chunk.tokens, chunk.page, chunk.heading_path,
+                         chunk.char_start, chunk.char_end, slots[offset]))
 
-            # Chunk and index
-            chunks = self._split_into_chunks(content)
+        await self._db.executemany(
+            f"""INSERT INTO {'document_chunks_staging' if staged else 'document_chunks'}
+                (document_id, content, content_hash, chunk_index, tokens,
+                 page, heading_path, char_start, char_end, store_slot)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+        if staged:
+            return
+        await self._bump_generation()
+        await self._db.execute(
+            "UPDATE documents SET chunk_count = chunk_count + ? WHERE id = ?",
+            (len(rows), doc_id)
+        )
 
-            for i, chunk_text in enumerate(chunks):
-                # Get embedding
-                embedding = await lm_client.get_embedding(chunk_text)
-                embedding_blob = json.dumps(embedding).encode() if embedding else None
+    async def _vectors_for(
+        self,
+        hashes: list[str],
+        embeddings: dict[str, list[float]]
+    ) -> list[list[float]]:
+        """Vectors by content hash: just computed, else shared ([] if neither)."""
+        shared: dict[str, list[float]] = {}
+        missing = list(dict.fromkeys(h for h in hashes if h not in embeddings))
+        for i in range(0, len(missing), SQL_BATCH):
+            batch = missing[i:i + SQL_BATCH]
+            async with self._db.execute(
+                f"SELECT content_hash, embedding FROM chunk_embeddings "
+                f"WHERE content_hash IN ({','.join('?' * len(batch))})",
+                batch
+            ) as cursor:
+                for row in await cursor.fetchall():
+                    shared[row[0]] = json.loads(row[1].decode())
+        return [embeddings.get(h) or shared.get(h) or [] for h in hashes]
 
-                # Use real token count instead of word count
-                token_count = self.count_tokens(chunk_text)
+    async def index_file(
+        self,
+        doc_id: str,
+        path: Path,
+        embed: Optional[Embedder] = None,
+        on_batch: Optional[Callable[[IndexReport], Awaitable[None]]] = None,
+        reuse: Optional[dict[str, list[float]]] = None,
+        staged: bool = False
+    ) -> IndexReport:
+        """
+        Parse, chunk and embed a file into a document, batch by batch
+        (no commit). `on_batch` is awaited after each batch with the
+        running totals; `reuse` supplies known vectors by content hash;
+        `staged` writes to the re-index staging table.
+        """
+        report = IndexReport(document_id=doc_id)
+        batch_size = config.ingestion.embed_batch_size
+        stream = chunker.stream()
+        pending: list[TextChunk] = []
+        collection = await self._document_collection(doc_id)
 
-                await self._db.execute(
-                    """INSERT INTO document_chunks
-                       (document_id, content, embedding, chunk_index, tokens)
-                       VALUES (?, ?, ?, ?, ?)""",
-                    (doc.id, chunk_text, embedding_blob, i, token_count)
-                )
+        async def index_pending(final: bool = False):
+            nonlocal pending
+            while len(pending) >= batch_size or (final and pending):
+                batch, pending = pending[:batch_size], pending[batch_size:]
+                embeddings, reused = await self.embed_chunks(batch, embed, reuse)
+                # Segment store writes stay locked until on_batch (which may commit) returns
+                async with self.store_writer(collection):
+                    await self.add_chunks(doc_id, report.chunks, batch, embeddings, staged)
+                    report.chunks += len(batch)
+                    report.reused += reused
+                    report.computed += len(batch) - reused
+                    if on_batch:
+                        await on_batch(report)
+
+        async for text, page in document_parser.iter_pages(path):
+            pending.extend(stream.feed(text, page))
+            await index_pending()
+        pending.extend(stream.flush())
+        await index_pending(final=True)
+        return report
+
+    async def reindex_document(
+        self,
+        doc_id: str,
+        file_path: Optional[Path] = None,
+        embed: Optional[Embedder] = None,
+        digest: Optional[str] = None,
+        on_batch: Optional[Callable[[IndexReport], Awaitable[None]]] = None
+    ) -> IndexReport:
+        """
+        Re-index a document from its file (or a new version at `file_path`).
+
+        Chunks are rebuilt, but only content without a shared embedding is
+        embedded again; the report says how many chunks were reused and
+        how many recomputed.
+
+        The new version is built in document_chunks_staging (committed
+        batch by batch, never searchable) while the old one stays in
+        place. One short transaction then swaps it in and records the new
+        content hash, so a cancelled, failed or interrupted re-index
+        leaves the previous version intact and its staged chunks are
+        discarded.
+        """
+        doc = await self.get_document(doc_id)
+        if not doc:
+            raise ValueError(f"Document not found: {doc_id}")
+        path = Path(file_path or doc.file_path)
+        if not path.exists():
+            raise FileNotFoundError(f"Document file not found: {path}")
+        digest = digest or await asyncio.to_thread(file_hash, path)
+        if digest == doc.content_hash:
+            return IndexReport(document_id=doc_id, status="unchanged",
+                               chunks=doc.chunk_count, reused=doc.chunk_count)
+
+        await self._discard_staged(doc_id, doc.collection)  # Left by an interrupted run
+        old_hashes = await self._chunk_hashes(doc_id)
+        # Segment collections: old vectors are read back from the store
+        store = await self._store(doc.collection)
+        reuse = None
+        if store:
+            async with self.store_writer(doc.collection) as store:
+                async with self._db.execute(
+                    "SELECT content_hash, store_slot FROM document_chunks WHERE document_id = ? AND store_slot IS NOT NULL",
+                    (doc_id,)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                vectors = store.vectors([row[1] for row in rows]).tolist()
+            reuse = {row[0]: vector for row, vector in zip(rows, vectors) if any(vector)}
+
+        async def staged_batch(progress: IndexReport):
+            await self._db.commit()
+            if on_batch:
+                await on_batch(progress)
+
+        try:
+            report = await self.index_file(doc_id, path, embed, staged_batch, reuse, staged=True)
+            if not report.chunks:
+                raise ValueError("Document is empty or couldn't be parsed")
+            new_hashes = await self._staged_hashes(doc_id)
+            async with self.store_writer(doc.collection):
+                old_slots = await self._swap_staged(doc_id, report.chunks, digest, path)
+                await self._release_slots(doc.collection, old_slots)
+        except BaseException:
+            await self._discard_staged(doc_id, doc.collection)
+            raise
+        report.status = "reindexed"
+        report.removed = sum(1 for h in old_hashes if h not in new_hashes)
+        return report
 
-            # Update chunk count
-            doc.chunk_count = len(chunks)
+    async def _swap_staged(self, doc_id: str, chunks: int, digest: str, path: Path) -> list[int]:
+        """
+        Replace a document's chunks with its staged ones and record the
+        new content hash, in one transaction. Returns the old chunks'
+        store slots (to release once committed).
+        """
+        old_hashes = await self._chunk_hashes(doc_id)
+        old_slots = await self._store_slots(doc_id)
+        async with self._savepoint():
+            cursor = await self._db.execute(
+                "UPDATE documents SET chunk_count = ?, content_hash = ?, file_path = ? WHERE id = ?",
+                (chunks, digest, str(path), doc_id)
+            )
+            if not cursor.rowcount:
+                raise ValueError(f"Document removed during re-index: {doc_id}")
+            await self._db.execute("DELETE FROM document_chunks WHERE document_id = ?", (doc_id,))
             await self._db.execute(
-                "UPDATE documents SET chunk_count = ? WHERE id = ?",
-                (doc.chunk_count, doc.id)
+                f"""INSERT INTO document_chunks (document_id, {_STAGED_COLUMNS})
+                    SELECT document_id, {_STAGED_COLUMNS} FROM document_chunks_staging
+                    WHERE document_id = ? ORDER BY chunk_index""",
+                (doc_id,)
             )
+            await self._db.execute("DELETE FROM document_chunks_staging WHERE document_id = ?", (doc_id,))
+            await self._drop_unused_embeddings(old_hashes)
+            await self._bump_generation()
+        await self._db.commit()
+        return old_slots
 
+    async def _discard_staged(self, doc_id: str, collection: Optional[str]):
+        """Delete a document's staged re-index chunks, their unused embeddings and store slots."""
+        async with self.store_writer(collection):
+            async with self._db.execute(
+                "SELECT content_hash, store_slot FROM document_chunks_staging WHERE document_id = ?",
+                (doc_id,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            if not rows:
+                return
+            await self._db.execute("DELETE FROM document_chunks_staging WHERE document_id = ?", (doc_id,))
+            await self._drop_unused_embeddings({row[0] for row in rows if row[0]})
             await self._db.commit()
-            return doc
+            await self._release_slots(collection, [row[1] for row in rows if row[1] is not None])
+
+    async def _staged_hashes(self, doc_id: str) -> set[str]:
+        async with self._db.execute(
+            "SELECT content_hash FROM document_chunks_staging WHERE document_id = ? AND content_hash IS NOT NULL",
+            (doc_id,)
+        ) as cursor:
+            return {row[0] for row in await cursor.fetchall()}
+
+    async def _chunk_hashes(self, doc_id: str) -> set[str]:
+        async with self._db.execute(
+            "SELECT content_hash FROM document_chunks WHERE document_id = ? AND content_hash IS NOT NULL",
+            (doc_id,)
+        ) as cursor:
+            return {row[0] for row in await cursor.fetchall()}
+
+    async def index_generation(self) -> int:
+        """
+        Generation of the chunk index (retrieval cache key). Kept in SQLite
+        and bumped by the transaction that changes the index, so a change
+        committed by any worker moves it for all of them.
+        """
+        async with self._db.execute("SELECT generation FROM rag_index_generation WHERE id = 1") as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else 0
+
+    @asynccontextmanager
+    async def _savepoint(self) -> AsyncIterator[None]:
+        """
+        Undo only this block's statements if it raises: a plain rollback
+        on the shared connection would also discard other callers'
+        uncommitted work (e.g. an ingestion batch). Commit after the block.
+        """
+        name = f"rag_{uuid.uuid4().hex}"
+        await self._db.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            try:
+                await self._db.execute(f"ROLLBACK TO {name}")
+                await self._db.execute(f"RELEASE {name}")
+            except aiosqlite.OperationalError:
+                log.warn("RAG: savepoint committed by another caller, changes not rolled back")
+            raise
+        try:
+            await self._db.execute(f"RELEASE {name}")
+        except aiosqlite.OperationalError:
+            pass  # Already committed by another caller
+
+    async def _bump_generation(self):
+        """Move the index generation on as part of the open transaction (no commit)."""
+        await self._db.execute("UPDATE rag_index_generation SET generation = generation + 1 WHERE id = 1")
+
+    async def _drop_unused_embeddings(self, hashes: set[str]):
+        """Delete shared embeddings among `hashes` that no chunk uses any more (no commit)."""
+        hashes = list(hashes)
+        for i in range(0, len(hashes), SQL_BATCH):
+            batch = hashes[i:i + SQL_BATCH]
+            await self._db.execute(
+                f"""DELETE FROM chunk_embeddings
+                    WHERE content_hash IN ({','.join('?' * len(batch))})
+                      AND NOT EXISTS (SELECT 1 FROM document_chunks c
+                                      WHERE c.content_hash = chunk_embeddings.content_hash)
+                      AND NOT EXISTS (SELECT 1 FROM document_chunks_staging s
+                                      WHERE s.content_hash = chunk_embeddings.content_hash)""",
+                batch
+            )
 
-        except Exception as e:
-            # Rollback on error
-            await self._db.rollback()
-            raise RuntimeError(f"Failed to add document: {e}") from e
-    
     async def _parse_document(self, path: Path) -> str:
-        """Parse document content based on file type."""
-        suffix = path.suffix.lower()
-        
-        if suffix == ".pdf":
-            return self._parse_pdf(path)
-        elif suffix == ".docx":
-            return self._parse_docx(path)
-        elif suffix in (".txt", ".md", ".markdown"):
-            return path.read_text(encoding="utf-8", errors="replace")
-        else:
-            raise ValueError(f"Unsupported file type: {suffix}")
-    
-    def _parse_pdf(self, path: Path) -> str:
-        """Extract text from PDF."""
-        if not HAS_PYMUPDF:
-            raise ImportError("PyMuPDF not installed. Run: pip install pymupdf")
-        
-        text_parts = []
-        with fitz.open(path) as doc:
-            for page in doc:
-                text_parts.append(page.get_text())
-        
-        return "\n".join(text_parts)
-    
-    def _parse_docx(self, path: Path) -> str:
-        """Extract text from DOCX."""
-        if not HAS_DOCX:
-            raise ImportError("python-docx not installed. Run: pip install python-docx")
-        
-        doc = DocxDocument(path)
-        return "\n".join([p.text for p in doc.paragraphs])
-    
+        """Parse document content based on file type (in the parser process pool)."""
+        return await document_parser.parse(path)
+
     def _split_into_chunks(self, text: str) -> list[str]:
-        """Split text into overlapping chunks."""
-        words = text.split()
-        chunks = []
-        
-        start = 0
-        while start < len(words):
-            end = start + self._chunk_size
-            chunk_words = words[start:end]
-            chunks.append(" ".join(chunk_words))
-            
-            # Move start with overlap
-            start = end - self._chunk_overlap
-            if start >= len(words):
-                break
-        
-        return chunks
-    
+        """Split text into overlapping, token-sized chunks."""
+        return [chunk.content for chunk in chunker.chunk_text(text)]
+
     async def query(
         self,
         question: str,
@@ -241,46 +776,143 @@ class RAGEngine:
             # Fallback to text search if embeddings fail
             return await self._text_search(question, top_k, document_id)
 
-        # Get all chunks with document info (JOIN for source filename)
+        scores = dict(await self.vector_candidates(query_embedding, top_k, document_id))
+        chunks = await self.get_chunks(list(scores))
+        for chunk in chunks:
+            chunk.score = scores[chunk.id]
+
+        # Sort by score and return top_k
+        chunks.sort(key=lambda c: c.score, reverse=True)
+        return chunks
+
+    async def vector_candidates(
+        self,
+        embedding: list[float],
+        limit: int,
+        document_id: Optional[str] = None
+    ) -> list[tuple[int, float]]:
+        """
+        (chunk id, cosine similarity) of the `limit` chunks closest to
+        `embedding`, best first. Chunks without an embedding of the same
+        size are not candidates.
+        """
+        sql = """SELECT c.id, COALESCE(e.embedding, c.embedding) AS embedding
+                 FROM document_chunks c
+                 LEFT JOIN chunk_embeddings e ON e.content_hash = c.content_hash
+                 WHERE c.store_slot IS NULL AND COALESCE(e.embedding, c.embedding) IS NOT NULL"""
+        params: tuple = ()
         if document_id:
-            sql = """SELECT c.*, d.filename as source_filename
-                     FROM document_chunks c
-                     JOIN documents d ON c.document_id = d.id
-                     WHERE c.document_id = ?"""
+            sql += " AND c.document_id = ?"
             params = (document_id,)
-        else:
-            sql = """SELECT c.*, d.filename as source_filename
-                     FROM document_chunks c
-                     JOIN documents d ON c.document_id = d.id"""
-            params = ()
-
+        if limit <= 0:
+            return []
         async with self._db.execute(sql, params) as cursor:
             rows = await cursor.fetchall()
+        segment_hits = await self._segment_candidates(embedding, limit, document_id)
+        if not rows:
+            return segment_hits
 
-        # Calculate similarity scores
-        scored_chunks = []
-        for row in rows:
-            if row["embedding"]:
-                chunk_embedding = json.loads(row["embedding"].decode())
-                score = self._cosine_similarity(query_embedding, chunk_embedding)
-            else:
-                # Text-based fallback score
-                score = self._text_similarity(question, row["content"])
-
-            scored_chunks.append(Chunk(
-                id=row["id"],
-                document_id=row["document_id"],
-                content=row["content"],
-                chunk_index=row["chunk_index"],
-                tokens=row["tokens"],
-                score=score,
-                source_filename=row["source_filename"]
-            ))
+        # One JSON parse for all vectors instead of one per row
+        vectors = json.loads("[" + b",".join(row[1] for row in rows).decode() + "]")
+        keep = [i for i, vector in enumerate(vectors) if len(vector) == len(embedding)]
+        if not keep:
+            return segment_hits
+        matrix = np.asarray([vectors[i] for i in keep], dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        norms[norms == 0] = np.inf
+        scores = (matrix @ query) / norms
+
+        top = np.argsort(-scores, kind="stable")[:limit]
+        hits = [(rows[keep[i]][0], float(scores[i])) for i in top]
+        if segment_hits:
+            hits = sorted(hits + segment_hits, key=lambda hit: hit[1], reverse=True)[:limit]
+        return hits
+
+    async def _segment_candidates(
+        self,
+        embedding: list[float],
+        limit: int,
+        document_id: Optional[str]
+    ) -> list[tuple[int, float]]:
+        """vector_candidates over segment collections (zero-copy mmap search)."""
+        if document_id:
+            doc = await self.get_document(document_id)
+            collections = [doc.collection] if doc and await self._store(doc.collection) else []
+        else:
+            collections = await self._segment_collections()
+
+        hits: list[tuple[int, float]] = []
+        for collection in collections:
+            store = await self._store(collection)
+            slots = await self._store_slots(document_id) if document_id else None
+            # Staged (not yet swapped in) and orphaned slots (interrupted
+            # indexing) have no row: search a margin more
+            margin = limit if slots is not None else limit + await self._staged_slots(collection)
+            found = await asyncio.to_thread(store.search, embedding, limit + margin, slots)
+            scores = dict(found)
+            batch = list(scores)
+            if not batch:
+                continue
+            async with self._db.execute(
+                f"""SELECT c.id, c.store_slot FROM document_chunks c
+                    JOIN documents d ON d.id = c.document_id
+                    WHERE d.collection = ? AND c.store_slot IN ({','.join('?' * len(batch))})""",
+                (collection, *batch)
+            ) as cursor:
+                hits.extend((row[0], scores[row[1]]) for row in await cursor.fetchall())
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:limit]
+
+    async def keyword_candidates(
+        self,
+        question: str,
+        limit: int,
+        document_id: Optional[str] = None
+    ) -> list[tuple[int, float]]:
+        """(chunk id, score) of the best keyword matches (FTS5 bm25), best first."""
+        terms = list(dict.fromkeys(t for t in _WORD.findall(question.lower()) if len(t) > 1))
+        if not terms or limit <= 0:
+            return []
+        if not self._fts:
+            return [(chunk.id, chunk.score) for chunk in await self._text_search(question, limit, document_id)]
+
+        match = " OR ".join(f'"{term}"' for term in terms[:32])
+        sql = """SELECT f.rowid, bm25(document_chunks_fts) AS rank
+                 FROM document_chunks_fts f"""
+        params: tuple = (match,)
+        if document_id:
+            sql += " JOIN document_chunks c ON c.id = f.rowid WHERE c.document_id = ? AND"
+            params = (document_id, match)
+        else:
+            sql += " WHERE"
+        sql += " document_chunks_fts MATCH ? ORDER BY rank LIMIT ?"
+        async with self._db.execute(sql, (*params, limit)) as cursor:
+            return [(row[0], -row[1]) for row in await cursor.fetchall()]
+
+    async def get_chunks(self, chunk_ids: list[int]) -> list[Chunk]:
+        """Chunks by id (with their embedding), in no particular order."""
+        chunks = []
+        stored: dict[str, list[tuple[Chunk, int]]] = {}  # Segment chunks by collection
+        for i in range(0, len(chunk_ids), SQL_BATCH):
+            batch = chunk_ids[i:i + SQL_BATCH]
+            async with self._db.execute(
+                _CHUNK_SELECT + f" WHERE c.id IN ({','.join('?' * len(batch))})", batch
+            ) as cursor:
+                for row in await cursor.fetchall():
+                    chunk = _chunk_from_row(row, 0.0)
+                    if row["store_slot"] is not None:
+                        stored.setdefault(row["collection"], []).append((chunk, row["store_slot"]))
+                    elif row["embedding"]:
+                        chunk.embedding = json.loads(row["embedding"].decode())
+                    chunks.append(chunk)
+        for collection, items in stored.items():
+            store = await self._store(collection)
+            slots = [slot for _, slot in items]
+            for (chunk, _), text, vector in zip(items, store.texts(slots), store.vectors(slots).tolist()):
+                chunk.content, chunk.embedding = text, vector
+        return chunks
 
-        # Sort by score and return top_k
-        scored_chunks.sort(key=lambda c: c.score, reverse=True)
-        return scored_chunks[:top_k]
-    
     async def _text_search(
         self,
         query: str,
@@ -291,16 +923,12 @@ class RAGEngine:
         # P1 fix: Escape special SQL LIKE characters
         escaped_query = _escape_like(query)
         if document_id:
-            sql = """SELECT c.*, d.filename as source_filename
-                     FROM document_chunks c
-                     JOIN documents d ON c.document_id = d.id
+            sql = _CHUNK_SELECT + """
                      WHERE c.document_id = ? AND c.content LIKE ? ESCAPE '\\'
                      LIMIT ?"""
             params = (document_id, f"%{escaped_query}%", top_k)
         else:
-            sql = """SELECT c.*, d.filename as source_filename
-                     FROM document_chunks c
-                     JOIN documents d ON c.document_id = d.id
+            sql = _CHUNK_SELECT + """
                      WHERE c.content LIKE ? ESCAPE '\\'
                      LIMIT ?"""
             params = (f"%{escaped_query}%", top_k)
@@ -308,43 +936,197 @@ class RAGEngine:
         async with self._db.execute(sql, params) as cursor:
             rows = await cursor.fetchall()
 
-        return [
-            Chunk(
-                id=row["id"],
-                document_id=row["document_id"],
-                content=row["content"],
-                chunk_index=row["chunk_index"],
-                tokens=row["tokens"],
-                score=1.0,
-                source_filename=row["source_filename"]
-            )
-            for row in rows
-        ]
-    
-    def _cosine_similarity(self, a: list[float], b: list[float]) -> float:
-        """Calculate cosine similarity between two vectors."""
-        if len(a) != len(b):
-            return 0.0
-        
-        dot_product = sum(x * y for x, y in zip(a, b))
-        norm_a = sum(x * x for x in a) ** 0.5
-        norm_b = sum(x * x for x in b) ** 0.5
-        
-        if norm_a == 0 or norm_b == 0:
-            return 0.0
-        
-        return dot_product / (norm_a * norm_b)
-    
-    def _text_similarity(self, query: str, text: str) -> float:
-        """Simple text-based similarity score."""
-        query_words = set(query.lower().split())
-        text_words = set(text.lower().split())
-        
-        if not query_words:
-            return 0.0
-        
-        return len(query_words & text_words) / len(query_words)
+        return [_chunk_from_row(row, 1.0) for row in rows]
     
+    # ==================== Collections ====================
+
+    async def create_collection(self, name: str, storage: str = "sqlite") -> dict:
+        """
+        Create a document collection. `storage` "segments" keeps its chunk
+        text and embeddings in a memory-mapped SegmentStore (chunk_store)
+        instead of max.db; "sqlite" is the default for documents.
+        """
+        if not _COLLECTION_NAME.match(name):
+            raise ValueError("Collection names are 1-64 letters, digits, '_' or '-'")
+        if storage not in STORAGES:
+            raise ValueError(f"Unknown storage: {storage} (expected one of {', '.join(STORAGES)})")
+        existing = await self.get_collection(name)
+        if existing:
+            if existing["storage"] != storage:
+                raise ValueError(f"Collection {name} already exists with {existing['storage']} storage")
+            return existing
+        await self._db.execute(
+            "INSERT INTO rag_collections (name, storage) VALUES (?, ?)", (name, storage)
+        )
+        await self._db.commit()
+        return await self.get_collection(name)
+
+    async def get_collection(self, name: str) -> Optional[dict]:
+        """Collection settings with document / chunk counts (and store stats for segments)."""
+        if name == DEFAULT_COLLECTION:
+            row = {"name": name, "storage": "sqlite", "store_generation": 0}
+        else:
+            async with self._db.execute(
+                "SELECT name, storage, store_generation FROM rag_collections WHERE name = ?", (name,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if not row:
+                return None
+        async with self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(chunk_count), 0) FROM documents WHERE collection = ?",
+            (name,)
+        ) as cursor:
+            documents, chunks = await cursor.fetchone()
+        info = {"name": row["name"], "storage": row["storage"], "documents": documents, "chunks": chunks}
+        store = await self._store(name)
+        if store:
+            info["store"] = store.get_stats()
+        return info
+
+    async def list_collections(self) -> list[dict]:
+        async with self._db.execute("SELECT name FROM rag_collections ORDER BY name") as cursor:
+            names = [row[0] for row in await cursor.fetchall()]
+        return [await self.get_collection(name) for name in [DEFAULT_COLLECTION, *names]]
+
+    async def _store(self, collection: Optional[str]) -> Optional[SegmentStore]:
+        """
+        The collection's SegmentStore, or None for SQLite storage. Checked
+        against the generation in SQLite and the slots on disk on every
+        use, so compactions and appends by other workers are picked up.
+        """
+        if not collection or collection == DEFAULT_COLLECTION:
+            return None
+        async with self._db.execute(
+            "SELECT storage, store_generation FROM rag_collections WHERE name = ?", (collection,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if not row or row["storage"] != "segments":
+            return None
+        store = self._stores.get(collection)
+        if store is None:
+            store = self._stores[collection] = SegmentStore(
+                config.data_dir / config.rag.segment_dir_name / collection,
+                generation=row["store_generation"]
+            )
+        elif store.generation != row["store_generation"]:
+            store.activate(row["store_generation"])  # Compacted by another worker
+        else:
+            store.refresh()
+        return store
+
+    @asynccontextmanager
+    async def store_writer(self, collection: Optional[str]) -> AsyncIterator[Optional[SegmentStore]]:
+        """
+        Exclusive write access to a collection's SegmentStore, among this
+        worker's tasks and across workers (the store's file lock), synced
+        with SQLite once held. Hold it from appending slots until the rows
+        that use them are committed, and from reading slots until they
+        are flagged deleted, so a compaction never renumbers or drops
+        slots in between. Re-entrant within a task; yields None for
+        SQLite collections.
+        """
+        store = await self._store(collection)
+        task = asyncio.current_task()
+        if not store or self._store_writers.get(collection) is task:
+            yield store
+            return
+        async with self._store_locks.setdefault(collection, asyncio.Lock()):
+            while not store.lock.acquire(blocking=False):
+                await asyncio.sleep(STORE_LOCK_POLL)  # Held by another worker
+            self._store_writers[collection] = task
+            try:
+                store = await self._store(collection)
+                store.discard_newer()  # Left by a compaction that never committed
+                yield store
+            finally:
+                del self._store_writers[collection]
+                store.lock.release()
+
+    async def _document_collection(self, doc_id: str) -> Optional[str]:
+        async with self._db.execute(
+            "SELECT collection FROM documents WHERE id = ?", (doc_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return row["collection"] if row else None
+
+    async def _segment_collections(self) -> list[str]:
+        async with self._db.execute(
+            "SELECT name FROM rag_collections WHERE storage = 'segments'"
+        ) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def _store_slots(self, doc_id: str) -> list[int]:
+        async with self._db.execute(
+            "SELECT store_slot FROM document_chunks WHERE document_id = ? AND store_slot IS NOT NULL",
+            (doc_id,)
+        ) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def _staged_slots(self, collection: str) -> int:
+        """Slots of the collection held by re-indexes not swapped in yet."""
+        async with self._db.execute(
+            """SELECT COUNT(*) FROM document_chunks_staging s
+               JOIN documents d ON d.id = s.document_id
+               WHERE d.collection = ? AND s.store_slot IS NOT NULL""",
+            (collection,)
+        ) as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def _release_slots(self, collection: Optional[str], slots: list[int]):
+        """
+        Flag a committed removal's slots deleted; compact once enough are.
+        Call within the store_writer() the slots were read under.
+        """
+        async with self.store_writer(collection) as store:
+            if not store or not slots:
+                return
+            store.delete(slots)
+            stats = store.get_stats()
+            if stats["deleted"] > stats["slots"] * config.rag.segment_compact_ratio:
+                await self.compact_collection(collection)
+
+    async def compact_collection(self, name: str) -> dict:
+        """
+        Rewrite a segment collection's store without deleted (or orphaned)
+        slots. The renumbered slots and the new store generation are
+        committed together, then the old files are removed.
+        """
+        async with self.store_writer(name) as store:
+            if not store:
+                raise ValueError(f"Not a segment collection: {name}")
+            if self._db.in_transaction:
+                return {"collection": name, "status": "busy"}  # An index transaction is open
+            if await self._staged_slots(name):
+                return {"collection": name, "status": "busy"}  # Staged slots would not be renumbered
+            async with self._db.execute(
+                """SELECT c.id, c.store_slot FROM document_chunks c
+                   JOIN documents d ON d.id = c.document_id
+                   WHERE d.collection = ? AND c.store_slot IS NOT NULL
+                   ORDER BY c.store_slot""",
+                (name,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            before = store.get_stats()
+            generation = await asyncio.to_thread(store.compact, [row["store_slot"] for row in rows])
+            try:
+                async with self._savepoint():
+                    await self._db.executemany(
+                        "UPDATE document_chunks SET store_slot = ? WHERE id = ?",
+                        [(slot, row["id"]) for slot, row in enumerate(rows)]
+                    )
+                    await self._db.execute(
+                        "UPDATE rag_collections SET store_generation = ? WHERE name = ?", (generation, name)
+                    )
+                    await self._bump_generation()
+                await self._db.commit()
+            except BaseException:
+                store.discard_newer()  # Drops the unused new files
+                raise
+            store.activate(generation)
+        log.debug(f"RAG: compacted {name}: {before['slots']} -> {len(rows)} slots")
+        return {"collection": name, "status": "compacted",
+                "slots_before": before["slots"], "slots": len(rows)}
+
     async def list_documents(self) -> list[Document]:
         """List all indexed documents."""
         async with self._db.execute(
@@ -352,17 +1134,7 @@ class RAGEngine:
         ) as cursor:
             rows = await cursor.fetchall()
         
-        return [
-            Document(
-                id=row["id"],
-                filename=row["filename"],
-                file_path=row["file_path"],
-                file_type=row["file_type"],
-                chunk_count=row["chunk_count"],
-                created_at=row["created_at"]
-            )
-            for row in rows
-        ]
+        return [_document_from_row(row) for row in rows]
     
     async def get_document(self, doc_id: str) -> Optional[Document]:
         """Get document by ID."""
@@ -374,32 +1146,61 @@ class RAGEngine:
         if not row:
             return None
         
-        return Document(
-            id=row["id"],
-            filename=row["filename"],
-            file_path=row["file_path"],
-            file_type=row["file_type"],
-            chunk_count=row["chunk_count"],
-            created_at=row["created_at"]
-        )
+        return _document_from_row(row)
     
     async def remove_document(self, doc_id: str) -> bool:
-        """Remove document and its chunks."""
-        # Delete chunks first (foreign key)
-        await self._db.execute(
-            "DELETE FROM document_chunks WHERE document_id = ?",
-            (doc_id,)
-        )
-        
-        # Delete document
-        cursor = await self._db.execute(
-            "DELETE FROM documents WHERE id = ?",
-            (doc_id,)
-        )
-        await self._db.commit()
-        
+        """Remove document and its chunks (and embeddings no other chunk shares)."""
+        doc = await self.get_document(doc_id)
+        collection = doc.collection if doc else None
+        async with self.store_writer(collection):
+            if doc:
+                await self._discard_staged(doc_id, collection)  # A re-index in progress
+            slots = await self._store_slots(doc_id)
+            hashes = await self._chunk_hashes(doc_id)
+            # Delete chunks first (foreign key)
+            await self._db.execute(
+                "DELETE FROM document_chunks WHERE document_id = ?",
+                (doc_id,)
+            )
+            await self._bump_generation()
+            await self._drop_unused_embeddings(hashes)
+
+            # Delete document
+            cursor = await self._db.execute(
+                "DELETE FROM documents WHERE id = ?",
+                (doc_id,)
+            )
+            await self._db.commit()
+            await self._release_slots(collection, slots)
+
         return cursor.rowcount > 0
-    
+
+    async def truncate_document(self, doc_id: str, chunk_count: int):
+        """
+        Delete a document's chunks from index `chunk_count` on (rows written
+        by a batch whose progress was never recorded) and set its count.
+        """
+        doc = await self.get_document(doc_id)
+        collection = doc.collection if doc else None
+        async with self.store_writer(collection):
+            async with self._db.execute(
+                "SELECT content_hash, store_slot FROM document_chunks WHERE document_id = ? AND chunk_index >= ?",
+                (doc_id, chunk_count)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            if rows:
+                await self._db.execute(
+                    "DELETE FROM document_chunks WHERE document_id = ? AND chunk_index >= ?",
+                    (doc_id, chunk_count)
+                )
+                await self._bump_generation()
+                await self._drop_unused_embeddings({row[0] for row in rows if row[0]})
+            await self._db.execute(
+                "UPDATE documents SET chunk_count = ? WHERE id = ?", (chunk_count, doc_id)
+            )
+            await self._db.commit()
+            await self._release_slots(collection, [row[1] for row in rows if row[1] is not None])
+
     async def get_context_for_query(
         self,
         question: str,
@@ -409,21 +1210,8 @@ class RAGEngine:
         Get formatted context from relevant documents for a query.
         Used to augment LLM prompts with document knowledge.
         """
-        chunks = await self.query(question, top_k=10)
-        
-        if not chunks:
-            return ""
-        
-        context_parts = []
-        tokens_used = 0
-        
-        for chunk in chunks:
-            chunk_tokens = chunk.tokens or len(chunk.content.split())
-            if tokens_used + chunk_tokens > max_tokens:
-                break
-            
-            context_parts.append(chunk.content)
-            tokens_used += chunk_tokens
+        result = await self.retrieval.retrieve(question, max_tokens=max_tokens)
+        context_parts = [chunk.content for chunk in result.chunks]
         
         if not context_parts:
             return ""
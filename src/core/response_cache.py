@@ -0,0 +1,385 @@
+"""
+LLM Response Cache for MAX AI Assistant.
+
+Caches non-streaming `lm_client.chat()` results that repeat across calls
+(fact extraction on duplicate messages, summaries of unchanged ranges,
+agent plans for identical goals, step verification).
+
+Features:
+- Exact match: sha256 of (model, normalized messages, temperature,
+  max_tokens, tools)
+- Opt-in semantic match for low-temperature calls via embedding_service
+- Persisted in SQLite with TTL and size caps; writes wait in memory while
+  the shared connection has another caller's transaction open
+- Per-call-site enable flags (config.response_cache.sites)
+- Hit-rate and saved-latency metrics
+
+Usage:
+    response = await lm_client.chat(messages, stream=False, cache_site="extract_facts")
+"""
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import aiosqlite
+
+from .config import config
+from .logger import log
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class SiteStats:
+    """Per-call-site cache counters."""
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    saved_latency_ms: float = 0.0
+
+
+@dataclass
+class CacheLookup:
+    """Result of a cache lookup."""
+    response: Optional[str] = None
+    semantic: bool = False
+    embedding: Optional[list[float]] = field(default=None, repr=False)
+
+
+class ResponseCache:
+    """SQLite-backed cache of LLM responses."""
+
+    PRUNE_EVERY = 50  # Stores between TTL/size pruning passes
+    MAX_PENDING = 256  # Writes kept while they cannot be committed (oldest dropped)
+
+    def __init__(self, db: Optional[aiosqlite.Connection] = None):
+        self._db = db
+        self._embedding_service = None
+        self._stats: dict[str, SiteStats] = {}
+        self._stores_since_prune = 0
+        # Not yet written: cache_key -> row (INSERT order), cache_key -> (hits, last_used_at)
+        self._pending: OrderedDict[str, tuple] = OrderedDict()
+        self._pending_touches: OrderedDict[str, tuple[int, float]] = OrderedDict()
+
+    async def initialize(self, db: aiosqlite.Connection, embedding_service=None):
+        """Initialize with database connection (and optional embedding service)."""
+        self._db = db
+        self._embedding_service = embedding_service
+        await self._ensure_tables()
+        await self.prune()
+
+    async def _ensure_tables(self):
+        await self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS llm_response_cache (
+                cache_key TEXT PRIMARY KEY,
+                call_site TEXT NOT NULL,
+                model TEXT,
+                temperature REAL,
+                embedding BLOB,
+                response TEXT NOT NULL,
+                latency_ms REAL DEFAULT 0,
+                hit_count INTEGER DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_llm_cache_site
+            ON llm_response_cache(call_site, model, last_used_at);
+        """)
+        await self._db.commit()
+
+    # ==================== Keys ====================
+
+    @staticmethod
+    def normalize_messages(messages: list[dict]) -> list[dict]:
+        """Collapse whitespace so cosmetic differences don't split entries."""
+        return [
+            {
+                "role": m.get("role", ""),
+                "content": _WHITESPACE.sub(" ", m.get("content") or "").strip()
+            }
+            for m in messages
+        ]
+
+    @classmethod
+    def make_key(
+        cls,
+        model: str,
+        messages: list[dict],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        tools: Optional[list[dict]] = None
+    ) -> str:
+        """Exact-match cache key."""
+        payload = json.dumps(
+            {
+                "model": model,
+                "messages": cls.normalize_messages(messages),
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "tools": tools or [],
+            },
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    # ==================== Lookup / Store ====================
+
+    def is_enabled(self, site: Optional[str]) -> bool:
+        """Check if caching is on for a call site."""
+        cfg = config.response_cache
+        return bool(site) and self._db is not None and cfg.enabled and cfg.sites.get(site, False)
+
+    def _semantic_allowed(self, site: str, temperature: Optional[float]) -> bool:
+        cfg = config.response_cache
+        return (
+            self._embedding_service is not None and
+            site in cfg.semantic_sites and
+            temperature is not None and
+            temperature <= cfg.semantic_max_temperature
+        )
+
+    async def lookup(
+        self,
+        site: str,
+        key: str,
+        model: str,
+        messages: list[dict],
+        temperature: Optional[float]
+    ) -> CacheLookup:
+        """Find a cached response (exact first, then semantic if allowed)."""
+        stats = self._site_stats(site)
+        now = time.time()
+        min_created = now - config.response_cache.ttl_seconds
+
+        try:
+            pending = self._pending.get(key)
+            if pending and pending[7] >= min_created:  # created_at
+                row = {"response": pending[5], "latency_ms": pending[6]}
+            else:
+                async with self._db.execute(
+                    """SELECT response, latency_ms FROM llm_response_cache
+                       WHERE cache_key = ? AND created_at >= ?""",
+                    (key, min_created)
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+            if row:
+                await self._touch(key, now)
+                stats.exact_hits += 1
+                stats.saved_latency_ms += row["latency_ms"] or 0.0
+                return CacheLookup(response=row["response"])
+
+            if self._semantic_allowed(site, temperature):
+                embedding = await self._embedding_service.get_or_compute(
+                    self._semantic_text(messages)
+                )
+                if embedding:
+                    match = await self._semantic_match(site, model, embedding, min_created)
+                    if match:
+                        match_key, response, latency_ms = match
+                        await self._touch(match_key, now)
+                        stats.semantic_hits += 1
+                        stats.saved_latency_ms += latency_ms or 0.0
+                        return CacheLookup(response=response, semantic=True)
+                    stats.misses += 1
+                    return CacheLookup(embedding=embedding)
+        except Exception as e:
+            log.warn(f"Response cache lookup failed: {e}")
+
+        stats.misses += 1
+        return CacheLookup()
+
+    async def store(
+        self,
+        site: str,
+        key: str,
+        model: str,
+        temperature: Optional[float],
+        response: str,
+        latency_ms: float,
+        embedding: Optional[list[float]] = None
+    ):
+        """Store a response (empty responses are not cached)."""
+        if not response or not response.strip():
+            return
+
+        now = time.time()
+        self._pending[key] = (
+            key, site, model, temperature,
+            json.dumps(embedding).encode() if embedding else None,
+            response, latency_ms, now, now
+        )
+        self._pending.move_to_end(key)
+        while len(self._pending) > self.MAX_PENDING:
+            self._pending.popitem(last=False)
+        self._site_stats(site).stores += 1
+        self._stores_since_prune += 1
+        try:
+            await self._write_pending()
+            if self._stores_since_prune >= self.PRUNE_EVERY:
+                await self.prune()
+        except Exception as e:
+            log.warn(f"Response cache store failed: {e}")
+
+    async def prune(self) -> int:
+        """Drop expired entries and enforce the size cap (LRU). Returns rows removed."""
+        if self._db is None or self._db.in_transaction:
+            return 0  # Would commit another caller's transaction; runs on a later store
+        self._stores_since_prune = 0
+        cfg = config.response_cache
+
+        cursor = await self._db.execute(
+            "DELETE FROM llm_response_cache WHERE created_at < ?",
+            (time.time() - cfg.ttl_seconds,)
+        )
+        removed = cursor.rowcount
+
+        cursor = await self._db.execute(
+            """DELETE FROM llm_response_cache WHERE cache_key IN (
+                   SELECT cache_key FROM llm_response_cache
+                   ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+               )""",
+            (cfg.max_entries,)
+        )
+        removed += cursor.rowcount
+        await self._db.commit()
+        return removed
+
+    async def clear(self):
+        """Remove all cached responses."""
+        if self._db is None:
+            return
+        self._pending.clear()
+        self._pending_touches.clear()
+        await self._db.execute("DELETE FROM llm_response_cache")
+        await self._db.commit()
+        self._stats.clear()
+
+    def get_stats(self) -> dict:
+        """Get hit-rate and saved-latency metrics (total and per call site)."""
+        sites = {}
+        total = SiteStats()
+        for site, s in self._stats.items():
+            hits = s.exact_hits + s.semantic_hits
+            sites[site] = {
+                "exact_hits": s.exact_hits,
+                "semantic_hits": s.semantic_hits,
+                "misses": s.misses,
+                "hit_rate": round(hits / (hits + s.misses), 2) if hits + s.misses else 0.0,
+                "saved_latency_ms": round(s.saved_latency_ms, 1),
+            }
+            total.exact_hits += s.exact_hits
+            total.semantic_hits += s.semantic_hits
+            total.misses += s.misses
+            total.saved_latency_ms += s.saved_latency_ms
+
+        hits = total.exact_hits + total.semantic_hits
+        return {
+            "enabled": config.response_cache.enabled,
+            "hits": hits,
+            "misses": total.misses,
+            "hit_rate": round(hits / (hits + total.misses), 2) if hits + total.misses else 0.0,
+            "saved_latency_ms": round(total.saved_latency_ms, 1),
+            "sites": sites,
+        }
+
+    # ==================== Internals ====================
+
+    def _site_stats(self, site: str) -> SiteStats:
+        if site not in self._stats:
+            self._stats[site] = SiteStats()
+        return self._stats[site]
+
+    async def _touch(self, key: str, now: float):
+        hits, _ = self._pending_touches.pop(key, (0, now))
+        self._pending_touches[key] = (hits + 1, now)
+        while len(self._pending_touches) > self.MAX_PENDING:
+            self._pending_touches.popitem(last=False)
+        await self._write_pending()
+
+    async def _write_pending(self):
+        """
+        Write pending stores and hits and commit, unless the shared
+        connection has a transaction open: committing would also commit
+        another caller's unfinished changes, so they wait for the next call.
+        """
+        if not (self._pending or self._pending_touches) or self._db.in_transaction:
+            return
+        rows, self._pending = list(self._pending.values()), OrderedDict()
+        touches, self._pending_touches = list(self._pending_touches.items()), OrderedDict()
+        await self._db.executemany(
+            """INSERT OR REPLACE INTO llm_response_cache
+               (cache_key, call_site, model, temperature, embedding, response,
+                latency_ms, hit_count, created_at, last_used_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)""",
+            rows
+        )
+        await self._db.executemany(
+            """UPDATE llm_response_cache
+               SET hit_count = hit_count + ?, last_used_at = ? WHERE cache_key = ?""",
+            [(hits, last_used, key) for key, (hits, last_used) in touches]
+        )
+        await self._db.commit()
+
+    @classmethod
+    def _semantic_text(cls, messages: list[dict]) -> str:
+        """Text embedded for semantic matching (the latest user turn)."""
+        normalized = cls.normalize_messages(messages)
+        users = [m["content"] for m in normalized if m["role"] == "user"]
+        return users[-1] if users else " ".join(m["content"] for m in normalized)
+
+    async def _semantic_match(
+        self,
+        site: str,
+        model: str,
+        embedding: list[float],
+        min_created: float
+    ) -> Optional[tuple[str, str, float]]:
+        """Best cached entry above the similarity threshold (recent candidates only)."""
+        cfg = config.response_cache
+        async with self._db.execute(
+            """SELECT cache_key, response, latency_ms, embedding FROM llm_response_cache
+               WHERE call_site = ? AND model = ? AND embedding IS NOT NULL AND created_at >= ?
+               ORDER BY last_used_at DESC LIMIT ?""",
+            (site, model, min_created, cfg.semantic_candidates)
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+        best = None
+        best_score = cfg.semantic_threshold
+        for row in rows:
+            try:
+                candidate = json.loads(row["embedding"].decode())
+            except (json.JSONDecodeError, AttributeError):
+                continue
+            score = _cosine_similarity(embedding, candidate)
+            if score >= best_score:
+                best, best_score = row, score
+
+        if best is None:
+            return None
+        return best["cache_key"], best["response"], best["latency_ms"]
+
+
+def _cosine_similarity(a: list[float], b: list[float]) -> float:
+    """Calculate cosine similarity between two vectors."""
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = sum(x * x for x in a) ** 0.5
+    norm_b = sum(x * x for x in b) ** 0.5
+    if norm_a == 0 or norm_b == 0:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+
+# Global response cache
+response_cache = ResponseCache()
@@ -0,0 +1,566 @@
+"""
+Retrieval pipeline for RAG context.
+
+Stages (each timed, see get_stats()):
+1. embed     - query embedding; then the result cache (RetrievalCache) is
+               consulted: exact or near-duplicate query embedding within
+               the current index generation returns the packed chunks
+2. vector    - cosine top-k over all chunk embeddings (NumPy)
+3. keyword   - FTS5 bm25 top-k (LIKE fallback without FTS5)
+4. fuse      - reciprocal rank fusion of both candidate lists
+5. mmr       - maximal marginal relevance: drops near-duplicates, e.g.
+               neighbouring chunks that share `chunk_overlap` tokens
+6. rerank    - optional, a local model scores (question, passage) pairs;
+               scores are cached per (query hash, chunk content hash)
+7. merge     - overlapping / adjacent chunks of one document become one
+8. pack      - greedy fill of the token budget in rank order
+
+Usage:
+    result = await rag.retrieval.retrieve("how do I install it?", max_tokens=1000)
+    for chunk in result.chunks:
+        ...
+"""
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Callable, Optional
+
+import aiosqlite
+import numpy as np
+
+from .config import config
+from .llm_scheduler import RequestPriority
+from .lm_client import lm_client
+from .logger import log
+
+if TYPE_CHECKING:
+    from .rag import Chunk, RAGEngine
+
+
+STAGES = ("embed", "cache", "vector", "keyword", "fuse", "mmr", "rerank", "merge", "pack")
+RRF_K = 60  # Reciprocal rank fusion damping constant
+MAX_PENDING_SCORES = 1024  # Rerank scores kept while they cannot be committed (oldest dropped)
+
+_WORD = re.compile(r"\w+")
+_WHITESPACE = re.compile(r"\s+")
+_JSON_ARRAY = re.compile(r"\[[^\[\]]*\]")
+
+
+@dataclass
+class RetrievalResult:
+    """Packed chunks (rank order) and per-stage latency."""
+    chunks: list["Chunk"] = field(default_factory=list)
+    timings_ms: dict[str, float] = field(default_factory=dict)
+    candidates: int = 0
+    cached: bool = False
+
+
+def reciprocal_rank_fusion(rankings: list[list[int]], k: int = RRF_K) -> dict[int, float]:
+    """Fuse ranked id lists: score(id) = sum of 1 / (k + rank)."""
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+def similarity_matrix(chunks: list["Chunk"]) -> np.ndarray:
+    """
+    Pairwise chunk similarity: cosine of embeddings when every chunk has
+    one of the same size, word-set Jaccard otherwise.
+    """
+    dims = {len(c.embedding) if c.embedding else 0 for c in chunks}
+    if len(dims) == 1 and 0 not in dims:
+        vectors = np.asarray([c.embedding for c in chunks], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0
+        vectors /= norms[:, None]
+        return vectors @ vectors.T
+
+    words = [set(_WORD.findall(c.content.lower())) for c in chunks]
+    n = len(chunks)
+    sim = np.eye(n, dtype=np.float32)
+    for i in range(n):
+        for j in range(i + 1, n):
+            union = len(words[i] | words[j])
+            sim[i, j] = sim[j, i] = len(words[i] & words[j]) / union if union else 0.0
+    return sim
+
+
+def mmr_select(relevance: np.ndarray, similarity: np.ndarray, k: int, lambda_: float) -> list[int]:
+    """
+    Maximal marginal relevance: repeatedly pick the index maximising
+    lambda * relevance - (1 - lambda) * max similarity to those picked.
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    selected = [int(np.argmax(relevance))]
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    redundancy = similarity[selected[0]].copy()
+    while len(selected) < min(k, n):
+        scores = lambda_ * relevance - (1.0 - lambda_) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
+
+
+def merge_neighbours(chunks: list["Chunk"], count_tokens: Callable[[str], int]) -> list["Chunk"]:
+    """
+    Merge chunks of one document that overlap (char offsets) or are
+    consecutive (chunk_index) into one chunk ranked like its best part.
+    Input and output are in rank order.
+    """
+    rank = {id(chunk): i for i, chunk in enumerate(chunks)}
+    by_document: dict[str, list["Chunk"]] = {}
+    for chunk in chunks:
+        by_document.setdefault(chunk.document_id, []).append(chunk)
+
+    merged: list[tuple[int, "Chunk"]] = []
+    for parts in by_document.values():
+        parts.sort(key=lambda c: (c.char_start if c.char_start is not None else -1, c.chunk_index))
+        run = [parts[0]]
+        for part in parts[1:]:
+            end = max((c.char_end for c in run if c.char_end is not None), default=None)
+            overlaps = end is not None and part.char_start is not None and part.char_start <= end
+            if overlaps or part.chunk_index == run[-1].chunk_index + 1:
+                run.append(part)
+            else:
+                merged.append(_join_run(run, rank, count_tokens))
+                run = [part]
+        merged.append(_join_run(run, rank, count_tokens))
+
+    return [chunk for _, chunk in sorted(merged, key=lambda item: item[0])]
+
+
+def _join_run(run: list["Chunk"], rank: dict[int, int], count_tokens) -> tuple[int, "Chunk"]:
+    """One chunk for a run of neighbours: overlaps spliced by offset, gaps joined by a newline."""
+    best = min(rank[id(c)] for c in run)
+    if len(run) == 1:
+        return best, run[0]
+    head = run[0]
+    content, end = head.content, head.char_end
+    for part in run[1:]:
+        if end is not None and part.char_start is not None and part.char_start <= end:
+            if part.char_end is not None and part.char_end > end:
+                content += part.content[end - part.char_start:]
+                end = part.char_end
+        else:
+            content += "\n" + part.content
+            end = part.char_end
+    return best, replace(
+        head,
+        content=content,
+        char_end=end,
+        tokens=count_tokens(content),
+        score=max(c.score for c in run),
+    )
+
+
+def pack(chunks: list["Chunk"], max_tokens: int) -> list["Chunk"]:
+    """Greedy fill in rank order; a chunk that doesn't fit is skipped, not a stop."""
+    packed, used = [], 0
+    for chunk in chunks:
+        tokens = chunk.tokens or len(chunk.content.split())
+        if used + tokens > max_tokens:
+            continue
+        packed.append(chunk)
+        used += tokens
+    return packed
+
+
+def query_hash(question: str, model: str) -> str:
+    """Rerank cache key of a question (whitespace / case normalized)."""
+    normalized = _WHITESPACE.sub(" ", question).strip().lower()
+    return hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+def _chunk_key(chunk: "Chunk") -> str:
+    # Content hash, not row id: ids change when a document is re-indexed
+    return chunk.content_hash or hashlib.sha256(chunk.content.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _CachedResult:
+    chunks: list["Chunk"]
+    candidates: int
+    scope: str
+    vector: Optional[np.ndarray]  # Normalized query embedding
+    nbytes: int
+
+
+class RetrievalCache:
+    """
+    In-memory LRU of packed retrieval results, bounded in bytes.
+
+    Keyed by the query embedding within a scope (document filter and
+    token budget): an exact match hits by key, otherwise the most similar
+    cached query of the same scope hits when its cosine similarity is at
+    least `threshold`. Queries without an embedding are keyed by their
+    normalized text. Entries belong to one index generation
+    (RAGEngine.index_generation()); the first lookup at another generation,
+    or store at a newer one, drops them all. Lookups drop them on any
+    change, since a rolled-back index transaction moves the generation back.
+    """
+
+    def __init__(self, max_bytes: int, threshold: float):
+        self.max_bytes = max_bytes
+        self.threshold = threshold
+        self._entries: OrderedDict[str, _CachedResult] = OrderedDict()
+        self._generation = 0
+        self._bytes = 0
+        self._matrix: Optional[np.ndarray] = None  # Stacked vectors, rebuilt lazily
+        self._matrix_keys: list[str] = []
+
+        self._hits = 0
+        self._near_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def make_key(scope: str, embedding: list[float], question: str) -> str:
+        digest = hashlib.sha1(scope.encode("utf-8"))
+        if embedding:
+            digest.update(np.asarray(embedding, dtype=np.float32).tobytes())
+        else:
+            digest.update(_WHITESPACE.sub(" ", question).strip().lower().encode("utf-8"))
+        return digest.hexdigest()
+
+    def lookup(
+        self, generation: int, scope: str, embedding: list[float], question: str
+    ) -> Optional[_CachedResult]:
+        """Cached result for the query, or None."""
+        self._sync(generation)
+        key = self.make_key(scope, embedding, question)
+        entry = self._entries.get(key)
+        if entry is None and embedding:
+            key = self._nearest(scope, embedding)
+            entry = self._entries.get(key) if key else None
+            if entry is not None:
+                self._near_hits += 1
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def store(
+        self,
+        generation: int,
+        scope: str,
+        embedding: list[float],
+        question: str,
+        chunks: list["Chunk"],
+        candidates: int
+    ):
+        """Cache a result computed at `generation` (dropped if the index has moved on)."""
+        if generation > self._generation:
+            self._sync(generation)
+        if generation != self._generation:
+            return
+        chunks = [replace(c, embedding=None) for c in chunks]
+        vector = None
+        if embedding:
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else None
+        nbytes = 256 + sum(
+            256 + len(c.content.encode("utf-8")) + len(c.heading_path) + len(c.source_filename or "")
+            for c in chunks
+        ) + (vector.nbytes if vector is not None else 0)
+        if nbytes > self.max_bytes:
+            return
+
+        key = self.make_key(scope, embedding, question)
+        previous = self._entries.pop(key, None)
+        if previous:
+            self._bytes -= previous.nbytes
+        self._entries[key] = _CachedResult(chunks, candidates, scope, vector, nbytes)
+        self._bytes += nbytes
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self._evictions += 1
+        self._matrix = None
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        self._matrix = None
+
+    def _sync(self, generation: int):
+        if generation != self._generation:
+            if self._entries:
+                self._invalidations += 1
+            self.clear()
+            self._generation = generation
+
+    def _nearest(self, scope: str, embedding: list[float]) -> Optional[str]:
+        """Key of the most similar cached query of the scope above the threshold."""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return None
+        if self._matrix is None:
+            self._matrix_keys = [k for k, e in self._entries.items() if e.vector is not None]
+            vectors = [self._entries[k].vector for k in self._matrix_keys]
+            dims = {len(v) for v in vectors}
+            self._matrix = np.stack(vectors) if len(dims) == 1 else np.empty((0, 0), dtype=np.float32)
+            if len(dims) > 1:
+                self._matrix_keys = []
+        if not self._matrix_keys or self._matrix.shape[1] != len(query):
+            return None
+        similarity = self._matrix @ (query / norm)
+        for i in np.argsort(-similarity):
+            if similarity[i] < self.threshold:
+                return None
+            if self._entries[self._matrix_keys[i]].scope == scope:
+                return self._matrix_keys[i]
+        return None
+
+    def get_stats(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "generation": self._generation,
+            "hits": self._hits,
+            "near_hits": self._near_hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 2) if lookups else 0.0,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations,
+        }
+
+
+class RetrievalPipeline:
+    """Candidate generation, MMR, rerank, neighbour merge and packing."""
+
+    def __init__(self, engine: "RAGEngine", db: Optional[aiosqlite.Connection] = None):
+        self._engine = engine
+        self._db = db
+        self._queries = 0
+        self._stage_ms = {stage: 0.0 for stage in STAGES}
+        self._rerank_hits = 0
+        self._rerank_misses = 0
+        self._rerank_errors = 0
+        # (query hash, chunk hash) -> (score, created_at) not yet written to rerank_cache
+        self._pending_scores: OrderedDict[tuple[str, str], tuple[float, float]] = OrderedDict()
+        self.cache = RetrievalCache(
+            max_bytes=int(config.rag.retrieval_cache_mb * 1024 * 1024),
+            threshold=config.rag.retrieval_cache_threshold
+        )
+
+    async def initialize(self, db: aiosqlite.Connection):
+        """Create the rerank score cache and drop expired entries."""
+        self._db = db
+        await self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS rerank_cache (
+                query_hash TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                score REAL NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (query_hash, chunk_hash)
+            ) WITHOUT ROWID;
+        """)
+        await self._db.execute(
+            "DELETE FROM rerank_cache WHERE created_at < ?",
+            (time.time() - config.rag.rerank_cache_ttl_seconds,)
+        )
+        await self._db.commit()
+
+    async def retrieve(
+        self,
+        question: str,
+        max_tokens: int = 2000,
+        document_id: Optional[str] = None
+    ) -> RetrievalResult:
+        """Run all stages; returns the packed chunks in rank order."""
+        settings = config.rag
+        result = RetrievalResult()
+        timings = result.timings_ms
+        clock = time.perf_counter()
+
+        def lap(stage: str):
+            nonlocal clock
+            now = time.perf_counter()
+            timings[stage] = round((now - clock) * 1000, 2)
+            clock = now
+
+        scope = f"{document_id or ''}|{max_tokens}"
+        embedding = await lm_client.get_embedding(question)
+        lap("embed")
+        # Read before searching: a result computed while the index changes
+        # (in any worker) is stored under the old generation, never served
+        generation = await self._engine.index_generation()
+        if settings.retrieval_cache_enabled:
+            hit = self.cache.lookup(generation, scope, embedding, question)
+            lap("cache")
+            if hit is not None:
+                result.chunks, result.candidates, result.cached = list(hit.chunks), hit.candidates, True
+                self._record(result)
+                return result
+        vector_ids = []
+        if embedding:
+            vector_ids = [cid for cid, _ in await self._engine.vector_candidates(
+                embedding, settings.candidate_k, document_id
+            )]
+        lap("vector")
+        keyword_ids = [cid for cid, _ in await self._engine.keyword_candidates(
+            question, settings.keyword_k, document_id
+        )]
+        lap("keyword")
+
+        fused = reciprocal_rank_fusion([vector_ids, keyword_ids])
+        chunks = await self._engine.get_chunks(list(fused))
+        for chunk in chunks:
+            chunk.score = fused[chunk.id]
+        chunks.sort(key=lambda c: c.score, reverse=True)
+        result.candidates = len(chunks)
+        lap("fuse")
+
+        if chunks:
+            relevance = np.asarray([c.score for c in chunks], dtype=np.float32)
+            relevance /= relevance.max()
+            picked = mmr_select(relevance, similarity_matrix(chunks), settings.mmr_k, settings.mmr_lambda)
+            chunks = [chunks[i] for i in picked]
+        lap("mmr")
+
+        if settings.rerank_enabled and chunks:
+            chunks = await self._rerank(question, chunks)
+        lap("rerank")
+
+        if settings.merge_neighbours:
+            chunks = merge_neighbours(chunks, self._engine.count_tokens)
+        lap("merge")
+
+        result.chunks = pack(chunks, max_tokens)
+        lap("pack")
+
+        if settings.retrieval_cache_enabled:
+            self.cache.store(generation, scope, embedding, question, result.chunks, result.candidates)
+        self._record(result)
+        return result
+
+    def _record(self, result: RetrievalResult):
+        self._queries += 1
+        for stage, ms in result.timings_ms.items():
+            self._stage_ms[stage] += ms
+        log.debug(
+            f"RAG retrieval: {result.candidates} candidates -> {len(result.chunks)} chunks"
+            + (" (cached)" if result.cached else ""),
+            **{f"{stage}_ms": ms for stage, ms in result.timings_ms.items()}
+        )
+
+    # ==================== Rerank ====================
+
+    async def _rerank(self, question: str, chunks: list["Chunk"]) -> list["Chunk"]:
+        """Order the top `rerank_top_n` chunks by model score (cached); the rest follow."""
+        settings = config.rag
+        head, tail = chunks[:settings.rerank_top_n], chunks[settings.rerank_top_n:]
+        qhash = query_hash(question, settings.rerank_model or "default")
+        keys = [_chunk_key(c) for c in head]
+
+        scores = await self._cached_scores(qhash, keys)
+        self._rerank_hits += len(scores)
+        missing = [i for i, key in enumerate(keys) if key not in scores]
+        self._rerank_misses += len(missing)
+        if missing:
+            fresh = await self._score(question, [head[i] for i in missing])
+            if fresh is None:
+                self._rerank_errors += 1
+                return chunks  # Keep the MMR order
+            now = time.time()
+            for i, score in zip(missing, fresh):
+                self._pending_scores[(qhash, keys[i])] = (score, now)
+                self._pending_scores.move_to_end((qhash, keys[i]))
+            while len(self._pending_scores) > MAX_PENDING_SCORES:
+                self._pending_scores.popitem(last=False)
+            scores.update((keys[i], score) for i, score in zip(missing, fresh))
+        await self._write_scores()
+
+        order = sorted(range(len(head)), key=lambda i: scores[keys[i]], reverse=True)  # Stable on ties
+        return [replace(head[i], score=scores[keys[i]]) for i in order] + tail
+
+    async def _cached_scores(self, qhash: str, keys: list[str]) -> dict[str, float]:
+        placeholders = ",".join("?" * len(keys))
+        async with self._db.execute(
+            f"""SELECT chunk_hash, score FROM rerank_cache
+                WHERE query_hash = ? AND created_at >= ? AND chunk_hash IN ({placeholders})""",
+            (qhash, time.time() - config.rag.rerank_cache_ttl_seconds, *keys)
+        ) as cursor:
+            scores = {row[0]: row[1] for row in await cursor.fetchall()}
+        for key in keys:
+            if (qhash, key) in self._pending_scores:
+                scores[key] = self._pending_scores[(qhash, key)][0]
+        return scores
+
+    async def _write_scores(self):
+        """
+        Write pending rerank scores and commit, unless the shared connection
+        has a transaction open: committing would also commit another
+        caller's unfinished changes, so they wait for the next rerank.
+        """
+        if not self._pending_scores or self._db.in_transaction:
+            return
+        rows = [(qhash, key, score, created_at)
+                for (qhash, key), (score, created_at) in self._pending_scores.items()]
+        self._pending_scores.clear()
+        await self._db.executemany(
+            "INSERT OR REPLACE INTO rerank_cache (query_hash, chunk_hash, score, created_at) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        await self._db.commit()
+
+    async def _score(self, question: str, chunks: list["Chunk"]) -> Optional[list[float]]:
+        """Relevance 0..1 per chunk from the rerank model, None on failure."""
+        limit = config.rag.rerank_passage_chars
+        passages = "\n\n".join(f"[{i}] {c.content[:limit]}" for i, c in enumerate(chunks, start=1))
+        messages = [
+            {"role": "system", "content": (
+                "Rate how well each passage answers the question on a scale of 0 to 10. "
+                "Reply with a JSON array of numbers only, one per passage, in order."
+            )},
+            {"role": "user", "content": f"Question: {question}\n\nPassages:\n{passages}"},
+        ]
+        try:
+            response = await lm_client.chat(
+                messages,
+                model=config.rag.rerank_model or None,
+                stream=False,
+                temperature=0.0,
+                max_tokens=8 * len(chunks) + 16,
+                priority=RequestPriority.INTERACTIVE
+            )
+            match = _JSON_ARRAY.search(response or "")
+            values = [float(v) for v in json.loads(match.group(0))] if match else []
+        except Exception as e:
+            log.warn(f"RAG rerank failed: {e}")
+            return None
+        if len(values) != len(chunks):
+            log.warn(f"RAG rerank returned {len(values)} scores for {len(chunks)} passages")
+            return None
+        return [min(max(v, 0.0), 10.0) / 10.0 for v in values]
+
+    def get_stats(self) -> dict:
+        """Query count, mean per-stage latency and rerank cache counters."""
+        queries = self._queries or 1
+        return {
+            "queries": self._queries,
+            "mean_stage_ms": {stage: round(ms / queries, 2) for stage, ms in self._stage_ms.items()},
+            "rerank_enabled": config.rag.rerank_enabled,
+            "rerank_cache_hits": self._rerank_hits,
+            "rerank_cache_misses": self._rerank_misses,
+            "rerank_errors": self._rerank_errors,
+            "cache": self.cache.get_stats(),
+        }
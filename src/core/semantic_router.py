@@ -12,10 +12,13 @@ Usage:
     # RouteDecision(category=CODE, model="deepseek-coder", thinking_mode="deep")
 """
 import asyncio
+import time
 from enum import Enum
 from dataclasses import dataclass
 from typing import Optional, TYPE_CHECKING
 
+from .logger import log
+
 if TYPE_CHECKING:
     from .user_profile import UserProfile
 
@@ -152,22 +155,27 @@ class SemanticRouter:
     Features:
     - Pre-computed category embeddings (fast lookup)
     - User profile integration (respects verbosity)
-    - Keyword fallback when embeddings unavailable
+    - Keyword fallback when embeddings unavailable (or still computing)
     """
     
+    PROBE_CONCURRENCY = 8  # Parallel probe embedding requests during warm-up
+    
     def __init__(self):
         self._embedding_service = None
         self._lm_client = None
         self._category_embeddings: dict[IntentCategory, list[list[float]]] = {}
         self._initialized = False
+        self._warmup_task: Optional[asyncio.Task] = None
     
-    async def initialize(self, lm_client, embedding_service=None):
+    async def initialize(self, lm_client, embedding_service=None, background: bool = False):
         """
         Initialize with LM client and compute category embeddings.
         
         Args:
             lm_client: LM client for embedding computation
             embedding_service: Optional shared embedding service
+            background: Return immediately and embed the probes in a
+                background task; routing uses keywords until it finishes
         """
         self._lm_client = lm_client
         
@@ -179,18 +187,47 @@ class SemanticRouter:
             await self._embedding_service.initialize(lm_client)
         
         # Pre-compute embeddings for all intent probes
-        await self._compute_category_embeddings()
+        if background:
+            self._warmup_task = asyncio.create_task(self._warm_up())
+        else:
+            await self._warm_up()
+    
+    async def _warm_up(self):
+        started = time.perf_counter()
+        try:
+            await self._compute_category_embeddings()
+        except Exception as e:
+            log.warn(f"Intent probe embedding failed, keyword routing only: {e}")
+            return
         self._initialized = True
+        log.debug(f"Semantic router ready in {(time.perf_counter() - started) * 1000:.0f}ms",
+                  probes=sum(len(e) for e in self._category_embeddings.values()))
+    
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait for background probe embedding. True once semantic routing is on."""
+        if self._warmup_task and not self._warmup_task.done():
+            await asyncio.wait({self._warmup_task}, timeout=timeout)
+        return self.ready
+    
+    @property
+    def ready(self) -> bool:
+        """Probe embeddings available (False: keyword routing)."""
+        return self._initialized and any(self._category_embeddings.values())
     
     async def _compute_category_embeddings(self):
-        """Pre-compute embeddings for intent probes."""
+        """Pre-compute embeddings for intent probes (concurrently, swapped in when complete)."""
+        semaphore = asyncio.Semaphore(self.PROBE_CONCURRENCY)
+        
+        async def embed(probe: str):
+            async with semaphore:
+                return await self._embedding_service.get_or_compute(probe)
+        
+        category_embeddings = {}
         for category, probes in INTENT_PROBES.items():
-            embeddings = []
-            for probe in probes:
-                emb = await self._embedding_service.get_or_compute(probe)
-                if emb:
-                    embeddings.append(emb)
-            self._category_embeddings[category] = embeddings
+            results = await asyncio.gather(*(embed(probe) for probe in probes))
+            category_embeddings[category] = [emb for emb in results if emb]
+        # Partially filled categories would skew routing, so publish all at once
+        self._category_embeddings = category_embeddings
     
     async def route(
         self,
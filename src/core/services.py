@@ -0,0 +1,127 @@
+"""
+Service registry for MAX AI Assistant startup.
+
+Subsystems register an async initializer and the services they depend
+on. `start()` runs every initializer as soon as its dependencies are
+ready, so independent ones (profile, RAG, templates, metrics, ...)
+initialize concurrently instead of one after another. Services marked
+lazy are only initialized by the first `ensure(name)`.
+
+Per-service cold-start times are kept for /api/health/cognitive and
+scripts/perf_test.py.
+
+Usage:
+    services.register("memory", memory.initialize)
+    services.register("rag", lambda: rag.initialize(memory._db), depends=("memory",))
+    await services.start()
+    services.get_timings()  # {"memory": 12.3, "rag": 1.1, ...} ms
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from .logger import log
+
+
+@dataclass
+class Service:
+    """One registered subsystem."""
+    name: str
+    init: Callable[[], Awaitable[None]]
+    depends: tuple[str, ...] = ()
+    lazy: bool = False
+    duration_ms: Optional[float] = None  # Own initializer time (excludes waiting for deps)
+    ready_at_ms: Optional[float] = None  # Since start() began
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+
+class ServiceRegistry:
+    """Dependency-ordered, concurrent subsystem initialization."""
+
+    def __init__(self):
+        self._services: dict[str, Service] = {}
+        self._started_at: Optional[float] = None
+        self.total_ms: Optional[float] = None
+
+    def register(
+        self,
+        name: str,
+        init: Callable[[], Awaitable[None]],
+        depends: tuple[str, ...] = (),
+        lazy: bool = False
+    ):
+        """Add a service (re-registering a name replaces it)."""
+        self._services[name] = Service(name=name, init=init, depends=tuple(depends), lazy=lazy)
+
+    async def start(self):
+        """Initialize all non-lazy services, concurrently where dependencies allow."""
+        self._started_at = time.perf_counter()
+        eager = [s.name for s in self._services.values() if not s.lazy]
+        await asyncio.gather(*(self.ensure(name) for name in eager), return_exceptions=True)
+        self.total_ms = (time.perf_counter() - self._started_at) * 1000
+
+        failed = {s.name: s.error for s in self._services.values() if s.error}
+        log.debug(f"Services started in {self.total_ms:.0f}ms", failed=len(failed))
+        if failed:
+            raise RuntimeError(f"Service initialization failed: {failed}")
+
+    async def ensure(self, name: str):
+        """Initialize `name` (and its dependencies) once; concurrent callers share the work."""
+        service = self._services.get(name)
+        if service is None:
+            raise KeyError(f"Unknown service: {name}")
+        if service.task is None:
+            service.task = asyncio.ensure_future(self._run(service))
+        await asyncio.shield(service.task)
+
+    async def _run(self, service: Service):
+        if service.depends:
+            try:
+                await asyncio.gather(*(self.ensure(dep) for dep in service.depends))
+            except Exception as e:
+                service.error = f"dependency failed: {e}"
+                raise
+        start = time.perf_counter()
+        try:
+            await service.init()
+        except Exception as e:
+            service.error = f"{type(e).__name__}: {e}"
+            log.error(f"Service '{service.name}' failed to initialize: {service.error}")
+            raise
+        finally:
+            service.duration_ms = (time.perf_counter() - start) * 1000
+            if self._started_at is not None:
+                service.ready_at_ms = (time.perf_counter() - self._started_at) * 1000
+
+    def is_ready(self, name: str) -> bool:
+        service = self._services.get(name)
+        return bool(service and service.task and service.task.done()
+                    and not service.task.cancelled() and service.error is None)
+
+    def get_timings(self) -> dict[str, float]:
+        """Own initializer time per service, ms (initialized services only)."""
+        return {
+            s.name: round(s.duration_ms, 1)
+            for s in self._services.values() if s.duration_ms is not None
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            "total_ms": round(self.total_ms, 1) if self.total_ms is not None else None,
+            "services": {
+                s.name: {
+                    "ready": self.is_ready(s.name),
+                    "lazy": s.lazy,
+                    "init_ms": round(s.duration_ms, 1) if s.duration_ms is not None else None,
+                    "ready_at_ms": round(s.ready_at_ms, 1) if s.ready_at_ms is not None else None,
+                    "error": s.error,
+                }
+                for s in self._services.values()
+            },
+        }
+
+
+# Global instance
+services = ServiceRegistry()
@@ -0,0 +1,189 @@
+"""
+Per-client session state for MAX AI Assistant.
+
+Each browser tab / Gradio client gets its own Session: current
+conversation, the message awaiting implicit feedback, and its own agent
+instance. Sessions are bounded in number (least recently used idle
+sessions are evicted) and dropped after an idle timeout, so several users
+can share one server without trampling each other's state.
+
+Usage:
+    session = session_manager.get(request.headers.get("X-Session-ID"))
+    session.begin_request()       # Busy sessions are never evicted
+    try:
+        session.conversation_id = conv_id
+        agent = await session_manager.get_agent(session)
+    finally:
+        session.end_request()
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from .config import config
+from .logger import log
+
+
+DEFAULT_SESSION = "default"  # Clients that don't send a session id share this one
+
+
+@dataclass
+class Session:
+    """State owned by one client."""
+    id: str
+    conversation_id: Optional[str] = None
+    pending_feedback_msg_id: Optional[int] = None  # Next user message is feedback on it
+    agent: Optional[Any] = field(default=None, repr=False)
+    created_at: float = field(default_factory=time.monotonic)
+    last_seen: float = field(default_factory=time.monotonic)
+    active_requests: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def begin_request(self):
+        self.active_requests += 1
+        self.touch()
+
+    def end_request(self):
+        self.active_requests = max(0, self.active_requests - 1)
+        self.touch()
+
+    @property
+    def agent_running(self) -> bool:
+        return bool(self.agent is not None and self.agent.is_running)
+
+    @property
+    def busy(self) -> bool:
+        """Busy sessions are never evicted."""
+        return self.active_requests > 0 or self.agent_running
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "conversation_id": self.conversation_id,
+            "agent_running": self.agent_running,
+            "active_requests": self.active_requests,
+            "idle_seconds": round(time.monotonic() - self.last_seen, 1),
+        }
+
+
+class SessionManager:
+    """
+    Registry of sessions keyed by client session id.
+
+    Args:
+        agent_factory: Async callable creating an initialized agent for a session
+        max_sessions: Cap on live sessions (idle LRU sessions evicted beyond it)
+        idle_ttl: Seconds of inactivity after which a session is dropped
+    """
+
+    def __init__(
+        self,
+        agent_factory: Optional[Callable[[], Awaitable[Any]]] = None,
+        max_sessions: Optional[int] = None,
+        idle_ttl: Optional[float] = None
+    ):
+        self.agent_factory = agent_factory
+        self.max_sessions = max_sessions or config.sessions.max_sessions
+        self.idle_ttl = idle_ttl or config.sessions.idle_ttl_seconds
+        self._sessions: OrderedDict[str, Session] = OrderedDict()  # LRU order
+        self._last_sweep = time.monotonic()
+        self._evicted = 0
+
+    def initialize(self, agent_factory: Callable[[], Awaitable[Any]]):
+        """Set how per-session agents are created."""
+        self.agent_factory = agent_factory
+
+    def get(self, session_id: Optional[str] = None) -> Session:
+        """Session for `session_id` (created if unknown; None -> default session)."""
+        session_id = (session_id or DEFAULT_SESSION).strip()[:128] or DEFAULT_SESSION
+        self._maybe_sweep()
+
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = Session(id=session_id)
+            self._sessions[session_id] = session
+            self._enforce_limit(keep=session_id)
+        else:
+            self._sessions.move_to_end(session_id)
+        session.touch()
+        return session
+
+    def peek(self, session_id: Optional[str]) -> Optional[Session]:
+        """Existing session or None (does not create or touch)."""
+        return self._sessions.get(session_id or DEFAULT_SESSION)
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    async def get_agent(self, session: Session) -> Any:
+        """The session's agent, created on first use."""
+        if session.agent is None:
+            async with session.lock:
+                if session.agent is None:
+                    if self.agent_factory is None:
+                        raise RuntimeError("SessionManager has no agent_factory")
+                    session.agent = await self.agent_factory()
+        return session.agent
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop sessions idle longer than idle_ttl. Returns how many were dropped."""
+        now = now if now is not None else time.monotonic()
+        stale = [
+            sid for sid, s in self._sessions.items()
+            if not s.busy and now - s.last_seen > self.idle_ttl
+        ]
+        for sid in stale:
+            del self._sessions[sid]
+        self._evicted += len(stale)
+        if stale:
+            log.debug(f"Evicted {len(stale)} idle sessions", remaining=len(self._sessions))
+        return len(stale)
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep >= config.sessions.sweep_interval_seconds:
+            self._last_sweep = now
+            self.evict_idle(now)
+
+    def _enforce_limit(self, keep: str):
+        """Evict least recently used idle sessions (except `keep`) until within max_sessions."""
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        idle = [sid for sid, s in self._sessions.items() if not s.busy and sid != keep]
+        for sid in idle[:excess]:
+            del self._sessions[sid]
+            self._evicted += 1
+        if len(self._sessions) > self.max_sessions:
+            log.warn(f"All sessions busy, running over limit ({len(self._sessions)}/{self.max_sessions})")
+
+    def find_agent_run(self, run_id: str) -> Optional[Any]:
+        """Agent of any session whose current run is `run_id`."""
+        for session in self._sessions.values():
+            run = getattr(session.agent, "_current_run", None)
+            if run is not None and run.id == run_id:
+                return session.agent
+        return None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get_stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "busy": sum(1 for s in self._sessions.values() if s.busy),
+            "agents": sum(1 for s in self._sessions.values() if s.agent is not None),
+            "evicted": self._evicted,
+        }
+
+
+# Global instance
+session_manager = SessionManager()
@@ -0,0 +1,268 @@
+"""
+Speculative Thinking Mode for MAX AI Assistant.
+
+Streams an immediate draft from the quick model while the reasoning
+model answers the same prompt in parallel. When the deep answer is ready
+it is delivered as a revision; the user can accept the draft early,
+which cancels the deep run.
+
+Stream items (same conventions as lm_client._stream_response):
+    str                                   - draft text
+    {"_meta": "thinking_start" | ...}     - draft thinking events
+    {"_meta": "draft_done", ...}          - draft finished, revision pending
+    {"_meta": "revision", "content": ...} - deep answer replaces the draft
+    {"_meta": "accepted" | "revision_failed", ...}
+
+Usage:
+    run = speculative_engine.start(messages)
+    async for item in speculative_engine.stream(run):
+        ...
+    # From another request:
+    speculative_engine.accept(run.id)
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import AsyncIterator, Optional, Union
+
+from .cancellation import CancelToken
+from .config import config
+from .lm_client import lm_client, ThinkingMode
+from .logger import log
+from .worker_bus import WORKER_ID
+
+
+class RunStatus(Enum):
+    """Lifecycle of a speculative run."""
+    DRAFTING = "drafting"      # Draft streaming, deep running
+    REFINING = "refining"      # Draft done, waiting for deep
+    REVISED = "revised"        # Deep answer delivered
+    ACCEPTED = "accepted"      # User kept the draft, deep cancelled
+    FAILED = "failed"          # Deep run failed, draft kept
+    CANCELLED = "cancelled"    # Client went away
+
+
+@dataclass
+class SpeculativeRun:
+    """One draft + refinement pair."""
+    id: str
+    messages: list[dict]
+    draft_model: str
+    deep_model: str
+    temperature: Optional[float] = None
+    cancel_token: Optional[CancelToken] = field(default=None, repr=False)
+    started_at: float = field(default_factory=time.perf_counter)
+    status: RunStatus = RunStatus.DRAFTING
+    draft_text: str = ""
+    deep_text: str = ""
+    # Latency to first visible (non-thinking) token, ms from run start
+    draft_first_token_ms: Optional[float] = None
+    deep_first_token_ms: Optional[float] = None
+    deep_done_ms: Optional[float] = None
+    deep_task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def timings(self) -> dict:
+        return {
+            "draft_first_token_ms": _round(self.draft_first_token_ms),
+            "deep_first_token_ms": _round(self.deep_first_token_ms),
+            "deep_done_ms": _round(self.deep_done_ms),
+        }
+
+
+def run_owner(run_id: str) -> Optional[str]:
+    """Worker that started a run (run ids are "<worker_id>.<hex>"), None if unknown."""
+    owner, _, _ = run_id.rpartition(".")
+    return owner or None
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+class LatencyWindow:
+    """Recent latency samples with simple percentiles."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, value: Optional[float]):
+        if value is not None:
+            self._samples.append(value)
+
+    def summary(self) -> dict:
+        if not self._samples:
+            return {"count": 0, "avg_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0}
+        ordered = sorted(self._samples)
+        return {
+            "count": len(ordered),
+            "avg_ms": round(sum(ordered) / len(ordered), 1),
+            "p50_ms": round(ordered[len(ordered) // 2], 1),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        }
+
+
+class SpeculativeEngine:
+    """Runs draft/refine pairs and keeps a registry for early acceptance."""
+
+    def __init__(self, client=None, worker_id: str = WORKER_ID):
+        self._client = client or lm_client
+        self._worker_id = worker_id
+        self._runs: OrderedDict[str, SpeculativeRun] = OrderedDict()
+        self._draft_latency = LatencyWindow()
+        self._deep_latency = LatencyWindow()
+        self._outcomes = {status.value: 0 for status in RunStatus}
+
+    def start(
+        self,
+        messages: list[dict],
+        temperature: Optional[float] = None,
+        cancel_token: Optional[CancelToken] = None
+    ) -> SpeculativeRun:
+        """Register a run and launch the deep model in the background."""
+        cfg = config.speculative
+        draft_mode = ThinkingMode(cfg.draft_mode)
+        deep_mode = ThinkingMode(cfg.refine_mode)
+
+        run = SpeculativeRun(
+            id=f"{self._worker_id}.{uuid.uuid4().hex[:12]}",
+            messages=messages,
+            draft_model=self._client.get_mode_config(draft_mode).model,
+            deep_model=self._client.get_mode_config(deep_mode).model,
+            temperature=temperature,
+            cancel_token=cancel_token,
+        )
+        run.deep_task = asyncio.create_task(self._run_deep(run, deep_mode))
+        # Failures are reported via the revision_failed event; never leave them unretrieved
+        run.deep_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        self._runs[run.id] = run
+        while len(self._runs) > cfg.max_active_runs:
+            _, stale = self._runs.popitem(last=False)
+            self._cancel_deep(stale)
+
+        log.lm(f"🔀 Speculative run {run.id}: draft={run.draft_model}, deep={run.deep_model}")
+        return run
+
+    async def stream(self, run: SpeculativeRun) -> AsyncIterator[Union[str, dict]]:
+        """Yield the draft stream, then the revision (or acceptance) event."""
+        try:
+            upstream = await self._client.chat(
+                messages=run.messages,
+                thinking_mode=ThinkingMode(config.speculative.draft_mode),
+                temperature=run.temperature,
+                stream=True,
+                cancel_token=run.cancel_token
+            )
+            parts = []
+            async for chunk in upstream:
+                if isinstance(chunk, str):
+                    if run.draft_first_token_ms is None and chunk.strip():
+                        run.draft_first_token_ms = run.elapsed_ms()
+                    parts.append(chunk)
+                yield chunk
+            run.draft_text = "".join(parts)
+
+            if run.status == RunStatus.DRAFTING:
+                run.status = RunStatus.REFINING
+            yield {"_meta": "draft_done", "run_id": run.id, **run.timings()}
+
+            await asyncio.wait({run.deep_task})
+            yield self._final_event(run)
+        finally:
+            if run.status in (RunStatus.DRAFTING, RunStatus.REFINING):
+                run.status = RunStatus.CANCELLED
+            self._finish(run)
+
+    def accept(self, run_id: str) -> bool:
+        """Keep the draft and cancel the deep run. False if the run is unknown or done."""
+        run = self._runs.get(run_id)
+        if run is None or run.status not in (RunStatus.DRAFTING, RunStatus.REFINING):
+            return False
+        run.status = RunStatus.ACCEPTED
+        self._cancel_deep(run)
+        log.lm(f"🔀 Speculative run {run_id}: draft accepted")
+        return True
+
+    def get_run(self, run_id: str) -> Optional[SpeculativeRun]:
+        return self._runs.get(run_id)
+
+    def get_stats(self) -> dict:
+        """First-useful-token latency of both paths and run outcomes."""
+        return {
+            "active_runs": sum(
+                1 for r in self._runs.values()
+                if r.status in (RunStatus.DRAFTING, RunStatus.REFINING)
+            ),
+            "draft_first_token": self._draft_latency.summary(),
+            "deep_first_token": self._deep_latency.summary(),
+            "outcomes": {k: v for k, v in self._outcomes.items() if k not in ("drafting", "refining")},
+        }
+
+    # ==================== Internals ====================
+
+    async def _run_deep(self, run: SpeculativeRun, mode: ThinkingMode):
+        """Collect the reasoning model's visible answer."""
+        upstream = await self._client.chat(
+            messages=run.messages,
+            thinking_mode=mode,
+            temperature=run.temperature,
+            stream=True,
+            cancel_token=run.cancel_token
+        )
+        parts = []
+        async for chunk in upstream:
+            if not isinstance(chunk, str):
+                continue  # Thinking events of the deep model stay server-side
+            if chunk.startswith("\n[Error:"):
+                raise RuntimeError(chunk.strip())
+            if run.deep_first_token_ms is None and chunk.strip():
+                run.deep_first_token_ms = run.elapsed_ms()
+            parts.append(chunk)
+        run.deep_text = "".join(parts).strip()
+        run.deep_done_ms = run.elapsed_ms()
+
+    def _final_event(self, run: SpeculativeRun) -> dict:
+        task = run.deep_task
+        if run.status == RunStatus.ACCEPTED or task.cancelled():
+            run.status = RunStatus.ACCEPTED
+            return {"_meta": "accepted", "run_id": run.id, **run.timings()}
+
+        error = task.exception()
+        if error is not None or not run.deep_text:
+            run.status = RunStatus.FAILED
+            log.warn(f"Speculative run {run.id}: deep model failed: {error or 'empty answer'}")
+            return {"_meta": "revision_failed", "run_id": run.id, **run.timings()}
+
+        run.status = RunStatus.REVISED
+        return {
+            "_meta": "revision",
+            "run_id": run.id,
+            "content": run.deep_text,
+            "changed": run.deep_text != run.draft_text.strip(),
+            "model": run.deep_model,
+            **run.timings(),
+        }
+
+    def _finish(self, run: SpeculativeRun):
+        self._cancel_deep(run)
+        if self._runs.pop(run.id, None) is None:
+            return  # Already evicted
+        self._draft_latency.add(run.draft_first_token_ms)
+        self._deep_latency.add(run.deep_first_token_ms)
+        self._outcomes[run.status.value] += 1
+        log.lm(f"🔀 Speculative run {run.id}: {run.status.value}", **run.timings())
+
+    @staticmethod
+    def _cancel_deep(run: SpeculativeRun):
+        if run.deep_task and not run.deep_task.done():
+            run.deep_task.cancel()
+
+
+# Global speculative engine
+speculative_engine = SpeculativeEngine()
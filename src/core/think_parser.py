@@ -0,0 +1,214 @@
+"""
+Incremental Think-Tag Parser for reasoning model streams.
+
+Splits a streamed completion into visible text and hidden reasoning
+blocks (<think>, <thinking>, <reasoning>, <reflection>).
+
+Design:
+- Scans only newly received characters (no re-scan of the whole buffer)
+- Holds back at most (longest tag - 1) chars when a tag may be split
+  across chunk boundaries
+- Tag matching is case-insensitive
+- Think content is collected as a list of parts capped at max_think_chars;
+  the full length is still counted
+
+Usage:
+    parser = ThinkTagParser()
+    for chunk in stream:
+        for event in parser.feed(chunk):
+            if isinstance(event, str):
+                ...  # visible text
+            elif event.kind == "start":
+                ...
+            else:  # "end"
+                ...  # event.content, event.chars, event.duration_ms
+    parser.flush()
+"""
+import re
+import time
+from dataclasses import dataclass
+from typing import Optional, Union
+
+
+# (open_tag, close_tag) pairs of supported reasoning models
+DEFAULT_TAG_PAIRS = [
+    ("<think>", "</think>"),           # DeepSeek R1, Qwen
+    ("<thinking>", "</thinking>"),     # Claude-style
+    ("<reasoning>", "</reasoning>"),   # Generic reasoning
+    ("<reflection>", "</reflection>"), # Reflection models
+]
+
+
+@dataclass
+class ThinkEvent:
+    """Boundary of a think block."""
+    kind: str                 # "start" or "end"
+    tag: str                  # Opening tag, e.g. "<think>"
+    content: str = ""         # Captured think content (capped), "end" only
+    chars: int = 0            # Full think content length, "end" only
+    duration_ms: int = 0      # Time between start and end tags, "end" only
+
+
+ParserOutput = Union[str, ThinkEvent]
+
+# Tags are ASCII: lowercase A-Z only so indices stay aligned with the input
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+class ThinkTagParser:
+    """Incremental tokenizer for think tags in streamed text."""
+
+    def __init__(
+        self,
+        tag_pairs: Optional[list[tuple[str, str]]] = None,
+        max_think_chars: int = 2000
+    ):
+        pairs = tag_pairs or DEFAULT_TAG_PAIRS
+        self._open_tags = [open_tag.lower() for open_tag, _ in pairs]
+        self._close_for = {open_tag.lower(): close_tag.lower() for open_tag, close_tag in pairs}
+        self._open_pattern = re.compile("|".join(re.escape(tag) for tag in self._open_tags))
+        self._max_tag_len = max(len(tag) for tag in [*self._open_tags, *self._close_for.values()])
+        self._max_think_chars = max_think_chars
+
+        # State
+        self._tail = ""                 # Held chars that may start a tag
+        self._open_tag: Optional[str] = None  # Current block's open tag
+        self._think_parts: list[str] = []
+        self._think_kept = 0
+        self._think_total = 0
+        self._think_started = 0.0
+
+        # Stats
+        self.visible_chars = 0
+        self.filtered_chars = 0
+        self.blocks = 0
+
+    @property
+    def in_think_block(self) -> bool:
+        return self._open_tag is not None
+
+    @property
+    def max_think_chars(self) -> int:
+        return self._max_think_chars
+
+    @property
+    def held_chars(self) -> int:
+        """Number of chars held back waiting for the next chunk."""
+        return len(self._tail)
+
+    def feed(self, chunk: str) -> list[ParserOutput]:
+        """Consume a chunk and return visible text pieces and block events."""
+        if not chunk:
+            return []
+
+        # Fast paths: no tag can start in this chunk and nothing is held back
+        if not self._tail:
+            if self._open_tag:
+                # Close tags start with "</" - a bare '<' in reasoning is just text
+                if "</" not in chunk and chunk[-1] != "<":
+                    self._think_total += len(chunk)
+                    if self._think_kept < self._max_think_chars:
+                        self._emit_think(chunk)
+                    return []
+            elif "<" not in chunk:
+                self.visible_chars += len(chunk)
+                return [chunk]
+
+        buf = self._tail + chunk
+        self._tail = ""
+        low = buf.translate(_ASCII_LOWER)  # Length-preserving, unlike str.lower()
+        out: list[ParserOutput] = []
+        pos = 0
+
+        while True:
+            if self._open_tag:
+                close_tag = self._close_for[self._open_tag]
+                end = low.find(close_tag, pos)
+                if end == -1:
+                    self._hold_partial(out, buf, low, pos, (close_tag,))
+                    break
+                self._emit(out, buf[pos:end])
+                pos = end + len(close_tag)
+                out.append(self._close_block())
+            else:
+                match = self._open_pattern.search(low, pos)
+                if not match:
+                    self._hold_partial(out, buf, low, pos, self._open_tags)
+                    break
+                self._emit(out, buf[pos:match.start()])
+                pos = match.end()
+                out.append(self._open_block(match.group()))
+
+        return out
+
+    def flush(self) -> list[ParserOutput]:
+        """
+        Finish the stream.
+
+        Held-back text outside a think block is released. An unclosed
+        think block is dropped (its content is never shown).
+        """
+        out: list[ParserOutput] = []
+        tail, self._tail = self._tail, ""
+        if tail:
+            self._emit(out, tail)
+        return out
+
+    # ==================== Internals ====================
+
+    def _hold_partial(
+        self,
+        out: list[ParserOutput],
+        buf: str,
+        low: str,
+        pos: int,
+        tags: list[str] | tuple[str, ...]
+    ):
+        """Emit buf[pos:] except a trailing prefix of one of `tags`."""
+        # Tags contain a single '<', so only the last one can start a partial tag
+        lt = low.rfind("<", max(pos, len(low) - self._max_tag_len + 1))
+        if lt != -1 and any(tag.startswith(low[lt:]) for tag in tags):
+            self._emit(out, buf[pos:lt])
+            self._tail = buf[lt:]
+        else:
+            self._emit(out, buf[pos:])
+
+    def _emit(self, out: list[ParserOutput], text: str):
+        """Route text to the output (visible) or the think buffer."""
+        if not text:
+            return
+        if self._open_tag:
+            self._think_total += len(text)
+            if self._think_kept < self._max_think_chars:
+                self._emit_think(text)
+        else:
+            self.visible_chars += len(text)
+            out.append(text)
+
+    def _emit_think(self, text: str):
+        """Keep think content up to the cap."""
+        kept = text[:self._max_think_chars - self._think_kept]
+        self._think_parts.append(kept)
+        self._think_kept += len(kept)
+
+    def _open_block(self, tag: str) -> ThinkEvent:
+        self._open_tag = tag
+        self._think_parts = []
+        self._think_kept = 0
+        self._think_total = 0
+        self._think_started = time.monotonic()
+        self.blocks += 1
+        return ThinkEvent(kind="start", tag=tag)
+
+    def _close_block(self) -> ThinkEvent:
+        event = ThinkEvent(
+            kind="end",
+            tag=self._open_tag,
+            content="".join(self._think_parts),
+            chars=self._think_total,
+            duration_ms=int((time.monotonic() - self._think_started) * 1000)
+        )
+        self.filtered_chars += self._think_total
+        self._open_tag = None
+        self._think_parts = []
+        return event
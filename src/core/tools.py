@@ -15,7 +15,6 @@ from typing import Optional, Any
 from dataclasses import dataclass
 from datetime import datetime
 
-from PIL import Image
 
 
 @dataclass
@@ -592,6 +591,7 @@ class ToolExecutor:
                 return ToolResult(False, "", f"Image not found: {path}")
 
             # Use context manager to properly close image
+            from PIL import Image  # Only image tools need Pillow
             with Image.open(p) as img:
                 # Get basic info
                 info = f"Image: {p.name}, Size: {img.size[0]}x{img.size[1]}, Format: {img.format}\n\n"
@@ -18,6 +18,7 @@ import aiosqlite
 
 from .config import config
 from .lm_client import lm_client
+from .worker_bus import worker_bus, TOPIC_PROFILE
 
 
 class Mood(Enum):
@@ -177,6 +178,11 @@ class UserProfile:
             (self._name, prefs_json, habits_json, dislikes_json)
         )
         await self._db.commit()
+        await worker_bus.publish(TOPIC_PROFILE)
+    
+    async def reload(self):
+        """Re-read the profile (saved by another API worker)."""
+        await self._load_profile()
     
     # ==================== Preferences ====================
     
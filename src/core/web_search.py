@@ -12,21 +12,21 @@ from dataclasses import dataclass
 from urllib.parse import urlparse
 
 import httpx
-from bs4 import BeautifulSoup
 
-# P2 fix: Handle both old and new package names for DuckDuckGo search
-try:
-    from duckduckgo_search import DDGS
-except ImportError:
+
+def _load_ddgs():
+    """DuckDuckGo client class, imported on first search (None if not installed)."""
+    # P2 fix: Handle both old and new package names for DuckDuckGo search
     try:
-        from ddgs import DDGS
+        from duckduckgo_search import DDGS
     except ImportError:
-        DDGS = None
-        # Don't import log here to avoid issues at module level if circular, 
-        # but print is robust for warning on import fail. 
-        # Let's import inside the except block to be safe or use print as fallback? 
-        # Actually logger.py is safe.
-        print("Warning: DuckDuckGo search not available. Install: pip install duckduckgo-search")
+        try:
+            from ddgs import DDGS
+        except ImportError:
+            from .logger import log
+            log.warn("DuckDuckGo search not available. Install: pip install duckduckgo-search")
+            return None
+    return DDGS
 
 
 @dataclass
@@ -44,8 +44,9 @@ class WebSearcher:
     """
 
     def __init__(self):
-        # P2 fix: Handle missing DDGS gracefully
-        self._ddgs = DDGS() if DDGS else None
+        # P2 fix: Handle missing DDGS gracefully (client created on first search)
+        self._ddgs = None
+        self._ddgs_loaded = False
         self._cache: dict[str, list[SearchResult]] = {}
         self._page_cache: dict[str, str] = {}
         
@@ -71,6 +72,10 @@ class WebSearcher:
             return self._cache[cache_key]
 
         # P2 fix: Check if DDGS is available
+        if not self._ddgs_loaded:
+            self._ddgs_loaded = True
+            ddgs_cls = _load_ddgs()
+            self._ddgs = ddgs_cls() if ddgs_cls else None
         if not self._ddgs:
             return []
 
@@ -131,6 +136,7 @@ class WebSearcher:
                 )
                 response.raise_for_status()
                 
+            from bs4 import BeautifulSoup
             soup = BeautifulSoup(response.text, "html.parser")
             
             # Remove script and style elements
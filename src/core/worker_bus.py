@@ -0,0 +1,262 @@
+"""
+Cross-worker coordination for MAX AI Assistant.
+
+With `run_api(workers=N)` each uvicorn worker is a separate process with
+its own in-memory caches and agents. Workers share only the SQLite
+database (WAL mode), so coordination goes through it too:
+
+- WorkerBus: a change table (`worker_events`) polled by every worker.
+  A worker that changes shared state invalidates its own caches and
+  publishes a topic; the others run their subscribed handlers.
+- AgentRegistry: which worker runs which session's agent, plus worker
+  heartbeats, so status/stop requests landing on another worker are
+  answered from the database or forwarded over the bus.
+
+Caches that are keyed by content (embeddings, LLM responses) need no
+invalidation and stay per-worker or persisted.
+
+Usage:
+    worker_bus.subscribe(TOPIC_METRICS, lambda payload: metrics_engine.invalidate_cache())
+    await worker_bus.start(memory._db)
+    ...
+    await worker_bus.publish(TOPIC_METRICS)
+"""
+import asyncio
+import inspect
+import json
+import os
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+import aiosqlite
+
+from .config import config
+from .logger import log
+
+
+# Topics
+TOPIC_METRICS = "metrics"                    # Interaction outcomes changed
+TOPIC_PROFILE = "user_profile"               # Preferences/habits saved
+TOPIC_AGENT_STOP = "agent.stop"              # {"run_id": ...}
+TOPIC_SPECULATIVE_ACCEPT = "speculative.accept"  # {"run_id": ...}
+
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class WorkerBus:
+    """Invalidation/event bus over a SQLite change table."""
+
+    def __init__(self, worker_id: str = WORKER_ID):
+        self.worker_id = worker_id
+        self._db: Optional[aiosqlite.Connection] = None
+        self._handlers: dict[str, list[Callable[[dict], Any]]] = {}
+        self._last_id = 0
+        self._task: Optional[asyncio.Task] = None
+        self._last_heartbeat = 0.0
+        self._last_prune = 0.0
+        self._published = 0
+        self._received = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def initialize(self, db: aiosqlite.Connection):
+        """Create tables and skip events published before this worker started."""
+        self._db = db
+        await self._ensure_tables()
+        async with self._db.execute("SELECT COALESCE(MAX(id), 0) FROM worker_events") as cursor:
+            self._last_id = (await cursor.fetchone())[0]
+
+    async def _ensure_tables(self):
+        await self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS worker_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                payload TEXT,
+                origin TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                pid INTEGER,
+                started_at REAL NOT NULL,
+                last_seen REAL NOT NULL
+            );
+        """)
+        await self._db.commit()
+
+    def subscribe(self, topic: str, handler: Callable[[dict], Any]):
+        """Run `handler(payload)` (sync or async) for events from other workers."""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def start(self, db: aiosqlite.Connection, interval: Optional[float] = None):
+        """Start polling (only needed with more than one worker)."""
+        await self.initialize(db)
+        if self.running:
+            return
+        await self.heartbeat()
+        self._task = asyncio.create_task(self._poll_loop(interval or config.workers.bus_poll_interval))
+        log.debug(f"Worker bus started ({self.worker_id})")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._db:
+            await self._db.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+            await self._db.commit()
+
+    async def publish(self, topic: str, payload: Optional[dict] = None):
+        """Notify the other workers. No-op when the bus isn't running (single worker)."""
+        if not self.running:
+            return
+        await self._db.execute(
+            "INSERT INTO worker_events (topic, payload, origin, created_at) VALUES (?, ?, ?, ?)",
+            (topic, json.dumps(payload or {}), self.worker_id, time.time())
+        )
+        await self._db.commit()
+        self._published += 1
+
+    async def poll(self) -> int:
+        """Dispatch new events from other workers. Returns how many were handled."""
+        async with self._db.execute(
+            "SELECT id, topic, payload, origin FROM worker_events WHERE id > ? ORDER BY id",
+            (self._last_id,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+        handled = 0
+        for event_id, topic, payload, origin in rows:
+            self._last_id = event_id
+            if origin == self.worker_id:
+                continue  # Publisher already applied its own change
+            handled += 1
+            await self._dispatch(topic, json.loads(payload or "{}"))
+        self._received += handled
+        return handled
+
+    async def _dispatch(self, topic: str, payload: dict):
+        for handler in self._handlers.get(topic, []):
+            try:
+                result = handler(payload)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                log.warn(f"Worker bus handler for '{topic}' failed: {e}")
+
+    async def heartbeat(self):
+        now = time.time()
+        await self._db.execute(
+            """INSERT INTO workers (worker_id, pid, started_at, last_seen) VALUES (?, ?, ?, ?)
+               ON CONFLICT(worker_id) DO UPDATE SET last_seen = excluded.last_seen""",
+            (self.worker_id, os.getpid(), now, now)
+        )
+        await self._db.commit()
+        self._last_heartbeat = now
+
+    async def prune(self):
+        """Drop delivered events and dead workers."""
+        now = time.time()
+        await self._db.execute(
+            "DELETE FROM worker_events WHERE created_at < ?",
+            (now - config.workers.event_retention_seconds,)
+        )
+        await self._db.execute(
+            "DELETE FROM workers WHERE last_seen < ?",
+            (now - config.workers.worker_timeout * 10,)
+        )
+        await self._db.commit()
+        self._last_prune = now
+
+    async def _poll_loop(self, interval: float):
+        while True:
+            try:
+                await self.poll()
+                now = time.time()
+                if now - self._last_heartbeat >= config.workers.heartbeat_interval:
+                    await self.heartbeat()
+                if now - self._last_prune >= config.workers.event_retention_seconds:
+                    await self.prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warn(f"Worker bus poll failed: {e}")
+            await asyncio.sleep(interval)
+
+    async def is_alive(self, worker_id: str) -> bool:
+        """True for this worker and for workers with a recent heartbeat."""
+        if worker_id == self.worker_id:
+            return True
+        async with self._db.execute(
+            "SELECT last_seen FROM workers WHERE worker_id = ?", (worker_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return bool(row) and time.time() - row[0] < config.workers.worker_timeout
+
+    def get_stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "running": self.running,
+            "published": self._published,
+            "received": self._received,
+            "last_event_id": self._last_id,
+        }
+
+
+class AgentRegistry:
+    """Which worker owns each session's latest agent run."""
+
+    def __init__(self, bus: WorkerBus):
+        self.bus = bus
+        self._db: Optional[aiosqlite.Connection] = None
+
+    async def initialize(self, db: aiosqlite.Connection):
+        self._db = db
+        if self.bus._db is None:
+            await self.bus.initialize(db)  # Worker heartbeats (bus may not be running)
+        await self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS agent_registry (
+                session_id TEXT PRIMARY KEY,
+                run_id TEXT NOT NULL,
+                worker_id TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+        await self._db.commit()
+
+    async def register(self, session_id: str, run_id: str):
+        """Record that this worker runs `run_id` for `session_id`."""
+        await self._db.execute(
+            """INSERT INTO agent_registry (session_id, run_id, worker_id, updated_at)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(session_id) DO UPDATE SET
+                   run_id = excluded.run_id, worker_id = excluded.worker_id,
+                   updated_at = excluded.updated_at""",
+            (session_id, run_id, self.bus.worker_id, time.time())
+        )
+        await self._db.commit()
+
+    async def lookup(self, session_id: str) -> Optional[dict]:
+        """{"run_id", "worker_id", "local", "alive"} for the session's latest run."""
+        async with self._db.execute(
+            "SELECT run_id, worker_id FROM agent_registry WHERE session_id = ?", (session_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if not row:
+            return None
+        run_id, worker_id = row[0], row[1]
+        return {
+            "run_id": run_id,
+            "worker_id": worker_id,
+            "local": worker_id == self.bus.worker_id,
+            "alive": await self.bus.is_alive(worker_id),
+        }
+
+
+# Global instances
+worker_bus = WorkerBus()
+agent_registry = AgentRegistry(worker_bus)
@@ -26,15 +26,16 @@ import gradio as gr
 
 from ..core.config import config
 from ..core.lm_client import lm_client, TaskType
-from ..core.memory import memory, Conversation
+from ..core.memory import memory
 from ..core.user_profile import user_profile, Verbosity, Formality
 from ..core.tools import tools, TOOLS
 from ..core.web_search import web_searcher
 from ..core.rag import rag
-from ..core.autogpt import autogpt, RunStatus
+from ..core.autogpt import autogpt, AutoGPTAgent, RunStatus
 from ..core.templates import templates
 from ..core.speech import speech
 from ..core.metrics import metrics_engine
+from ..core.sessions import Session, SessionManager
 from ..core.adaptation import (
     initialize_adaptation, prompt_builder, correction_detector,
     anticipation_engine
@@ -47,12 +48,12 @@ class MaxAssistantUI:
     """
     
     def __init__(self):
-        self.current_conversation: Optional[Conversation] = None
         self._initialized = False
         # P0 Fix: Security state for dangerous actions
         self.allow_dangerous = False
-        # Logic Fix: Track pending message for feedback analysis
-        self._pending_feedback_msg_id: Optional[int] = None
+        # Per-browser state (current conversation, pending feedback, agent)
+        # keyed by Gradio's session hash, so two tabs don't share a conversation
+        self.sessions = SessionManager(agent_factory=self._create_agent)
         
     async def initialize(self):
         """Initialize all subsystems."""
@@ -62,9 +63,7 @@ class MaxAssistantUI:
         await memory.initialize()
         await user_profile.initialize(memory._db)
         await rag.initialize(memory._db)
-        await autogpt.initialize(memory._db)
-        # P0 Fix: Register security callback
-        autogpt.set_callbacks(on_confirmation_needed=self._security_check)
+        await autogpt.initialize(memory._db)  # Run history listing
         await templates.initialize(memory._db)
         
         # IQ & Empathy metrics system
@@ -76,9 +75,25 @@ class MaxAssistantUI:
         # P0 Fix: Load security preference
         if user_profile.preferences:
              self.allow_dangerous = user_profile.preferences.allow_dangerous
-        
-        # Create initial conversation
-        self.current_conversation = await memory.create_conversation("Новый разговор")
+    
+    def _session(self, request: Optional[gr.Request]) -> Session:
+        """Session of the browser tab making the call."""
+        return self.sessions.get(getattr(request, "session_hash", None))
+    
+    async def _conversation_id(self, session: Session) -> str:
+        """Current conversation of `session` (created on first message)."""
+        if not session.conversation_id:
+            conv = await memory.create_conversation("Новый разговор")
+            session.conversation_id = conv.id
+        return session.conversation_id
+    
+    async def _create_agent(self) -> AutoGPTAgent:
+        """Agent for one session."""
+        agent = AutoGPTAgent(memory._db)
+        await agent.initialize(memory._db)
+        # P0 Fix: Register security callback
+        agent.set_callbacks(on_confirmation_needed=self._security_check)
+        return agent
     
     async def chat(
         self,
@@ -87,7 +102,8 @@ class MaxAssistantUI:
         model_choice: str,
         temperature: float,
         reasoning_mode: bool,
-        use_rag: bool
+        use_rag: bool,
+        request: gr.Request = None
     ) -> Generator:
         """Process chat message with streaming response."""
         if not self._initialized:
@@ -97,30 +113,47 @@ class MaxAssistantUI:
             yield history
             return
         
+        session = self._session(request)
+        session.begin_request()
+        try:
+            async for update in self._chat(session, message, history, model_choice,
+                                           temperature, reasoning_mode, use_rag):
+                yield update
+        finally:
+            session.end_request()
+    
+    async def _chat(
+        self,
+        session: Session,
+        message: str,
+        history: list,
+        model_choice: str,
+        temperature: float,
+        reasoning_mode: bool,
+        use_rag: bool
+    ) -> Generator:
+        conv_id = await self._conversation_id(session)
+        
         # Logic Fix: Analyze current message as feedback on PREVIOUS response
-        if self._pending_feedback_msg_id:
+        if session.pending_feedback_msg_id:
             await metrics_engine.record_interaction_outcome(
-                message_id=self._pending_feedback_msg_id,
+                message_id=session.pending_feedback_msg_id,
                 user_message=message,  # This IS the reaction to previous response
                 facts_in_context=0,
                 style_prompt_length=0
             )
-            self._pending_feedback_msg_id = None
+            session.pending_feedback_msg_id = None
         
         # Track interaction for personalization
         await user_profile.track_interaction(message)
         await user_profile.detect_mood(message)
         
         # Add user message to memory
-        await memory.add_message(
-            self.current_conversation.id,
-            "user",
-            message
-        )
+        await memory.add_message(conv_id, "user", message)
         
         # Build context with smart memory
         context = await memory.get_smart_context(
-            self.current_conversation.id,
+            conv_id,
             max_tokens=config.memory.max_context_tokens
         )
         
@@ -182,7 +215,7 @@ class MaxAssistantUI:
                 yield history
             
             saved_msg = await memory.add_message(
-                self.current_conversation.id,
+                conv_id,
                 "assistant",
                 full_response,
                 model_used=model
@@ -190,7 +223,7 @@ class MaxAssistantUI:
             
             # Logic Fix: Store message ID to analyze USER's NEXT message as feedback
             if saved_msg:
-                self._pending_feedback_msg_id = saved_msg.id
+                session.pending_feedback_msg_id = saved_msg.id
             
             # Save daily metrics periodically
             if user_profile.habits and user_profile.habits.total_interactions % 20 == 0:
@@ -200,12 +233,15 @@ class MaxAssistantUI:
             history[-1][1] = f"Error: {str(e)}"
             yield history
     
-    async def new_conversation(self):
+    async def new_conversation(self, request: gr.Request = None):
         """Start a new conversation."""
         if not self._initialized:
             await self.initialize()
-        self.current_conversation = await memory.create_conversation("Новый разговор")
-        return [], f"Новый разговор: {self.current_conversation.id[:8]}"
+        session = self._session(request)
+        conv = await memory.create_conversation("Новый разговор")
+        session.conversation_id = conv.id
+        session.pending_feedback_msg_id = None
+        return [], f"Новый разговор: {conv.id[:8]}"
     
     async def search_history(self, query: str) -> list:
         """Search across all conversations."""
@@ -216,7 +252,9 @@ class MaxAssistantUI:
         results = await memory.search_history(query, limit=20)
         return [[r.conversation_id[:8], r.role, r.content[:100] + "..."] for r in results]
     
-    async def load_conversation_from_history(self, evt: gr.SelectData, search_results: list):
+    async def load_conversation_from_history(
+        self, evt: gr.SelectData, search_results: list, request: gr.Request = None
+    ):
         """Load selected conversation from history."""
         # Get row index
         index = evt.index[0]
@@ -229,7 +267,9 @@ class MaxAssistantUI:
         conv = next((c for c in convs if c.id.startswith(short_id)), None)
         
         if conv:
-            self.current_conversation = conv
+            session = self._session(request)
+            session.conversation_id = conv.id
+            session.pending_feedback_msg_id = None
             # Get messages for chat
             messages = await memory.get_messages(conv.id)
             history = []
@@ -258,11 +298,12 @@ class MaxAssistantUI:
             model_ids = ["auto"]
         return gr.Dropdown(choices=model_ids, value="auto")
     
-    async def save_feedback(self, rating: int, history: list):
+    async def save_feedback(self, rating: int, history: list, request: gr.Request = None):
         """Save user feedback on last response."""
-        if not history:
+        conv_id = self._session(request).conversation_id
+        if not history or not conv_id:
             return "Нет сообщений"
-        messages = await memory.get_messages(self.current_conversation.id, limit=1)
+        messages = await memory.get_messages(conv_id, limit=1)
         if messages:
             await user_profile.record_feedback(messages[-1].id, positive=(rating > 0))
         return "Спасибо!"
@@ -318,7 +359,7 @@ class MaxAssistantUI:
         """P0 Fix: Security callback for dangerous tools."""
         return self.allow_dangerous
 
-    async def start_autogpt(self, goal: str, max_steps: int) -> Generator:
+    async def start_autogpt(self, goal: str, max_steps: int, request: gr.Request = None) -> Generator:
         """Start an Auto-GPT run (Non-blocking generator)."""
         if not self._initialized:
             await self.initialize()
@@ -326,14 +367,20 @@ class MaxAssistantUI:
             yield "Введите цель", []
             return
         
+        session = self._session(request)
         try:
-            run = await autogpt.set_goal(goal, max_steps=int(max_steps))
+            agent = await self.sessions.get_agent(session)
+            async with session.lock:
+                if agent.is_running:
+                    yield "Агент уже выполняется", []
+                    return
+                run = await agent.set_goal(goal, max_steps=int(max_steps))
             
             steps_data = []
             yield f"Status: {run.status.value}", steps_data
             
             # P1 Fix: Consume generator for non-blocking UI updates
-            async for step in autogpt.run_generator():
+            async for step in agent.run_generator():
                 steps_data.append([
                     step.step_number, 
                     step.action, 
@@ -14,6 +14,8 @@ import pytest_asyncio
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+SCHEMA = Path(__file__).parent.parent / "data" / "schema.sql"
+
 
 # ============= Event Loop =============
 
@@ -140,6 +142,59 @@ def sample_feedback_signals():
     }
 
 
+# ============= Schema Database =============
+
+@pytest_asyncio.fixture
+async def connect_db(tmp_path):
+    """Open connections to one database file (closed after the test), e.g. one per worker."""
+    import aiosqlite
+
+    connections = []
+
+    async def connect():
+        conn = await aiosqlite.connect(str(tmp_path / "test.db"))
+        conn.row_factory = aiosqlite.Row
+        connections.append(conn)
+        return conn
+
+    yield connect
+    for conn in reversed(connections):
+        await conn.close()
+
+
+@pytest_asyncio.fixture
+async def schema_db(connect_db):
+    """Connection to a fresh database with data/schema.sql applied."""
+    conn = await connect_db()
+    await conn.executescript(SCHEMA.read_text(encoding="utf-8"))
+    await conn.commit()
+    return conn
+
+
+# ============= Chunker Tokenizer =============
+
+class WordTokenizer:
+    """Chunker tokenizer stand-in: one token per whitespace-separated word."""
+
+    name = "words"
+
+    def count(self, text):
+        return len(text.split())
+
+    def offsets(self, text):
+        import re
+        import numpy as np
+        return np.array([m.start() for m in re.finditer(r"\S+", text)], dtype=np.int64)
+
+
+@pytest.fixture
+def word_tokenizer(monkeypatch):
+    """WordTokenizer, also installed as the chunker's default tokenizer."""
+    tokenizer = WordTokenizer()
+    monkeypatch.setattr("src.core.chunker._tokenizer", tokenizer)
+    return tokenizer
+
+
 # ============= Test Client for FastAPI =============
 
 @pytest.fixture
@@ -0,0 +1,251 @@
+"""
+Fake OpenAI-compatible LM server for tests and benchmarks.
+
+A tiny asyncio HTTP server that "generates" tokens at a fixed rate, like
+LM Studio does, and stops generating as soon as the client connection
+drops. Each request is recorded as a Generation so tests can check when
+(and whether) the server-side work stopped.
+
+Endpoints:
+    POST /v1/chat/completions  - streaming (optional <think> block) or not
+    POST /v1/embeddings        - deterministic vectors (hash of the text)
+    GET  /v1/models            - `models`, first one reported as loaded
+
+Usage:
+    server = FakeLMServer(token_interval=0.01)
+    await server.start()
+    client = AsyncOpenAI(base_url=server.base_url, api_key="test")
+    ...
+    await server.stop()
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+
+@dataclass
+class Generation:
+    """One chat completion handled by the server."""
+    model: str
+    stream: bool
+    tokens_sent: int = 0
+    disconnected: bool = False  # Client went away mid-generation
+    started_at: float = field(default_factory=time.monotonic)
+    stopped_at: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+def fake_embedding(text: str, dim: int = 64) -> list[float]:
+    """Deterministic unit vector for `text` (same text -> same vector)."""
+    values = []
+    counter = 0
+    while len(values) < dim:
+        digest = hashlib.sha256(f"{counter}:{text}".encode()).digest()
+        values.extend(b / 127.5 - 1.0 for b in digest)
+        counter += 1
+    values = values[:dim]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+
+class FakeLMServer:
+    """
+    Streams up to `max_tokens` tokens per request, `token_interval` seconds apart.
+
+    Args:
+        token_interval: Seconds between streamed tokens (1 / tokens per second)
+        max_tokens: Upper bound of generated tokens per request
+        token: Text of each generated token
+        first_token_delay: Extra delay before the first token (prompt processing)
+        think_tokens: Tokens streamed inside a <think> block before the answer
+        embedding_dim: Size of /v1/embeddings vectors
+        models: Model ids served by /v1/models
+        responder: Optional fn(payload) -> content for non-streaming chat
+            (None falls back to `token` * max_tokens)
+    """
+
+    def __init__(
+        self,
+        token_interval: float = 0.01,
+        max_tokens: int = 1000,
+        token: str = "tok ",
+        first_token_delay: float = 0.0,
+        think_tokens: int = 0,
+        embedding_dim: int = 64,
+        models: tuple[str, ...] = ("fake-model",),
+        responder: Optional[Callable[[dict], Optional[str]]] = None
+    ):
+        self.token_interval = token_interval
+        self.max_tokens = max_tokens
+        self.token = token
+        self.first_token_delay = first_token_delay
+        self.think_tokens = think_tokens
+        self.embedding_dim = embedding_dim
+        self.models = list(models)
+        self.responder = responder
+        self.generations: list[Generation] = []
+        self.embedding_requests = 0
+        self.embedding_inputs = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: set[asyncio.Task] = set()
+        self.port = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            for task in self._handlers:
+                task.cancel()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode().split("\r\n")
+            method, path, _ = lines[0].split(" ", 2)
+            headers = {
+                k.strip().lower(): v.strip()
+                for k, v in (line.split(":", 1) for line in lines[1:] if ":" in line)
+            }
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            payload = json.loads(body) if body else {}
+
+            if method == "POST" and path.endswith("/chat/completions"):
+                await self._chat(payload, reader, writer)
+            elif method == "POST" and path.endswith("/embeddings"):
+                self._send_json(writer, 200, self._embeddings(payload))
+                await writer.drain()
+            elif method == "GET" and path.endswith("/models"):
+                self._send_json(writer, 200, {
+                    "object": "list",
+                    "data": [{"id": m, "object": "model", "owned_by": "fake"} for m in self.models],
+                })
+                await writer.drain()
+            else:
+                self._send_json(writer, 404, {"error": {"message": f"Unknown path {path}"}})
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def _chat(self, payload: dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        gen = Generation(model=payload.get("model", ""), stream=bool(payload.get("stream")))
+        self.generations.append(gen)
+        limit = min(payload.get("max_tokens") or self.max_tokens, self.max_tokens)
+
+        if not gen.stream:
+            content = self.responder(payload) if self.responder else None
+            if content is None:
+                content = self.token * limit
+            # Generation time proportional to the answer length (~len(token) chars per token)
+            n_tokens = min(limit, max(1, len(content) // max(1, len(self.token))))
+            await asyncio.sleep(self.first_token_delay + self.token_interval * n_tokens)
+            gen.tokens_sent = n_tokens
+            self._finish(gen)
+            self._send_json(writer, 200, self._completion(gen.model, content))
+            await writer.drain()
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+        )
+        # EOF on the request side means the client closed the connection
+        client_gone = asyncio.ensure_future(reader.read(1))
+        pieces = []
+        if self.think_tokens:
+            pieces = ["<think>"] + ["hmm "] * self.think_tokens + ["</think>"]
+        pieces += [self.token] * limit
+        try:
+            if self.first_token_delay:
+                await asyncio.sleep(self.first_token_delay)
+            for piece in pieces:
+                if client_gone.done():
+                    gen.disconnected = True
+                    break
+                self._send_event(writer, self._chunk(gen.model, piece))
+                await writer.drain()
+                gen.tokens_sent += 1
+                await asyncio.sleep(self.token_interval)
+            else:
+                self._send_event(writer, self._chunk(gen.model, None, finish_reason="stop"))
+                writer.write(b"data: [DONE]\n\n")
+                await writer.drain()
+        except ConnectionError:
+            gen.disconnected = True
+        finally:
+            client_gone.cancel()
+            self._finish(gen)
+
+    def _embeddings(self, payload: dict) -> dict:
+        inputs = payload.get("input", "")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self.embedding_requests += 1
+        self.embedding_inputs += len(inputs)
+
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_embedding(str(text), self.embedding_dim)
+            if payload.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        return {
+            "object": "list", "data": data, "model": payload.get("model", ""),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    @staticmethod
+    def _finish(gen: Generation):
+        gen.stopped_at = time.monotonic()
+        gen.done.set()
+
+    @staticmethod
+    def _send_json(writer: asyncio.StreamWriter, status: int, data: dict):
+        body = json.dumps(data).encode()
+        writer.write(
+            f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+
+    @staticmethod
+    def _send_event(writer: asyncio.StreamWriter, data: dict):
+        writer.write(f"data: {json.dumps(data)}\n\n".encode())
+
+    @staticmethod
+    def _chunk(model: str, content: Optional[str], finish_reason: Optional[str] = None) -> dict:
+        delta = {"content": content} if content is not None else {}
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    @staticmethod
+    def _completion(model: str, content: str) -> dict:
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion",
+            "created": int(time.time()), "model": model,
+            "choices": [{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
@@ -0,0 +1,135 @@
+"""
+Tests for request-scoped cancellation (client disconnect -> upstream stop).
+"""
+import asyncio
+import time
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tests.fake_lm_server import FakeLMServer
+
+
+MESSAGES = [{"role": "user", "content": "Write a very long story"}]
+
+
+class TestCancelToken:
+    """Tests for CancelToken bookkeeping."""
+
+    async def test_cancels_tracked_tasks(self):
+        from src.core.cancellation import CancelToken, cancel_scope, track_task
+
+        token = CancelToken("test")
+        with cancel_scope(token):
+            task = track_task(asyncio.create_task(asyncio.sleep(10)))
+        untracked = track_task(asyncio.create_task(asyncio.sleep(0)))  # No scope: not tied
+
+        assert token.cancel("gone")
+        await asyncio.sleep(0)
+
+        assert task.cancelled()
+        assert not untracked.cancelled()
+        assert not token.cancel("again")  # Idempotent
+        assert token.reason == "gone"
+
+    async def test_callbacks(self):
+        from src.core.cancellation import CancelToken
+
+        token = CancelToken()
+        closed = []
+
+        async def close():
+            closed.append("async")
+
+        token.on_cancel(close)
+        unregister = token.on_cancel(lambda: closed.append("removed"))
+        unregister()
+        token.cancel()
+        await token.wait_closed()
+
+        token.on_cancel(lambda: closed.append("late"))  # Runs at once on a cancelled token
+        assert closed == ["async", "late"]
+
+    async def test_task_added_after_cancel(self):
+        from src.core.cancellation import CancelToken
+
+        token = CancelToken()
+        token.cancel()
+        task = token.add_task(asyncio.create_task(asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        assert task.cancelled()
+
+
+class TestUpstreamCancellation:
+    """The fake server's generation stops when the request is cancelled."""
+
+    @pytest.fixture
+    async def server(self):
+        server = FakeLMServer(token_interval=0.01, max_tokens=2000)
+        await server.start()
+        yield server
+        await server.stop()
+
+    def _client(self, server):
+        from openai import AsyncOpenAI
+        from src.core.lm_client import LMStudioClient
+
+        client = LMStudioClient()
+        client.client = AsyncOpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+        return client
+
+    async def test_generation_stops_within_bound(self, server):
+        from src.core.cancellation import CancelToken
+
+        client = self._client(server)
+        token = CancelToken("chat")
+        stream = await client.chat(MESSAGES, model="fake", stream=True, cancel_token=token)
+
+        received = []
+        async for item in stream:
+            received.append(item)
+            if len(received) == 3:
+                break  # Consumer stalls (e.g. SSE writer blocked), stream stays open
+
+        cancelled_at = time.monotonic()
+        token.cancel("client disconnected")
+        generation = server.generations[0]
+        await asyncio.wait_for(generation.done.wait(), timeout=2.0)
+
+        assert generation.disconnected
+        assert generation.stopped_at - cancelled_at < 0.5
+        assert generation.tokens_sent < server.max_tokens
+
+        # Remaining iteration ends quietly and frees the scheduler slot
+        rest = [item async for item in stream]
+        assert not any(isinstance(i, str) and i.startswith("\n[Error:") for i in rest)
+        assert client.scheduler.get_stats()["active"] == 0
+
+    async def test_consumer_cancellation_closes_upstream(self, server):
+        """Cancelling the task that reads the stream also drops the connection."""
+        client = self._client(server)
+
+        async def consume():
+            async for _ in await client.chat(MESSAGES, model="fake", stream=True):
+                pass
+
+        task = asyncio.create_task(consume())
+        while not server.generations or server.generations[0].tokens_sent < 3:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+        generation = server.generations[0]
+        await asyncio.wait_for(generation.done.wait(), timeout=2.0)
+        assert generation.disconnected
+        assert client.scheduler.get_stats()["active"] == 0
+
+    async def test_completed_stream(self, server):
+        server.max_tokens = 5
+        client = self._client(server)
+
+        items = [i async for i in await client.chat(MESSAGES, model="fake", stream=True)]
+
+        assert "".join(items) == "tok " * 5
+        assert not server.generations[0].disconnected
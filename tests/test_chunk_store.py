@@ -0,0 +1,229 @@
+"""
+Tests for the memory-mapped segment store and segment collections in RAG.
+"""
+import pytest
+import pytest_asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+TOPICS = ("apples", "pears", "plums")
+
+
+class TopicEmbedder:
+    """Embedding stand-in: topic word counts; records what it embedded."""
+
+    def __init__(self):
+        self.texts = []
+
+    async def __call__(self, texts):
+        self.texts.extend(texts)
+        return [[float(t.count(topic)) + 0.01 for topic in TOPICS] for t in texts]
+
+
+def sections(*names):
+    return "".join(f"# {name}\n\nAll about {name} and nothing else.\n\n" for name in names)
+
+
+class TestSegmentStore:
+    """Tests for SegmentStore."""
+
+    def test_append_search_and_reopen(self, tmp_path):
+        import numpy as np
+        from src.core.chunk_store import SegmentStore
+
+        store = SegmentStore(tmp_path / "kb")
+        assert store.append(["привет", "world"], [[1.0, 0.0], [0.0, 2.0]]) == [0, 1]
+        assert store.append(["no vector"], [[]]) == [2]
+
+        assert [slot for slot, _ in store.search([0.1, 1.0], k=2)] == [1, 0]
+        assert store.texts([0, 2]) == ["привет", "no vector"]
+        assert isinstance(store.vectors(), np.memmap)  # Zero-copy view
+        assert store.vectors([1]).tolist() == [[0.0, 1.0]]  # Stored normalized
+        store.close()
+
+        reopened = SegmentStore(tmp_path / "kb")
+        assert (reopened.count, reopened.dim) == (3, 2)
+        assert reopened.search([1.0, 0.0], k=1)[0][0] == 0
+        assert reopened.append(["more"], [[1.0, 1.0]]) == [3]
+        assert reopened.texts([3, 1]) == ["more", "world"]
+
+    def test_delete_and_compact(self, tmp_path):
+        from src.core.chunk_store import SegmentStore
+
+        store = SegmentStore(tmp_path / "kb")
+        store.append([f"t{i}" for i in range(5)], [[1.0, float(i)] for i in range(5)])
+        store.delete([1, 3])
+
+        assert {slot for slot, _ in store.search([1.0, 1.0], k=5)} == {0, 2, 4}
+        generation = store.compact([0, 2, 4])
+        assert store.texts([1]) == ["t1"]  # Old generation still live until activated
+        store.activate(generation)
+
+        assert (store.count, store.get_stats()["deleted"]) == (3, 0)
+        assert store.texts([0, 1, 2]) == ["t0", "t2", "t4"]
+        assert sorted(p.name for p in (tmp_path / "kb").iterdir()) == [
+            "meta.json", f"slots.{generation}.idx", f"text.{generation}.heap", f"vectors.{generation}.f32"
+        ]
+
+    def test_uncommitted_compaction_is_discarded_on_open(self, tmp_path):
+        from src.core.chunk_store import SegmentStore
+
+        store = SegmentStore(tmp_path / "kb")
+        store.append(["a", "b"], [[1.0], [2.0]])
+        store.compact([1])  # SQLite never recorded generation 1
+        store.close()
+
+        store = SegmentStore(tmp_path / "kb", generation=0)
+        assert store.texts([0, 1]) == ["a", "b"]
+        assert list((tmp_path / "kb").glob("*.1.*"))  # Maybe another process compacting
+        with store.lock:
+            store.discard_newer()
+        assert not list((tmp_path / "kb").glob("*.1.*"))
+
+    def test_stores_in_two_processes_share_slots(self, tmp_path):
+        from src.core.chunk_store import SegmentStore
+
+        first, second = SegmentStore(tmp_path / "kb"), SegmentStore(tmp_path / "kb")
+        with first.lock:
+            assert first.append(["a", "b"], [[1.0, 0.0], [0.0, 1.0]]) == [0, 1]
+            assert not second.lock.acquire(blocking=False)
+        with second.lock:
+            assert second.append(["c"], [[1.0, 1.0]]) == [2]  # Count re-read from disk
+
+        first.refresh()
+        assert first.texts([0, 1, 2]) == ["a", "b", "c"]
+        assert first.search([1.0, 1.0], k=1)[0][0] == 2
+
+
+@pytest_asyncio.fixture
+async def engine(schema_db, tmp_path, monkeypatch, word_tokenizer):
+    from src.core.config import config
+    from src.core.lm_client import lm_client
+    from src.core.rag import RAGEngine
+
+    embedder = TopicEmbedder()
+    monkeypatch.setattr(lm_client, "get_embeddings", embedder)
+    monkeypatch.setattr(config, "data_dir", tmp_path / "data")
+    monkeypatch.setattr(config.rag, "chunk_size", 10)
+    monkeypatch.setattr(config.rag, "chunk_overlap", 0)
+
+    engine = RAGEngine()
+    await engine.initialize(schema_db)
+    engine.embedder = embedder
+    return engine
+
+
+async def add_text(engine, tmp_path, name, text, collection=None):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return await engine.add_document(str(path), collection=collection)
+
+
+class TestSegmentCollections:
+    """Tests for RAG documents stored in a segment collection."""
+
+    async def test_chunks_live_outside_sqlite(self, engine, tmp_path):
+        await engine.create_collection("kb", storage="segments")
+        doc = await add_text(engine, tmp_path, "fruit.md", sections("apples", "pears", "plums"), "kb")
+
+        async with engine._db.execute(
+            "SELECT content, embedding, store_slot FROM document_chunks WHERE document_id = ?", (doc.id,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        async with engine._db.execute("SELECT COUNT(*) FROM chunk_embeddings") as cursor:
+            shared = (await cursor.fetchone())[0]
+
+        assert [(r["content"], r["embedding"], r["store_slot"]) for r in rows] == [("", None, 0), ("", None, 1), ("", None, 2)]
+        assert shared == 0
+        ranked = await engine.vector_candidates([0.0, 1.0, 0.0], 1)
+        chunks = await engine.get_chunks([ranked[0][0]])
+        assert chunks[0].content.startswith("# pears")
+        assert (await engine.get_collection("kb"))["store"]["slots"] == 3
+
+    async def test_collections_are_validated(self, engine):
+        with pytest.raises(ValueError):
+            await engine.create_collection("bad name!")
+        await engine.create_collection("kb", storage="segments")
+        with pytest.raises(ValueError):
+            await engine.create_collection("kb", storage="sqlite")
+        assert [c["name"] for c in await engine.list_collections()] == ["default", "kb"]
+
+    async def test_remove_compacts_and_renumbers(self, engine, tmp_path):
+        await engine.create_collection("kb", storage="segments")
+        first = await add_text(engine, tmp_path, "a.md", sections("apples", "pears"), "kb")
+        await add_text(engine, tmp_path, "b.md", sections("plums"), "kb")
+
+        await engine.remove_document(first.id)  # 2 of 3 slots deleted: above the ratio
+
+        stats = (await engine.get_collection("kb"))["store"]
+        assert (stats["slots"], stats["deleted"], stats["generation"]) == (1, 0, 1)
+        ranked = await engine.vector_candidates([0.0, 0.0, 1.0], 5)
+        chunks = await engine.get_chunks([chunk_id for chunk_id, _ in ranked])
+        assert [c.content for c in chunks] == ["# plums\n\nAll about plums and nothing else."]
+
+    async def test_vector_candidates_keep_segment_hits(self, engine, tmp_path):
+        await engine.create_collection("kb", storage="segments")
+        await add_text(engine, tmp_path, "fruit.md", sections("apples", "pears"), "kb")
+        await engine._db.execute(
+            "INSERT INTO documents (id, filename, file_path, file_type) VALUES ('old', 'old.txt', 'old.txt', 'txt')"
+        )
+        await engine._db.execute(
+            "INSERT INTO document_chunks (document_id, content, embedding) VALUES ('old', 'x', ?)", (b"[1.0, 0.0]",)
+        )
+        await engine._db.commit()
+
+        ranked = await engine.vector_candidates([0.0, 1.0, 0.0], 1)  # SQLite rows: another model's size
+
+        assert (await engine.get_chunks([ranked[0][0]]))[0].content.startswith("# pears")
+
+    async def test_failed_add_flags_appended_slots(self, engine, tmp_path, monkeypatch):
+        from src.core.config import config
+        monkeypatch.setattr(config.rag, "segment_compact_ratio", 1.0)  # Keep the flagged slots
+        await engine.create_collection("kb", storage="segments")
+        add_chunks = engine.add_chunks
+
+        async def add_then_fail(*args, **kwargs):
+            await add_chunks(*args, **kwargs)
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(engine, "add_chunks", add_then_fail)
+        with pytest.raises(RuntimeError):
+            await add_text(engine, tmp_path, "fruit.md", sections("apples", "pears"), "kb")
+
+        stats = (await engine.get_collection("kb"))["store"]
+        assert (stats["slots"], stats["deleted"]) == (2, 2)
+
+    async def test_workers_share_a_collection(self, engine, tmp_path, connect_db):
+        from src.core.rag import RAGEngine
+
+        await engine.create_collection("kb", storage="segments")
+        first = await add_text(engine, tmp_path, "a.md", sections("apples", "pears"), "kb")
+        other = RAGEngine()  # A second API worker: own connection and cached store
+        await other.initialize(await connect_db())
+        assert len(await other.vector_candidates([1.0, 0.0, 0.0], 5)) == 2  # Opens its store
+        await add_text(engine, tmp_path, "b.md", sections("plums"), "kb")
+        await add_text(other, tmp_path, "c.md", sections("pears"), "kb")
+
+        async with engine._db.execute("SELECT store_slot FROM document_chunks ORDER BY store_slot") as cursor:
+            assert [row[0] for row in await cursor.fetchall()] == [0, 1, 2, 3]  # No slot handed out twice
+
+        await engine.remove_document(first.id)  # Compacts: the other worker's store is stale
+        ranked = await other.vector_candidates([0.0, 0.0, 1.0], 1)
+        chunks = await other.get_chunks([chunk_id for chunk_id, _ in ranked])
+        assert [c.content for c in chunks] == ["# plums\n\nAll about plums and nothing else."]
+        assert (await other.get_collection("kb"))["store"]["generation"] == 1
+
+    async def test_reindex_reuses_stored_vectors(self, engine, tmp_path):
+        await engine.create_collection("kb", storage="segments")
+        doc = await add_text(engine, tmp_path, "a.md", sections("apples", "pears"), "kb")
+        engine.embedder.texts.clear()
+
+        (tmp_path / "a.md").write_text(sections("apples", "plums"), encoding="utf-8")
+        report = await engine.reindex_document(doc.id)
+
+        assert (report.reused, report.computed) == (1, 1)
+        assert engine.embedder.texts == ["# plums\n\nAll about plums and nothing else."]
+        ranked = await engine.vector_candidates([1.0, 0.0, 0.0], 1)
+        assert (await engine.get_chunks([ranked[0][0]]))[0].content.startswith("# apples")
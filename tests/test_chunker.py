@@ -0,0 +1,119 @@
+"""
+Tests for token-accurate, structure-aware chunking.
+"""
+import time
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def make_chunker(size=40, overlap=0, tokenizer=None):
+    from src.core.chunker import Chunker, RegexTokenizer
+    return Chunker(size, overlap, tokenizer=tokenizer or RegexTokenizer())
+
+
+GUIDE = """# Guide
+
+Intro paragraph about the tool. It has two sentences.
+
+## Setup
+
+Install it first. Then configure it.
+
+### Linux
+
+Use the package manager.
+
+```
+# not a heading
+make install
+```
+
+## Usage
+
+Run it.
+"""
+
+
+class TestChunker:
+    """Tests for Chunker / ChunkStream."""
+
+    def test_offsets_point_into_text(self):
+        text = GUIDE * 20
+        chunks = make_chunker(30, 5).chunk_text(text)
+
+        assert len(chunks) > 20
+        for chunk in chunks:
+            assert text[chunk.char_start:chunk.char_end] == chunk.content
+            assert chunk.tokens <= 30
+
+    def test_token_limit_and_overlap(self, word_tokenizer):
+        words = " ".join(f"w{i}" for i in range(300))  # No structural boundaries
+        chunks = make_chunker(50, 10, word_tokenizer).chunk_text(words)
+
+        assert [c.tokens for c in chunks[:-1]] == [50] * (len(chunks) - 1)
+        assert chunks[0].content.split()[-10:] == chunks[1].content.split()[:10]
+        assert chunks[-1].content.endswith("w299")
+
+    def test_headings_start_chunks_with_path(self):
+        chunks = make_chunker(40).chunk_text(GUIDE)
+        by_heading = {c.heading_path: c.content for c in chunks}
+
+        assert by_heading["Guide"].startswith("# Guide")
+        assert by_heading["Guide > Setup"].startswith("## Setup")
+        assert by_heading["Guide > Setup > Linux"].startswith("### Linux")
+        assert "# not a heading" in by_heading["Guide > Setup > Linux"]  # Inside a code fence
+        assert by_heading["Guide > Usage"] == "## Usage\n\nRun it."
+
+    def test_skipped_heading_levels(self):
+        chunks = make_chunker(40).chunk_text("# Top\n\ntext\n\n### Deep\n\nmore\n")
+        assert [c.heading_path for c in chunks] == ["Top", "Top > Deep"]
+
+    def test_prefers_paragraph_then_sentence_boundaries(self):
+        para = "Alpha beta gamma delta. Epsilon zeta eta theta."
+        text = "\n\n".join([para] * 6)
+        chunks = make_chunker(40).chunk_text(text)
+
+        assert all(c.content.endswith(".") for c in chunks)
+        assert all(c.content.startswith("Alpha") for c in chunks)
+
+    def test_streamed_pages_match_whole_text(self):
+        pages = [f"Page {i} text. " * 30 + "\n" for i in range(1, 8)]
+        chunker = make_chunker(45, 8)
+
+        stream = chunker.stream()
+        streamed = []
+        for number, text in enumerate(pages, start=1):
+            streamed.extend(stream.feed(text, page=number))
+        streamed.extend(stream.flush())
+
+        whole = "".join(pages)
+        assert streamed[0].char_start == 0
+        assert streamed[-1].char_end == len(whole.rstrip())
+        for prev, chunk in zip(streamed, streamed[1:]):
+            assert chunk.char_start <= prev.char_end  # Overlapping, no gaps
+        for chunk in streamed:
+            assert whole[chunk.char_start:chunk.char_end] == chunk.content
+            assert f"Page {chunk.page} " in chunk.content
+
+    def test_stream_keeps_heading_across_units(self):
+        stream = make_chunker(20).stream()
+        chunks = stream.feed("# Title\n\n## Part\n\n")
+        chunks += stream.feed("word " * 60)
+        chunks += stream.flush()
+
+        assert chunks[-1].heading_path == "Title > Part"
+
+    def test_empty_text(self):
+        assert make_chunker().chunk_text("   \n\n ") == []
+
+    def test_large_text_is_fast(self):
+        text = GUIDE * 2000  # ~0.6MB
+        start = time.perf_counter()
+        chunks = make_chunker(500, 50).chunk_text(text)
+        elapsed = time.perf_counter() - start
+
+        assert chunks[-1].char_end == len(text.rstrip())
+        assert elapsed < 5.0
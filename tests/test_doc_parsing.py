@@ -0,0 +1,95 @@
+"""
+Tests for process-pool document parsing with page streaming.
+"""
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def make_pdf(path: Path, pages: int) -> Path:
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"page {i} marker{i}")
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+class TestDocumentParser:
+    """Tests for DocumentParser."""
+
+    async def test_pdf_pages_in_order_across_processes(self, tmp_path):
+        from src.core.doc_parsing import DocumentParser
+
+        pdf = make_pdf(tmp_path / "big.pdf", 23)
+        parser = DocumentParser(processes=2, pages_per_task=3, tasks_in_flight=2)
+        try:
+            pages = [unit async for unit in parser.iter_pages(pdf)]
+            assert await parser.count_pages(pdf) == 23
+        finally:
+            parser.shutdown()
+
+        assert [page for _, page in pages] == list(range(1, 24))
+        assert [f"marker{i}" in text for i, (text, _) in enumerate(pages)] == [True] * 23
+
+    async def test_thread_mode_matches_process_mode(self, tmp_path):
+        from src.core.doc_parsing import DocumentParser
+
+        pdf = make_pdf(tmp_path / "doc.pdf", 5)
+        parser = DocumentParser(processes=0, pages_per_task=2)
+        text = await parser.parse(pdf)
+
+        assert all(f"marker{i}" in text for i in range(5))
+
+    async def test_early_stop_drops_pending_ranges(self, tmp_path):
+        from src.core.doc_parsing import DocumentParser
+
+        pdf = make_pdf(tmp_path / "doc.pdf", 12)
+        parser = DocumentParser(processes=0, pages_per_task=2, tasks_in_flight=3)
+        stream = parser.iter_pages(pdf)
+        first, page = await stream.__anext__()
+        await stream.aclose()
+
+        assert "marker0" in first
+        assert page == 1
+
+    async def test_text_file_blocks(self, tmp_path):
+        from src.core.doc_parsing import DocumentParser, read_text_blocks
+
+        path = tmp_path / "notes.md"
+        path.write_text("".join(f"line {i}\n" for i in range(5000)), encoding="utf-8")
+
+        blocks = list(read_text_blocks(str(path), block_chars=1000))
+        assert len(blocks) > 1
+        assert all(block.endswith("\n") for block in blocks)  # Never splits a line
+        assert "".join(blocks) == path.read_text(encoding="utf-8")
+        # Units concatenate to the file text, so chunk offsets refer to it
+        assert await DocumentParser(processes=0).parse(path) == path.read_text(encoding="utf-8")
+
+    async def test_docx_headings_become_markdown(self, tmp_path):
+        from src.core.doc_parsing import DocumentParser
+
+        docx = pytest.importorskip("docx")
+        doc = docx.Document()
+        doc.add_heading("Manual", level=0)
+        doc.add_heading("Install", level=1)
+        doc.add_paragraph("Run the installer.")
+        doc.add_paragraph("")
+        doc.add_heading("Linux", level=2)
+        doc.add_paragraph("Use the package.")
+        doc.save(str(tmp_path / "manual.docx"))
+
+        text = await DocumentParser(processes=0).parse(tmp_path / "manual.docx")
+        assert text == ("# Manual\n\n# Install\n\nRun the installer.\n\n"
+                        "## Linux\n\nUse the package.\n\n")
+
+    async def test_unsupported_type(self, tmp_path):
+        from src.core.doc_parsing import DocumentParser
+
+        path = tmp_path / "image.bmp"
+        path.write_bytes(b"BM")
+        with pytest.raises(ValueError, match="Unsupported file type"):
+            await DocumentParser(processes=0).count_pages(path)
@@ -0,0 +1,214 @@
+"""
+Tests for watched-folder sync (manifest scans, change detection, deletion, budget).
+"""
+import asyncio
+import os
+import time
+import pytest
+import pytest_asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+async def fake_embed(texts):
+    return [[float(len(t)), 1.0] for t in texts]
+
+
+@pytest.fixture(autouse=True)
+def small_config(monkeypatch, tmp_path, word_tokenizer):
+    from src.core.config import config
+    monkeypatch.setattr(config, "data_dir", tmp_path / "data")
+    monkeypatch.setattr(config.rag, "chunk_size", 10)
+    monkeypatch.setattr(config.rag, "chunk_overlap", 0)
+    monkeypatch.setattr(config.folder_sync, "cpu_budget", 1.0)
+
+
+@pytest_asyncio.fixture
+async def sync(schema_db):
+    from src.core.folder_sync import FolderSync
+    from src.core.ingestion import IngestionManager
+    from src.core.rag import RAGEngine
+
+    engine = RAGEngine()
+    await engine.initialize(schema_db)
+    manager = IngestionManager(rag_engine=engine, embed=fake_embed)
+    await manager.initialize(schema_db, workers=1)
+    sync = FolderSync(rag_engine=engine, ingestion_manager=manager)
+    await sync.initialize(schema_db, start=False)
+    yield sync
+    await sync.stop()
+    await manager.stop()
+
+
+def make_tree(root: Path) -> Path:
+    (root / "sub").mkdir(parents=True)
+    (root / "a.txt").write_text("alpha " * 25, encoding="utf-8")
+    (root / "b.md").write_text("# Beta\n\nbeta text here", encoding="utf-8")
+    (root / "sub" / "c.txt").write_text("gamma " * 5, encoding="utf-8")
+    (root / "image.png").write_bytes(b"\x89PNG")
+    (root / ".hidden.txt").write_text("secret", encoding="utf-8")
+    return root
+
+
+async def idle(sync):
+    """Wait until the ingestion queue has drained."""
+    while await sync._ingestion.list_jobs(active_only=True):
+        await asyncio.sleep(0.01)
+
+
+async def doc_names(sync, root: Path):
+    """Document names relative to `root` (they are full paths)."""
+    return sorted(Path(d.filename).relative_to(root).as_posix() for d in await sync._rag.list_documents())
+
+
+class TestFolderSync:
+    """Tests for FolderSync."""
+
+    async def test_initial_scan_then_manifest_only_rescan(self, sync, tmp_path, monkeypatch):
+        root = make_tree(tmp_path / "notes")
+        folder = await sync.add_folder(str(root))
+        assert (await sync.add_folder(str(root))).id == folder.id
+
+        stats = await sync.scan(folder.id)
+        await idle(sync)
+        assert (stats.files, stats.new, stats.skipped) == (3, 3, 1)
+        assert await doc_names(sync, root) == ["a.txt", "b.md", "sub/c.txt"]
+
+        async def no_reads(*args):
+            raise AssertionError("unchanged files must not be read")
+
+        monkeypatch.setattr(sync, "_hash", no_reads)
+        stats = await sync.scan(folder.id)
+        assert (stats.unchanged, stats.hashed, stats.new, stats.deleted) == (3, 0, 0, 0)
+        assert (await sync.get_folder(folder.id)).last_scan["unchanged"] == 3
+
+    async def test_changes_touches_and_deletions(self, sync, tmp_path):
+        root = make_tree(tmp_path / "notes")
+        folder = await sync.add_folder(str(root))
+        await sync.scan(folder.id)
+        await idle(sync)
+
+        (root / "a.txt").write_text("alpha " * 20 + "delta " * 5, encoding="utf-8")
+        stamp = time.time() + 5
+        os.utime(root / "b.md", (stamp, stamp))  # Touched, same content
+        (root / "sub" / "c.txt").unlink()
+        (root / "d.txt").write_text("new file", encoding="utf-8")
+
+        stats = await sync.scan(folder.id)
+        await idle(sync)
+
+        assert (stats.changed, stats.touched, stats.deleted, stats.new, stats.unchanged) == (1, 1, 1, 1, 0)
+        assert await doc_names(sync, root) == ["a.txt", "b.md", "d.txt"]
+        jobs = await sync._ingestion.list_jobs()
+        reindex = next(j for j in jobs if j["reindex"])
+        assert (reindex["reused_chunks"], reindex["computed_chunks"]) == (2, 1)
+
+    async def test_missing_folder_is_not_a_mass_deletion(self, sync, tmp_path):
+        root = make_tree(tmp_path / "notes")
+        folder = await sync.add_folder(str(root))
+        await sync.scan(folder.id)
+        await idle(sync)
+
+        root.rename(tmp_path / "unmounted")
+        stats = await sync.scan(folder.id)
+
+        assert stats.deleted == 0 and stats.errors == 1
+        assert len(await sync._rag.list_documents()) == 3
+
+    async def test_remove_folder_removes_its_documents(self, sync, tmp_path):
+        folder = await sync.add_folder(str(make_tree(tmp_path / "notes")))
+        await sync.scan(folder.id)
+        await idle(sync)
+
+        assert await sync.remove_folder(folder.id)
+        assert await sync._rag.list_documents() == []
+        assert await sync.list_folders() == []
+
+    async def test_folders_with_the_same_name_stay_separate(self, sync, tmp_path):
+        first = make_tree(tmp_path / "work" / "notes")
+        second = make_tree(tmp_path / "home" / "notes")
+        (second / "a.txt").write_text("other alpha " * 10, encoding="utf-8")
+        folders = []
+        for root in (first, second):
+            folders.append((await sync.add_folder(str(root))).id)
+            await sync.scan(folders[-1])
+            await idle(sync)
+        # b.md and sub/c.txt are identical in both: indexed once, from work/notes
+        assert await doc_names(sync, tmp_path) == [
+            "home/notes/a.txt", "work/notes/a.txt", "work/notes/b.md", "work/notes/sub/c.txt",
+        ]
+
+        (first / "a.txt").unlink()
+        (second / "b.md").unlink()
+        for folder_id in folders:
+            assert (await sync.scan(folder_id)).deleted == 1
+
+        assert await doc_names(sync, tmp_path) == [
+            "home/notes/a.txt", "work/notes/b.md", "work/notes/sub/c.txt",
+        ]
+
+    async def test_deleted_file_keeps_documents_it_did_not_create(self, sync, tmp_path):
+        root = make_tree(tmp_path / "notes")
+        upload = tmp_path / "a-copy.txt"
+        upload.write_text((root / "a.txt").read_text(encoding="utf-8"), encoding="utf-8")
+        doc = await sync._rag.add_document(str(upload))  # Same content, added by hand
+        folder = await sync.add_folder(str(root))
+        await sync.scan(folder.id)
+        await idle(sync)
+
+        (root / "a.txt").unlink()
+        assert (await sync.scan(folder.id)).deleted == 1
+        assert await sync._rag.get_document(doc.id) is not None
+
+    async def test_scan_claimed_by_one_worker(self, sync, tmp_path):
+        folder = await sync.add_folder(str(make_tree(tmp_path / "notes")))
+        assert await sync._claim(folder.id)
+        assert await sync.scan(folder.id) is None  # Already being scanned
+        await sync._release(folder.id)
+        assert await sync.scan(folder.id) is not None
+
+    async def test_rescan_of_10k_unchanged_files(self, sync, tmp_path):
+        from src.core.folder_sync import walk_folder
+
+        root = tmp_path / "big"
+        for d in range(20):
+            (root / f"d{d}").mkdir(parents=True)
+            for f in range(500):
+                (root / f"d{d}" / f"f{f}.txt").write_bytes(b"x")
+        folder = await sync.add_folder(str(root))
+        files, _ = walk_folder(str(root), True)
+        await sync._db.executemany(
+            """INSERT INTO sync_manifest (folder_id, rel_path, size, mtime_ns, content_hash, synced_at)
+               VALUES (?, ?, ?, ?, 'h', 0)""",
+            [(folder.id, rel, size, mtime) for rel, (size, mtime) in files.items()]
+        )
+        await sync._db.commit()
+
+        start = time.perf_counter()
+        stats = await sync.scan(folder.id)
+        elapsed = time.perf_counter() - start
+
+        assert (stats.files, stats.unchanged, stats.hashed) == (10000, 10000, 0)
+        assert elapsed < 5.0
+
+
+class TestWorkBudget:
+    """Tests for the CPU / IO budget."""
+
+    async def test_cpu_share_sleeps_in_proportion(self):
+        from src.core.folder_sync import WorkBudget
+
+        budget = WorkBudget(cpu_share=0.5, io_bytes_per_s=1e12)
+        time.sleep(0.06)  # Work
+        await budget.pace()
+        assert budget.slept == pytest.approx(0.06, abs=0.03)
+
+    async def test_io_rate(self):
+        from src.core.folder_sync import WorkBudget
+
+        budget = WorkBudget(cpu_share=1.0, io_bytes_per_s=1000)
+        start = time.perf_counter()
+        for _ in range(3):
+            await budget.read(100)  # 300 bytes at 1000 B/s
+        assert time.perf_counter() - start >= 0.25
@@ -0,0 +1,323 @@
+"""
+Tests for background document ingestion (job queue, batching, resume, cancel).
+"""
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class FakeEmbedder:
+    """Batch embedder that records calls and can be paused between batches."""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = None  # asyncio.Event; batches after the first wait for it
+        self.fail_at = None  # Raise on this (0-based) call
+
+    async def __call__(self, texts):
+        if self.gate is not None and self.calls:
+            await self.gate.wait()
+        if self.fail_at == len(self.calls):
+            raise RuntimeError("embedding server down")
+        self.calls.append(len(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch, tmp_path, word_tokenizer):
+    from src.core.config import config
+    monkeypatch.setattr(config, "data_dir", tmp_path)
+    monkeypatch.setattr(config.ingestion, "embed_batch_size", 4)
+    monkeypatch.setattr(config.rag, "chunk_size", 10)
+    monkeypatch.setattr(config.rag, "chunk_overlap", 0)
+
+
+async def make_manager(db, embedder, workers=1):
+    from src.core.ingestion import IngestionManager
+    from src.core.rag import RAGEngine
+
+    engine = RAGEngine()
+    await engine.initialize(db)
+    manager = IngestionManager(rag_engine=engine, embed=embedder)
+    await manager.initialize(db, workers=workers)
+    return manager
+
+
+def write_doc(tmp_path, name="notes.txt", chunks=10):
+    """Upload that splits into `chunks` chunks of 10 words."""
+    path = tmp_path / "uploads" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(" ".join(f"word{i}" for i in range(chunks * 10)), encoding="utf-8")
+    return path
+
+
+async def wait_done(manager, job_id, timeout=5):
+    async def finished():
+        while (await manager.get(job_id))["status"] in ("queued", "parsing", "embedding"):
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(finished(), timeout)
+    return await manager.get(job_id)
+
+
+async def chunk_count(db, doc_id, table="document_chunks"):
+    async with db.execute(f"SELECT COUNT(*) FROM {table} WHERE document_id = ?", (doc_id,)) as cursor:
+        return (await cursor.fetchone())[0]
+
+
+async def chunk_indexes(db, doc_id):
+    async with db.execute(
+        "SELECT chunk_index FROM document_chunks WHERE document_id = ? ORDER BY chunk_index", (doc_id,)
+    ) as cursor:
+        return [row[0] for row in await cursor.fetchall()]
+
+
+def write_new_version(tmp_path):
+    """notes.txt upload in which every chunk changed."""
+    path = write_doc(tmp_path)
+    path.write_text(path.read_text(encoding="utf-8").replace("word", "v2-"), encoding="utf-8")
+    return path
+
+
+class TestIngestionManager:
+    """Tests for IngestionManager."""
+
+    async def test_ingests_in_batches(self, schema_db, tmp_path):
+        embedder = FakeEmbedder()
+        manager = await make_manager(schema_db, embedder)
+        path = write_doc(tmp_path)
+
+        job = await manager.submit(path, "notes.txt")
+        assert job.status.value == "queued"
+        state = await wait_done(manager, job.id)
+
+        assert state["status"] == "completed"
+        assert state["done_chunks"] == state["total_chunks"] == 10
+        assert state["progress"] == 1.0
+        assert embedder.calls == [4, 4, 2]  # One request per batch
+        assert await chunk_count(schema_db, state["document_id"]) == 10
+        assert not path.exists()  # Upload removed once finished
+        await manager.stop()
+
+    async def test_document_queryable_while_ingesting(self, schema_db, tmp_path):
+        embedder = FakeEmbedder()
+        embedder.gate = asyncio.Event()
+        manager = await make_manager(schema_db, embedder)
+
+        job = await manager.submit(write_doc(tmp_path), "notes.txt")
+        while embedder.calls != [4]:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+
+        state = await manager.get(job.id)
+        assert state["status"] == "embedding"
+        assert state["done_chunks"] == 4
+        assert await chunk_count(schema_db, state["document_id"]) == 4  # First batch committed
+        assert await manager.active_document_ids() == {state["document_id"]}
+
+        embedder.gate.set()
+        assert (await wait_done(manager, job.id))["status"] == "completed"
+        assert await manager.active_document_ids() == set()
+        await manager.stop()
+
+    async def test_cancel_removes_partial_document(self, schema_db, tmp_path):
+        embedder = FakeEmbedder()
+        embedder.gate = asyncio.Event()
+        manager = await make_manager(schema_db, embedder)
+
+        job = await manager.submit(write_doc(tmp_path), "notes.txt")
+        while embedder.calls != [4]:
+            await asyncio.sleep(0.01)
+        doc_id = (await manager.get(job.id))["document_id"]
+
+        assert await manager.cancel(job.id)
+        embedder.gate.set()
+        state = await wait_done(manager, job.id)
+
+        assert state["status"] == "cancelled"
+        assert await chunk_count(schema_db, doc_id) == 0
+        assert await manager._rag.get_document(doc_id) is None
+        assert not await manager.cancel(job.id)  # Already finished
+        await manager.stop()
+
+    async def test_resume_after_crash(self, schema_db, tmp_path):
+        embedder = FakeEmbedder()
+        embedder.gate = asyncio.Event()
+        crashed = await make_manager(schema_db, embedder)
+        job = await crashed.submit(write_doc(tmp_path), "notes.txt")
+        while embedder.calls != [4]:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        await crashed.stop()  # Dies mid-job; the row stays "embedding"
+
+        resumed_embedder = FakeEmbedder()
+        manager = await make_manager(schema_db, resumed_embedder)
+        state = await wait_done(manager, job.id)
+
+        assert state["status"] == "completed"
+        assert resumed_embedder.calls == [4, 2]  # Only the chunks not yet committed
+        assert await chunk_count(schema_db, state["document_id"]) == 10
+        await manager.stop()
+
+    async def test_resume_drops_rows_past_progress(self, schema_db, tmp_path, monkeypatch):
+        embedder = FakeEmbedder()
+        crashed = await make_manager(schema_db, embedder)
+        add_chunks = crashed._rag.add_chunks
+
+        async def crash_after_rows(*args, **kwargs):
+            await add_chunks(*args, **kwargs)
+            await schema_db.commit()  # Another caller's commit lands before the progress
+            raise asyncio.CancelledError
+
+        monkeypatch.setattr(crashed._rag, "add_chunks", crash_after_rows)
+        job = await crashed.submit(write_doc(tmp_path), "notes.txt")
+        await asyncio.gather(*crashed._workers, return_exceptions=True)
+        await crashed.stop()
+
+        manager = await make_manager(schema_db, embedder)
+        state = await wait_done(manager, job.id)
+
+        assert state["status"] == "completed"
+        assert embedder.calls == [4, 4, 4, 2]  # The unrecorded batch is embedded again
+        assert await chunk_indexes(schema_db, state["document_id"]) == list(range(10))
+        await manager.stop()
+
+    async def test_batch_rolled_back_by_another_caller_is_redone(self, schema_db, tmp_path, monkeypatch):
+        embedder = FakeEmbedder()
+        manager = await make_manager(schema_db, embedder)
+        add_chunks = manager._rag.add_chunks
+        rolled_back = []
+
+        async def rolled_back_once(*args, **kwargs):
+            await add_chunks(*args, **kwargs)
+            if not rolled_back:
+                rolled_back.append(True)
+                await schema_db.rollback()  # E.g. a failed add_document on the shared connection
+
+        monkeypatch.setattr(manager._rag, "add_chunks", rolled_back_once)
+        state = await wait_done(manager, (await manager.submit(write_doc(tmp_path), "notes.txt")).id)
+
+        assert state["status"] == "completed"
+        assert embedder.calls == [4, 4, 4, 2]
+        assert await chunk_indexes(schema_db, state["document_id"]) == list(range(10))
+        assert (await manager._rag.get_document(state["document_id"])).chunk_count == 10
+        await manager.stop()
+
+    async def test_duplicate_filename_reuses_document(self, schema_db, tmp_path):
+        embedder = FakeEmbedder()
+        manager = await make_manager(schema_db, embedder)
+        first = await wait_done(manager, (await manager.submit(write_doc(tmp_path), "notes.txt")).id)
+
+        again = await manager.submit(write_doc(tmp_path, name="copy.txt"), "notes.txt")
+
+        assert again.status.value == "completed"
+        assert again.document_id == first["document_id"]
+        assert embedder.calls == [4, 4, 2]
+        await manager.stop()
+
+    async def test_parse_failure_marks_job_failed(self, schema_db, tmp_path):
+        manager = await make_manager(schema_db, FakeEmbedder())
+        path = tmp_path / "image.bmp"
+        path.write_bytes(b"BM")
+
+        state = await wait_done(manager, (await manager.submit(path, "image.bmp")).id)
+
+        assert state["status"] == "failed"
+        assert "Unsupported file type" in state["error"]
+        assert state["document_id"] is None
+        await manager.stop()
+
+    async def test_events_stream_until_finished(self, schema_db, tmp_path):
+        manager = await make_manager(schema_db, FakeEmbedder())
+        job = await manager.submit(write_doc(tmp_path), "notes.txt")
+
+        updates = [state async for state in manager.events(job.id)]
+
+        assert updates[-1]["status"] == "completed"
+        assert [u["done_chunks"] for u in updates] == sorted(u["done_chunks"] for u in updates)
+        await manager.stop()
+
+    async def test_reupload_reindexes_changed_chunks_only(self, schema_db, tmp_path):
+        embedder = FakeEmbedder()
+        manager = await make_manager(schema_db, embedder)
+        first = await wait_done(manager, (await manager.submit(write_doc(tmp_path), "notes.txt")).id)
+
+        # Same content under another name: nothing to do
+        copy = await manager.submit(write_doc(tmp_path, name="copy.txt"), "copy.txt")
+        assert copy.status.value == "completed"
+        assert copy.document_id == first["document_id"]
+
+        # Changed file under the same name: one chunk differs
+        path = write_doc(tmp_path)
+        path.write_text(path.read_text(encoding="utf-8").replace("word55", "changed"), encoding="utf-8")
+        embedder.calls.clear()
+        job = await manager.submit(path, "notes.txt")
+        assert job.reindex
+        state = await wait_done(manager, job.id)
+
+        assert state["status"] == "completed"
+        assert state["document_id"] == first["document_id"]
+        assert (state["done_chunks"], state["reused_chunks"], state["computed_chunks"]) == (10, 9, 1)
+        assert embedder.calls == [1]
+        assert await chunk_count(schema_db, state["document_id"]) == 10
+        await manager.stop()
+
+    async def test_cancelled_reindex_keeps_previous_version(self, schema_db, tmp_path):
+        embedder = FakeEmbedder()
+        manager = await make_manager(schema_db, embedder)
+        doc_id = (await wait_done(manager, (await manager.submit(write_doc(tmp_path), "notes.txt")).id))["document_id"]
+        before = await manager._rag.get_document(doc_id)
+        embedder.calls.clear()
+        embedder.gate = asyncio.Event()
+        job = await manager.submit(write_new_version(tmp_path), "notes.txt")
+        assert job.reindex
+
+        while await chunk_count(schema_db, doc_id, "document_chunks_staging") != 4:
+            await asyncio.sleep(0.01)  # First batch staged and committed
+        assert await manager.cancel(job.id)  # Commits on the shared connection
+        await schema_db.commit()
+
+        doc = await manager._rag.get_document(doc_id)
+        assert doc.content_hash == before.content_hash
+        assert await chunk_count(schema_db, doc_id) == 10  # Old version untouched
+
+        embedder.gate.set()
+        state = await wait_done(manager, job.id)
+        assert state["status"] == "cancelled"
+        assert state["document_id"] == doc_id
+        doc = await manager._rag.get_document(doc_id)
+        assert (doc.content_hash, doc.chunk_count) == (before.content_hash, 10)
+        async with schema_db.execute("SELECT content FROM document_chunks WHERE document_id = ?", (doc_id,)) as cursor:
+            assert all("v2-" not in row[0] for row in await cursor.fetchall())
+        assert await chunk_count(schema_db, doc_id, "document_chunks_staging") == 0
+
+        # The new version was never recorded: uploading it again re-indexes
+        embedder.gate = None
+        retry = await manager.submit(write_new_version(tmp_path), "notes.txt")
+        assert retry.reindex
+        assert (await wait_done(manager, retry.id))["status"] == "completed"
+        assert await chunk_count(schema_db, doc_id) == 10
+        await manager.stop()
+
+    async def test_failed_reindex_keeps_previous_version(self, schema_db, tmp_path):
+        embedder = FakeEmbedder()
+        manager = await make_manager(schema_db, embedder)
+        doc_id = (await wait_done(manager, (await manager.submit(write_doc(tmp_path), "notes.txt")).id))["document_id"]
+        before = await manager._rag.get_document(doc_id)
+        embedder.calls.clear()
+        embedder.fail_at = 1  # Second batch of the re-index
+
+        state = await wait_done(manager, (await manager.submit(write_new_version(tmp_path), "notes.txt")).id)
+
+        assert state["status"] == "failed"
+        assert "embedding server down" in state["error"]
+        doc = await manager._rag.get_document(doc_id)
+        assert (doc.content_hash, doc.chunk_count) == (before.content_hash, 10)
+        assert await chunk_count(schema_db, doc_id) == 10
+        assert await chunk_count(schema_db, doc_id, "document_chunks_staging") == 0
+        async with schema_db.execute("SELECT COUNT(*) FROM chunk_embeddings") as cursor:
+            assert (await cursor.fetchone())[0] == 10  # The staged batch's embeddings dropped
+        await manager.stop()
+
@@ -4,11 +4,14 @@ Tests for MetricsEngine and ImplicitFeedbackAnalyzer.
 ALIGNED WITH REAL API.
 """
 import pytest
+import pytest_asyncio
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+SCHEMA = Path(__file__).parent.parent / "data" / "schema.sql"
+
 
 class TestImplicitFeedbackAnalyzer:
     """Tests for ImplicitFeedbackAnalyzer."""
@@ -167,3 +170,228 @@ class TestAchievementStructure:
         assert d["id"] == "test"
         assert d["name"] == "Test Achievement"
         assert d["unlocked"] == True
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    import aiosqlite
+    from src.core.metrics import MetricsEngine
+
+    db = await aiosqlite.connect(str(tmp_path / "metrics.db"))
+    await db.executescript(SCHEMA.read_text(encoding="utf-8"))
+    engine = MetricsEngine()
+    await engine.initialize(db)
+    yield engine
+    await db.close()
+
+
+OUTCOMES = [
+    # user_message, facts_in_context, facts_referenced
+    ("спасибо, отлично", 4, 2),
+    ("нет, я имел в виду другое", 0, 0),
+    ("great", 2, 2),
+    ("thanks", 0, 0),
+]
+
+
+class TestMetricsRollup:
+    """Tests for the daily rollup and generation-based score cache."""
+
+    async def test_rollup_matches_raw_outcomes(self, engine):
+        for message, facts, referenced in OUTCOMES:
+            await engine.record_interaction_outcome(
+                user_message=message, facts_in_context=facts, facts_referenced=referenced
+            )
+
+        data = await engine._get_recent_outcomes(days=30)
+
+        assert (data["total"], data["positive"], data["negative"], data["corrections"]) == (4, 3, 1, 1)
+        assert data["avg_context_util"] == pytest.approx((0.5 + 0.5 + 1.0 + 0.5) / 4)
+
+    async def test_existing_outcomes_backfilled(self, engine):
+        await engine._db.executemany("""
+            INSERT INTO interaction_outcomes
+            (session_date, implicit_positive, implicit_negative, was_correction,
+             facts_in_context, facts_referenced)
+            VALUES (date('now', 'localtime', ?), ?, ?, ?, ?, ?)
+        """, [("-1 days", True, False, False, 2, 1), ("-1 days", False, True, True, 0, 0),
+              ("-20 days", True, False, False, 0, 0)])
+        await engine._db.commit()
+
+        await engine.initialize(engine._db)
+        async with engine._db.execute("SELECT COUNT(*), SUM(total) FROM metrics_rollup_daily") as cursor:
+            assert tuple(await cursor.fetchone()) == (2, 3)
+
+        await engine.initialize(engine._db)  # Already built: not counted twice
+        data = await engine._get_recent_outcomes(days=7)
+        assert (data["total"], data["positive"], data["corrections"]) == (2, 1, 1)
+
+    async def test_scores_cached_until_generation_moves(self, engine, monkeypatch):
+        await engine.record_interaction_outcome(user_message="спасибо")
+        first = await engine.calculate_iq()
+
+        async def no_scan(*args, **kwargs):
+            raise AssertionError("cached scores must not query")
+
+        with monkeypatch.context() as m:
+            m.setattr(engine, "_get_recent_outcomes", no_scan)
+            assert await engine.calculate_iq() is first
+
+        await engine.record_interaction_outcome(user_message="нет, не то")
+        second = await engine.calculate_iq()
+
+        assert second is not first and second.score < first.score
+        stats = engine.get_stats()
+        assert (stats["generation"], stats["cache_hits"], stats["cache_misses"]) == (2, 1, 2)
+
+    async def test_result_computed_across_invalidation_not_cached(self, engine, monkeypatch):
+        real = engine._get_recent_outcomes
+
+        async def invalidated_midway(days=30):
+            engine.invalidate_cache()  # e.g. a worker_bus notification
+            return await real(days)
+
+        monkeypatch.setattr(engine, "_get_recent_outcomes", invalidated_midway)
+        await engine.calculate_iq()
+
+        assert not engine._is_cache_valid("iq")
+
+
+async def add_messages(db, count):
+    await db.execute("INSERT OR IGNORE INTO conversations (id, title) VALUES ('c1', 'Test')")
+    await db.executemany(
+        "INSERT INTO messages (conversation_id, role, content) VALUES ('c1', 'user', ?)",
+        [(f"m{i}",) for i in range(count)]
+    )
+    await db.commit()
+
+
+class TestAchievementCounters:
+    """Tests for trigger-maintained counters and threshold-driven unlocks."""
+
+    async def test_counters_follow_inserts_and_deletes(self, engine):
+        await add_messages(engine._db, 3)
+        await engine._db.execute("DELETE FROM messages WHERE content = 'm0'")
+        await engine.record_interaction_outcome(user_message="спасибо")
+        await engine.record_interaction_outcome(user_message="thanks")
+
+        counters = await engine.get_counters()
+
+        assert counters == {"messages": 2, "memory_facts": 0, "active_days": 1, "positive_outcomes": 2}
+
+    async def test_counters_seeded_from_existing_rows(self, tmp_path):
+        import aiosqlite
+        from src.core.metrics import MetricsEngine
+
+        db = await aiosqlite.connect(str(tmp_path / "old.db"))
+        await db.executescript(SCHEMA.read_text(encoding="utf-8"))
+        await add_messages(db, 4)  # Before the counters existed
+        engine = MetricsEngine()
+        await engine.initialize(db)
+        await engine.initialize(db)  # Seeded once
+
+        assert (await engine.get_counters())["messages"] == 4
+        await db.close()
+
+    async def test_unlock_written_only_on_crossing(self, engine):
+        statements = []
+        await engine._db.set_trace_callback(statements.append)
+
+        await engine.record_interaction_outcome(user_message="нет, не то")
+        quiet = [s for s in statements if "achievements" in s or "COUNT(" in s]
+        statements.clear()
+        await engine.record_interaction_outcome(user_message="спасибо")
+        unlocks = [s for s in statements if "achievements" in s]
+        statements.clear()
+        await engine.record_interaction_outcome(user_message="thanks")
+        again = [s for s in statements if "achievements" in s]
+
+        assert quiet == [] and again == []
+        assert len(unlocks) == 1
+        by_id = {a["id"]: a for a in await engine.get_achievements()}
+        assert by_id["first_thank"]["unlocked"] and by_id["first_thank"]["progress"] == 100
+        assert not by_id["week_together"]["unlocked"]
+        assert by_id["week_together"]["progress"] == pytest.approx(100 / 7, abs=0.1)
+
+
+@pytest_asyncio.fixture
+async def retention(engine, tmp_path, monkeypatch):
+    from src.core.config import config
+    from src.core.metrics_retention import MetricsRetention
+
+    monkeypatch.setattr(config, "data_dir", tmp_path)
+    monkeypatch.setattr(config.metrics_retention, "raw_days", 7)
+    monkeypatch.setattr(config.metrics_retention, "batch_rows", 2)
+    monkeypatch.setattr(config.metrics_retention, "export_format", "csv")
+    retention = MetricsRetention()
+    await retention.initialize(engine._db, start=False)
+    return retention
+
+
+async def add_outcomes(db, days_ago, hour, count, positive=False):
+    await db.executemany("""
+        INSERT INTO interaction_outcomes (session_date, implicit_positive, response_time_ms, recorded_at)
+        VALUES (date('now', 'localtime', ?), ?, 100,
+                datetime(date('now', 'localtime', ?), ?, 'utc'))
+    """, [(f"-{days_ago} days", positive, f"-{days_ago} days", f"+{hour} hours")] * count)
+    await db.commit()
+
+
+class TestMetricsRetention:
+    """Tests for raw outcome retention, hourly rollup and export."""
+
+    async def test_expired_days_exported_rolled_up_and_deleted(self, engine, retention, tmp_path):
+        import csv
+        from datetime import date, timedelta
+
+        await add_outcomes(engine._db, 40, 9, 3, positive=True)
+        await add_outcomes(engine._db, 40, 14, 2)
+        await add_outcomes(engine._db, 2, 10, 1)
+        await engine.initialize(engine._db)  # Daily rollup backfilled from the raw rows
+
+        report = await retention.run()
+
+        day = (date.today() - timedelta(days=40)).isoformat()
+        assert (report.days, report.rows_deleted) == ([day], 5)
+        with open(tmp_path / "metrics_export" / f"interaction_outcomes.{day}.csv", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        assert len(rows) == 5 and rows[0]["session_date"] == day
+
+        series = await retention.hourly(since=day)
+        assert [(h["hour"][-5:], h["total"], h["positive"], h["response_ms_sum"]) for h in series] == [
+            ("09:00", 3, 3, 300), ("14:00", 2, 0, 200), ("10:00", 1, 0, 100)
+        ]
+        async with engine._db.execute("SELECT COUNT(*) FROM interaction_outcomes") as cursor:
+            assert (await cursor.fetchone())[0] == 1
+        async with engine._db.execute("SELECT SUM(total) FROM metrics_rollup_daily") as cursor:
+            assert (await cursor.fetchone())[0] == 6  # Daily rollup kept
+
+        assert (await retention.run()).days == []
+
+    async def test_interrupted_pass_keeps_first_export(self, engine, retention, tmp_path):
+        from datetime import date, timedelta
+
+        await add_outcomes(engine._db, 30, 8, 4)
+        day = (date.today() - timedelta(days=30)).isoformat()
+        export = tmp_path / "metrics_export" / f"interaction_outcomes.{day}.csv"
+        export.parent.mkdir()
+        export.write_text("complete export\n", encoding="utf-8")  # Written before the interruption
+
+        report = await retention.run()
+
+        assert (report.rows_deleted, report.files) == (4, [])
+        assert export.read_text(encoding="utf-8") == "complete export\n"
+        assert [h["total"] for h in await retention.hourly(since=day)] == [4]
+
+    async def test_parquet_export(self, engine, retention, tmp_path, monkeypatch):
+        pq = pytest.importorskip("pyarrow.parquet")
+        from src.core.config import config
+
+        monkeypatch.setattr(config.metrics_retention, "export_format", "auto")
+        await add_outcomes(engine._db, 10, 12, 3, positive=True)
+
+        report = await retention.run()
+
+        table = pq.read_table(report.files[0])
+        assert report.files[0].endswith(".parquet")
+        assert table.num_rows == 3 and table.column("implicit_positive").to_pylist() == [1, 1, 1]
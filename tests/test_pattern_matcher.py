@@ -0,0 +1,138 @@
+"""
+Tests for the multi-pattern signal matcher and the analyzers built on it.
+"""
+import re
+import time
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class TestPatternMatcher:
+    """Tests for PatternMatcher."""
+
+    def test_literals_report_overlapping_signals_with_positions(self):
+        from src.core.pattern_matcher import PatternMatcher
+
+        matcher = PatternMatcher([
+            ("negative", "не то"), ("correction", "не то что я просил"),
+            ("negative", "нет"), ("positive", "то"),
+        ])
+        text = "нет, не то что я просил"
+
+        found = [(m.label, m.pattern, m.start, m.end) for m in matcher.finditer(text)]
+
+        assert found == [
+            ("negative", "нет", 0, 3),
+            ("negative", "не то", 5, 10),
+            ("correction", "не то что я просил", 5, 23),
+            ("positive", "то", 8, 10),
+            ("positive", "то", 12, 14),  # Inside "что"
+        ]
+        assert matcher.labels(text, ["negative"]) == {"negative"}  # Stops at the first one
+
+    def test_regex_matches_equal_separate_searches(self):
+        from src.core.pattern_matcher import PatternMatcher
+
+        patterns = [r"\bможет быть\b", r"\bможет\s+быть\b", r"^\d+\.\s", r"^-\s", r"\bi think\b", r"fail"]
+        matcher = PatternMatcher([("p", p) for p in patterns], regex=True, flags=re.MULTILINE)
+        text = "1. может быть\nx- not this\n- i think it failed\n22. ok; semi think"
+
+        expected = sorted(
+            (m.start(), i) for i, p in enumerate(patterns) for m in re.finditer(p, text, re.MULTILINE)
+        )
+
+        assert sorted((m.start, m.index) for m in matcher.finditer(text)) == expected
+        assert sorted(matcher.matched(text)) == list(range(len(patterns)))
+
+    def test_first_prefers_pattern_order(self):
+        from src.core.pattern_matcher import PatternMatcher
+
+        matcher = PatternMatcher([("a", r"late\w*"), ("b", r"early")], regex=True)
+
+        match = matcher.first("early text, later text")
+
+        assert (match.label, match.start) == ("a", 12)
+        assert matcher.first("nothing here") is None
+
+
+class TestSignalAnalyzers:
+    """Tests for the analyzers using the shared matcher."""
+
+    def test_explain_lists_signals(self):
+        from src.core.metrics import ImplicitFeedbackAnalyzer
+
+        explained = ImplicitFeedbackAnalyzer().explain("Спасибо! Но ты не понял")
+
+        assert {"label": "positive", "pattern": "спасибо", "start": 0, "end": 7} in explained
+        assert {"label": "correction", "pattern": "ты не понял", "start": 12, "end": 23} in explained
+
+    def test_long_pasted_message(self):
+        from src.core.adaptation import CorrectionDetector
+        from src.core.confidence import ConfidenceScorer
+        from src.core.metrics import ImplicitFeedbackAnalyzer
+
+        log = "\n".join(
+            f"2024-01-01 12:00:{i % 60:02d} worker-{i % 7} processed batch {i} in {i % 97} ms"
+            for i in range(4000)
+        )
+        message = "Посмотри лог, пожалуйста:\n" + log + "\nнет, я имел в виду другое"
+
+        start = time.perf_counter()
+        feedback = ImplicitFeedbackAnalyzer().analyze(message)
+        correction = CorrectionDetector().detect(message)
+        confidence = ConfidenceScorer().score_response(log + "\nвозможно, это ошибка")
+        elapsed = time.perf_counter() - start
+
+        assert feedback[1] and feedback[2]
+        assert correction == (True, "misunderstanding")
+        assert "hedging_x1" in confidence.factors and "mentions_error" in confidence.factors
+        assert elapsed < 1.0
+
+
+class TestConfidenceStream:
+    """Tests for confidence scored while a response streams."""
+
+    def test_chunked_stream_equals_one_shot_score(self):
+        from src.core.confidence import ConfidenceScorer
+
+        scorer = ConfidenceScorer()
+        response = (
+            "Может быть, дело в кэше.\n1. Очистите его\n- перезапустите сервер\n"
+            "```\npip install -U lib\n```\nЕсли будет ошибка, maybe the port is busy, because"
+        )
+        expected = scorer.score_response(response, category="code")
+
+        for size in (1, 2, 3, 7, len(response)):
+            stream = scorer.stream(category="code")
+            for i in range(0, len(response), size):
+                stream.feed(response[i:i + size])  # Splits "мож|ет", "ошиб|ка", "may|be", "``|`"
+            result = stream.finish()
+            assert (result.score, result.level, result.factors) == (
+                expected.score, expected.level, expected.factors
+            ), size
+
+    def test_word_boundary_waits_for_next_chunk(self):
+        from src.core.confidence import ConfidenceScorer
+
+        stream = ConfidenceScorer().stream()
+        stream.feed("the answer is maybe")
+        assert "hedging_x1" not in stream.score().factors  # Could still become "maybeline"
+
+        stream.feed("line")
+        assert "hedging_x1" not in stream.finish().factors
+
+    def test_provisional_score_mid_stream(self):
+        from src.core.confidence import ConfidenceScorer
+
+        stream = ConfidenceScorer().stream()
+        assert stream.score().factors == ["empty_response"]
+
+        stream.feed("Возможно, это ошибка конфигурации. ")
+        provisional = stream.score()
+        assert "hedging_x1" in provisional.factors and "mentions_error" in provisional.factors
+
+        stream.feed("Проверьте порт, потому что он занят. " * 2)
+        assert stream.finish().score > provisional.score
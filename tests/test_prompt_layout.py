@@ -0,0 +1,112 @@
+"""
+Tests for PromptLayout and PrefixTracker (prompt-prefix stability).
+"""
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class TestPromptLayout:
+    """Tests for segment ordering."""
+
+    def test_segment_order(self):
+        """Stable segments first, per-turn RAG and query last."""
+        from src.core.prompt_layout import PromptLayout
+
+        messages = PromptLayout().build(
+            query="Q",
+            system="SYS",
+            profile="PROFILE",
+            memory="FACTS",
+            history=[{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}],
+            retrieval="DOCS"
+        )
+
+        assert messages[0] == {"role": "system", "content": "SYS\n\nPROFILE\n\nFACTS"}
+        assert messages[1:3] == [{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}]
+        assert messages[-1] == {"role": "user", "content": "DOCS\n\nQ"}
+
+    def test_saved_query_not_duplicated(self):
+        """Query already saved to history is not sent twice."""
+        from src.core.prompt_layout import PromptLayout
+
+        messages = PromptLayout().build(
+            query="hello",
+            history=[{"role": "user", "content": "hello"}]
+        )
+
+        assert messages == [{"role": "user", "content": "hello"}]
+
+    def test_thinking_suffix_not_injected_twice(self):
+        """lm_client keeps a suffix already placed by the layout."""
+        from src.core.lm_client import LMStudioClient
+        from src.core.prompt_layout import PromptLayout
+
+        messages = PromptLayout().build(query="q", system="SUFFIX", profile="style")
+        injected = LMStudioClient()._inject_thinking_prompt(messages, "SUFFIX")
+
+        assert injected[0]["content"] == "SUFFIX\n\nstyle"
+
+
+class TestPrefixTracker:
+    """Tests for prefix reuse reporting."""
+
+    def _turn(self, history, query, retrieval=""):
+        from src.core.prompt_layout import PromptLayout
+        return PromptLayout().build(
+            query=query, system="SYS", profile="style", history=history, retrieval=retrieval
+        )
+
+    def test_first_turn_has_no_reuse(self):
+        from src.core.prompt_layout import PrefixTracker
+
+        report = PrefixTracker().observe("c1", self._turn([], "hi"))
+        assert report.reused_chars == 0
+        assert report.prompt_chars > 0
+
+    def test_append_only_history_reuses_prefix(self):
+        """Next turn shares everything up to the previous query."""
+        from src.core.prompt_layout import PrefixTracker
+
+        tracker = PrefixTracker()
+        tracker.observe("c1", self._turn([], "first question", retrieval="DOCS"))
+        history = [
+            {"role": "user", "content": "first question"},
+            {"role": "assistant", "content": "answer " * 50},
+        ]
+        report = tracker.observe("c1", self._turn(history, "second"))
+
+        assert report.head_stable
+        assert report.ratio > 0.05
+        # Shared: system message + "user\n" prefix of the previous user turn
+        assert report.reused_chars >= len("system\nSYS\n\nstyle\x00user\n")
+
+    def test_head_change_detected(self):
+        from src.core.prompt_layout import PrefixTracker, PromptLayout
+
+        tracker = PrefixTracker()
+        tracker.observe("c1", PromptLayout().build(query="q", system="A"))
+        report = tracker.observe("c1", PromptLayout().build(query="q", system="B"))
+
+        assert not report.head_stable
+        assert tracker.get_stats()["head_changes"] == 1
+
+    def test_conversations_bounded(self):
+        from src.core.prompt_layout import PrefixTracker
+
+        tracker = PrefixTracker(max_conversations=2)
+        for conv in ("a", "b", "c"):
+            tracker.observe(conv, self._turn([], "q"))
+
+        assert tracker.get_stats()["tracked_conversations"] == 2
+        assert tracker.observe("a", self._turn([], "q")).reused_chars == 0
+
+    def test_common_prefix_len(self):
+        from src.core.prompt_layout import _common_prefix_len
+
+        assert _common_prefix_len("abcdef", "abcxyz") == 3
+        assert _common_prefix_len("abc", "abcdef") == 3
+        assert _common_prefix_len("", "a") == 0
+        assert _common_prefix_len("xbc", "abc") == 0
@@ -117,3 +117,217 @@ class TestRAGEngineGlobal:
         from src.core.rag import rag, RAGEngine
         
         assert isinstance(rag, RAGEngine)
+
+
+class TestChunkMetadata:
+    """Tests for chunk position metadata in the index."""
+
+    async def test_headings_and_offsets_stored(self, schema_db, tmp_path, monkeypatch):
+        from src.core.chunker import RegexTokenizer
+        from src.core.config import config
+        from src.core.lm_client import lm_client
+        from src.core.rag import RAGEngine
+
+        async def no_embeddings(texts):
+            return [[] for _ in texts]
+
+        monkeypatch.setattr(lm_client, "get_embeddings", no_embeddings)
+        monkeypatch.setattr("src.core.chunker._tokenizer", RegexTokenizer())
+        monkeypatch.setattr(config.rag, "chunk_size", 30)
+        path = tmp_path / "guide.md"
+        path.write_text("# Guide\n\nIntro.\n\n## Setup\n\nInstall the zeppelin package.\n", encoding="utf-8")
+
+        engine = RAGEngine()
+        await engine.initialize(schema_db)
+        doc = await engine.add_document(str(path))
+        chunks = await engine._text_search("zeppelin", 5, doc.id)
+
+        assert doc.chunk_count == 2
+        assert len(chunks) == 1
+        assert chunks[0].heading_path == "Guide > Setup"
+        text = path.read_text(encoding="utf-8")
+        assert text[chunks[0].char_start:chunks[0].char_end] == chunks[0].content
+
+    async def test_migrates_old_chunk_table(self, tmp_path):
+        import aiosqlite
+        from src.core.rag import RAGEngine
+
+        async with aiosqlite.connect(str(tmp_path / "old.db")) as db:
+            await db.execute(
+                """CREATE TABLE document_chunks (id INTEGER PRIMARY KEY, document_id TEXT,
+                   content TEXT, embedding BLOB, chunk_index INTEGER, tokens INTEGER)"""
+            )
+            await RAGEngine().initialize(db)
+            async with db.execute("PRAGMA table_info(document_chunks)") as cursor:
+                columns = {row[1] for row in await cursor.fetchall()}
+
+        assert {"page", "heading_path", "char_start", "char_end"} <= columns
+
+
+class CountingEmbedder:
+    """Embedder stand-in that records how many texts it embedded."""
+
+    def __init__(self):
+        self.texts = []
+
+    async def __call__(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+@pytest.fixture
+def hashing_env(tmp_path, monkeypatch):
+    from src.core.chunker import RegexTokenizer
+    from src.core.config import config
+    from src.core.lm_client import lm_client
+
+    embedder = CountingEmbedder()
+    monkeypatch.setattr(lm_client, "get_embeddings", embedder)
+    monkeypatch.setattr("src.core.chunker._tokenizer", RegexTokenizer())
+    monkeypatch.setattr(config.rag, "chunk_size", 30)
+    monkeypatch.setattr(config.rag, "chunk_overlap", 0)
+    return embedder
+
+
+async def open_engine(db):
+    from src.core.rag import RAGEngine
+
+    engine = RAGEngine()
+    await engine.initialize(db)
+    return engine
+
+
+def sections(*names):
+    """Markdown with one chunk-sized section per name."""
+    return "".join(f"# {name}\n\nAll about {name} and nothing else.\n\n" for name in names)
+
+
+class TestContentHashing:
+    """Tests for content-hash deduplication and incremental re-indexing."""
+
+    async def test_same_content_other_name_not_reembedded(self, schema_db, tmp_path, hashing_env):
+        first = tmp_path / "a.md"
+        first.write_text(sections("apples", "pears"), encoding="utf-8")
+        copy = tmp_path / "b.md"
+        copy.write_text(first.read_text(encoding="utf-8"), encoding="utf-8")
+
+        engine = await open_engine(schema_db)
+        doc = await engine.add_document(str(first))
+        embedded = len(hashing_env.texts)
+        again = await engine.add_document(str(copy))
+
+        assert embedded == 2
+        assert again.id == doc.id
+        assert len(hashing_env.texts) == embedded
+
+    async def test_same_name_other_file_is_new_document(self, schema_db, tmp_path, hashing_env):
+        (tmp_path / "x").mkdir()
+        (tmp_path / "y").mkdir()
+        one = tmp_path / "x" / "notes.md"
+        one.write_text(sections("apples"), encoding="utf-8")
+        two = tmp_path / "y" / "notes.md"
+        two.write_text(sections("apples", "plums"), encoding="utf-8")
+
+        engine = await open_engine(schema_db)
+        doc_one = await engine.add_document(str(one))
+        doc_two = await engine.add_document(str(two))
+        async with schema_db.execute("SELECT COUNT(*) FROM chunk_embeddings") as cursor:
+            shared = (await cursor.fetchone())[0]
+
+        assert doc_one.id != doc_two.id
+        assert doc_two.chunk_count == 2
+        assert len(hashing_env.texts) == 2  # The "apples" chunk was embedded once
+        assert shared == 2
+
+    async def test_reindex_embeds_only_changed_chunks(self, schema_db, tmp_path, hashing_env):
+        path = tmp_path / "guide.md"
+        path.write_text(sections("alpha", "beta", "gamma"), encoding="utf-8")
+
+        engine = await open_engine(schema_db)
+        doc = await engine.add_document(str(path))
+        unchanged = await engine.reindex_document(doc.id)
+
+        hashing_env.texts.clear()
+        path.write_text(sections("alpha", "delta", "gamma"), encoding="utf-8")
+        report = await engine.reindex_document(doc.id)
+
+        chunks = await engine._text_search("delta", 5, doc.id)
+        async with schema_db.execute("SELECT COUNT(*) FROM chunk_embeddings") as cursor:
+            shared = (await cursor.fetchone())[0]
+        assert (await engine.get_document(doc.id)).chunk_count == 3
+
+        assert unchanged.status == "unchanged"
+        assert (report.status, report.chunks, report.reused, report.computed, report.removed) == (
+            "reindexed", 3, 2, 1, 1
+        )
+        assert hashing_env.texts == ["# delta\n\nAll about delta and nothing else."]
+        assert len(chunks) == 1
+        assert shared == 3  # "beta" embedding dropped, nothing else uses it
+
+    async def test_inline_embeddings_migrated(self, tmp_path, hashing_env):
+        import aiosqlite
+        from src.core.rag import RAGEngine, content_hash
+
+        async with aiosqlite.connect(str(tmp_path / "old.db")) as db:
+            db.row_factory = aiosqlite.Row
+            await db.execute(
+                """CREATE TABLE document_chunks (id INTEGER PRIMARY KEY, document_id TEXT,
+                   content TEXT, embedding BLOB, chunk_index INTEGER, tokens INTEGER)"""
+            )
+            await db.execute(
+                "INSERT INTO document_chunks (document_id, content, embedding) VALUES ('d', 'hello', ?)",
+                (b"[1.0, 2.0]",)
+            )
+            await db.commit()
+            await RAGEngine().initialize(db)
+            async with db.execute("SELECT content_hash, embedding FROM document_chunks") as cursor:
+                row = await cursor.fetchone()
+            async with db.execute("SELECT embedding FROM chunk_embeddings WHERE content_hash = ?",
+                                  (content_hash("hello"),)) as cursor:
+                shared = await cursor.fetchone()
+
+        assert row["content_hash"] == content_hash("hello")
+        assert row["embedding"] is None
+        assert shared["embedding"] == b"[1.0, 2.0]"
+
+
+async def pending_write(db):
+    """Another caller's uncommitted work on the shared connection."""
+    await db.execute(
+        """INSERT INTO documents (id, filename, file_path, file_type, chunk_count)
+           VALUES ('other', 'o.md', 'o.md', 'md', 0)"""
+    )
+
+
+async def has_pending_write(db):
+    async with db.execute("SELECT 1 FROM documents WHERE id = 'other'") as cursor:
+        return await cursor.fetchone() is not None
+
+
+class TestSharedConnection:
+    """Failed index writes undo only their own statements on the shared connection."""
+
+    async def test_failed_swap_keeps_other_callers_work(self, schema_db, tmp_path, hashing_env):
+        path = tmp_path / "guide.md"
+        path.write_text(sections("alpha"), encoding="utf-8")
+        engine = await open_engine(schema_db)
+        doc = await engine.add_document(str(path))
+
+        await pending_write(schema_db)
+        with pytest.raises(ValueError):
+            await engine._swap_staged("removed-meanwhile", 1, "digest", path)
+
+        assert await has_pending_write(schema_db)
+        assert (await engine.get_document(doc.id)).chunk_count == 1
+
+    async def test_failed_add_keeps_other_callers_work(self, schema_db, tmp_path, hashing_env):
+        path = tmp_path / "empty.md"
+        path.write_text("", encoding="utf-8")
+        engine = await open_engine(schema_db)
+
+        await pending_write(schema_db)
+        with pytest.raises(RuntimeError):
+            await engine.add_document(str(path))
+
+        assert await has_pending_write(schema_db)
+        assert [d.filename for d in await engine.list_documents()] == ["o.md"]
@@ -0,0 +1,217 @@
+"""
+Tests for the LLM response cache.
+"""
+import pytest
+import pytest_asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@pytest_asyncio.fixture
+async def cache_db():
+    """In-memory database for the cache table."""
+    import aiosqlite
+
+    db = await aiosqlite.connect(":memory:")
+    db.row_factory = aiosqlite.Row
+    yield db
+    await db.close()
+
+
+class FakeEmbeddings:
+    """Maps known texts to fixed vectors."""
+
+    def __init__(self, vectors: dict):
+        self.vectors = vectors
+
+    async def get_or_compute(self, text: str):
+        return self.vectors.get(text, [])
+
+
+MESSAGES = [{"role": "user", "content": "Extract facts from: I live in Berlin"}]
+
+
+class TestCacheKey:
+    """Tests for key construction."""
+
+    def test_whitespace_normalized(self):
+        from src.core.response_cache import ResponseCache
+
+        a = ResponseCache.make_key("m", [{"role": "user", "content": "hello   world\n"}], 0.2, 100)
+        b = ResponseCache.make_key("m", [{"role": "user", "content": " hello world"}], 0.2, 100)
+        assert a == b
+
+    def test_parameters_split_keys(self):
+        from src.core.response_cache import ResponseCache
+
+        base = ResponseCache.make_key("m", MESSAGES, 0.2, 100)
+        assert base != ResponseCache.make_key("other", MESSAGES, 0.2, 100)
+        assert base != ResponseCache.make_key("m", MESSAGES, 0.7, 100)
+        assert base != ResponseCache.make_key("m", MESSAGES, 0.2, 200)
+        assert base != ResponseCache.make_key("m", MESSAGES, 0.2, 100, tools=[{"type": "function"}])
+
+
+class TestResponseCache:
+    """Tests for lookup / store / pruning."""
+
+    async def test_exact_hit_and_stats(self, cache_db):
+        from src.core.response_cache import ResponseCache
+
+        cache = ResponseCache()
+        await cache.initialize(cache_db)
+        key = cache.make_key("m", MESSAGES, 0.2, 100)
+
+        assert (await cache.lookup("extract_facts", key, "m", MESSAGES, 0.2)).response is None
+        await cache.store("extract_facts", key, "m", 0.2, "- lives in Berlin", latency_ms=800)
+        hit = await cache.lookup("extract_facts", key, "m", MESSAGES, 0.2)
+
+        assert hit.response == "- lives in Berlin"
+        assert not hit.semantic
+        stats = cache.get_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["saved_latency_ms"] == 800.0
+
+    async def test_empty_response_not_stored(self, cache_db):
+        from src.core.response_cache import ResponseCache
+
+        cache = ResponseCache()
+        await cache.initialize(cache_db)
+        await cache.store("extract_facts", "k", "m", 0.2, "  ", latency_ms=10)
+
+        assert (await cache.lookup("extract_facts", "k", "m", MESSAGES, 0.2)).response is None
+
+    async def test_ttl_expiry(self, cache_db, monkeypatch):
+        from src.core.config import config
+        from src.core.response_cache import ResponseCache
+
+        cache = ResponseCache()
+        await cache.initialize(cache_db)
+        await cache.store("extract_facts", "k", "m", 0.2, "old", latency_ms=10)
+
+        monkeypatch.setattr(config.response_cache, "ttl_seconds", -1)
+        assert (await cache.lookup("extract_facts", "k", "m", MESSAGES, 0.2)).response is None
+        assert await cache.prune() == 1
+
+    async def test_size_cap_evicts_least_recently_used(self, cache_db, monkeypatch):
+        from src.core.config import config
+        from src.core.response_cache import ResponseCache
+
+        monkeypatch.setattr(config.response_cache, "max_entries", 2)
+        cache = ResponseCache()
+        await cache.initialize(cache_db)
+        for key in ("a", "b", "c"):
+            await cache.store("extract_facts", key, "m", 0.2, f"resp-{key}", latency_ms=1)
+        await cache.lookup("extract_facts", "a", "m", MESSAGES, 0.2)  # refresh "a"
+
+        await cache.prune()
+
+        assert (await cache.lookup("extract_facts", "a", "m", MESSAGES, 0.2)).response == "resp-a"
+        assert (await cache.lookup("extract_facts", "b", "m", MESSAGES, 0.2)).response is None
+
+    async def test_writes_wait_for_open_transaction(self, cache_db):
+        from src.core.response_cache import ResponseCache
+
+        async def rows():
+            async with cache_db.execute("SELECT cache_key, hit_count FROM llm_response_cache") as cursor:
+                return [tuple(row) for row in await cursor.fetchall()]
+
+        cache = ResponseCache()
+        await cache.initialize(cache_db)
+        await cache_db.execute("CREATE TABLE other (x)")
+        await cache_db.commit()
+
+        await cache_db.execute("INSERT INTO other VALUES (1)")  # Another caller's unfinished work
+        await cache.store("extract_facts", "k", "m", 0.2, "answer", latency_ms=5)
+        assert (await cache.lookup("extract_facts", "k", "m", MESSAGES, 0.2)).response == "answer"
+        assert await rows() == []  # Nothing committed over the open transaction
+        await cache_db.rollback()
+
+        assert (await cache.lookup("extract_facts", "k", "m", MESSAGES, 0.2)).response == "answer"
+        assert await rows() == [("k", 2)]
+        async with cache_db.execute("SELECT COUNT(*) FROM other") as cursor:
+            assert (await cursor.fetchone())[0] == 0
+
+    async def test_pending_writes_bounded(self, cache_db):
+        from src.core.response_cache import ResponseCache
+
+        cache = ResponseCache()
+        await cache.initialize(cache_db)
+        cache.MAX_PENDING = 2
+        await cache_db.execute("DELETE FROM llm_response_cache")  # Keeps a transaction open
+        for key in ("a", "b", "c"):
+            await cache.store("extract_facts", key, "m", 0.2, f"resp-{key}", latency_ms=1)
+
+        assert list(cache._pending) == ["b", "c"]
+
+    async def test_semantic_hit_opt_in(self, cache_db, monkeypatch):
+        """Near-duplicate prompts hit only on opted-in sites at low temperature."""
+        from src.core.config import config
+        from src.core.response_cache import ResponseCache
+
+        original = [{"role": "user", "content": "Summarize: meeting moved to Monday"}]
+        similar = [{"role": "user", "content": "Summarize: the meeting moved to Monday"}]
+        embeddings = FakeEmbeddings({
+            original[0]["content"]: [1.0, 0.0, 0.1],
+            similar[0]["content"]: [1.0, 0.0, 0.11],
+        })
+        cache = ResponseCache()
+        await cache.initialize(cache_db, embeddings)
+        monkeypatch.setattr(config.response_cache, "semantic_sites", ["compress_history"])
+
+        miss = await cache.lookup("compress_history", "k1", "m", original, 0.2)
+        await cache.store("compress_history", "k1", "m", 0.2, "Monday meeting", 500, miss.embedding)
+
+        hit = await cache.lookup("compress_history", "k2", "m", similar, 0.2)
+        assert hit.response == "Monday meeting" and hit.semantic
+
+        # Too warm for semantic reuse
+        assert (await cache.lookup("compress_history", "k3", "m", similar, 0.9)).response is None
+
+    async def test_disabled_site(self, monkeypatch, cache_db):
+        from src.core.config import config
+        from src.core.response_cache import ResponseCache
+
+        cache = ResponseCache()
+        assert not cache.is_enabled("extract_facts")  # Not initialized
+
+        await cache.initialize(cache_db)
+        assert cache.is_enabled("extract_facts")
+        assert not cache.is_enabled("unknown_site")
+        monkeypatch.setitem(config.response_cache.sites, "extract_facts", False)
+        assert not cache.is_enabled("extract_facts")
+
+
+class TestChatIntegration:
+    """lm_client.chat() consults the cache for non-streaming calls."""
+
+    async def test_second_call_served_from_cache(self, cache_db, monkeypatch):
+        from types import SimpleNamespace
+        from src.core import lm_client as lm_module
+        from src.core.response_cache import ResponseCache
+
+        cache = ResponseCache()
+        await cache.initialize(cache_db)
+        monkeypatch.setattr(lm_module, "response_cache", cache)
+
+        calls = []
+
+        async def create(**params):
+            calls.append(params)
+            message = SimpleNamespace(content="cached answer")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+        client = lm_module.LMStudioClient()
+        client.client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+        )
+
+        for _ in range(2):
+            result = await client.chat(MESSAGES, stream=False, cache_site="agent_verify")
+            assert result == "cached answer"
+        await client.chat(MESSAGES, stream=False)  # No site: always calls the model
+
+        assert len(calls) == 2
+        assert cache.get_stats()["sites"]["agent_verify"]["exact_hits"] == 1
@@ -0,0 +1,308 @@
+"""
+Tests for the RAG retrieval pipeline (hybrid candidates, MMR, rerank cache, merge).
+"""
+import re
+import pytest
+import pytest_asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+TOPICS = ("apples", "pears", "plums")
+
+
+def topic_vector(text):
+    """Embedding stand-in: topic word counts ([] when the text has none)."""
+    vector = [float(text.count(topic)) for topic in TOPICS]
+    return vector if any(vector) else []
+
+
+async def topic_embeddings(texts):
+    return [topic_vector(t) for t in texts]
+
+
+async def topic_embedding(text):
+    return topic_vector(text)
+
+
+def sections(*names):
+    return "".join(f"# {name}\n\nAll about {name} and nothing else.\n\n" for name in names)
+
+
+@pytest.fixture(autouse=True)
+def retrieval_env(monkeypatch, word_tokenizer):
+    from src.core.config import config
+    from src.core.lm_client import lm_client
+
+    monkeypatch.setattr(lm_client, "get_embeddings", topic_embeddings)
+    monkeypatch.setattr(lm_client, "get_embedding", topic_embedding)
+    monkeypatch.setattr(config.rag, "chunk_size", 10)
+    monkeypatch.setattr(config.rag, "chunk_overlap", 0)
+    monkeypatch.setattr(config.rag, "rerank_enabled", False)
+
+
+@pytest_asyncio.fixture
+async def engine(schema_db):
+    from src.core.rag import RAGEngine
+
+    engine = RAGEngine()
+    await engine.initialize(schema_db)
+    return engine
+
+
+async def add_text(engine, tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return await engine.add_document(str(path))
+
+
+def chunk(doc, index, start, end, text, score=0.0):
+    from src.core.rag import Chunk
+    return Chunk(id=index, document_id=doc, content=text[start:end], chunk_index=index,
+                 tokens=len(text[start:end].split()), score=score, char_start=start, char_end=end)
+
+
+class TestStages:
+    """Tests for the pure pipeline stages."""
+
+    def test_mmr_skips_near_duplicates(self):
+        import numpy as np
+        from src.core.retrieval import mmr_select
+
+        relevance = np.array([1.0, 0.98, 0.6])
+        similarity = np.array([[1.0, 0.97, 0.1],
+                               [0.97, 1.0, 0.1],
+                               [0.1, 0.1, 1.0]])
+
+        assert mmr_select(relevance, similarity, 2, 0.5) == [0, 2]
+        assert mmr_select(relevance, similarity, 2, 1.0) == [0, 1]
+
+    def test_merge_overlapping_and_adjacent_neighbours(self):
+        from src.core.retrieval import merge_neighbours
+
+        text = " ".join(f"w{i}" for i in range(40))
+        at = [m.start() for m in re.finditer(r"\S+", text)] + [len(text) + 1]
+        a = chunk("d", 0, 0, at[10] - 1, text, 0.5)           # w0..w9
+        b = chunk("d", 1, at[7], at[20] - 1, text, 0.9)       # w7..w19, overlaps a
+        c = chunk("d", 3, at[30], at[40] - 1, text, 0.4)      # Not a neighbour of b
+        other = chunk("e", 2, 0, at[5] - 1, text, 0.7)
+
+        merged = merge_neighbours([b, other, a, c], lambda s: len(s.split()))
+
+        assert [m.document_id for m in merged] == ["d", "e", "d"]  # Best part's rank
+        assert merged[0].content == text[0:at[20] - 1]
+        assert (merged[0].char_start, merged[0].char_end, merged[0].tokens) == (0, at[20] - 1, 20)
+        assert merged[0].score == 0.9
+        assert merged[2] is c
+
+    def test_pack_skips_what_does_not_fit(self):
+        from src.core.retrieval import pack
+
+        text = "a b c d e f g h i j"
+        big, small = chunk("d", 0, 0, 19, text), chunk("d", 1, 0, 5, text)
+        assert pack([big, small], max_tokens=5) == [small]
+
+
+class TestRetrievalPipeline:
+    """Tests for RetrievalPipeline against an indexed database."""
+
+    async def test_keyword_candidates_find_unembedded_chunks(self, engine, tmp_path, monkeypatch):
+        from src.core.config import config
+        from src.core.retrieval import STAGES
+
+        monkeypatch.setattr(config.rag, "merge_neighbours", False)
+        text = sections("apples", "pears") + "# zeppelin\n\nThe zeppelin flies over everything.\n\n"
+        await add_text(engine, tmp_path, "mixed.md", text)
+
+        keyword = await engine.keyword_candidates("zeppelin", 5)
+        result = await engine.retrieval.retrieve("apples and the zeppelin", max_tokens=100)
+
+        assert len(keyword) == 1
+        contents = [c.content for c in result.chunks]
+        assert contents[0].startswith("# apples")
+        assert any(c.startswith("# zeppelin") for c in contents)
+        assert set(result.timings_ms) == set(STAGES)
+
+    async def test_overlapping_hits_merged_before_packing(self, engine, tmp_path, monkeypatch):
+        from src.core.config import config
+
+        monkeypatch.setattr(config.rag, "chunk_size", 20)
+        monkeypatch.setattr(config.rag, "chunk_overlap", 5)
+        text = " ".join(f"w{i}" for i in range(60))
+        await add_text(engine, tmp_path, "words.txt", text)
+
+        result = await engine.retrieval.retrieve("w17 w18", max_tokens=100)
+
+        assert len(result.chunks) == 1
+        merged = result.chunks[0]
+        assert merged.content == text[merged.char_start:merged.char_end]
+        assert merged.content.startswith("w0 ") and merged.content.endswith(" w34")
+
+    async def test_rerank_orders_and_caches_scores(self, engine, tmp_path, monkeypatch):
+        from src.core.config import config
+        from src.core.lm_client import lm_client
+
+        calls = []
+
+        async def rerank_model(messages, **kwargs):
+            calls.append(messages)
+            passages = re.findall(r"^\[\d+\] (.*)$", messages[-1]["content"], re.M)
+            return "[" + ", ".join("9" if "pears" in p else "1" for p in passages) + "]"
+
+        monkeypatch.setattr(lm_client, "chat", rerank_model)
+        monkeypatch.setattr(config.rag, "rerank_enabled", True)
+        monkeypatch.setattr(config.rag, "merge_neighbours", False)
+        await add_text(engine, tmp_path, "fruit.md", sections("apples", "pears"))
+
+        first = await engine.retrieval.retrieve("apples or pears?")
+        second = await engine.retrieval.retrieve("Apples  or pears?")  # Same normalized query
+
+        assert len(calls) == 1
+        assert [c.heading_path for c in first.chunks] == ["pears", "apples"]
+        assert [c.content for c in second.chunks] == [c.content for c in first.chunks]
+        stats = engine.retrieval.get_stats()
+        assert (stats["rerank_cache_hits"], stats["rerank_cache_misses"]) == (2, 2)
+
+    async def test_rerank_cache_waits_for_open_transaction(self, engine, tmp_path, monkeypatch):
+        from src.core.config import config
+        from src.core.lm_client import lm_client
+
+        calls = []
+
+        async def rerank_model(messages, **kwargs):
+            calls.append(messages)
+            passages = re.findall(r"^\[\d+\] (.*)$", messages[-1]["content"], re.M)
+            return "[" + ", ".join("9" if "pears" in p else "1" for p in passages) + "]"
+
+        async def cached_rows():
+            async with engine._db.execute("SELECT COUNT(*) FROM rerank_cache") as cursor:
+                return (await cursor.fetchone())[0]
+
+        monkeypatch.setattr(lm_client, "chat", rerank_model)
+        monkeypatch.setattr(config.rag, "rerank_enabled", True)
+        monkeypatch.setattr(config.rag, "retrieval_cache_enabled", False)
+        await add_text(engine, tmp_path, "fruit.md", sections("apples", "pears"))
+
+        # Another caller's unfinished change on the shared connection
+        await engine._db.execute("UPDATE documents SET filename = 'half-done.md'")
+        await engine.retrieval.retrieve("apples or pears?")
+        await engine.retrieval.retrieve("apples or pears?")
+        assert len(calls) == 1 and await cached_rows() == 0  # Served from memory, not committed
+        await engine._db.rollback()
+
+        await engine.retrieval.retrieve("apples or pears?")
+        assert len(calls) == 1 and await cached_rows() == 2
+        assert [doc.filename for doc in await engine.list_documents()] == ["fruit.md"]
+
+    async def test_pending_rerank_scores_bounded(self, engine, tmp_path, monkeypatch):
+        from src.core.config import config
+        from src.core.lm_client import lm_client
+
+        async def rerank_model(messages, **kwargs):
+            passages = re.findall(r"^\[\d+\] (.*)$", messages[-1]["content"], re.M)
+            return "[" + ", ".join("5" for _ in passages) + "]"
+
+        monkeypatch.setattr(lm_client, "chat", rerank_model)
+        monkeypatch.setattr(config.rag, "rerank_enabled", True)
+        monkeypatch.setattr("src.core.retrieval.MAX_PENDING_SCORES", 1)
+        await add_text(engine, tmp_path, "fruit.md", sections("apples", "pears"))
+
+        await engine._db.execute("UPDATE documents SET filename = 'half-done.md'")  # Held open
+        await engine.retrieval.retrieve("apples or pears?")
+
+        assert len(engine.retrieval._pending_scores) == 1
+        await engine._db.rollback()
+
+    async def test_vector_candidates_ranked_by_cosine(self, engine, tmp_path):
+        await add_text(engine, tmp_path, "fruit.md", sections("apples", "pears", "plums"))
+
+        ranked = await engine.vector_candidates([0.1, 1.0, 0.0], 2)
+        chunks = await engine.get_chunks([chunk_id for chunk_id, _ in ranked])
+        by_id = {c.id: c for c in chunks}
+
+        assert [by_id[chunk_id].heading_path for chunk_id, _ in ranked] == ["pears", "apples"]
+        assert ranked[0][1] == pytest.approx(1.0 / (0.01 + 1.0) ** 0.5)
+
+
+class TestRetrievalCache:
+    """Tests for the per-query result cache."""
+
+    async def test_repeat_and_near_duplicate_queries_hit(self, engine, tmp_path, monkeypatch):
+        from src.core.lm_client import lm_client
+
+        await add_text(engine, tmp_path, "fruit.md", sections("apples", "pears"))
+        first = await engine.retrieval.retrieve("apples please")
+
+        async def fail(*args, **kwargs):
+            raise AssertionError("cached queries must not search")
+
+        monkeypatch.setattr(engine, "vector_candidates", fail)
+        again = await engine.retrieval.retrieve("apples please")
+
+        async def nearly_apples(text):
+            return [1.0, 0.01, 0.0]
+
+        monkeypatch.setattr(lm_client, "get_embedding", nearly_apples)
+        near = await engine.retrieval.retrieve("tell me about apples")
+
+        assert again.cached and near.cached
+        assert [c.content for c in again.chunks] == [c.content for c in first.chunks]
+        assert [c.content for c in near.chunks] == [c.content for c in first.chunks]
+        stats = engine.retrieval.get_stats()["cache"]
+        assert (stats["hits"], stats["near_hits"], stats["misses"]) == (2, 1, 1)
+        assert stats["hit_rate"] == 0.67
+
+    async def test_index_changes_invalidate(self, engine, tmp_path):
+        doc = await add_text(engine, tmp_path, "fruit.md", sections("apples"))
+        assert (await engine.retrieval.retrieve("apples")).chunks
+
+        await engine.remove_document(doc.id)
+        assert (await engine.retrieval.retrieve("apples")).chunks == []
+
+        await add_text(engine, tmp_path, "more.md", sections("pears", "apples"))
+        result = await engine.retrieval.retrieve("apples")
+        assert not result.cached and result.chunks
+        assert engine.retrieval.get_stats()["cache"]["invalidations"] == 2
+
+    async def test_other_worker_changes_invalidate(self, engine, tmp_path, connect_db):
+        from src.core.rag import RAGEngine
+
+        doc = await add_text(engine, tmp_path, "fruit.md", sections("apples"))
+        assert (await engine.retrieval.retrieve("apples")).chunks
+        other = RAGEngine()  # A second API worker on its own connection
+        await other.initialize(await connect_db())
+
+        await other.remove_document(doc.id)
+        result = await engine.retrieval.retrieve("apples")
+        assert not result.cached and result.chunks == []
+
+    async def test_rolled_back_changes_invalidate(self, engine, tmp_path, monkeypatch):
+        from src.core.chunker import TextChunk
+        from src.core.config import config
+
+        monkeypatch.setattr(config.rag, "merge_neighbours", False)
+        doc = await add_text(engine, tmp_path, "fruit.md", sections("apples"))
+        chunks = [TextChunk(content="apples again", tokens=2, char_start=0, char_end=12)]
+        embeddings, _ = await engine.embed_chunks(chunks)
+        await engine.add_chunks(doc.id, 5, chunks, embeddings)
+        assert len((await engine.retrieval.retrieve("apples")).chunks) == 2  # Sees the open transaction
+        await engine._db.rollback()
+
+        result = await engine.retrieval.retrieve("apples")
+        assert not result.cached and len(result.chunks) == 1
+
+    def test_bounded_in_bytes(self):
+        from src.core.rag import Chunk
+        from src.core.retrieval import RetrievalCache
+
+        cache = RetrievalCache(max_bytes=4000, threshold=0.99)
+        for i in range(10):
+            chunks = [Chunk(id=i, content="x" * 1000)]
+            cache.store(0, "", [float(i), 1.0], f"q{i}", chunks, 1)
+
+        stats = cache.get_stats()
+        assert stats["bytes"] <= 4000 and stats["entries"] < 10 and stats["evictions"] > 0
+        assert cache.lookup(0, "", [9.0, 1.0], "q9") is not None  # Most recent kept
+        assert cache.lookup(0, "", [0.0, 1.0], "q0") is None
+        assert cache.lookup(1, "", [9.0, 1.0], "q9") is None  # New generation
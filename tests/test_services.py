@@ -0,0 +1,113 @@
+"""
+Tests for the startup service registry and background router warm-up.
+"""
+import asyncio
+import time
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def recorder(log: list, name: str, delay: float = 0.05, fail: bool = False):
+    async def init():
+        log.append(f"start:{name}")
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{name} broken")
+        log.append(f"done:{name}")
+    return init
+
+
+class TestServiceRegistry:
+    """Tests for ServiceRegistry."""
+
+    async def test_independent_services_run_concurrently(self):
+        from src.core.services import ServiceRegistry
+
+        registry = ServiceRegistry()
+        events = []
+        for name in ("a", "b", "c"):
+            registry.register(name, recorder(events, name, delay=0.1))
+
+        start = time.perf_counter()
+        await registry.start()
+
+        assert time.perf_counter() - start < 0.25  # Not 3 x 0.1s
+        assert set(registry.get_timings()) == {"a", "b", "c"}
+
+    async def test_dependencies_initialize_first(self):
+        from src.core.services import ServiceRegistry
+
+        registry = ServiceRegistry()
+        events = []
+        registry.register("rag", recorder(events, "rag"), depends=("memory",))
+        registry.register("memory", recorder(events, "memory"))
+
+        await registry.start()
+
+        assert events.index("done:memory") < events.index("start:rag")
+        assert registry.get_stats()["services"]["rag"]["ready_at_ms"] >= \
+            registry.get_stats()["services"]["memory"]["ready_at_ms"]
+
+    async def test_lazy_service_waits_for_first_use(self):
+        from src.core.services import ServiceRegistry
+
+        registry = ServiceRegistry()
+        events = []
+        registry.register("memory", recorder(events, "memory", delay=0))
+        registry.register("parsers", recorder(events, "parsers", delay=0), lazy=True)
+
+        await registry.start()
+        assert not registry.is_ready("parsers")
+
+        await asyncio.gather(registry.ensure("parsers"), registry.ensure("parsers"))
+        assert events.count("start:parsers") == 1
+        assert registry.is_ready("parsers")
+
+    async def test_failure_is_reported(self):
+        from src.core.services import ServiceRegistry
+
+        registry = ServiceRegistry()
+        events = []
+        registry.register("memory", recorder(events, "memory", delay=0, fail=True))
+        registry.register("rag", recorder(events, "rag", delay=0), depends=("memory",))
+        registry.register("embeddings", recorder(events, "embeddings", delay=0))
+
+        with pytest.raises(RuntimeError, match="memory broken"):
+            await registry.start()
+
+        stats = registry.get_stats()["services"]
+        assert "start:rag" not in events
+        assert stats["rag"]["error"].startswith("dependency failed")
+        assert stats["embeddings"]["ready"]
+
+
+class SlowEmbeddings:
+    """Embedding service whose vectors arrive only when released."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def get_or_compute(self, text):
+        await self.release.wait()
+        return [1.0, 0.0] if "код" in text.lower() or "code" in text.lower() else [0.0, 1.0]
+
+
+class TestRouterWarmup:
+    """Semantic router embeds intent probes in the background."""
+
+    async def test_keyword_fallback_until_ready(self):
+        from src.core.semantic_router import SemanticRouter
+
+        router = SemanticRouter()
+        embeddings = SlowEmbeddings()
+        await router.initialize(lm_client=None, embedding_service=embeddings, background=True)
+
+        assert not router.ready
+        decision = await router.route("Hello")  # Must not block on probe embedding
+        assert decision.confidence < 1.0
+
+        embeddings.release.set()
+        assert await router.wait_ready(timeout=2.0)
@@ -0,0 +1,96 @@
+"""
+Tests for per-client session state.
+"""
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class FakeAgent:
+    """Agent stand-in with the is_running property."""
+
+    def __init__(self):
+        self.is_running = False
+
+
+async def make_agent():
+    return FakeAgent()
+
+
+class TestSessionManager:
+    """Tests for SessionManager."""
+
+    def test_sessions_are_isolated(self):
+        from src.core.sessions import SessionManager
+
+        manager = SessionManager(max_sessions=8, idle_ttl=60)
+        tab_a = manager.get("tab-a")
+        tab_b = manager.get("tab-b")
+        tab_a.conversation_id = "conv-a"
+        tab_a.pending_feedback_msg_id = 1
+
+        assert tab_b.conversation_id is None
+        assert tab_b.pending_feedback_msg_id is None
+        assert manager.get("tab-a") is tab_a
+
+    def test_missing_id_uses_default_session(self):
+        from src.core.sessions import SessionManager, DEFAULT_SESSION
+
+        manager = SessionManager(max_sessions=8, idle_ttl=60)
+        assert manager.get(None).id == DEFAULT_SESSION
+        assert manager.get("") is manager.get(None)
+
+    async def test_agent_per_session(self):
+        from src.core.sessions import SessionManager
+
+        manager = SessionManager(agent_factory=make_agent, max_sessions=8, idle_ttl=60)
+        tab_a, tab_b = manager.get("a"), manager.get("b")
+
+        agents = await asyncio.gather(manager.get_agent(tab_a), manager.get_agent(tab_a))
+        assert agents[0] is agents[1]  # Created once even when requested concurrently
+        assert await manager.get_agent(tab_b) is not agents[0]
+
+    def test_lru_eviction_skips_busy(self):
+        from src.core.sessions import SessionManager
+
+        manager = SessionManager(max_sessions=2, idle_ttl=60)
+        busy = manager.get("busy")
+        busy.begin_request()
+        manager.get("idle")
+        manager.get("new")
+
+        assert manager.peek("busy") is busy
+        assert manager.peek("idle") is None
+        assert len(manager) == 2
+        assert manager.get_stats()["evicted"] == 1
+
+    def test_idle_eviction(self):
+        from src.core.sessions import SessionManager
+
+        manager = SessionManager(max_sessions=8, idle_ttl=10)
+        old = manager.get("old")
+        running = manager.get("agent")
+        running.agent = FakeAgent()
+        running.agent.is_running = True
+        fresh = manager.get("fresh")
+
+        now = old.last_seen + 11
+        fresh.last_seen = now
+        assert manager.evict_idle(now=now) == 1
+
+        assert manager.peek("old") is None
+        assert manager.peek("agent") is running  # Agent still working
+        assert manager.peek("fresh") is fresh
+
+    def test_end_request_never_negative(self):
+        from src.core.sessions import SessionManager
+
+        session = SessionManager(max_sessions=8, idle_ttl=60).get("s")
+        session.begin_request()
+        session.end_request()
+        session.end_request()
+        assert session.active_requests == 0
+        assert not session.busy
@@ -0,0 +1,144 @@
+"""
+Tests for speculative (draft + deep revision) thinking mode.
+"""
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+class FakeClient:
+    """Streams scripted answers per thinking mode."""
+
+    def __init__(self, draft, deep, deep_gate=None, deep_error=False):
+        self.script = {"fast": draft, "deep": deep}
+        self.deep_gate = deep_gate
+        self.deep_error = deep_error
+
+    def get_mode_config(self, mode):
+        from types import SimpleNamespace
+        return SimpleNamespace(model=f"{mode.value}-model")
+
+    async def chat(self, messages, thinking_mode, temperature=None, stream=True, cancel_token=None):
+        pieces = self.script[thinking_mode.value]
+        is_deep = thinking_mode.value == "deep"
+
+        async def gen():
+            if is_deep and self.deep_gate is not None:
+                await self.deep_gate.wait()
+            if is_deep and self.deep_error:
+                yield "\n[Error: model crashed]"
+            for piece in pieces:
+                yield piece
+
+        return gen()
+
+
+async def collect(engine, run):
+    return [item async for item in engine.stream(run)]
+
+
+MESSAGES = [{"role": "user", "content": "Why is the sky blue?"}]
+
+
+class TestSpeculativeEngine:
+    """Tests for SpeculativeEngine."""
+
+    async def test_draft_then_revision(self):
+        from src.core.speculative import SpeculativeEngine
+
+        client = FakeClient(draft=["Rayleigh", " scattering."], deep=["Because of Rayleigh scattering."])
+        engine = SpeculativeEngine(client)
+        run = engine.start(MESSAGES)
+
+        items = await collect(engine, run)
+
+        assert "".join(i for i in items if isinstance(i, str)) == "Rayleigh scattering."
+        metas = [i for i in items if isinstance(i, dict)]
+        assert [m["_meta"] for m in metas] == ["draft_done", "revision"]
+        assert metas[1]["content"] == "Because of Rayleigh scattering."
+        assert metas[1]["changed"] is True
+        assert metas[1]["draft_first_token_ms"] is not None
+        assert metas[1]["deep_first_token_ms"] is not None
+
+    async def test_accept_cancels_deep(self):
+        from src.core.speculative import SpeculativeEngine
+
+        client = FakeClient(draft=["draft"], deep=["never"], deep_gate=asyncio.Event())
+        engine = SpeculativeEngine(client)
+        run = engine.start(MESSAGES)
+
+        stream = engine.stream(run)
+        items = []
+        async for item in stream:
+            items.append(item)
+            if isinstance(item, dict) and item["_meta"] == "draft_done":
+                assert engine.accept(run.id)
+
+        assert items[-1]["_meta"] == "accepted"
+        assert run.deep_task.cancelled()
+        assert not engine.accept(run.id)  # Already finished
+        assert engine.get_stats()["outcomes"]["accepted"] == 1
+
+    async def test_run_id_names_worker(self):
+        from src.core.speculative import SpeculativeEngine, run_owner
+
+        client = FakeClient(draft=["draft"], deep=["deep"])
+        engine = SpeculativeEngine(client, worker_id="worker-a")
+        run = engine.start(MESSAGES)
+        await collect(engine, run)
+
+        assert run_owner(run.id) == "worker-a"
+        assert run_owner("abc123") is None
+
+    async def test_deep_failure_keeps_draft(self):
+        from src.core.speculative import SpeculativeEngine
+
+        engine = SpeculativeEngine(FakeClient(draft=["draft"], deep=[], deep_error=True))
+        run = engine.start(MESSAGES)
+
+        items = await collect(engine, run)
+
+        assert items[0] == "draft"
+        assert items[-1]["_meta"] == "revision_failed"
+        assert engine.get_stats()["outcomes"]["failed"] == 1
+
+    async def test_unchanged_revision(self):
+        from src.core.speculative import SpeculativeEngine
+
+        engine = SpeculativeEngine(FakeClient(draft=["Same answer "], deep=["Same answer"]))
+        items = await collect(engine, engine.start(MESSAGES))
+
+        assert items[-1]["_meta"] == "revision"
+        assert items[-1]["changed"] is False
+
+    async def test_closed_stream_cancels_deep(self):
+        """Client disconnect stops the deep run too."""
+        from src.core.speculative import SpeculativeEngine
+
+        client = FakeClient(draft=["a", "b"], deep=["x"], deep_gate=asyncio.Event())
+        engine = SpeculativeEngine(client)
+        run = engine.start(MESSAGES)
+
+        stream = engine.stream(run)
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0)
+
+        assert run.deep_task.cancelled()
+        assert engine.get_stats()["outcomes"]["cancelled"] == 1
+        assert engine.get_stats()["active_runs"] == 0
+
+    async def test_latency_stats(self):
+        from src.core.speculative import SpeculativeEngine
+
+        engine = SpeculativeEngine(FakeClient(draft=["d"], deep=["deep"]))
+        for _ in range(3):
+            await collect(engine, engine.start(MESSAGES))
+
+        stats = engine.get_stats()
+        assert stats["draft_first_token"]["count"] == 3
+        assert stats["deep_first_token"]["count"] == 3
+        assert stats["outcomes"]["revised"] == 3
@@ -0,0 +1,115 @@
+"""
+Tests for chat stream framing and token coalescing.
+"""
+import asyncio
+import json
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+async def collect(aiter):
+    return [item async for item in aiter]
+
+
+async def burst(items):
+    """Source that yields without pausing."""
+    for item in items:
+        yield item
+
+
+class TestStreamWriter:
+    """Tests for SSE / NDJSON framing."""
+
+    def test_sse_token_matches_json_dumps(self):
+        from src.api.streaming import StreamWriter, StreamFormat
+
+        writer = StreamWriter(StreamFormat.SSE)
+        text = 'Привет "мир"\n\t<tag> \\ 🙂'
+
+        assert writer.token(text) == f"data: {json.dumps({'token': text})}\n\n"
+        assert writer.media_type == "text/event-stream"
+
+    def test_ndjson_lines(self):
+        from src.api.streaming import StreamWriter, StreamFormat
+
+        writer = StreamWriter(StreamFormat.NDJSON)
+        frame = writer.token("a") + writer.event({"done": True})
+
+        lines = frame.splitlines()
+        assert [json.loads(line) for line in lines] == [{"token": "a"}, {"done": True}]
+        assert writer.media_type == "application/x-ndjson"
+
+
+class TestCoalesceTokens:
+    """Tests for coalesce_tokens."""
+
+    async def test_burst_merged(self):
+        """Tokens arriving together become one frame."""
+        from src.api.streaming import coalesce_tokens
+
+        out = await collect(coalesce_tokens(burst(["a", "b", "c"]), flush_interval=0.05))
+        assert out == ["abc"]
+
+    async def test_control_items_flush_and_keep_order(self):
+        """Control items split the buffer and pass through unchanged."""
+        from src.api.streaming import coalesce_tokens
+
+        items = ["a", "b", {"_meta": "thinking_start"}, "c", {"_meta": "thinking_end"}]
+        out = await collect(coalesce_tokens(burst(items), flush_interval=0.05))
+
+        assert out == ["ab", {"_meta": "thinking_start"}, "c", {"_meta": "thinking_end"}]
+
+    async def test_max_chars_flushes_early(self):
+        from src.api.streaming import coalesce_tokens
+
+        out = await collect(coalesce_tokens(burst(["aa"] * 5), flush_interval=1.0, max_chars=4))
+        assert out == ["aaaa", "aaaa", "aa"]
+
+    async def test_window_flush_on_stalled_upstream(self):
+        """Buffered text is released after the window even if upstream stalls."""
+        from src.api.streaming import coalesce_tokens
+
+        gate = asyncio.Event()
+
+        async def stalled():
+            yield "x"
+            await gate.wait()
+            yield "y"
+
+        stream = coalesce_tokens(stalled(), flush_interval=0.01)
+        first = await asyncio.wait_for(stream.__anext__(), 0.5)
+        assert first == "x"
+
+        gate.set()
+        assert await collect(stream) == ["y"]
+
+    async def test_custom_control_predicate(self):
+        """Error chunks can be kept out of merged frames."""
+        from src.api.streaming import coalesce_tokens
+
+        items = ["ok", "\n[Error: boom]"]
+        out = await collect(coalesce_tokens(
+            burst(items),
+            flush_interval=0.05,
+            is_control=lambda c: not isinstance(c, str) or c.startswith("\n[Error:")
+        ))
+        assert out == ["ok", "\n[Error: boom]"]
+
+    async def test_disabled_passthrough(self):
+        from src.api.streaming import coalesce_tokens
+
+        out = await collect(coalesce_tokens(burst(["a", "b"]), flush_interval=0))
+        assert out == ["a", "b"]
+
+    async def test_source_errors_propagate(self):
+        from src.api.streaming import coalesce_tokens
+
+        async def failing():
+            yield "a"
+            raise RuntimeError("upstream")
+
+        with pytest.raises(RuntimeError):
+            await collect(coalesce_tokens(failing(), flush_interval=0.05))
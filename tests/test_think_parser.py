@@ -0,0 +1,141 @@
+"""
+Tests for ThinkTagParser (incremental think-tag filtering).
+"""
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def run_parser(pieces, **kwargs):
+    """Feed pieces and return (visible_text, end_events, parser)."""
+    from src.core.think_parser import ThinkTagParser, ThinkEvent
+
+    parser = ThinkTagParser(**kwargs)
+    visible = []
+    ends = []
+    outputs = []
+    for piece in pieces:
+        outputs.extend(parser.feed(piece))
+    outputs.extend(parser.flush())
+
+    for item in outputs:
+        if isinstance(item, ThinkEvent):
+            if item.kind == "end":
+                ends.append(item)
+        else:
+            visible.append(item)
+    return "".join(visible), ends, parser
+
+
+SAMPLE = "Hi <b>there</b>! <think>plan a<b, x</y</think>Answer <THINKING>more</thinking> done <"
+
+
+class TestThinkTagParser:
+    """Tests for tag detection and buffering."""
+
+    def test_single_chunk(self):
+        """Whole text in one chunk filters both blocks."""
+        visible, ends, _ = run_parser([SAMPLE])
+
+        assert visible == "Hi <b>there</b>! Answer  done <"
+        assert [e.content for e in ends] == ["plan a<b, x</y", "more"]
+
+    def test_every_split_point(self):
+        """Splitting at any boundary gives the same result."""
+        expected = run_parser([SAMPLE])[:2]
+
+        for i in range(len(SAMPLE) + 1):
+            visible, ends, _ = run_parser([SAMPLE[:i], SAMPLE[i:]])
+            assert (visible, [e.content for e in ends]) == \
+                (expected[0], [e.content for e in expected[1]]), f"split at {i}"
+
+    def test_char_by_char(self):
+        """One character per chunk."""
+        visible, ends, _ = run_parser(list(SAMPLE))
+
+        assert visible == "Hi <b>there</b>! Answer  done <"
+        assert len(ends) == 2
+
+    def test_case_insensitive_and_tag_pairs(self):
+        """Close tag must match the open tag's pair, in any case."""
+        visible, ends, _ = run_parser(["<Reasoning>a</think>b</REASONING>c"])
+
+        assert visible == "c"
+        assert ends[0].content == "a</think>b"
+        assert ends[0].tag == "<reasoning>"
+
+    def test_tail_is_bounded(self):
+        """Only a possible tag prefix is held back."""
+        from src.core.think_parser import ThinkTagParser
+
+        parser = ThinkTagParser()
+        assert parser.feed("text <thinki") == ["text "]
+        assert parser.held_chars == len("<thinki")
+
+        assert parser.feed("ng") == []
+        assert parser.held_chars == len("<thinking")
+        assert parser.feed("!") == ["<thinking!"]
+        assert parser.held_chars == 0
+
+    def test_think_content_capped(self):
+        """Think content is capped but fully counted."""
+        visible, ends, parser = run_parser(
+            ["<think>"] + ["x" * 100] * 50 + ["</think>ok"],
+            max_think_chars=250
+        )
+
+        assert visible == "ok"
+        assert len(ends[0].content) == 250
+        assert ends[0].chars == 5000
+        assert parser.filtered_chars == 5000
+
+    def test_unclosed_block_dropped(self):
+        """Unclosed think block never leaks into visible output."""
+        visible, ends, parser = run_parser(["Start <think>secret", " more </thi"])
+
+        assert visible == "Start "
+        assert ends == []
+        assert parser.in_think_block
+
+    def test_stats(self):
+        """Visible/filtered counters and block count."""
+        _, _, parser = run_parser(list(SAMPLE))
+
+        assert parser.blocks == 2
+        assert parser.visible_chars == len("Hi <b>there</b>! Answer  done <")
+        assert parser.filtered_chars == len("plan a<b, x</y") + len("more")
+
+
+class TestStreamResponseIntegration:
+    """_stream_response yields the same events as before."""
+
+    async def test_meta_events(self):
+        from types import SimpleNamespace
+        from src.core.lm_client import LMStudioClient
+
+        pieces = ["Hel", "lo <th", "ink>hidden</th", "ink> world"]
+
+        async def gen():
+            for piece in pieces:
+                delta = SimpleNamespace(content=piece)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+        async def create(**params):
+            return gen()
+
+        client = LMStudioClient()
+        client.client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+        )
+
+        items = [item async for item in client._stream_response({"model": "test"})]
+        text = "".join(i for i in items if isinstance(i, str))
+        metas = [i for i in items if isinstance(i, dict)]
+
+        assert text == "Hello  world"
+        assert metas[0] == {"_meta": "thinking_start"}
+        assert metas[1]["_meta"] == "thinking_end"
+        assert metas[1]["think_content"] == "hidden"
+        assert metas[1]["chars_filtered"] == 6
@@ -0,0 +1,236 @@
+"""
+Tests for cross-worker coordination (change-table bus, agent registry).
+"""
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@pytest_asyncio.fixture
+async def worker_dbs(tmp_path):
+    """Two connections to one WAL database, as two API workers would have."""
+    import aiosqlite
+
+    path = str(tmp_path / "shared.db")
+    dbs = []
+    for _ in range(2):
+        db = await aiosqlite.connect(path)
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute("PRAGMA busy_timeout=5000")
+        dbs.append(db)
+    yield dbs
+    for db in dbs:
+        await db.close()
+
+
+async def make_buses(worker_dbs):
+    from src.core.worker_bus import WorkerBus
+
+    buses = [WorkerBus(worker_id=name) for name in ("worker-a", "worker-b")]
+    for bus, db in zip(buses, worker_dbs):
+        await bus.start(db, interval=3600)  # Tests poll by hand
+    await asyncio.sleep(0)  # Let the first (empty) poll run
+    return buses
+
+
+async def stop(buses):
+    for bus in buses:
+        await bus.stop()
+
+
+class TestWorkerBus:
+    """Tests for WorkerBus."""
+
+    async def test_events_reach_other_workers_only(self, worker_dbs):
+        a, b = await make_buses(worker_dbs)
+        got_a, got_b = [], []
+        a.subscribe("metrics", got_a.append)
+
+        async def handler(payload):
+            got_b.append(payload)
+        b.subscribe("metrics", handler)
+
+        await a.publish("metrics", {"reason": "outcome"})
+
+        assert await b.poll() == 1
+        assert await a.poll() == 0  # Publisher applied its own change already
+        assert got_b == [{"reason": "outcome"}]
+        assert got_a == []
+        assert await b.poll() == 0  # Delivered once
+        await stop([a, b])
+
+    async def test_publish_without_bus_is_noop(self, worker_dbs):
+        from src.core.worker_bus import WorkerBus
+
+        bus = WorkerBus(worker_id="single")
+        await bus.initialize(worker_dbs[0])
+        await bus.publish("metrics")
+
+        async with worker_dbs[0].execute("SELECT COUNT(*) FROM worker_events") as cursor:
+            assert (await cursor.fetchone())[0] == 0
+
+    async def test_new_worker_skips_old_events(self, worker_dbs):
+        from src.core.worker_bus import WorkerBus
+
+        a, b = await make_buses(worker_dbs)
+        await a.publish("metrics")
+
+        late = WorkerBus(worker_id="worker-c")
+        await late.initialize(worker_dbs[1])
+        assert await late.poll() == 0
+        await stop([a, b])
+
+    async def test_failing_handler_does_not_block(self, worker_dbs):
+        a, b = await make_buses(worker_dbs)
+        got = []
+        b.subscribe("metrics", lambda payload: 1 / 0)
+        b.subscribe("metrics", got.append)
+
+        await a.publish("metrics")
+        await b.poll()
+
+        assert got == [{}]
+        await stop([a, b])
+
+
+class TestAgentRegistry:
+    """Tests for AgentRegistry."""
+
+    async def test_lookup_across_workers(self, worker_dbs):
+        from src.core.worker_bus import AgentRegistry
+
+        a, b = await make_buses(worker_dbs)
+        reg_a, reg_b = AgentRegistry(a), AgentRegistry(b)
+        await reg_a.initialize(worker_dbs[0])
+        await reg_b.initialize(worker_dbs[1])
+
+        await reg_a.register("tab-1", "run-1")
+
+        entry = await reg_b.lookup("tab-1")
+        assert entry == {"run_id": "run-1", "worker_id": "worker-a", "local": False, "alive": True}
+        assert (await reg_a.lookup("tab-1"))["local"]
+        assert await reg_b.lookup("tab-2") is None
+        await stop([a, b])
+
+    async def test_dead_worker(self, worker_dbs):
+        from src.core.worker_bus import AgentRegistry
+        from src.core.config import config
+
+        a, b = await make_buses(worker_dbs)
+        reg_a, reg_b = AgentRegistry(a), AgentRegistry(b)
+        await reg_a.initialize(worker_dbs[0])
+        await reg_b.initialize(worker_dbs[1])
+        await reg_a.register("tab-1", "run-1")
+
+        stale = time.time() - config.workers.worker_timeout - 1
+        await worker_dbs[0].execute(
+            "UPDATE workers SET last_seen = ? WHERE worker_id = 'worker-a'", (stale,)
+        )
+        await worker_dbs[0].commit()
+
+        assert not (await reg_b.lookup("tab-1"))["alive"]
+        await stop([a, b])
+
+
+class FakeBus:
+    """Running bus of worker-a that sees worker-b alive."""
+
+    def __init__(self):
+        self.running = True
+        self.worker_id = "worker-a"
+        self.published = []
+
+    async def is_alive(self, worker_id):
+        return worker_id in ("worker-a", "worker-b")
+
+    async def publish(self, topic, payload=None):
+        self.published.append((topic, payload))
+
+
+class FakeRegistry:
+    def __init__(self, entry=None):
+        self.entry = entry
+
+    async def lookup(self, session_id):
+        return self.entry
+
+
+@pytest.fixture
+def api_workers(monkeypatch):
+    """The API module with a fresh session manager and fake bus/registry."""
+    from src.api import api
+    from src.core.sessions import SessionManager
+
+    async def no_agents():
+        raise AssertionError("agent created")
+
+    monkeypatch.setattr(api, "session_manager", SessionManager(agent_factory=no_agents))
+    monkeypatch.setattr(api, "worker_bus", FakeBus())
+    monkeypatch.setattr(api, "agent_registry", FakeRegistry())
+    return api
+
+
+def request_from(session_id):
+    from types import SimpleNamespace
+    from src.api.api import SESSION_HEADER
+
+    return SimpleNamespace(headers={SESSION_HEADER: session_id})
+
+
+class TestAgentEndpoints:
+    """Agent status/stop must not build an agent for the session."""
+
+    async def test_idle_session_gets_no_agent(self, api_workers):
+        api = api_workers
+
+        assert await api.agent_status(request_from("tab-1")) == {"running": False, "steps": []}
+        assert await api.stop_agent(request_from("tab-1")) == {"success": True}
+        assert api.session_manager.get("tab-1").agent is None
+
+    async def test_remote_run_read_without_session_agent(self, api_workers, monkeypatch):
+        from src.core.autogpt import AutoGPTRun
+
+        api = api_workers
+        api.agent_registry.entry = {"run_id": "run-1", "worker_id": "worker-b", "local": False, "alive": True}
+
+        class Reader:
+            def __init__(self, db=None):
+                pass
+
+            async def get_run(self, run_id):
+                return AutoGPTRun(id=run_id, goal="sum the logs")
+        monkeypatch.setattr(api, "ReflectiveAgent", Reader)
+
+        status = await api.agent_status(request_from("tab-1"))
+        assert status["running"] and status["goal"] == "sum the logs"
+
+        await api.stop_agent(request_from("tab-1"))
+        assert api.worker_bus.published == [(api.TOPIC_AGENT_STOP, {"run_id": "run-1"})]
+        assert api.session_manager.get("tab-1").agent is None
+
+
+class TestSpeculativeAccept:
+    """Accepting a run this worker doesn't have is forwarded only to its live owner."""
+
+    @pytest.mark.parametrize("run_id", ["abc123", "worker-a.abc123", "worker-c.abc123"])
+    async def test_unowned_run_not_found(self, api_workers, run_id):
+        from fastapi import HTTPException
+
+        api = api_workers
+        with pytest.raises(HTTPException) as exc:
+            await api.accept_speculative_draft(run_id)
+        assert exc.value.status_code == 404
+        assert api.worker_bus.published == []
+
+    async def test_forwarded_to_live_owner(self, api_workers):
+        api = api_workers
+
+        result = await api.accept_speculative_draft("worker-b.abc123")
+
+        assert result["forwarded"] and result["accepted"] == "unknown"
+        assert api.worker_bus.published == [(api.TOPIC_SPECULATIVE_ACCEPT, {"run_id": "worker-b.abc123"})]